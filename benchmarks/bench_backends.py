@@ -0,0 +1,70 @@
+"""
+Độ trễ mỗi beat của các backend inference (eager, fused, torchscript, onnx, onnx-int8)
+theo kích thước batch, kèm sai lệch probability so với eager.
+
+Cần chạy export_model.py / quantize_model.py trước để có artifact (thiếu thì bỏ qua).
+
+Chạy:
+    python benchmarks/bench_backends.py --batch 1 32 256
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import torch
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_model import (  # noqa: E402
+    ARTIFACT_SUFFIXES, BACKENDS, artifact_path, load_backend, load_model, weights_version
+)
+from export_model import compare, parity_beats  # noqa: E402
+
+
+def measure(forward, beats, batch, min_time):
+    """Thời gian trung bình mỗi beat (µs) khi gọi forward với batch cố định"""
+    chunks = [beats[i:i + batch] for i in range(0, len(beats) - batch + 1, batch)]
+    forward(chunks[0])
+    count, start = 0, time.perf_counter()
+    while True:
+        for chunk in chunks:
+            forward(chunk)
+        count += len(chunks) * batch
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / count * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default=os.path.join(ROOT, "resetECG_new.pth"))
+    parser.add_argument("--batch", type=int, nargs="+", default=[1, 32, 256])
+    parser.add_argument("--min-time", type=float, default=1.0, help="thời gian đo tối thiểu mỗi ô (giây)")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    version = weights_version(args.model)
+    beats = parity_beats()
+    beats = np.resize(beats, (max(len(beats), max(args.batch)), beats.shape[1]))
+    reference = load_backend("eager", model)(beats)
+
+    print(f"{len(beats)} beats, torch {torch.__version__}, {torch.get_num_threads()} thread\n")
+    print(f"{'backend':<12} {'max|Δp|':>9} " + " ".join(f"{f'b={b} µs/beat':>14}" for b in args.batch))
+    for backend in BACKENDS:
+        artifact = artifact_path(args.model, backend) if backend in ARTIFACT_SUFFIXES else None
+        try:
+            forward = load_backend(backend, model, artifact, expected_version=version)
+        except Exception as e:
+            print(f"{backend:<12} bỏ qua: {e}")
+            continue
+        max_diff, _ = compare(reference, forward(beats))
+        cells = " ".join(f"{measure(forward, beats, b, args.min_time):>14.1f}" for b in args.batch)
+        print(f"{backend:<12} {max_diff:>9.1e} {cells}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""
+Benchmark MicroBatcher: throughput và latency p50/p99 với nhiều cấu hình
+(max_batch_size, max_wait_ms) khi có nhiều client gửi đồng thời.
+
+Chạy:
+    python benchmarks/bench_batcher.py --clients 16 --duration 5
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_batcher import MicroBatcher  # noqa: E402
+from ecg_dsp import ecg_to_beats  # noqa: E402
+from ecg_model import load_model, torch_forward  # noqa: E402
+
+model_forward = torch_forward(load_model(os.path.join(ROOT, "resetECG_new.pth")))
+
+SETTINGS = [
+    (64, 0.0),
+    (64, 1.0),
+    (256, 2.0),
+    (256, 5.0),
+    (1024, 10.0),
+]
+
+
+def run_direct(beats, clients, duration):
+    """Baseline: mỗi request gọi model_forward riêng (hành vi cũ của /predict)"""
+    lock = threading.Lock()
+    latencies = []
+    stop = time.perf_counter() + duration
+    start = time.perf_counter()
+
+    def client():
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            model_forward(beats)
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000.0
+    return {
+        "throughput_rps": len(latencies) / elapsed,
+        "throughput_beats_per_s": len(latencies) * len(beats) / elapsed,
+        "mean_batch_beats": float(len(beats)),
+        "latency_p50_ms": p50,
+        "latency_p99_ms": p99,
+    }
+
+
+def run_setting(beats, max_batch_size, max_wait_ms, clients, duration):
+    batcher = MicroBatcher(model_forward, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+    stop = time.perf_counter() + duration
+
+    def client():
+        while time.perf_counter() < stop:
+            batcher.predict(beats)
+
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    stats = batcher.stats()
+    batcher.close()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=5.0)
+    parser.add_argument("--file", default=os.path.join(ROOT, "ecg_12s.txt"))
+    args = parser.parse_args()
+
+    beats = ecg_to_beats(np.loadtxt(args.file)).astype(np.float32)
+    print(f"{len(beats)} beats/request, {args.clients} clients, {args.duration:.0f}s mỗi cấu hình\n")
+    print(f"{'batch':>6} {'wait_ms':>8} {'req/s':>9} {'beats/s':>10} {'mean_batch':>11} {'p50_ms':>8} {'p99_ms':>8}")
+
+    def report(batch, wait, s):
+        print(f"{batch:>6} {wait:>8} {s['throughput_rps']:>9.1f} "
+              f"{s['throughput_beats_per_s']:>10.0f} {s['mean_batch_beats']:>11.1f} "
+              f"{s.get('latency_p50_ms', 0):>8.1f} {s.get('latency_p99_ms', 0):>8.1f}")
+
+    report("direct", "-", run_direct(beats, args.clients, args.duration))
+    for max_batch_size, max_wait_ms in SETTINGS:
+        s = run_setting(beats, max_batch_size, max_wait_ms, args.clients, args.duration)
+        report(max_batch_size, f"{max_wait_ms:.1f}", s)
+
+
+if __name__ == "__main__":
+    main()
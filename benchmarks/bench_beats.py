@@ -0,0 +1,110 @@
+"""
+Kiểm tra parity và đo tốc độ của ecg_to_beats (vector hóa) so với vòng lặp
+từng beat cũ (ecg_to_beats_reference).
+
+Chạy:
+    python benchmarks/bench_beats.py
+Thoát với mã lỗi 1 nếu kết quả lệch quá --atol.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+from scipy.signal import butter, filtfilt, find_peaks, resample, resample_poly
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_dsp import PIPELINE_FS, ecg_to_beats  # noqa: E402
+from generate_mock_ecg import generate_normal_ecg, generate_abnormal_ecg  # noqa: E402
+
+
+def ecg_to_beats_reference(ecg_adc, fs=PIPELINE_FS, global_size=450, new_fs=120):
+    """
+    Cài đặt gốc (như tests/test_dsp.py): butter (b, a) + filtfilt, mỗi beat một lần pad + FFT resample
+    + chuẩn hóa; tín hiệu ở fs khác được resample_poly về PIPELINE_FS trước
+    """
+    ecg = np.asarray(ecg_adc, dtype=np.float32)
+    ecg -= np.mean(ecg)
+    ecg /= 512.0
+    if fs != PIPELINE_FS:
+        ecg = resample_poly(ecg, PIPELINE_FS, fs)
+        fs = PIPELINE_FS
+
+    nyq = 0.5 * fs
+    b, a = butter(4, [0.5 / nyq, 40.0 / nyq], btype="band")
+    ecg = filtfilt(b, a, ecg)
+
+    peaks, _ = find_peaks(ecg, distance=int(0.25 * fs))
+    if len(peaks) < 2:
+        return np.array([])
+
+    rr = np.diff(peaks)
+    hb_size = int(np.mean(rr))
+
+    beats = []
+    for p in peaks:
+        s = p - hb_size // 2
+        e = p + hb_size // 2
+        if s < 0 or e > len(ecg):
+            continue
+
+        hb = ecg[s:e]
+        hb = np.pad(hb, (0, max(0, global_size - len(hb))), "constant")[:global_size]
+        hb = resample(hb, int(global_size * new_fs / fs))
+        hb = (hb - hb.mean()) / (hb.std() + 1e-8)
+        beats.append(hb[:150])
+
+    return np.array(beats)
+
+
+def signals():
+    np.random.seed(0)
+    yield "ecg_12s.txt @250", np.loadtxt(os.path.join(ROOT, "ecg_12s.txt")), 250
+    yield "normal 72bpm @360", generate_normal_ecg(20000, sample_rate=360, heart_rate=72), 360
+    yield "normal 80bpm @250", generate_normal_ecg(20000, sample_rate=250, heart_rate=80), 250
+    yield "arrhythmia @250", generate_abnormal_ecg(20000, sample_rate=250, heart_rate=65), 250
+    yield "bradycardia 30bpm @250", generate_abnormal_ecg(20000, sample_rate=250, heart_rate=30,
+                                                          abnormality="bradycardia"), 250
+
+
+def timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    out = fn(*args, **kwargs)
+    return out, time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # filtfilt (b, a) và sosfiltfilt lệch nhau cỡ 1e-6 sau chuẩn hóa beat
+    parser.add_argument("--atol", type=float, default=1e-5)
+    parser.add_argument("--repeat", type=int, default=100,
+                        help="số lần lặp ecg_12s.txt cho phép đo tốc độ (100 ~ 20 phút tín hiệu)")
+    args = parser.parse_args()
+
+    ok = True
+    print("Parity:")
+    for name, ecg_adc, fs in signals():
+        ref = ecg_to_beats_reference(ecg_adc, fs=fs)
+        new = ecg_to_beats(ecg_adc, fs=fs)
+        same_shape = len(ref) == len(new) and (len(ref) == 0 or ref.shape == new.shape)
+        err = float(np.abs(ref - new).max()) if same_shape and len(ref) else 0.0
+        passed = same_shape and err <= args.atol
+        ok &= passed
+        print(f"  {'OK  ' if passed else 'FAIL'} {name:<24} beats={len(new):<5} max_abs_err={err:.2e}")
+
+    ecg_adc = np.tile(np.loadtxt(os.path.join(ROOT, "ecg_12s.txt")), args.repeat)
+    ref, t_ref = timed(ecg_to_beats_reference, ecg_adc)
+    new, t_new = timed(ecg_to_beats, ecg_adc)
+    print(f"\nTốc độ ({len(ecg_adc)} mẫu, {len(new)} beats):")
+    print(f"  reference  {t_ref * 1000:9.1f} ms")
+    print(f"  vectorized {t_new * 1000:9.1f} ms  (x{t_ref / t_new:.1f})")
+
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+So sánh thời gian parse và bộ nhớ đỉnh của các định dạng upload cho /predict:
+text (np.loadtxt), int16/uint16 nhị phân, .npy, node chunk của Firebase (firebase, cho
+/predict/firebase) và các biến thể nén gzip/zstd.
+
+Đo gồm decode_ecg_payload + preprocess_adc (bước dữ liệu chuyển sang float32).
+
+Chạy:
+    python benchmarks/bench_formats.py --minutes 60
+"""
+
+import argparse
+import gzip
+import io
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_dsp import preprocess_adc  # noqa: E402
+from ecg_io import decode_ecg_payload, load_zstandard  # noqa: E402
+from ecg_uploader import format_chunks  # noqa: E402
+from generate_mock_ecg import generate_normal_ecg  # noqa: E402
+
+
+def build_payloads(ecg_adc):
+    txt = io.BytesIO()
+    np.savetxt(txt, ecg_adc, fmt="%d")
+    txt = txt.getvalue()
+    i16 = ecg_adc.astype("<i2").tobytes()
+    npy = io.BytesIO()
+    np.save(npy, ecg_adc.astype("<i2"))
+    npy = npy.getvalue()
+    firebase = json.dumps(format_chunks(ecg_adc)).encode()
+
+    payloads = [
+        ("text", txt, {"fmt": "text"}),
+        ("int16", i16, {"fmt": "int16"}),
+        ("uint16", ecg_adc.astype("<u2").tobytes(), {"fmt": "uint16"}),
+        ("npy", npy, {}),
+        ("firebase", firebase, {"fmt": "firebase"}),
+        ("text+gzip", gzip.compress(txt, 6), {"fmt": "text"}),
+        ("firebase+gzip", gzip.compress(firebase, 6), {"fmt": "firebase"}),
+        ("int16+gzip", gzip.compress(i16, 6), {"fmt": "int16"}),
+        ("npy+gzip", gzip.compress(npy, 6), {}),
+    ]
+    zstandard = load_zstandard()
+    if zstandard is not None:
+        cctx = zstandard.ZstdCompressor(level=3)
+        payloads += [
+            ("int16+zstd", cctx.compress(i16), {"fmt": "int16"}),
+            ("npy+zstd", cctx.compress(npy), {}),
+        ]
+    return payloads
+
+
+def measure(data, kwargs, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        preprocess_adc(decode_ecg_payload(data, **kwargs))
+        best = min(best, time.perf_counter() - t0)
+
+    tracemalloc.start()
+    preprocess_adc(decode_ecg_payload(data, **kwargs))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60.0, help="độ dài tín hiệu (phút)")
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    n = int(args.minutes * 60 * args.fs)
+    np.random.seed(0)
+    base = generate_normal_ecg(60 * args.fs, sample_rate=args.fs)
+    # Lặp đoạn 60 s + nhiễu ±2 LSB để nén không được lợi từ chu kỳ lặp
+    ecg_adc = np.clip(np.resize(base, n) + np.random.randint(-2, 3, n), 0, 1023)
+
+    print(f"{n} mẫu ({args.minutes:g} phút @ {args.fs} Hz)\n")
+    print(f"{'format':<14} {'payload_MB':>10} {'parse_ms':>10} {'peak_MB':>9} {'speedup':>8}")
+    baseline = None
+    for name, data, kwargs in build_payloads(ecg_adc):
+        t, peak = measure(data, kwargs, args.repeat)
+        baseline = baseline or t
+        print(f"{name:<14} {len(data) / 1e6:>10.2f} {t * 1000:>10.1f} {peak / 1e6:>9.2f} {baseline / t:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""
+Suy luận theo luồng thay đổi (rtdb_gateway) so với cách app đang làm (tải lại cả node ECG/raw
+rồi chạy lại cả pipeline mỗi lần bấm "Dự đoán"):
+
+- refetch: mỗi --refetch-every giây tín hiệu, decode toàn bộ chunk đã có + ecg_to_beats + forward
+  tất cả beat. Tổng thời gian CPU tăng theo bình phương độ dài bản ghi.
+- gateway: --devices thiết bị, chuỗi sự kiện chunk (mỗi chunk một PATCH như device_fleet) được
+  phát lại bằng rtdb_local.replay nhanh gấp --speed, rtdb_gateway.RTDBGateway chỉ xử lý chunk mới.
+  Kiểm tra: kết quả ghi lại của mỗi thiết bị trùng với StreamingBeatExtractor chạy từng chunk
+  trên cả tín hiệu (vị trí beat, nhãn, confidence).
+
+Chạy:
+    python benchmarks/bench_gateway.py
+    python benchmarks/bench_gateway.py --devices 50 --duration 2m --speed 20 --save session.jsonl
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_dsp import ecg_to_beats  # noqa: E402
+from ecg_io import decode_chunks  # noqa: E402
+from ecg_stream import StreamingBeatExtractor, beat_results  # noqa: E402
+from ecg_synth import synthesize  # noqa: E402
+from ecg_uploader import CHUNK_SIZE, format_chunks  # noqa: E402
+from rtdb_gateway import RTDBGateway, load_classifier  # noqa: E402
+from rtdb_local import LocalRTDB  # noqa: E402
+
+SEED = 0
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+PATH = "ECG/fleet/{device}/raw"
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def make_events(signals, fs, chunk_size):
+    """Sự kiện như rtdb_gateway.py --record: chunk k của mỗi thiết bị được PATCH lúc nó "có" """
+    events = [{"t": 0.0, "event": "put", "path": "/ECG/fleet", "data": None}]
+    timed = []
+    for device, ecg in signals.items():
+        chunks = list(format_chunks(ecg, chunk_size).items())
+        phase = (len(timed) % 10) * chunk_size / fs / 10
+        for k, (key, value) in enumerate(chunks):
+            t = phase + min(k + 1, len(ecg) / chunk_size) * chunk_size / fs
+            if k == 0:
+                timed.append((t, {"event": "put", "path": f"/ECG/fleet/{device}/raw", "data": {key: value}}))
+            else:
+                timed.append((t, {"event": "patch", "path": f"/ECG/fleet/{device}/raw", "data": {key: value}}))
+    timed.sort(key=lambda item: item[0])
+    return events + [{"t": round(t, 4), **event} for t, event in timed]
+
+
+def reference(ecg, fs, classify, chunk_size, detector):
+    extractor = StreamingBeatExtractor(fs=fs, detector=detector)
+    out = [extractor.process(ecg[i:i + chunk_size]) for i in range(0, len(ecg), chunk_size)] + [extractor.flush()]
+    beats = np.concatenate([beats for beats, _ in out]).astype(np.float32)
+    peaks = np.concatenate([peaks for _, peaks in out])
+    return beat_results(peaks, classify(beats), fs) if len(beats) else []
+
+
+def matches(stored, expected):
+    beats = (stored or {}).get("beats") or {}
+    if len(beats) != len(expected):
+        return False
+    for result in expected:
+        got = beats.get(f"beat_{result['index']}")
+        if (got is None or got["sample"] != result["sample"] or got["prediction"] != result["prediction"]
+                or abs(got["confidence"] - result["confidence"]) > 1e-4):
+            return False
+    return True
+
+
+def refetch(ecg, fs, classify, chunk_size, every):
+    chunks = format_chunks(ecg, chunk_size)
+    keys = list(chunks)
+    step = max(1, int(every * fs / chunk_size))
+    started = time.perf_counter()
+    clicks = 0
+    for stop in range(step, len(keys) + 1, step):
+        samples = decode_chunks({key: chunks[key] for key in keys[:stop]})
+        beats = ecg_to_beats(samples, fs)
+        if len(beats):
+            classify(beats.astype(np.float32))
+        clicks += 1
+    return time.perf_counter() - started, clicks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=20)
+    parser.add_argument("--duration", default="1m")
+    parser.add_argument("--fs", type=int, default=360)
+    parser.add_argument("--speed", type=float, default=10.0)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--flush-interval", type=float, default=0.5)
+    parser.add_argument("--refetch-every", type=float, default=10.0, help="giây tín hiệu giữa hai lần bấm Dự đoán")
+    parser.add_argument("--detector", default="pan_tompkins")
+    parser.add_argument("--save", help="ghi chuỗi sự kiện ra file JSONL (rtdb_local.py --replay)")
+    args = parser.parse_args()
+
+    classify, version = load_classifier(os.path.join(ROOT, "resetECG_new.pth"))
+    n = int(parse_duration(args.duration) * args.fs)
+    rng = np.random.default_rng(SEED)
+    signals = {f"device-{i:04d}": synthesize(n, args.fs, float(rng.uniform(55, 110)), seed=rng).astype(np.int16)
+               for i in range(args.devices)}
+    events = make_events(signals, args.fs, args.chunk_size)
+    if args.save:
+        with open(args.save, "w") as f:
+            f.writelines(json.dumps(event) + "\n" for event in events)
+    print(f"{args.devices} thiết bị x {args.duration} @ {args.fs} Hz: {len(events)} sự kiện, "
+          f"phát lại x{args.speed:g} ({events[-1]['t'] / args.speed:.1f} s)\n")
+
+    seconds, clicks = refetch(next(iter(signals.values())), args.fs, classify, args.chunk_size, args.refetch_every)
+    print(f"refetch  (1 thiết bị, {clicks} lần bấm): {seconds:.3f} s CPU, "
+          f"{seconds / clicks * 1000:.1f} ms / lần, lần cuối xử lý cả {n} mẫu")
+
+    with LocalRTDB() as db:
+        gateway = RTDBGateway(classify, db.url, PATH, fs=args.fs, flush_interval=args.flush_interval,
+                              detector=args.detector, model_version=version)
+        db.replay(events, args.speed)
+        stats = gateway.run(idle_exit=max(2.0, 2 * args.flush_interval))
+        summary = stats.summary()
+        per_device = (stats.dsp_seconds + stats.infer_seconds) / args.devices
+        print(f"gateway  (1 thiết bị, trung bình): {per_device:.3f} s CPU cho cả bản ghi "
+              f"(DSP {summary['dsp_us_per_sample']} µs / mẫu, forward {summary['infer_ms_per_beat']} ms / beat)")
+        print(json.dumps(summary, indent=1))
+
+        failed = 0
+        for device, ecg in signals.items():
+            expected = reference(ecg, args.fs, classify, args.chunk_size, args.detector)
+            failed += not matches(db.get(f"predictions/{device}"), expected)
+    print(f"{'✓' if not failed else '✗'} kết quả khớp với StreamingBeatExtractor ở "
+          f"{args.devices - failed}/{args.devices} thiết bị")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+Bản ghi dài: ecg_to_beats trên cả mảng (như /predict) so với chế độ Holter (ecg_holter.segment_beats:
+memory map + xử lý theo đoạn, tuần tự hoặc trên DspPool). Mỗi chế độ chạy trong process riêng;
+đo thời gian và bộ nhớ đỉnh (VmHWM) của process chính và của worker DSP lớn nhất. Chỉ đo DSP
+(tách beat), không chạy model.
+
+--parity so beats của hai cách trên bản ghi --parity-duration (mặc định 1 giờ).
+
+Chạy:
+    python benchmarks/bench_holter.py --durations 1h 24h --workers 0 2
+    python benchmarks/bench_holter.py --durations 10m --parity
+"""
+
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_dsp import ecg_to_beats  # noqa: E402
+from ecg_holter import segment_beats  # noqa: E402
+from ecg_io import Recording  # noqa: E402
+from ecg_pipeline import DspPool  # noqa: E402
+
+SEED = 0
+BASE_SECONDS = 600
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def write_recording(path, fs, seconds):
+    """Bản ghi int16 tất định: đoạn mock 10 phút lặp lại + nhiễu ±2, ghi ra file"""
+    from generate_mock_ecg import generate_normal_ecg
+
+    np.random.seed(SEED)
+    base = generate_normal_ecg(int(BASE_SECONDS * fs), sample_rate=fs)
+    n = int(seconds * fs)
+    noise = np.random.RandomState(SEED + n).randint(-2, 3, n)
+    (np.resize(base, n) + noise).astype("<i2").tofile(path)
+    return n
+
+
+def peak_rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmHWM"):
+                return int(line.split()[1]) / 1e3
+    return None
+
+
+def run_child(mode, path, n, fs, workers):
+    """Chạy một chế độ trong process mới (bộ nhớ đỉnh không lẫn với chế độ khác)"""
+    proc = subprocess.run([sys.executable, __file__, "--child", mode, "--path", path, "--samples", str(n),
+                           "--child-fs", str(fs), "--child-workers", str(workers)],
+                          capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def child(args):
+    started = time.perf_counter()
+    if args.child == "full":
+        beats = ecg_to_beats(np.fromfile(args.path, dtype="<i2"), fs=args.child_fs)
+        n_beats = len(beats)
+    else:
+        pool = DspPool(args.child_workers).start() if args.child_workers else None
+        recording = Recording(args.path, "<i2", 0, args.samples)
+        with tempfile.TemporaryDirectory() as workdir:
+            n_beats = sum(len(beats) for _, beats in segment_beats(recording, args.child_fs, workdir, pool=pool))
+        if pool is not None:
+            pool.close()
+    print(json.dumps({
+        "seconds": round(time.perf_counter() - started, 2),
+        "beats": n_beats,
+        "peak_rss_mb": peak_rss_mb(),
+        # ru_maxrss của các process con đã kết thúc (worker DSP), KB trên Linux
+        "worker_peak_rss_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1e3 or None,
+    }))
+
+
+def parity(path, n, fs):
+    reference = ecg_to_beats(np.fromfile(path, dtype="<i2"), fs=fs)
+    with tempfile.TemporaryDirectory() as workdir:
+        beats = np.concatenate([b for _, b in segment_beats(Recording(path, "<i2", 0, n), fs, workdir)])
+    if len(beats) != len(reference):
+        return f"✗ {len(beats)} beats, ecg_to_beats: {len(reference)}"
+    return f"✓ {len(beats)} beats, chênh lệch lớn nhất {np.abs(beats - reference).max():.2e}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, nargs="+", default=[250])
+    parser.add_argument("--durations", nargs="+", default=["1h", "24h"])
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1],
+                        help="số worker DspPool của chế độ Holter (0 = tuần tự)")
+    parser.add_argument("--parity", action="store_true", help="so beats với ecg_to_beats")
+    parser.add_argument("--parity-duration", default="1h")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--path", help=argparse.SUPPRESS)
+    parser.add_argument("--samples", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--child-fs", type=float, help=argparse.SUPPRESS)
+    parser.add_argument("--child-workers", type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        if args.child_fs.is_integer():
+            args.child_fs = int(args.child_fs)
+        return child(args)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "recording.i16")
+        if args.parity:
+            for fs in args.fs:
+                n = write_recording(path, fs, parse_duration(args.parity_duration))
+                print(f"Parity {args.parity_duration} @ {fs} Hz: {parity(path, n, fs)}")
+            print()
+
+        print(f"{'case':<14} {'mode':<12} {'seconds':>8} {'beats':>8} {'peak_rss_MB':>12} {'worker_MB':>10}")
+        for fs in args.fs:
+            for duration in args.durations:
+                n = write_recording(path, fs, parse_duration(duration))
+                modes = [("full", 0)] + [("holter", w) for w in args.workers]
+                for mode, workers in modes:
+                    result = run_child(mode, path, n, fs, workers)
+                    label = mode if mode == "full" else f"holter/{workers}w"
+                    worker_mb = f"{result['worker_peak_rss_mb']:.0f}" if result["worker_peak_rss_mb"] else "-"
+                    print(f"{f'{fs}hz_{duration}':<14} {label:<12} {result['seconds']:>8.2f} {result['beats']:>8} "
+                          f"{result['peak_rss_mb']:>12.0f} {worker_mb:>10}")
+
+
+if __name__ == "__main__":
+    main()
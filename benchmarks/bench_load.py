@@ -0,0 +1,300 @@
+"""
+Load test end-to-end của /predict: khởi động server cục bộ (gunicorn theo gunicorn.conf.py hoặc
+server dev của Flask), gửi request ở các tốc độ mục tiêu với hỗn hợp bản ghi bình thường / bất
+thường nhiều độ dài, rồi báo throughput, tỉ lệ lỗi và latency p50/p95/p99 ở từng mức tải để tìm
+điểm gãy (knee) của đường cong latency cho mỗi cấu hình server.
+
+- Open-loop: request thứ i được gửi tại thời điểm lên lịch (i / rate, hoặc Poisson với --poisson),
+  không chờ request trước xong. Latency tính từ thời điểm lên lịch nên thời gian xếp hàng phía
+  client khi server chậm cũng được tính (tránh coordinated omission).
+- Mix: --mix "loại:độ dài:trọng số,...", loại là normal | arrhythmia | tachycardia | bradycardia,
+  độ dài như 10s, 5m, 1h. Tín hiệu từ ecg_synth (seed cố định), sinh đủ độ dài.
+- Mỗi request đổi vài mẫu đầu nên không trúng cache dự đoán; --reuse gửi y nguyên để đo đường cache.
+- Knee: mức tải đầu tiên có throughput dưới 90% tốc độ gửi, có lỗi, hoặc p99 vượt
+  --knee-factor lần p99 của mức tải thấp nhất.
+
+Cấu hình server qua biến môi trường (ECG_WORKERS, ECG_THREADS, ECG_MODEL_BACKEND, ...) hoặc --env.
+Client chạy cùng máy với server: trên máy ít core, kết quả gồm cả phần CPU client chiếm.
+
+Chạy:
+    python benchmarks/bench_load.py --rates 1 2 4 8 --duration 20
+    python benchmarks/bench_load.py --server dev --mix "normal:10s:1" --rates 5 10 20
+    python benchmarks/bench_load.py --env ECG_WORKERS=2 --env ECG_MODEL_BACKEND=onnx --output load.json
+    python benchmarks/bench_load.py --url http://127.0.0.1:5001 --rates 2    # server đang chạy sẵn
+"""
+
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_synth import synthesize  # noqa: E402
+
+SEED = 0
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+# Số mẫu đầu được đổi (-1 / 0 / +1) để mỗi request có nội dung khác nhau: 3**16 tổ hợp
+UNIQUE_SAMPLES = 16
+
+# Loại bản ghi -> nhịp tim (BPM) cho ecg_synth
+KINDS = {"normal": 72, "arrhythmia": 65, "bradycardia": 48, "tachycardia": 120}
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+# =========================================================
+# RECORDINGS
+# =========================================================
+
+def parse_mix(text):
+    """'normal:10s:3,arrhythmia:1m:1' -> [(tên, loại, giây, trọng số)]"""
+    mix = []
+    for item in text.split(","):
+        kind, duration, weight = (item.strip().split(":") + ["1"])[:3]
+        if kind not in KINDS:
+            raise SystemExit(f"Unknown recording kind '{kind}' (expected one of {', '.join(KINDS)})")
+        mix.append((f"{kind}_{duration}", kind, parse_duration(duration), float(weight)))
+    return mix
+
+
+def build_recordings(mix, fs):
+    """Mỗi mục của mix -> mảng int16 tất định"""
+    recordings = []
+    for i, (_, kind, seconds, _) in enumerate(mix):
+        adc = synthesize(int(seconds * fs), fs, KINDS[kind], kind=kind, seed=SEED + i)
+        recordings.append(adc.astype("<i2"))
+    return recordings
+
+
+def unique_payload(signal, i):
+    """Bytes của bản ghi với UNIQUE_SAMPLES mẫu đầu lệch -1/0/+1 theo chữ số hệ 3 của i"""
+    signal = signal.copy()
+    k = min(UNIQUE_SAMPLES, len(signal))
+    signal[:k] += (i // 3 ** np.arange(k)) % 3 - 1
+    return signal.tobytes()
+
+
+# =========================================================
+# SERVER
+# =========================================================
+
+def start_server(mode, port, env, log):
+    if mode == "prod":
+        env = dict(env, ECG_BIND=f"127.0.0.1:{port}")
+        cmd = [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "flask_api_fixed:app"]
+    else:
+        cmd = [sys.executable, "-c",
+               f"import flask_api_fixed as api; api.app.run(host='127.0.0.1', port={port}, threaded=True)"]
+    return subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_ready(url, proc, timeout=180):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if proc is not None and proc.poll() is not None:
+            raise RuntimeError(f"server exited with code {proc.returncode}")
+        try:
+            if requests.get(f"{url}/ready", timeout=5).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+        time.sleep(0.5)
+    raise RuntimeError("server did not become ready")
+
+
+def stop_server(proc):
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+        proc.wait()
+
+
+# =========================================================
+# LOAD
+# =========================================================
+
+_local = threading.local()
+
+
+def send(url, data, scheduled, timeout, results, entry):
+    """Gửi một request; ghi (mục mix, latency tính từ thời điểm lên lịch, status hoặc tên exception)"""
+    session = getattr(_local, "session", None)
+    if session is None:
+        session = _local.session = requests.Session()
+    try:
+        resp = session.post(url, data=data, timeout=timeout, headers={"Content-Type": "application/octet-stream"})
+        status = resp.status_code
+    except requests.RequestException as e:
+        status = type(e).__name__
+    results.append((entry, time.perf_counter() - scheduled, status))
+
+
+def percentiles_ms(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p95_ms": None, "p99_ms": None, "max_ms": None}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99]) * 1000
+    return {"p50_ms": round(p50, 1), "p95_ms": round(p95, 1), "p99_ms": round(p99, 1),
+            "max_ms": round(max(latencies) * 1000, 1)}
+
+
+def format_ms(value):
+    return f"{value:>8.1f}" if value is not None else f"{'-':>8}"
+
+
+def run_step(url, rate, recordings, mix, args, rng):
+    """Một mức tải: gửi rate x duration request theo lịch, chờ mọi request xong"""
+    n = max(1, int(rate * args.duration))
+    if args.poisson:
+        offsets = np.concatenate([[0.0], np.cumsum(rng.exponential(1 / rate, n - 1))])
+    else:
+        offsets = np.arange(n) / rate
+    weights = np.array([w for *_, w in mix])
+    entries = rng.choice(len(mix), n, p=weights / weights.sum())
+
+    results = []
+    with ThreadPoolExecutor(args.concurrency) as pool:
+        start = time.perf_counter()
+        for i, (offset, entry) in enumerate(zip(offsets, entries)):
+            data = recordings[entry].tobytes() if args.reuse else unique_payload(recordings[entry], args.sequence + i)
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(send, url, data, start + offset, args.timeout, results, entry)
+    elapsed = time.perf_counter() - start
+    args.sequence += n
+
+    ok = [latency for _, latency, status in results if status == 200]
+    errors = {}
+    for _, _, status in results:
+        if status != 200:
+            errors[str(status)] = errors.get(str(status), 0) + 1
+    return {
+        "rate": rate,
+        # Tốc độ thực gửi (với --poisson lệch khỏi rate khi số request nhỏ)
+        "offered": round(n / (offsets[-1] + 1 / rate), 2),
+        "sent": n,
+        "ok": len(ok),
+        "error_rate": round(1 - len(ok) / n, 4),
+        "errors": errors,
+        "throughput": round(len(ok) / elapsed, 2),
+        **percentiles_ms(ok),
+        "by_recording": {
+            name: percentiles_ms([lat for e, lat, status in results if e == j and status == 200])
+            for j, (name, *_) in enumerate(mix)
+        },
+    }
+
+
+def find_knee(steps, knee_factor):
+    """Mức tải đầu tiên bão hòa (throughput < 90% tốc độ gửi), có lỗi, hoặc p99 tăng vọt"""
+    reference = steps[0]["p99_ms"]
+    for step in steps:
+        if step["error_rate"] > 0 or step["throughput"] < 0.9 * step["offered"]:
+            return step["rate"]
+        if reference and step["p99_ms"] and step["p99_ms"] > knee_factor * reference:
+            return step["rate"]
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--server", choices=["prod", "dev"], default="prod",
+                        help="prod: gunicorn.conf.py, dev: server threaded của Flask")
+    parser.add_argument("--url", help="dùng server đang chạy thay vì khởi động server mới")
+    parser.add_argument("--port", type=int, default=5098)
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="biến môi trường thêm cho server (lặp lại được)")
+    parser.add_argument("--rates", type=float, nargs="+", default=[1, 2, 4, 8], help="request / giây")
+    parser.add_argument("--duration", type=float, default=20.0, help="thời gian gửi ở mỗi mức tải (giây)")
+    parser.add_argument("--mix", default="normal:10s:5,normal:1m:3,arrhythmia:1m:1,bradycardia:1m:1,normal:10m:1")
+    parser.add_argument("--fs", type=int, default=250)
+    parser.add_argument("--poisson", action="store_true", help="khoảng cách giữa các request theo phân phối mũ")
+    parser.add_argument("--concurrency", type=int, default=64, help="số request đang chờ tối đa phía client")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--reuse", action="store_true", help="gửi y nguyên bản ghi (trúng cache dự đoán)")
+    parser.add_argument("--knee-factor", type=float, default=3.0)
+    parser.add_argument("--max-error-rate", type=float, default=0.5, help="dừng tăng tải khi tỉ lệ lỗi vượt ngưỡng")
+    parser.add_argument("--output", help="ghi kết quả JSON")
+    args = parser.parse_args()
+    args.sequence = 0
+
+    mix = parse_mix(args.mix)
+    recordings = build_recordings(mix, args.fs)
+    print("Mix: " + ", ".join(f"{name} x{w:g}" for name, _, _, w in mix) + f" @ {args.fs} Hz")
+
+    proc = None
+    log = tempfile.TemporaryFile()
+    base_url = args.url
+    if base_url is None:
+        env = dict(os.environ, **dict(item.split("=", 1) for item in args.env))
+        proc = start_server(args.server, args.port, env, log)
+        base_url = f"http://127.0.0.1:{args.port}"
+    url = f"{base_url.rstrip('/')}/predict?fs={args.fs}"
+
+    try:
+        try:
+            wait_ready(base_url, proc)
+        except RuntimeError:
+            log.seek(0)
+            sys.stderr.write(log.read()[-4000:].decode(errors="replace"))
+            raise
+        # Một request mỗi loại bản ghi trước khi đo: worker nào cũng đã chạy qua mọi shape
+        rng = np.random.RandomState(SEED)
+        for i, signal_ in enumerate(recordings):
+            requests.post(url, data=unique_payload(signal_, 3 ** UNIQUE_SAMPLES - 1 - i), timeout=args.timeout,
+                          headers={"Content-Type": "application/octet-stream"})
+
+        steps = []
+        print(f"\n{'rate/s':>7} {'sent':>6} {'ok':>6} {'err%':>6} {'thr/s':>7} "
+              f"{'p50_ms':>8} {'p95_ms':>8} {'p99_ms':>8} {'max_ms':>8}")
+        for rate in args.rates:
+            step = run_step(url, rate, recordings, mix, args, rng)
+            steps.append(step)
+            print(f"{rate:>7g} {step['sent']:>6} {step['ok']:>6} {step['error_rate'] * 100:>6.1f} "
+                  f"{step['throughput']:>7.2f} "
+                  + " ".join(format_ms(step[k]) for k in ("p50_ms", "p95_ms", "p99_ms", "max_ms"))
+                  + (f"  {step['errors']}" if step["errors"] else ""))
+            if step["error_rate"] > args.max_error_rate:
+                print(f"Dừng: tỉ lệ lỗi {step['error_rate']:.0%} > {args.max_error_rate:.0%}")
+                break
+    finally:
+        if proc is not None:
+            stop_server(proc)
+
+    knee = find_knee(steps, args.knee_factor)
+    print(f"\nKnee: {knee:g} request/s" if knee is not None else "\nKnee: chưa tới trong các mức tải đã chạy")
+
+    if args.output:
+        report = {
+            "server": args.url or args.server,
+            "env": args.env,
+            "fs": args.fs,
+            "mix": [{"name": name, "kind": kind, "seconds": s, "weight": w} for name, kind, s, w in mix],
+            "poisson": args.poisson,
+            "duration": args.duration,
+            "knee": knee,
+            "steps": steps,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=1)
+        print(f"✓ Đã ghi {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Đổi phiên bản model khi đang có tải (ecg_registry qua POST /models của flask_api_fixed, test client):
+
+--clients thread gửi /predict liên tục trong --duration giây. Mỗi --swap-every giây benchmark yêu cầu đổi qua lại
+giữa resetECG_new.pth và resetECG.pth. Lần đầu mỗi checkpoint được nạp, self-test và warmup ở nền; các lần
+sau chỉ kích hoạt lại bản đã có trong bộ nhớ.
+
+Kiểm tra: không request nào lỗi; model_version trong body trùng header X-Model-Version; kết quả của mỗi
+request trùng với forward trực tiếp của đúng phiên bản đó (không request nào bị trộn hai phiên bản).
+In latency p50/p99 của request trong 1 giây sau mỗi lần đổi so với lúc ổn định.
+
+Chạy:
+    python benchmarks/bench_model_swap.py
+    python benchmarks/bench_model_swap.py --clients 8 --duration 30 --swap-every 3
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("ECG_ADMIN_TOKEN", "bench")
+
+import flask_api_fixed  # noqa: E402
+from ecg_dsp import ecg_to_beats  # noqa: E402
+from ecg_model import load_model, torch_forward, weights_version  # noqa: E402
+from ecg_synth import synthesize  # noqa: E402
+
+SEED = 0
+CHECKPOINTS = ("resetECG.pth", "resetECG_new.pth")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=4)
+    parser.add_argument("--duration", type=float, default=12.0)
+    parser.add_argument("--swap-every", type=float, default=2.0)
+    parser.add_argument("--recordings", type=int, default=16, help="số bản ghi 10 s khác nhau được gửi lặp lại")
+    args = parser.parse_args()
+
+    flask_api_fixed.prediction_cache.max_entries = 0
+    rng = np.random.default_rng(SEED)
+    signals = [synthesize(2500, 250, float(rng.uniform(55, 110)), seed=rng) for _ in range(args.recordings)]
+    bodies = ["\n".join(map(str, s)) for s in signals]
+    expected = {}
+    for name in CHECKPOINTS:
+        forward = torch_forward(load_model(os.path.join(ROOT, name)))
+        expected[weights_version(os.path.join(ROOT, name))] = [
+            int(np.bincount(forward(ecg_to_beats(s, fs=250).astype(np.float32)).argmax(axis=1)).argmax())
+            for s in signals
+        ]
+
+    lock = threading.Lock()
+    records = []  # (thời điểm kết thúc, latency, status, version, đúng)
+    started = time.perf_counter()
+    stop = started + args.duration
+
+    def client(i):
+        client = flask_api_fixed.app.test_client()
+        n = i
+        while time.perf_counter() < stop:
+            k = n % len(bodies)
+            n += args.clients
+            t0 = time.perf_counter()
+            r = client.post("/predict?fields=final_prediction,model_version", data=bodies[k],
+                            content_type="text/plain")
+            t1 = time.perf_counter()
+            version = r.headers.get("X-Model-Version")
+            ok = r.status_code == 200 and r.get_json()["model_version"] == version
+            ok = ok and r.get_json()["final_prediction"] == expected[version][k]
+            with lock:
+                records.append((t1 - started, t1 - t0, r.status_code, version, ok))
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    admin = flask_api_fixed.app.test_client()
+    swaps = []
+    k = 0
+    while time.perf_counter() + args.swap_every < stop:
+        time.sleep(args.swap_every)
+        name = CHECKPOINTS[k % 2]
+        k += 1
+        requested = time.perf_counter()
+        admin.post("/models", json={"path": name}, headers={"X-Admin-Token": os.environ["ECG_ADMIN_TOKEN"]})
+        version = weights_version(os.path.join(ROOT, name))
+        while flask_api_fixed.registry.active.version != version and time.perf_counter() < stop:
+            time.sleep(0.005)
+        swaps.append((requested - started, time.perf_counter() - requested, name))
+    for t in threads:
+        t.join()
+
+    print(f"{args.clients} clients x {args.duration:g} s, {len(records)} request, {len(swaps)} lần đổi\n")
+    for at, took, name in swaps:
+        print(f"  {at:6.2f} s  -> {name:<18} active sau {took * 1000:7.1f} ms")
+    latencies = np.array([r[1] for r in records]) * 1000
+    after = np.array([any(0 <= r[0] - at <= 1 + took for at, took, _ in swaps) for r in records])
+    for label, mask in (("ổn định", ~after), ("1 s sau khi đổi", after)):
+        if mask.any():
+            p50, p99 = np.percentile(latencies[mask], [50, 99])
+            print(f"  {label:<16} {mask.sum():>6} request  p50 {p50:6.1f} ms  p99 {p99:6.1f} ms")
+    failed = sum(r[2] != 200 for r in records)
+    wrong = sum(r[2] == 200 and not r[4] for r in records)
+    versions = sorted({r[3] for r in records if r[3]})
+    print(f"\n{'✓' if not failed and not wrong else '✗'} lỗi {failed}, sai phiên bản / kết quả {wrong}, "
+          f"phiên bản đã phục vụ: {', '.join(versions)}")
+    if failed or wrong:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""
+Đo số request/giây bền vững của /predict khi nhiều client gửi đồng thời,
+so sánh DSP chạy ngay trong thread của request với chế độ pipeline
+(DSP trên process pool, inference trên batcher).
+
+Chạy:
+    python benchmarks/bench_pipeline.py --clients 8 --duration 10 --workers 0 2 4
+"""
+
+import argparse
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import flask_api_fixed  # noqa: E402
+from ecg_pipeline import DspPool  # noqa: E402
+from generate_mock_ecg import generate_normal_ecg  # noqa: E402
+
+
+def run(clients, duration, payloads):
+    client = flask_api_fixed.app.test_client
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    stop = time.perf_counter() + duration
+
+    def worker(idx):
+        c = client()
+        i = idx
+        while time.perf_counter() < stop:
+            t0 = time.perf_counter()
+            resp = c.post("/predict", data=payloads[i % len(payloads)], content_type="application/octet-stream")
+            with lock:
+                latencies.append(time.perf_counter() - t0)
+                errors[0] += resp.status_code != 200
+            i += clients
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    p50, p99 = np.percentile(latencies, [50, 99]) * 1000
+    return len(latencies) / elapsed, p50, p99, errors[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, nargs="+", default=[0, os.cpu_count() or 1],
+                        help="số tiến trình DSP (0 = không dùng pipeline)")
+    parser.add_argument("--seconds", type=float, default=60.0, help="độ dài mỗi bản ghi (giây @ 250 Hz)")
+    args = parser.parse_args()
+
+    flask_api_fixed.prediction_cache.max_entries = 0
+    np.random.seed(0)
+    n = int(args.seconds * 250)
+    base = generate_normal_ecg(n, sample_rate=250)
+    payloads = [np.clip(base + np.random.randint(-2, 3, n), 0, 1023).astype("<i2").tobytes() for _ in range(64)]
+
+    print(f"{args.clients} clients, {args.duration:g}s, bản ghi {args.seconds:g}s @ 250 Hz, {os.cpu_count()} core\n")
+    print(f"{'dsp_workers':>11} {'req/s':>8} {'p50_ms':>8} {'p99_ms':>8} {'errors':>7}")
+    for workers in args.workers:
+        flask_api_fixed.dsp_pool = DspPool(workers).start() if workers else None
+        rps, p50, p99, errors = run(args.clients, args.duration, payloads)
+        print(f"{workers:>11} {rps:>8.1f} {p50:>8.1f} {p99:>8.1f} {errors:>7}")
+        if flask_api_fixed.dsp_pool:
+            flask_api_fixed.dsp_pool.close()
+
+
+if __name__ == "__main__":
+    main()
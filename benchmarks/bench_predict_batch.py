@@ -0,0 +1,62 @@
+"""
+So sánh N lần gọi /predict (mỗi bản ghi một request) với một lần /predict/batch
+chứa N bản ghi trong một file .npz. Dùng Flask test client (không qua mạng).
+
+Chạy:
+    python benchmarks/bench_predict_batch.py --recordings 10 100 500
+"""
+
+import argparse
+import io
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import flask_api_fixed  # noqa: E402
+from generate_mock_ecg import generate_normal_ecg, generate_abnormal_ecg  # noqa: E402
+
+
+def make_recordings(n, num_points):
+    np.random.seed(0)
+    base = [generate_normal_ecg(num_points, sample_rate=250), generate_abnormal_ecg(num_points, sample_rate=250)]
+    # Nhiễu nhỏ để mỗi bản ghi khác nhau (không trúng cache kết quả)
+    return [np.clip(base[i % 2] + np.random.randint(-2, 3, num_points), 0, 1023).astype(np.int16)
+            for i in range(n)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--recordings", type=int, nargs="+", default=[10, 100, 500])
+    parser.add_argument("--points", type=int, default=10000, help="số mẫu mỗi bản ghi")
+    args = parser.parse_args()
+
+    client = flask_api_fixed.app.test_client()
+    flask_api_fixed.prediction_cache.max_entries = 0
+
+    print(f"{'recordings':>10} {'single_s':>9} {'rec/s':>8} {'batch_s':>8} {'rec/s':>8} {'speedup':>8}")
+    for n in args.recordings:
+        recs = make_recordings(n, args.points)
+
+        t0 = time.perf_counter()
+        for rec in recs:
+            client.post("/predict", data=rec.tobytes(), content_type="application/octet-stream")
+        t_single = time.perf_counter() - t0
+
+        buf = io.BytesIO()
+        np.savez(buf, **{f"rec_{i}": rec for i, rec in enumerate(recs)})
+        t0 = time.perf_counter()
+        resp = client.post("/predict/batch", data=buf.getvalue(), content_type="application/octet-stream")
+        t_batch = time.perf_counter() - t0
+        assert resp.status_code == 200, resp.get_json()
+
+        print(f"{n:>10} {t_single:>9.2f} {n / t_single:>8.1f} {t_batch:>8.2f} {n / t_batch:>8.1f} "
+              f"{t_single / t_batch:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
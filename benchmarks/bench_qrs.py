@@ -0,0 +1,126 @@
+"""
+Bộ dò R-peak: find_peaks(distance=0.25 s) so với Pan-Tompkins (ecg_qrs) trên tín hiệu mock đã
+lọc như ecg_to_beats. Với mỗi bộ dò: thời gian dò, số peak đúng / sai / bị sót so với vị trí QRS
+thật của bộ sinh mock ecg_synth (lệch tối đa --tolerance-ms), và số beat sai đưa vào model (peak sai còn
+lại sau điều kiện biên của extract_beats - mỗi beat sai tốn một lần resample và một forward).
+
+Kiểm tra thêm: QRSDetector chạy theo chunk (--stream-chunk mẫu) cho đúng cùng peak như detect_qrs.
+
+Chạy:
+    python benchmarks/bench_qrs.py
+    python benchmarks/bench_qrs.py --fs 250 --duration 1m --cases normal:72 arrhythmia:65
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_dsp import PIPELINE_FS, bandpass_filter, detect_r_peaks, preprocess_adc, to_pipeline_rate  # noqa: E402
+from ecg_qrs import QRSDetector  # noqa: E402
+from ecg_synth import synthesize  # noqa: E402
+
+SEED = 0
+DETECTORS = ("find_peaks", "pan_tompkins")
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def mock_with_truth(kind, heart_rate, fs, seconds):
+    """(ADC, vị trí QRS thật ở PIPELINE_FS)"""
+    adc, r_peaks = synthesize(int(seconds * fs), fs, heart_rate, kind=kind, seed=SEED, return_r_peaks=True)
+    return adc, r_peaks * PIPELINE_FS
+
+
+def filtered_signal(adc, fs):
+    """Như ecg_to_beats trước bước dò peak"""
+    return bandpass_filter(to_pipeline_rate(preprocess_adc(adc), fs), PIPELINE_FS)
+
+
+def match(peaks, truth, tolerance):
+    """Mảng bool: peak nào trùng một QRS thật (mỗi QRS thật chỉ nhận một peak gần nhất)"""
+    if len(peaks) == 0 or len(truth) == 0:
+        return np.zeros(len(peaks), dtype=bool)
+    idx = np.clip(np.searchsorted(truth, peaks), 1, len(truth) - 1)
+    nearest = np.where(np.abs(truth[idx - 1] - peaks) <= np.abs(truth[idx] - peaks), idx - 1, idx)
+    ok = np.flatnonzero(np.abs(truth[nearest] - peaks) <= tolerance)
+    # Nhiều peak cùng trúng một QRS: chỉ peak đầu tiên được tính là đúng
+    ok = ok[np.concatenate([[True], nearest[ok][1:] != nearest[ok][:-1]])]
+    correct = np.zeros(len(peaks), dtype=bool)
+    correct[ok] = True
+    return correct
+
+
+def best_time(fn, runs):
+    best, out = float("inf"), None
+    for _ in range(runs):
+        started = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - started)
+    return best, out
+
+
+def model_beats(peaks, length):
+    """Bool: peak nào thành beat (cùng điều kiện biên với extract_beats, hb_size = RR trung bình)"""
+    if len(peaks) < 2:
+        return np.zeros(len(peaks), dtype=bool)
+    half = int(np.mean(np.diff(peaks))) // 2
+    return (peaks - half >= 0) & (peaks + half <= length)
+
+
+def stream_peaks(ecg, chunk):
+    detector = QRSDetector(PIPELINE_FS)
+    parts = [detector.process(ecg[i:i + chunk]) for i in range(0, len(ecg), chunk)]
+    parts.append(detector.flush())
+    return np.concatenate(parts)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, nargs="+", default=[250, 360])
+    parser.add_argument("--duration", default="10m")
+    parser.add_argument("--cases", nargs="+",
+                        default=["normal:72", "normal:120", "arrhythmia:65", "bradycardia:45", "tachycardia:130"],
+                        help="kind:bpm, kind xem ecg_synth.KINDS")
+    parser.add_argument("--tolerance-ms", type=float, default=50.0)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--stream-chunk", type=int, default=250)
+    args = parser.parse_args()
+
+    seconds = parse_duration(args.duration)
+    tolerance = args.tolerance_ms / 1000 * PIPELINE_FS
+    print(f"{'case':<24} {'detector':<13} {'time_ms':>8} {'true_qrs':>8} {'peaks':>6} {'correct':>7} "
+          f"{'false':>6} {'missed':>6} {'false_beats':>11}")
+    mismatched = 0
+    for fs in args.fs:
+        for case in args.cases:
+            kind, bpm = case.split(":")
+            adc, truth = mock_with_truth(kind, float(bpm), fs, seconds)
+            ecg = filtered_signal(adc, fs)
+            label = f"{kind}{bpm}_{fs}hz_{args.duration}"
+            for detector in DETECTORS:
+                elapsed, peaks = best_time(lambda: detect_r_peaks(ecg, PIPELINE_FS, detector), args.runs)
+                correct = match(peaks, truth, tolerance)
+                false_beats = int((model_beats(peaks, len(ecg)) & ~correct).sum())
+                print(f"{label:<24} {detector:<13} {elapsed * 1000:>8.2f} {len(truth):>8} {len(peaks):>6} "
+                      f"{correct.sum():>7} {(~correct).sum():>6} {len(truth) - correct.sum():>6} {false_beats:>11}")
+                if detector == "pan_tompkins" and not np.array_equal(stream_peaks(ecg, args.stream_chunk), peaks):
+                    print(f"  ✗ QRSDetector theo chunk {args.stream_chunk} mẫu khác detect_qrs")
+                    mismatched += 1
+
+    if mismatched:
+        sys.exit(1)
+    print(f"\n✓ QRSDetector theo chunk {args.stream_chunk} mẫu cho cùng peak với detect_qrs")
+
+
+if __name__ == "__main__":
+    main()
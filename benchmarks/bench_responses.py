@@ -0,0 +1,73 @@
+"""
+Kích thước và thời gian tạo response của /predictt theo cách mã hóa: JSON list
+(như trước), base64 float32/float16, MessagePack, RLE, chọn trường, gzip.
+
+Kết quả dự đoán được tính trước (cache ấm) nên thời gian đo chủ yếu là
+chọn trường + mã hóa + nén.
+
+Chạy:
+    python benchmarks/bench_responses.py --minutes 60
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import flask_api_fixed  # noqa: E402
+from ecg_response import load_msgpack  # noqa: E402
+from generate_mock_ecg import generate_normal_ecg  # noqa: E402
+
+VARIANTS = [
+    ("json list", "", {}),
+    ("json f32", "arrays=f32", {}),
+    ("json f16", "arrays=f16", {}),
+    ("json f16 rle", "arrays=f16&rle=1", {}),
+    ("json list gzip", "", {"Accept-Encoding": "gzip"}),
+    ("json f16 rle gzip", "arrays=f16&rle=1", {"Accept-Encoding": "gzip"}),
+    ("msgpack f16", "arrays=f16", {"Accept": "application/msgpack"}),
+    ("msgpack f16 rle gzip", "arrays=f16&rle=1", {"Accept": "application/msgpack", "Accept-Encoding": "gzip"}),
+    ("summary only", "fields=num_beats,final_prediction", {}),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60.0, help="độ dài bản ghi (phút @ 250 Hz)")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    n = int(args.minutes * 60 * 250)
+    base = generate_normal_ecg(60 * 250, sample_rate=250)
+    data = np.clip(np.resize(base, n) + np.random.randint(-2, 3, n), 0, 1023).astype("<i2").tobytes()
+
+    client = flask_api_fixed.app.test_client()
+    headers = {"Content-Type": "application/octet-stream"}
+    warm = client.post("/predictt?fields=num_beats", data=data, headers=headers).get_json()
+    print(f"{args.minutes:g} phút @ 250 Hz, {warm['num_beats']} beats\n")
+    print(f"{'encoding':<22} {'size_MB':>9} {'time_ms':>9} {'smaller':>8}")
+
+    baseline = None
+    for name, query, extra in VARIANTS:
+        if "msgpack" in name and load_msgpack() is None:
+            print(f"{name:<22} bỏ qua: chưa cài msgpack")
+            continue
+        best = float("inf")
+        for _ in range(args.repeat):
+            t0 = time.perf_counter()
+            resp = client.post(f"/predictt?{query}", data=data, headers={**headers, **extra})
+            best = min(best, time.perf_counter() - t0)
+        assert resp.status_code == 200, resp.data[:200]
+        size = len(resp.data)
+        baseline = baseline or size
+        print(f"{name:<22} {size / 1e6:>9.2f} {best * 1000:>9.1f} {baseline / size:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
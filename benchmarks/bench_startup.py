@@ -0,0 +1,78 @@
+"""
+Thời gian khởi động server trong process mới: import theo module (-X importtime), nạp model,
+warmup, và độ trễ các request /predict đầu tiên khi tắt warmup (ECG_WARMUP=off) so với có warmup.
+
+Chạy:
+    python benchmarks/bench_startup.py --requests 4
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Chạy trong process con: import, rồi gửi request 30 s xen kẽ 250 / 360 Hz (tín hiệu khác nhau, không trúng cache)
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+import flask_api_fixed as api
+
+client = api.app.test_client()
+latencies = []
+for i in range({requests}):
+    fs = (250, 360)[i % 2]
+    data = (api.synthetic_ecg(fs, seconds=30) + i).tobytes()
+    started = time.perf_counter()
+    resp = client.post(f"/predict?fs={{fs}}", data=data, headers={{"Content-Type": "application/octet-stream"}})
+    assert resp.status_code == 200, resp.data[:200]
+    latencies.append(round((time.perf_counter() - started) * 1000, 1))
+print(json.dumps({{"ready": client.get("/ready").get_json(), "latencies_ms": latencies}}))
+"""
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| (\s*)(\S+)")
+
+
+def import_breakdown(env):
+    """Module flask_api_fixed import trực tiếp và thời gian import tích lũy (ms)"""
+    proc = subprocess.run([sys.executable, "-X", "importtime", "-c", "import flask_api_fixed"],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    top = {}
+    for line in proc.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match and len(match.group(3)) == 2:
+            top[match.group(4)] = int(match.group(2)) / 1000
+    return sorted(top.items(), key=lambda item: -item[1])
+
+
+def run_child(env, requests):
+    proc = subprocess.run([sys.executable, "-c", CHILD.format(root=ROOT, requests=requests)],
+                          cwd=ROOT, env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=4, help="số request đo sau khi khởi động")
+    parser.add_argument("--min-ms", type=float, default=20.0, help="chỉ in module import lâu hơn ngưỡng này")
+    args = parser.parse_args()
+
+    env = dict(os.environ, ECG_WARMUP="off")
+    print("Import flask_api_fixed (ms, tích lũy theo module import trực tiếp):")
+    for name, ms in import_breakdown(env):
+        if ms >= args.min_ms:
+            print(f"  {name:<24} {ms:>8.0f}")
+
+    print(f"\n{'ECG_WARMUP':<11} {'imports_s':>9} {'ready_s':>8} {'warmup_ms':>10}  request ms")
+    for mode in ("off", "sync"):
+        result = run_child(dict(os.environ, ECG_WARMUP=mode), args.requests)
+        ready = result["ready"]
+        print(f"{mode:<11} {ready['imports_done_s']:>9} {ready['ready_s']:>8} {ready['warmup_ms']:>10.0f}  "
+              + " ".join(f"{ms:.0f}" for ms in result["latencies_ms"]))
+
+
+if __name__ == "__main__":
+    main()
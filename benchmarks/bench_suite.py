@@ -0,0 +1,315 @@
+"""
+Bộ micro-benchmark cho đường nóng DSP và model: thời gian và bộ nhớ đỉnh của từng bước
+(preprocess_adc, resample, bandpass_filter, find_peaks, extract_beats, ecg_to_beats trọn vẹn,
+ECGResNet.forward) trên tín hiệu mock tất định ở 250 và 360 Hz, từ 10 giây tới 24 giờ.
+
+- Tín hiệu: generate_normal_ecg (seed cố định) sinh một đoạn 10 phút cho mỗi fs, lặp lại tới độ dài
+  cần đo và cộng nhiễu ±2 ADC tất định (giữ nguyên cách dựng tín hiệu để so được với baseline đã lưu).
+- Thời gian: --rounds lượt xen kẽ các bước (lượt 1 mọi bước, rồi lượt 2...). Mỗi lượt lấy lần nhanh nhất
+  của một bước (ít nhất --min-runs lần và tới khi tổng vượt --min-time / --rounds, tối đa --max-runs lần
+  cả các lượt). time_ms là trung vị của các lượt, time_iqr_ms là khoảng tứ phân vị: độ nhiễu giữa các lượt.
+- Bộ nhớ, đo ở một lần chạy riêng trước khi đo thời gian:
+  - peak_alloc_mb: đỉnh cấp phát trong bước (tracemalloc: numpy / scipy / Python; tất định)
+  - peak_rss_mb: đỉnh RSS tăng thêm (VmHWM, Linux) - gồm cả tensor torch nhưng nhiễu hơn
+- forward: eager, batch 256 như MicroBatcher, tối đa --max-forward-beats beat đầu tiên.
+
+Kết quả ghi JSON (--output). --baseline so với kết quả đã lưu, thoát với mã 1 nếu có bước chậm hơn
+--time-tolerance và vượt cả độ nhiễu (NOISE_IQRS lần tổng IQR của baseline và lần đo này, tối thiểu
+MIN_TIME_DIFF_MS), hoặc cấp phát nhiều hơn --memory-tolerance. peak_rss_mb chỉ để tham khảo.
+
+Chạy:
+    python benchmarks/bench_suite.py --output results.json
+    python benchmarks/bench_suite.py --durations 10s 1m --baseline benchmarks/baseline.json
+    python benchmarks/bench_suite.py --save-baseline benchmarks/baseline.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import scipy
+import torch
+from scipy.signal import find_peaks
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_dsp import (  # noqa: E402
+    PIPELINE_FS, bandpass_filter, ecg_to_beats, extract_beats, preprocess_adc, to_pipeline_rate
+)
+from ecg_model import load_model, torch_forward  # noqa: E402
+from generate_mock_ecg import generate_normal_ecg  # noqa: E402
+
+SEED = 0
+BASE_SECONDS = 600
+FORWARD_BATCH = 256
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+# Chênh lệch tuyệt đối nhỏ hơn ngưỡng này không tính là regression (nhiễu đo). Hai lần chạy liên tiếp trên
+# cùng máy 1 CPU lệch tới ~0.3 ms ở các bước dưới 1 ms.
+MIN_TIME_DIFF_MS = 0.5
+MIN_ALLOC_DIFF_MB = 0.1
+# Chậm hơn trong khoảng NOISE_IQRS x (IQR baseline + IQR hiện tại) cũng coi là nhiễu
+NOISE_IQRS = 3.0
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+# =========================================================
+# SIGNALS
+# =========================================================
+
+_bases = {}
+
+
+def synthetic_recording(fs, seconds):
+    """Bản ghi ADC int16 tất định: đoạn mock 10 phút của fs này lặp lại + nhiễu ±2"""
+    if fs not in _bases:
+        np.random.seed(SEED)
+        _bases[fs] = generate_normal_ecg(int(BASE_SECONDS * fs), sample_rate=fs)
+    n = int(seconds * fs)
+    noise = np.random.RandomState(SEED + n).randint(-2, 3, n)
+    return (np.resize(_bases[fs], n) + noise).astype(np.int16)
+
+
+# =========================================================
+# MEASUREMENT
+# =========================================================
+
+def best_time(fn, min_time, min_runs, max_runs):
+    """Thời gian tốt nhất (giây) của fn trong một lượt"""
+    best, total, runs = float("inf"), 0.0, 0
+    while runs < max_runs and (runs < min_runs or total < min_time):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best, total, runs = min(best, elapsed), total + elapsed, runs + 1
+    return best
+
+
+def time_rounds(stages, args):
+    """{bước: [thời gian tốt nhất của từng lượt]}; các bước chạy xen kẽ nên thay đổi trạng thái máy nằm trong IQR"""
+    rounds = {name: [] for name, _ in stages}
+    min_time = args.min_time / args.rounds
+    max_runs = max(args.min_runs, args.max_runs // args.rounds)
+    for _ in range(args.rounds):
+        for name, fn in stages:
+            rounds[name].append(best_time(fn, min_time, args.min_runs, max_runs))
+    return rounds
+
+
+def _status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def peak_memory(fn):
+    """(đỉnh cấp phát tracemalloc MB, đỉnh RSS tăng thêm MB hoặc None) của một lần chạy fn"""
+    try:
+        # Ghi "5" vào clear_refs: đặt lại VmHWM (đỉnh RSS) về RSS hiện tại (Linux >= 4.0)
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        rss_before = _status_kb("VmRSS")
+    except OSError:
+        rss_before = None
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    hwm = _status_kb("VmHWM") if rss_before is not None else None
+    return peak / 1e6, (hwm - rss_before) / 1e3 if hwm is not None else None
+
+
+def run_case(fs, seconds, forward, args):
+    """Đo mọi bước trên một bản ghi; mỗi bước dùng đầu ra của bước trước"""
+    adc = synthetic_recording(fs, seconds)
+    # Mỗi bước ghi ra khóa riêng để chạy lại nhiều lần vẫn cho cùng đầu vào
+    state = {}
+
+    def preprocess():
+        state["ecg"] = state["pipeline_ecg"] = preprocess_adc(adc)
+
+    def resample():
+        state["pipeline_ecg"] = to_pipeline_rate(state["ecg"], fs)
+
+    def bandpass():
+        state["filtered"] = bandpass_filter(state["pipeline_ecg"], PIPELINE_FS)
+
+    def peaks():
+        # Như filtered_to_beats, tách riêng dò peak và cắt beat
+        state["peaks"], _ = find_peaks(state["filtered"], distance=int(0.25 * PIPELINE_FS))
+
+    def beats():
+        hb_size = int(np.mean(np.diff(state["peaks"])))
+        state["beats"] = extract_beats(state["filtered"], state["peaks"], hb_size, fs=PIPELINE_FS)
+
+    def end_to_end():
+        ecg_to_beats(adc, fs=fs)
+
+    def model_forward():
+        x = state["beats"][:args.max_forward_beats].astype(np.float32)
+        for i in range(0, len(x), FORWARD_BATCH):
+            forward(x[i:i + FORWARD_BATCH])
+
+    stages = [("preprocess", preprocess), ("resample", resample), ("bandpass", bandpass),
+              ("find_peaks", peaks), ("extract_beats", beats), ("ecg_to_beats", end_to_end),
+              ("forward", model_forward)]
+    if fs == PIPELINE_FS:
+        stages.pop(1)
+
+    # Lần đo bộ nhớ chạy trước, đồng thời là warmup (kernel theo shape, plan DSP) cho lần đo thời gian
+    memory = {name: peak_memory(fn) for name, fn in stages}
+    rounds = time_rounds(stages, args)
+    results = {}
+    for name, _ in stages:
+        alloc_mb, rss_mb = memory[name]
+        q1, median, q3 = np.percentile(rounds[name], [25, 50, 75]) * 1000
+        results[name] = {
+            "time_ms": round(median, 3),
+            "time_iqr_ms": round(q3 - q1, 3),
+            "peak_alloc_mb": round(alloc_mb, 3),
+            "peak_rss_mb": round(rss_mb, 1) if rss_mb is not None else None,
+        }
+    n_forward = min(len(state["beats"]), args.max_forward_beats)
+    if n_forward:
+        results["forward"]["per_beat_us"] = round(results["forward"]["time_ms"] * 1000 / n_forward, 2)
+    return {"samples": len(adc), "beats": len(state["beats"]), "forward_beats": n_forward, "stages": results}
+
+
+# =========================================================
+# BASELINE
+# =========================================================
+
+def cpu_model():
+    """Tên CPU (/proc/cpuinfo); platform.processor() thường rỗng trên Linux"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("model name"):
+                    return line.split(":", 1)[1].strip()
+    except OSError:
+        pass
+    return platform.processor()
+
+
+def machine_info():
+    return {
+        "machine": platform.machine(),
+        "processor": cpu_model(),
+        "cpus": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "scipy": scipy.__version__,
+        "torch": torch.__version__,
+    }
+
+
+def compare(baseline, current, time_tolerance, memory_tolerance):
+    """In bảng so sánh; trả về số regression"""
+    keys = set(baseline["meta"]) | set(current["meta"])
+    differs = {k: (baseline["meta"].get(k), current["meta"].get(k)) for k in sorted(keys)
+               if baseline["meta"].get(k) != current["meta"].get(k)}
+    if differs:
+        print("⚠ Baseline đo trên môi trường khác, so sánh thời gian không đáng tin: "
+              + ", ".join(f"{k} {a} -> {b}" for k, (a, b) in differs.items()) + "\n")
+
+    print(f"{'case/stage':<34} {'metric':<14} {'baseline':>10} {'current':>10} {'change':>8}")
+    regressions = 0
+    for case, result in current["results"].items():
+        base_case = baseline["results"].get(case)
+        if base_case is None:
+            continue
+        for stage, values in result["stages"].items():
+            base = base_case["stages"].get(stage)
+            if base is None:
+                continue
+            # Baseline cũ không có time_iqr_ms: chỉ dùng IQR của lần đo này
+            noise = NOISE_IQRS * (base.get("time_iqr_ms", 0.0) + values.get("time_iqr_ms", 0.0))
+            checks = [("time_ms", time_tolerance, max(MIN_TIME_DIFF_MS, noise))]
+            if stage != "forward":
+                # Tensor torch không đi qua tracemalloc: peak_alloc_mb của forward không có ý nghĩa
+                checks.append(("peak_alloc_mb", memory_tolerance, MIN_ALLOC_DIFF_MB))
+            for metric, tolerance, min_diff in checks:
+                old, new = base[metric], values[metric]
+                change = (new - old) / old if old else 0.0
+                if change > tolerance and new - old > min_diff:
+                    flag = "  ✗ REGRESSION"
+                    regressions += 1
+                elif change < -tolerance and old - new > min_diff:
+                    flag = "  ✓ faster" if metric == "time_ms" else "  ✓ smaller"
+                else:
+                    continue
+                print(f"{case + '/' + stage:<34} {metric:<14} {old:>10.3f} {new:>10.3f} {change:>+7.1%}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, nargs="+", default=[250, 360])
+    parser.add_argument("--durations", nargs="+", default=["10s", "1m", "10m", "1h", "24h"])
+    parser.add_argument("--model", default=os.path.join(ROOT, "resetECG_new.pth"))
+    parser.add_argument("--max-forward-beats", type=int, default=1024)
+    parser.add_argument("--min-time", type=float, default=0.5, help="tổng thời gian đo tối thiểu mỗi bước (giây)")
+    parser.add_argument("--rounds", type=int, default=5, help="số lượt đo xen kẽ các bước (trung vị + IQR)")
+    parser.add_argument("--min-runs", type=int, default=1, help="số lần chạy tối thiểu mỗi bước trong một lượt")
+    parser.add_argument("--max-runs", type=int, default=20, help="số lần chạy tối đa mỗi bước, cộng mọi lượt")
+    parser.add_argument("--output", help="ghi kết quả JSON")
+    parser.add_argument("--baseline", help="so với kết quả JSON đã lưu")
+    parser.add_argument("--save-baseline", help="ghi kết quả làm baseline mới")
+    parser.add_argument("--time-tolerance", type=float, default=0.25,
+                        help="chậm hơn bao nhiêu là regression (và vượt cả độ nhiễu, xem NOISE_IQRS)")
+    parser.add_argument("--memory-tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    forward = torch_forward(load_model(args.model))
+    forward(np.zeros((FORWARD_BATCH, 150), dtype=np.float32))
+
+    report = {"meta": machine_info(), "results": {}}
+    print(f"{'case':<22} {'stage':<14} {'time_ms':>10} {'iqr_ms':>8} {'alloc_MB':>9} {'rss_MB':>8}")
+    for fs in args.fs:
+        for duration in args.durations:
+            case = f"normal_{fs}hz_{duration}"
+            result = run_case(fs, parse_duration(duration), forward, args)
+            report["results"][case] = result
+            for stage, values in result["stages"].items():
+                rss = values["peak_rss_mb"]
+                print(f"{case:<22} {stage:<14} {values['time_ms']:>10.3f} {values['time_iqr_ms']:>8.3f} "
+                      f"{values['peak_alloc_mb']:>9.2f} "
+                      f"{rss if rss is not None else '-':>8}")
+
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, "w") as f:
+                json.dump(report, f, indent=1)
+            print(f"\n✓ Đã ghi {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        print()
+        regressions = compare(baseline, report, args.time_tolerance, args.memory_tolerance)
+        if regressions:
+            print(f"\n✗ {regressions} regression so với {args.baseline}")
+            sys.exit(1)
+        print(f"\n✓ Không có regression so với {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""
+Bộ sinh ECG giả: ecg_synth (scatter-add vector hóa) so với vòng lặp mask từng beat cũ
+(generate_*_ecg_reference, O(beat x mẫu)).
+
+- Parity: cùng np.random.seed -> cùng ADC như bản cũ (số mẫu lệch, lệch lớn nhất).
+- Thời gian: bản cũ tới --max-reference-duration (chậm theo bình phương độ dài), ecg_synth tới 24 giờ,
+  và synthesize_batch cho --batch bản ghi 10 phút với nhịp tim khác nhau.
+
+Chạy:
+    python benchmarks/bench_synth.py
+    python benchmarks/bench_synth.py --fs 360 --durations 1m 1h 24h
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_synth import synthesize, synthesize_batch  # noqa: E402
+
+SEED = 0
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def generate_normal_ecg_reference(num_points, sample_rate, heart_rate):
+    """Cài đặt gốc của generate_mock_ecg.generate_normal_ecg: mỗi beat một mask trên cả trục thời gian"""
+    t = np.linspace(0, num_points / sample_rate, num_points)
+    qrs = np.zeros_like(t)
+    rr_interval = 1.0 / (heart_rate / 60.0)
+    for i in range(int(t[-1] / rr_interval)):
+        beat_time = i * rr_interval
+        qrs_mask = (t >= beat_time) & (t < beat_time + 0.1)
+        qrs[qrs_mask] = 2.0 * np.exp(-((t[qrs_mask] - beat_time - 0.05) / 0.02) ** 2)
+        p_mask = (t >= beat_time - 0.15) & (t < beat_time - 0.05)
+        qrs[p_mask] += 0.3 * np.exp(-((t[p_mask] - beat_time + 0.1) / 0.03) ** 2)
+        t_mask = (t >= beat_time + 0.15) & (t < beat_time + 0.35)
+        qrs[t_mask] += 0.5 * np.exp(-((t[t_mask] - beat_time - 0.25) / 0.05) ** 2)
+    ecg = qrs + np.random.normal(0, 0.05, num_points) + 0.1 * np.sin(2 * np.pi * 0.5 * t)
+    ecg_normalized = (ecg - np.min(ecg)) / (np.max(ecg) - np.min(ecg) + 1e-8)
+    return np.clip(512 + (ecg_normalized - 0.5) * 200, 0, 1023).astype(int)
+
+
+def generate_arrhythmia_ecg_reference(num_points, sample_rate, heart_rate):
+    """Cài đặt gốc của generate_abnormal_ecg(abnormality='arrhythmia')"""
+    t = np.linspace(0, num_points / sample_rate, num_points)
+    qrs = np.zeros_like(t)
+    rr_interval = 1.0 / (heart_rate / 60.0)
+    for i in range(int(t[-1] / rr_interval)):
+        beat_time = i * rr_interval + np.random.uniform(-0.1, 0.1)
+        if beat_time < 0 or beat_time > t[-1]:
+            continue
+        qrs_mask = (t >= beat_time) & (t < beat_time + 0.12)
+        qrs[qrs_mask] = 2.5 * np.exp(-((t[qrs_mask] - beat_time - 0.06) / 0.025) ** 2)
+        p_mask = (t >= beat_time - 0.2) & (t < beat_time - 0.08)
+        qrs[p_mask] += 0.2 * np.exp(-((t[p_mask] - beat_time + 0.14) / 0.04) ** 2)
+        t_mask = (t >= beat_time + 0.2) & (t < beat_time + 0.4)
+        qrs[t_mask] += 0.6 * np.exp(-((t[t_mask] - beat_time - 0.3) / 0.06) ** 2)
+    ecg = qrs + np.random.normal(0, 0.1, num_points) + 0.2 * np.sin(2 * np.pi * 0.3 * t)
+    ecg_normalized = (ecg - np.min(ecg)) / (np.max(ecg) - np.min(ecg) + 1e-8)
+    return np.clip(512 + (ecg_normalized - 0.5) * 250, 0, 1023).astype(int)
+
+
+# (kind, bản cũ, nhịp tim): nhịp nhanh để cửa sổ T / P / QRS của các beat kề nhau chồng lên nhau
+REFERENCES = (
+    ("normal", generate_normal_ecg_reference, 72),
+    ("normal", generate_normal_ecg_reference, 150),
+    ("arrhythmia", generate_arrhythmia_ecg_reference, 65),
+    ("arrhythmia", generate_arrhythmia_ecg_reference, 150),
+)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    out = fn()
+    return time.perf_counter() - started, out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, nargs="+", default=[250, 360])
+    parser.add_argument("--durations", nargs="+", default=["10s", "1m", "10m", "1h", "24h"])
+    parser.add_argument("--max-reference-duration", default="10m", help="bản cũ chỉ chạy tới độ dài này")
+    parser.add_argument("--batch", type=int, default=64, help="số bản ghi 10 phút cho synthesize_batch")
+    args = parser.parse_args()
+
+    max_reference = parse_duration(args.max_reference_duration)
+    print(f"{'case':<30} {'reference_s':>11} {'synth_s':>8} {'speedup':>8} {'diff_samples':>12} {'max_diff':>8}")
+    for fs in args.fs:
+        for kind, reference, bpm in REFERENCES:
+            for duration in args.durations:
+                seconds = parse_duration(duration)
+                n = int(seconds * fs)
+                np.random.seed(SEED)
+                synth_s, adc = timed(lambda: synthesize(n, fs, bpm, kind=kind, seed=np.random))
+                label = f"{kind}_{bpm}bpm_{fs}hz_{duration}"
+                if seconds > max_reference:
+                    print(f"{label:<30} {'-':>11} {synth_s:>8.3f} {'-':>8} {'-':>12} {'-':>8}")
+                    continue
+                np.random.seed(SEED)
+                reference_s, expected = timed(lambda: reference(n, fs, bpm))
+                diff = np.abs(adc - expected)
+                print(f"{label:<30} {reference_s:>11.3f} {synth_s:>8.3f} {reference_s / synth_s:>7.0f}x "
+                      f"{int((diff > 0).sum()):>12} {int(diff.max()):>8}")
+
+        heart_rates = np.linspace(45, 130, args.batch)
+        batch_s, _ = timed(lambda: synthesize_batch(args.batch, 600 * fs, fs, heart_rates, kind="arrhythmia",
+                                                    seed=SEED))
+        single_s, _ = timed(lambda: [synthesize(600 * fs, fs, hr, kind="arrhythmia", seed=SEED) for hr in heart_rates])
+        print(f"{f'batch {args.batch}x10m_{fs}hz':<30} {'-':>11} {batch_s:>8.3f}   (từng bản ghi: {single_s:.3f} s)")
+
+
+if __name__ == "__main__":
+    main()
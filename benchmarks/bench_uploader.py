@@ -0,0 +1,114 @@
+"""
+Upload ECG lên Realtime Database, chạy offline trên rtdb_local (độ trễ mạng giả lập --latency-ms):
+
+- put_whole: cách cũ của các script push_*: một requests.put cả dict chunk (ghi đè, không giống thiết bị)
+- patch_per_chunk: nối từng chunk bằng requests.patch không dùng Session (mỗi request một kết nối mới)
+- session_per_chunk: RTDBUploader, mỗi chunk một PATCH trên kết nối keep-alive
+- session_batched: RTDBUploader.upload (gộp --max-batch chunk mỗi request)
+- stream_xN: RTDBUploader.stream theo tốc độ lấy mẫu x --speed (tốc độ đạt được, độ trễ tối đa của chunk)
+- stream_faults: như stream nhưng --fail-rate request bị trả 503 (retry + backoff)
+
+Mỗi trường hợp kiểm tra nội dung node sau khi xong đúng bằng format_chunks của tín hiệu.
+
+Chạy:
+    python benchmarks/bench_uploader.py
+    python benchmarks/bench_uploader.py --duration 10m --latency-ms 30 --speed 50
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from ecg_synth import synthesize  # noqa: E402
+from ecg_uploader import CHUNK_SIZE, ECG_PATH, RTDBUploader, format_chunks  # noqa: E402
+from rtdb_local import LocalRTDB  # noqa: E402
+
+SEED = 0
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def put_whole(db, ecg, args):
+    url = f"{db.url}/{ECG_PATH}.json"
+    requests.put(url, json=format_chunks(ecg, CHUNK_SIZE), params={"print": "silent"}, timeout=30).raise_for_status()
+    return 1, 0
+
+
+def patch_per_chunk(db, ecg, args):
+    url = f"{db.url}/{ECG_PATH}.json"
+    requests.delete(url, timeout=30).raise_for_status()
+    chunks = format_chunks(ecg, CHUNK_SIZE)
+    for key, value in chunks.items():
+        requests.patch(url, json={key: value}, params={"print": "silent"}, timeout=30).raise_for_status()
+    return len(chunks) + 1, 0
+
+
+def session_per_chunk(db, ecg, args):
+    with RTDBUploader(db.url) as uploader:
+        stats = uploader.upload(ecg, CHUNK_SIZE, max_batch=1)
+    return stats.requests, stats.retries
+
+
+def session_batched(db, ecg, args):
+    with RTDBUploader(db.url) as uploader:
+        stats = uploader.upload(ecg, CHUNK_SIZE, max_batch=args.max_batch)
+    return stats.requests, stats.retries
+
+
+def stream(db, ecg, args):
+    with RTDBUploader(db.url, backoff=0.05) as uploader:
+        stats = uploader.stream(ecg, args.fs, CHUNK_SIZE, speed=args.speed, max_batch=args.max_batch)
+    summary = stats.summary()
+    print(f"    realtime_factor {summary['realtime_factor']} / {args.speed:g}, max_lag {summary['max_lag_ms']} ms")
+    return stats.requests, stats.retries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fs", type=int, default=360)
+    parser.add_argument("--duration", default="2m")
+    parser.add_argument("--latency-ms", type=float, default=10.0)
+    parser.add_argument("--max-batch", type=int, default=50)
+    parser.add_argument("--speed", type=float, default=20.0)
+    parser.add_argument("--fail-rate", type=float, default=0.05)
+    args = parser.parse_args()
+
+    ecg = synthesize(int(parse_duration(args.duration) * args.fs), args.fs, 72, seed=SEED)
+    expected = format_chunks(ecg, CHUNK_SIZE)
+    cases = [
+        ("put_whole", put_whole, 0.0),
+        ("patch_per_chunk", patch_per_chunk, 0.0),
+        ("session_per_chunk", session_per_chunk, 0.0),
+        ("session_batched", session_batched, 0.0),
+        (f"stream_x{args.speed:g}", stream, 0.0),
+        ("stream_faults", stream, args.fail_rate),
+    ]
+    print(f"{len(ecg)} mẫu ({len(expected)} chunk), latency {args.latency_ms:g} ms / request\n")
+    print(f"{'case':<20} {'seconds':>8} {'samples/s':>10} {'requests':>8} {'retries':>7} {'connections':>11} "
+          f"{'ok':>3}")
+    failed = 0
+    for name, fn, fail_rate in cases:
+        with LocalRTDB(latency=args.latency_ms / 1000, fail_rate=fail_rate, seed=SEED) as db:
+            started = time.perf_counter()
+            n_requests, retries = fn(db, ecg, args)
+            elapsed = time.perf_counter() - started
+            ok = db.get(ECG_PATH) == expected
+            failed += not ok
+            print(f"{name:<20} {elapsed:>8.2f} {len(ecg) / elapsed:>10.0f} {n_requests:>8} {retries:>7} "
+                  f"{db.connections:>11} {'✓' if ok else '✗':>3}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Bộ nhớ của chế độ production (gunicorn.conf.py) theo số worker: khởi động gunicorn,
+gửi vài request để worker chạm vào model, rồi đọc /proc/<pid>/smaps_rollup.
+
+- private: bộ nhớ riêng của tiến trình (không chia sẻ với tiến trình nào khác)
+- pss: phần bộ nhớ chia sẻ được chia đều cho các tiến trình dùng chung
+
+So sánh preload (model nạp một lần trong master) với ECG_PRELOAD=0 (mỗi worker tự nạp).
+Chỉ chạy trên Linux.
+
+Chạy:
+    python benchmarks/bench_workers.py --workers 1 2 4
+"""
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import numpy as np
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from generate_mock_ecg import generate_normal_ecg  # noqa: E402
+
+
+def smaps(pid):
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == "kB":
+                values[parts[0].rstrip(":")] = int(parts[1]) * 1024
+    return {"private": values["Private_Clean"] + values["Private_Dirty"], "pss": values["Pss"]}
+
+
+def children(pid):
+    with open(f"/proc/{pid}/task/{pid}/children") as f:
+        pids = [int(p) for p in f.read().split()]
+    # Bỏ resource_tracker của multiprocessing (không phải worker gunicorn)
+    return [p for p in pids if b"gunicorn" in open(f"/proc/{p}/cmdline", "rb").read()]
+
+
+def measure(workers, preload, port, n_requests, payload):
+    env = dict(os.environ, ECG_WORKERS=str(workers), ECG_PRELOAD="1" if preload else "0",
+               ECG_BIND=f"127.0.0.1:{port}")
+    proc = subprocess.Popen([sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "flask_api_fixed:app"],
+                            cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.time() + 120
+        while True:
+            try:
+                if requests.get(f"{url}/health", timeout=5).ok and len(children(proc.pid)) == workers:
+                    break
+            except requests.RequestException:
+                pass
+            if time.time() > deadline:
+                raise RuntimeError("gunicorn did not start")
+            time.sleep(0.5)
+
+        for _ in range(n_requests):
+            requests.post(f"{url}/predict", data=payload, headers={"Content-Type": "application/octet-stream"})
+
+        master = smaps(proc.pid)
+        per_worker = [smaps(p) for p in children(proc.pid)]
+        return master, per_worker
+    finally:
+        proc.send_signal(signal.SIGTERM)
+        proc.wait(timeout=60)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--requests", type=int, default=20, help="số request gửi trước khi đo")
+    parser.add_argument("--port", type=int, default=5099)
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    payload = generate_normal_ecg(30 * 250, sample_rate=250).astype("<i2").tobytes()
+
+    print(f"{'mode':<10} {'workers':>7} {'master_MB':>10} {'worker_private_MB':>18} {'total_pss_MB':>13}")
+    for preload in (True, False):
+        for workers in args.workers:
+            master, per_worker = measure(workers, preload, args.port, args.requests, payload)
+            private = np.mean([w["private"] for w in per_worker])
+            total = master["pss"] + sum(w["pss"] for w in per_worker)
+            print(f"{'preload' if preload else 'no-preload':<10} {workers:>7} {master['private'] / 1e6:>10.1f} "
+                  f"{private / 1e6:>18.1f} {total / 1e6:>13.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+"""
+Sinh corpus ECG giả có nhãn (hàng nghìn tới hàng triệu bản ghi) cho load test và đánh giá model.
+
+Bản ghi được sinh bằng ecg_synth (cùng bộ sinh với generate_mock_ecg / push_good_mock_data),
+theo lô, song song trên một process pool: mỗi worker sinh và ghi một shard. Định dạng và cách đọc:
+xem ecg_corpus.
+
+Corpus chỉ phụ thuộc vào tham số và --seed, không phụ thuộc --workers.
+
+Chạy:
+    python build_corpus.py --out corpus/ --count 100000
+    python build_corpus.py --out corpus/ --count 2000000 --mix normal:10s:6 arrhythmia:10s:2 \\
+        bradycardia:30s:1 tachycardia:30s:1 --fs 250 360 --shard-mb 512 --workers 8
+Đọc:
+    from ecg_corpus import Corpus
+    corpus = Corpus("corpus/"); adc, fs, label = corpus[12345]
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from ecg_corpus import META_FILE, MixItem, plan_corpus, write_metadata, write_shard
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_mix_item(text):
+    """'kind:duration:weight' (weight mặc định 1), duration như '10s' | '5m' | '1h'"""
+    parts = text.split(":")
+    if len(parts) not in (2, 3) or parts[1][-1:] not in DURATIONS:
+        raise argparse.ArgumentTypeError(f"Invalid mix item {text!r}, expected kind:duration[:weight]")
+    try:
+        seconds = float(parts[1][:-1]) * DURATIONS[parts[1][-1]]
+        weight = float(parts[2]) if len(parts) == 3 else 1.0
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid mix item {text!r}, expected kind:duration[:weight]")
+    return MixItem(parts[0], seconds, weight)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", required=True, help="thư mục corpus (phải rỗng hoặc chưa tồn tại)")
+    parser.add_argument("--count", type=int, default=10000)
+    parser.add_argument("--mix", type=parse_mix_item, nargs="+",
+                        default=[parse_mix_item(m) for m in
+                                 ("normal:10s:4", "arrhythmia:10s:2", "bradycardia:10s:1", "tachycardia:10s:1",
+                                  "good:10s:2")],
+                        help="kind:duration[:weight], kind xem ecg_synth.KINDS")
+    parser.add_argument("--fs", type=int, nargs="+", default=[250, 360], help="fs rút đều cho mỗi bản ghi")
+    parser.add_argument("--shard-mb", type=float, default=256)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if os.path.isdir(args.out) and os.listdir(args.out):
+        sys.exit(f"Output directory is not empty: {args.out}")
+    os.makedirs(args.out, exist_ok=True)
+
+    started = time.perf_counter()
+    try:
+        index, labels = plan_corpus(args.count, args.mix, args.fs, int(args.shard_mb * (1 << 20)), args.seed)
+    except ValueError as e:
+        sys.exit(str(e))
+    n_shards = int(index["shard"].max()) + 1 if len(index) else 0
+    total_bytes = 0
+    print(f"{args.count} bản ghi, {n_shards} shard, {args.workers} worker")
+
+    # "fork" như DspPool: worker không import lại module chính
+    method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+    # Bản ghi của một shard nằm liền nhau trong index
+    bounds = np.searchsorted(index["shard"], np.arange(n_shards + 1))
+    with ProcessPoolExecutor(args.workers, mp_context=multiprocessing.get_context(method)) as pool:
+        futures = [pool.submit(write_shard, args.out, k, index[bounds[k]:bounds[k + 1]], labels, args.seed)
+                   for k in range(n_shards)]
+        for done, future in enumerate(as_completed(futures), 1):
+            shard, nbytes = future.result()
+            total_bytes += nbytes
+            elapsed = time.perf_counter() - started
+            print(f"  shard {shard:05d} xong ({done}/{n_shards}), {total_bytes / elapsed / 1e6:.1f} MB/s")
+
+    params = {
+        "count": args.count,
+        "mix": [item._asdict() for item in args.mix],
+        "fs": args.fs,
+        "shard_mb": args.shard_mb,
+        "seed": args.seed,
+    }
+    write_metadata(args.out, index, labels, params)
+    elapsed = time.perf_counter() - started
+    print(f"✓ {os.path.join(args.out, META_FILE)}: {args.count} bản ghi, {total_bytes / 1e9:.2f} GB "
+          f"trong {elapsed:.1f} s ({args.count / elapsed:.0f} bản ghi/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,381 @@
+"""
+Giả lập một đội thiết bị đo (AD8232) gửi ECG cùng lúc, để đo đường ingest khi có hàng trăm bệnh nhân.
+
+Mỗi thiết bị ảo là một coroutine asyncio, có nhịp tim, loại tín hiệu (ecg_synth) và fs riêng
+(rút theo --mix / --fs). Thiết bị có một kết nối HTTP/1.1 keep-alive riêng, như firmware thật.
+Nó nối dần từng chunk vào node của mình (PATCH <target>/<path>.json, định dạng chunk_N như
+ecg_uploader) theo đồng hồ thời gian thực: chunk thứ k "có" sau (k + 1) x chunk_size / fs giây.
+
+- Chunk gửi tuần tự. Chunk chờ quá --max-backlog giây (bộ đệm của thiết bị đầy) bị bỏ và tính là
+  dropped. Request lỗi sau --retries lần thử lại cũng làm các chunk của nó bị bỏ.
+- send-lag của một chunk = thời điểm server xác nhận - thời điểm chunk "có".
+- Thống kê theo từng thiết bị và cho cả đội: mẫu/s, request/s, lag p50/p95/p99/max, chunk bị bỏ, lỗi.
+
+Chạy:
+    python device_fleet.py --devices 200 --duration 60s                  # rtdb_local ở tiến trình riêng
+    python device_fleet.py --devices 300 --fs 250 360 --mix normal:6 arrhythmia:2 bradycardia:1 tachycardia:1 \\
+        --local-latency-ms 20 --output fleet.json
+    python device_fleet.py --target http://127.0.0.1:9000 --path "ECG/{device}/raw"
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import ssl
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+import numpy as np
+import requests
+
+from ecg_corpus import HEART_RATES
+from ecg_synth import KINDS, synthesize
+from ecg_uploader import CHUNK_SIZE, RETRY_STATUS, RTDBUploader, format_chunks
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+# Một thiết bị ảo: phase = độ lệch thời điểm bắt đầu (giây) để các thiết bị không gửi cùng lúc
+Device = namedtuple("Device", ["device_id", "kind", "heart_rate", "fs", "phase"])
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def parse_mix_item(text):
+    """'kind:weight' (weight mặc định 1)"""
+    kind, _, weight = text.partition(":")
+    if kind not in KINDS:
+        raise argparse.ArgumentTypeError(f"Unknown ECG kind: {kind!r}, expected one of {KINDS}")
+    try:
+        return kind, float(weight or 1)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"Invalid mix item {text!r}, expected kind[:weight]")
+
+
+def make_fleet(count, mix, fs_list, chunk_size, stagger=True, seed=0):
+    """Rút loại (theo trọng số mix), fs và nhịp tim (ecg_corpus.HEART_RATES) cho từng thiết bị"""
+    rng = np.random.default_rng(seed)
+    kinds = [kind for kind, _ in mix]
+    weights = np.array([weight for _, weight in mix], dtype=np.float64)
+    choice = rng.choice(len(kinds), size=count, p=weights / weights.sum())
+    fs = rng.choice(fs_list, size=count)
+    devices = []
+    for i in range(count):
+        kind = kinds[choice[i]]
+        heart_rate = round(float(rng.uniform(*HEART_RATES[kind])), 1)
+        phase = float(rng.uniform(0, chunk_size / fs[i])) if stagger else 0.0
+        devices.append(Device(f"device-{i:04d}", kind, heart_rate, int(fs[i]), phase))
+    return devices
+
+
+# =========================================================
+# HTTP/1.1 KEEP-ALIVE (asyncio streams)
+# =========================================================
+
+class HTTPConnection:
+    """Một kết nối keep-alive, request tuần tự; tự kết nối lại sau lỗi"""
+
+    def __init__(self, base_url, timeout):
+        url = urlsplit(base_url)
+        self.host = url.hostname
+        self.port = url.port or (443 if url.scheme == "https" else 80)
+        self.ssl = ssl.create_default_context() if url.scheme == "https" else None
+        self.prefix = url.path.rstrip("/")
+        self.timeout = timeout
+        self.connects = 0
+        self._reader = self._writer = None
+
+    async def request(self, method, target, body=b""):
+        """Returns: (status, body). Lỗi kết nối / timeout: đóng kết nối và ném lại"""
+        try:
+            return await asyncio.wait_for(self._request(method, target, body), self.timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _request(self, method, target, body):
+        if self._writer is None:
+            self._reader, self._writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl)
+            self.connects += 1
+        head = (f"{method} {self.prefix}{target} HTTP/1.1\r\nHost: {self.host}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n")
+        self._writer.write(head.encode() + body)
+        await self._writer.drain()
+
+        status_line = await self._reader.readline()
+        if not status_line:
+            raise ConnectionError("Connection closed by server")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self._reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        if headers.get("transfer-encoding", "").lower() == "chunked":
+            data = b""
+            while True:
+                size = int((await self._reader.readline()).split(b";")[0], 16)
+                data += await self._reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            data = await self._reader.readexactly(int(headers.get("content-length", 0)))
+        if headers.get("connection", "").lower() == "close":
+            self.close()
+        return status, data
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+
+# =========================================================
+# THIẾT BỊ ẢO
+# =========================================================
+
+class DeviceStats:
+    def __init__(self, device, n_chunks):
+        self.device = device
+        self.chunks = n_chunks
+        self.sent = 0
+        self.dropped = 0
+        self.requests = 0
+        self.retries = 0
+        self.errors = 0                 # request thất bại hẳn (chunk của nó bị bỏ)
+        self.connects = 0
+        self.lags = []                  # giây, mỗi chunk đã gửi
+        self.samples = 0                # số mẫu đã gửi
+        self.seconds = 0.0
+
+    def summary(self):
+        lags = np.array(self.lags) * 1000
+        return {
+            "device": self.device.device_id,
+            "kind": self.device.kind,
+            "heart_rate": self.device.heart_rate,
+            "fs": self.device.fs,
+            "chunks": self.chunks,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "requests": self.requests,
+            "retries": self.retries,
+            "errors": self.errors,
+            "connects": self.connects,
+            "samples_per_s": round(self.samples / self.seconds, 1) if self.seconds else None,
+            **_lag_summary(lags),
+        }
+
+
+def _lag_summary(lags_ms):
+    if not len(lags_ms):
+        return {"lag_p50_ms": None, "lag_p95_ms": None, "lag_p99_ms": None, "lag_max_ms": None}
+    p50, p95, p99 = np.percentile(lags_ms, [50, 95, 99])
+    return {"lag_p50_ms": round(float(p50), 1), "lag_p95_ms": round(float(p95), 1),
+            "lag_p99_ms": round(float(p99), 1), "lag_max_ms": round(float(lags_ms.max()), 1)}
+
+
+async def run_device(device, ecg, args, t0):
+    loop = asyncio.get_running_loop()
+    cs = args.chunk_size
+    period = cs / device.fs
+    n_chunks = -(-len(ecg) // cs)
+    end = len(ecg) / device.fs
+    start = t0 + device.phase
+    target = f"/{args.path.format(device=device.device_id).strip('/')}.json?print=silent"
+    conn = HTTPConnection(args.target, args.timeout)
+    stats = DeviceStats(device, n_chunks)
+    # ready[k]: thời điểm chunk k "có" (chunk cuối: khi hết mẫu)
+    ready = start + np.minimum((np.arange(n_chunks) + 1) * period, end)
+
+    sent = 0
+    while sent < n_chunks:
+        now = loop.time()
+        available = int(np.searchsorted(ready, now, side="right"))
+        if available <= sent:
+            await asyncio.sleep(ready[sent] - now)
+            continue
+        # Bộ đệm thiết bị chỉ giữ max_backlog giây: chunk cũ hơn bị bỏ
+        fresh = max(sent, int(np.searchsorted(ready, now - args.max_backlog, side="left")))
+        stats.dropped += fresh - sent
+        sent = fresh
+        stop = min(available, sent + args.max_batch)
+        body = json.dumps(format_chunks(ecg[sent * cs:stop * cs], cs, sent + 1), separators=(",", ":")).encode()
+        # Request đầu là PUT (thay node của phiên đo trước), sau đó PATCH
+        method = "PUT" if sent == 0 else "PATCH"
+        if await _send(conn, method, target, body, args, stats):
+            done = loop.time()
+            stats.lags.extend((done - ready[sent:stop]).tolist())
+            stats.sent += stop - sent
+            stats.samples += min(stop * cs, len(ecg)) - sent * cs
+        else:
+            stats.errors += 1
+            stats.dropped += stop - sent
+        sent = stop
+
+    stats.seconds = loop.time() - start
+    stats.connects = conn.connects
+    conn.close()
+    return stats
+
+
+async def _send(conn, method, target, body, args, stats):
+    for attempt in range(args.retries + 1):
+        stats.requests += 1
+        try:
+            status, _ = await conn.request(method, target, body)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError, IndexError):
+            status = None
+        if status is not None and 200 <= status < 300:
+            return True
+        if status is not None and status not in RETRY_STATUS:
+            return False
+        if attempt < args.retries:
+            stats.retries += 1
+            await asyncio.sleep(min(args.max_backoff, args.backoff * 2 ** attempt) * random.uniform(0.5, 1.0))
+    return False
+
+
+async def run_fleet(devices, signals, args):
+    loop = asyncio.get_running_loop()
+    # Bắt đầu sau một khoảng ngắn để mọi coroutine kịp tạo
+    t0 = loop.time() + 0.5
+    return await asyncio.gather(*(run_device(device, ecg, args, t0) for device, ecg in zip(devices, signals)))
+
+
+# =========================================================
+# MAIN
+# =========================================================
+
+def start_local(args):
+    """rtdb_local ở tiến trình riêng (không tranh GIL với vòng lặp asyncio). Returns: (Popen, url)"""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "rtdb_local.py"), "--port", str(port),
+         "--latency-ms", str(args.local_latency_ms), "--fail-rate", str(args.local_fail_rate)],
+        stdout=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 10
+    while True:
+        try:
+            requests.get(f"{url}/.json", timeout=1)
+            return process, url
+        except requests.ConnectionError:
+            if time.monotonic() > deadline or process.poll() is not None:
+                process.kill()
+                sys.exit("rtdb_local did not start")
+            time.sleep(0.05)
+
+
+def overall_summary(results, wall):
+    lags = np.concatenate([np.array(r.lags) for r in results]) * 1000 if results else np.empty(0)
+    chunks = sum(r.chunks for r in results)
+    dropped = sum(r.dropped for r in results)
+    return {
+        "devices": len(results),
+        "wall_seconds": round(wall, 2),
+        "samples_per_s": round(sum(r.samples for r in results) / wall, 1),
+        "requests_per_s": round(sum(r.requests for r in results) / wall, 1),
+        "chunks": chunks,
+        "sent": sum(r.sent for r in results),
+        "dropped": dropped,
+        "dropped_pct": round(100 * dropped / chunks, 3) if chunks else 0.0,
+        "devices_with_drops": sum(r.dropped > 0 for r in results),
+        "retries": sum(r.retries for r in results),
+        "errors": sum(r.errors for r in results),
+        "connects": sum(r.connects for r in results),
+        **_lag_summary(lags),
+    }
+
+
+def print_devices(summaries, limit):
+    columns = ("device", "kind", "heart_rate", "fs", "sent", "dropped", "retries", "errors", "lag_p50_ms",
+               "lag_p95_ms", "lag_max_ms")
+    print(" ".join(f"{c:>12}" for c in columns))
+    for s in summaries[:limit]:
+        print(" ".join(f"{'-' if s[c] is None else s[c]:>12}" for c in columns))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--devices", type=int, default=100)
+    parser.add_argument("--duration", default="60s")
+    parser.add_argument("--fs", type=int, nargs="+", default=[250, 360])
+    parser.add_argument("--mix", type=parse_mix_item, nargs="+",
+                        default=[("normal", 4), ("arrhythmia", 2), ("bradycardia", 1), ("tachycardia", 1)],
+                        help="kind:weight, kind xem ecg_synth.KINDS")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--target", default=None, help="URL gốc của Realtime Database (mặc định: rtdb_local)")
+    parser.add_argument("--path", default="ECG/fleet/{device}/raw", help="node của mỗi thiết bị, {device} = id")
+    parser.add_argument("--max-batch", type=int, default=1, help="số chunk tối đa mỗi request khi bị chậm")
+    parser.add_argument("--max-backlog", type=float, default=5.0, help="giây chunk chờ được trước khi bị bỏ")
+    parser.add_argument("--timeout", type=float, default=10.0)
+    parser.add_argument("--retries", type=int, default=2)
+    parser.add_argument("--backoff", type=float, default=0.25)
+    parser.add_argument("--max-backoff", type=float, default=2.0)
+    parser.add_argument("--no-stagger", dest="stagger", action="store_false",
+                        help="mọi thiết bị bắt đầu cùng lúc (mặc định lệch ngẫu nhiên trong một chunk)")
+    parser.add_argument("--local-latency-ms", type=float, default=0.0)
+    parser.add_argument("--local-fail-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--show", type=int, default=10, help="số thiết bị in ra (lag p95 lớn nhất trước)")
+    parser.add_argument("--output", help="ghi thống kê (từng thiết bị + tổng) ra file JSON")
+    args = parser.parse_args()
+
+    devices = make_fleet(args.devices, args.mix, args.fs, args.chunk_size, args.stagger, args.seed)
+    seconds = parse_duration(args.duration)
+    signals = [synthesize(int(seconds * d.fs), d.fs, d.heart_rate, kind=d.kind,
+                          seed=np.random.default_rng([args.seed, i])).astype(np.int16)
+               for i, d in enumerate(devices)]
+
+    local = None
+    if args.target is None:
+        local, args.target = start_local(args)
+    print(f"{len(devices)} thiết bị x {args.duration} -> {args.target}/{args.path}.json "
+          f"(chunk {args.chunk_size} mẫu, max_batch {args.max_batch}, backlog {args.max_backlog:g} s)")
+    try:
+        started = time.perf_counter()
+        results = asyncio.run(run_fleet(devices, signals, args))
+        wall = time.perf_counter() - started
+        if local is not None:
+            # Kiểm tra: số chunk server lưu cho mỗi thiết bị = số chunk đã gửi thành công
+            stored = []
+            for d in devices:
+                with RTDBUploader(args.target, args.path.format(device=d.device_id), backoff=0.05) as reader:
+                    listing = reader.request("GET", params={"shallow": "true", "print": "pretty"}).json()
+                    stored.append(len(listing or {}))
+    finally:
+        if local is not None:
+            local.terminate()
+            local.wait()
+
+    summaries = sorted((r.summary() for r in results), key=lambda s: -(s["lag_p95_ms"] or 0))
+    overall = overall_summary(results, wall)
+    print_devices(summaries, args.show)
+    print(json.dumps(overall, indent=1))
+    if local is not None:
+        mismatched = sum(n != r.sent for n, r in zip(stored, results))
+        print(f"{'✓' if not mismatched else '✗'} rtdb_local: số chunk lưu khớp với số chunk đã gửi "
+              f"ở {len(devices) - mismatched}/{len(devices)} thiết bị")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"overall": overall, "devices": summaries, "args": {k: v for k, v in vars(args).items()}},
+                      f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
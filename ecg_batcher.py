@@ -0,0 +1,211 @@
+"""
+Bộ gom batch (micro-batching) cho inference ECGResNet.
+
+Beats của các request đồng thời được xếp hàng, gộp thành một tensor (giới hạn
+bởi max_batch_size beat và max_wait_ms thời gian chờ), chạy một lần forward
+rồi tách probabilities trả về cho từng request.
+"""
+
+import os
+import threading
+import time
+import weakref
+from collections import deque
+from concurrent.futures import Future
+
+import numpy as np
+
+
+# Batcher còn sống, để khởi động lại sau fork; WeakSet để batcher đã bỏ (vd. phiên bản model bị loại
+# khỏi ecg_registry) vẫn được thu hồi cùng forward và trọng số của nó
+_live_batchers = weakref.WeakSet()
+
+
+def _reset_after_fork():
+    for batcher in list(_live_batchers):
+        batcher._reset_after_fork()
+
+
+# Thread không sống sót qua fork (pre-fork server) -> khởi động lại trong worker
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class _Job:
+    __slots__ = ("beats", "future", "enqueued")
+
+    def __init__(self, beats):
+        self.beats = beats
+        self.future = Future()
+        self.enqueued = time.perf_counter()
+
+
+class MicroBatcher:
+    def __init__(self, forward, max_batch_size=256, max_wait_ms=2.0, latency_window=10000, on_batch=None):
+        """
+        Args:
+            forward: hàm nhận mảng beats [N, L] float32, trả về probs [N, C]
+            max_batch_size: số beat tối đa trong một lần forward
+            max_wait_ms: thời gian tối đa (ms) chờ gom thêm request
+            latency_window: số mẫu latency giữ lại để tính p50/p99
+            on_batch: hàm (số beat, thời gian chờ của từng request, thời gian forward, số request
+                      còn trong hàng đợi) gọi sau mỗi batch, vd. ecg_metrics.observe_batch
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be >= 1")
+        self.forward = forward
+        self.max_batch_size = int(max_batch_size)
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.on_batch = on_batch
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._thread = None
+        self._closed = False
+
+        self._latencies = deque(maxlen=latency_window)
+        self._started_at = time.perf_counter()
+        self._requests = 0
+        self._beats = 0
+        self._batches = 0
+
+        _live_batchers.add(self)
+
+    # -----------------------------------------------------
+    # Public API
+    # -----------------------------------------------------
+
+    def submit(self, beats):
+        beats = np.ascontiguousarray(beats, dtype=np.float32)
+        job = _Job(beats)
+        if len(beats) == 0:
+            job.future.set_result(np.zeros((0, 0), dtype=np.float32))
+            return job.future
+
+        with self._cond:
+            if self._closed:
+                raise RuntimeError("MicroBatcher is closed")
+            self._ensure_worker()
+            self._queue.append(job)
+            self._cond.notify()
+        return job.future
+
+    def predict(self, beats, timeout=None):
+        return self.submit(beats).result(timeout=timeout)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+    def queue_depth(self):
+        with self._cond:
+            return len(self._queue)
+
+    def stats(self):
+        with self._cond:
+            latencies = np.array(self._latencies, dtype=np.float64)
+            elapsed = time.perf_counter() - self._started_at
+            requests, beats, batches = self._requests, self._beats, self._batches
+            depth = len(self._queue)
+
+        stats = {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000.0,
+            "queue_depth": depth,
+            "requests": requests,
+            "beats": beats,
+            "batches": batches,
+            "mean_batch_beats": beats / batches if batches else 0.0,
+            "throughput_rps": requests / elapsed if elapsed > 0 else 0.0,
+            "throughput_beats_per_s": beats / elapsed if elapsed > 0 else 0.0,
+        }
+        if len(latencies):
+            p50, p99 = np.percentile(latencies, [50, 99]) * 1000.0
+            stats["latency_p50_ms"] = float(p50)
+            stats["latency_p99_ms"] = float(p99)
+        return stats
+
+    # -----------------------------------------------------
+    # Worker
+    # -----------------------------------------------------
+
+    def _ensure_worker(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="ecg-batcher", daemon=True)
+            self._thread.start()
+
+    def _reset_after_fork(self):
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._thread = None
+        self._latencies.clear()
+        self._started_at = time.perf_counter()
+        self._requests = self._beats = self._batches = 0
+
+    def _collect(self):
+        with self._cond:
+            while not self._queue and not self._closed:
+                self._cond.wait()
+            if not self._queue:
+                return None
+
+            batch = [self._queue.popleft()]
+            size = len(batch[0].beats)
+            deadline = batch[0].enqueued + self.max_wait
+
+            while size < self.max_batch_size:
+                if self._queue:
+                    if size + len(self._queue[0].beats) > self.max_batch_size:
+                        break
+                    job = self._queue.popleft()
+                    batch.append(job)
+                    size += len(job.beats)
+                    continue
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0 or self._closed:
+                    break
+                self._cond.wait(remaining)
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+            try:
+                beats = np.concatenate([job.beats for job in batch]) if len(batch) > 1 else batch[0].beats
+                started = time.perf_counter()
+                probs = self._forward_chunked(beats)
+            except Exception as e:
+                for job in batch:
+                    job.future.set_exception(e)
+                continue
+
+            done = time.perf_counter()
+            start = 0
+            for job in batch:
+                end = start + len(job.beats)
+                job.future.set_result(probs[start:end])
+                start = end
+
+            with self._cond:
+                self._batches += 1
+                self._requests += len(batch)
+                self._beats += len(beats)
+                self._latencies.extend(done - job.enqueued for job in batch)
+                depth = len(self._queue)
+
+            if self.on_batch is not None:
+                self.on_batch(len(beats), [started - job.enqueued for job in batch], done - started, depth)
+
+    def _forward_chunked(self, beats):
+        # Một request lớn hơn max_batch_size được chạy riêng theo từng khối
+        if len(beats) <= self.max_batch_size:
+            return np.asarray(self.forward(beats))
+        return np.concatenate([
+            np.asarray(self.forward(beats[i:i + self.max_batch_size]))
+            for i in range(0, len(beats), self.max_batch_size)
+        ])
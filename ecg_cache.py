@@ -0,0 +1,152 @@
+"""
+Cache kết quả dự đoán theo nội dung (content-addressed), có LRU + TTL và
+single-flight: các request giống hệt nhau đến cùng lúc chỉ tính một lần.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+
+
+def signal_digest(signal):
+    """Hash của tín hiệu ở dạng float32 (dạng model thực sự nhìn thấy), không phụ thuộc định dạng upload"""
+    data = np.ascontiguousarray(signal, dtype=np.float32)
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(data.shape).encode())
+    h.update(memoryview(data).cast("B"))
+    return h.hexdigest()
+
+
+def make_key(signal, model_version, **params):
+    """Key = hash tín hiệu + phiên bản model + tham số tiền xử lý"""
+    param_str = ",".join(f"{k}={params[k]!r}" for k in sorted(params))
+    return f"{signal_digest(signal)}:{model_version}:{param_str}"
+
+
+def _nbytes(value):
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (tuple, list)):
+        return sum(_nbytes(v) for v in value)
+    if isinstance(value, dict):
+        return sum(_nbytes(v) for v in value.values())
+    return 0
+
+
+def _freeze(value):
+    # Kết quả trong cache được chia sẻ giữa các request -> chỉ-đọc
+    if isinstance(value, np.ndarray):
+        value.flags.writeable = False
+    elif isinstance(value, (tuple, list)):
+        for v in value:
+            _freeze(v)
+    elif isinstance(value, dict):
+        for v in value.values():
+            _freeze(v)
+    return value
+
+
+class PredictionCache:
+    def __init__(self, max_entries=256, ttl=60.0, max_bytes=256 * 1024 * 1024):
+        """
+        Args:
+            max_entries: số kết quả tối đa (0 = tắt cache, vẫn gộp request trùng)
+            ttl: thời gian sống của mỗi kết quả (giây)
+            max_bytes: tổng dung lượng mảng numpy tối đa trong cache
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+        self._entries = OrderedDict()   # key -> (expires_at, nbytes, value)
+        self._inflight = {}             # key -> Future
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get_or_compute(self, key, compute):
+        """
+        Returns:
+            (value, status) với status là 'hit', 'miss' hoặc 'coalesced'
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[2], "hit"
+                self._remove(key)
+                self.expirations += 1
+
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                owner = False
+            else:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+                owner = True
+
+        if not owner:
+            return future.result(), "coalesced"
+
+        try:
+            value = _freeze(compute())
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            self._store(key, value)
+        future.set_result(value)
+        return value, "miss"
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "inflight": len(self._inflight),
+                "hit_ratio": (self.hits + self.coalesced) / lookups if lookups else 0.0,
+            }
+
+    def _store(self, key, value):
+        size = _nbytes(value)
+        if self.max_entries <= 0 or size > self.max_bytes:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
@@ -0,0 +1,205 @@
+"""
+Corpus ECG giả có nhãn, lưu theo shard để benchmark và đánh giá model ở quy mô lớn.
+
+Cấu trúc thư mục:
+    corpus.json         metadata: dtype mẫu, danh sách nhãn, file shard, tham số sinh
+    index.npy           mảng có cấu trúc INDEX_DTYPE, một dòng mỗi bản ghi (đọc bằng mmap)
+    shard-00000.i16     mẫu ADC int16 little-endian của các bản ghi, nối liền nhau
+
+Mỗi shard có kích thước cố định khoảng shard_bytes (bản ghi cuối có thể vượt, vì một bản ghi
+không bị tách giữa hai shard). Đọc một bản ghi chỉ cần index và một memory map của shard chứa nó,
+không phải nạp cả shard.
+
+Các shard độc lập với nhau: mỗi shard sinh bằng RNG riêng (seed, chỉ số shard), nên kết quả
+không phụ thuộc số tiến trình.
+"""
+
+import json
+import os
+from collections import namedtuple
+
+import numpy as np
+
+from ecg_io import Recording
+from ecg_synth import KINDS, synthesize_batch
+
+CORPUS_VERSION = 1
+META_FILE = "corpus.json"
+INDEX_FILE = "index.npy"
+SAMPLE_DTYPE = np.dtype("<i2")
+
+# offset: vị trí mẫu đầu tiên trong shard (đơn vị mẫu), label: chỉ số trong danh sách nhãn của corpus
+INDEX_DTYPE = np.dtype([
+    ("shard", "<u4"), ("offset", "<u8"), ("length", "<u4"), ("fs", "<f4"), ("label", "u1"), ("heart_rate", "<f4"),
+])
+
+# Khoảng nhịp tim (BPM) của từng loại, rút đều cho mỗi bản ghi
+HEART_RATES = {
+    "normal": (60, 100),
+    "arrhythmia": (50, 90),
+    "bradycardia": (35, 55),
+    "tachycardia": (105, 150),
+    "good": (60, 90),
+}
+
+# Số mẫu tối đa mỗi lần gọi synthesize_batch (bộ nhớ tạm của worker ~ 40 byte / mẫu)
+BATCH_SAMPLES = 1 << 22
+
+# Một thành phần của mix: loại bản ghi (nhãn), độ dài (giây), trọng số
+MixItem = namedtuple("MixItem", ["kind", "seconds", "weight"])
+
+
+def shard_name(shard):
+    return f"shard-{shard:05d}.i16"
+
+
+# =========================================================
+# PLAN
+# =========================================================
+
+def plan_corpus(count, mix, fs_list, shard_bytes, seed=0):
+    """
+    Chọn loại, fs, nhịp tim, độ dài cho từng bản ghi và xếp chúng vào shard.
+
+    Args:
+        mix: list MixItem; kind là một trong ecg_synth.KINDS
+    Returns:
+        (index [count] INDEX_DTYPE, danh sách nhãn; label = chỉ số trong ecg_synth.KINDS)
+    """
+    for item in mix:
+        if item.kind not in KINDS:
+            raise ValueError(f"Unknown ECG kind: {item.kind!r}, expected one of {KINDS}")
+    labels = list(KINDS)
+    rng = np.random.default_rng([seed, 0xC0])
+    weights = np.array([item.weight for item in mix], dtype=np.float64)
+    choice = rng.choice(len(mix), size=count, p=weights / weights.sum())
+    fs = np.asarray(fs_list, dtype=np.float64)[rng.integers(len(fs_list), size=count)]
+
+    index = np.zeros(count, dtype=INDEX_DTYPE)
+    index["fs"] = fs
+    index["length"] = (np.array([item.seconds for item in mix])[choice] * fs).astype(np.int64)
+    index["label"] = np.array([labels.index(item.kind) for item in mix])[choice]
+    low, high = np.array([HEART_RATES[item.kind] for item in mix], dtype=np.float64).T
+    index["heart_rate"] = rng.uniform(low[choice], high[choice])
+
+    # Bản ghi thuộc shard chứa mẫu đầu tiên của nó (theo vị trí nối liền của cả corpus)
+    capacity = max(1, shard_bytes // SAMPLE_DTYPE.itemsize)
+    starts = np.cumsum(index["length"], dtype=np.int64) - index["length"]
+    shard = starts // capacity
+    # Đánh số lại các shard liên tiếp (shard rỗng khi một bản ghi dài hơn capacity)
+    _, index["shard"] = np.unique(shard, return_inverse=True)
+    first = np.flatnonzero(np.diff(index["shard"], prepend=-1))
+    index["offset"] = starts - np.repeat(starts[first], np.diff(np.append(first, count)))
+    return index, labels
+
+
+# =========================================================
+# WRITE (chạy trong process pool)
+# =========================================================
+
+def write_shard(directory, shard, records, labels, seed):
+    """
+    Sinh và ghi một shard. records: các dòng index của shard này.
+    File được ghi dưới tên tạm rồi đổi tên: shard có mặt là shard hoàn chỉnh.
+
+    Returns:
+        (shard, số byte)
+    """
+    rng = np.random.default_rng([seed, 1, shard])
+    n_samples = int((records["offset"] + records["length"]).max()) if len(records) else 0
+    path = os.path.join(directory, shard_name(shard))
+    tmp = path + ".tmp"
+    out = np.memmap(tmp, dtype=SAMPLE_DTYPE, mode="w+", shape=(max(n_samples, 1),))
+
+    # Bản ghi cùng (loại, fs, độ dài) được sinh cùng một lượt synthesize_batch
+    order = np.lexsort((records["length"], records["fs"], records["label"]))
+    keys = records[["label", "fs", "length"]][order]
+    bounds = np.flatnonzero(np.append(True, keys[1:] != keys[:-1]))
+    for start, stop in zip(bounds, np.append(bounds[1:], len(order))):
+        group = records[order[start:stop]]
+        length = int(group["length"][0])
+        per_batch = max(1, BATCH_SAMPLES // max(length, 1))
+        for i in range(0, len(group), per_batch):
+            batch = group[i:i + per_batch]
+            adc = synthesize_batch(len(batch), length, float(batch["fs"][0]), batch["heart_rate"].astype(np.float64),
+                                   kind=labels[batch["label"][0]], seed=rng)
+            out[batch["offset"].astype(np.int64)[:, None] + np.arange(length)] = adc
+
+    out.flush()
+    del out
+    os.replace(tmp, path)
+    return shard, n_samples * SAMPLE_DTYPE.itemsize
+
+
+def write_metadata(directory, index, labels, params):
+    """Ghi index và metadata sau cùng: corpus chỉ đọc được khi mọi shard đã xong"""
+    np.save(os.path.join(directory, INDEX_FILE), index)
+    n_shards = int(index["shard"].max()) + 1 if len(index) else 0
+    meta = {
+        "version": CORPUS_VERSION,
+        "dtype": SAMPLE_DTYPE.str,
+        "labels": labels,
+        "count": len(index),
+        "shards": [shard_name(k) for k in range(n_shards)],
+        "params": params,
+    }
+    with open(os.path.join(directory, META_FILE), "w") as f:
+        json.dump(meta, f, indent=1)
+
+
+# =========================================================
+# READ
+# =========================================================
+
+class Corpus:
+    """
+    Đọc corpus đã sinh: index được memory map, mỗi shard được memory map khi cần.
+    corpus[i] -> (tín hiệu ADC int16 [length], fs, tên nhãn); tín hiệu là view chỉ-đọc.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        meta_path = os.path.join(directory, META_FILE)
+        if not os.path.exists(meta_path):
+            raise FileNotFoundError(f"Not a corpus directory (missing {META_FILE}): {directory}")
+        with open(meta_path) as f:
+            self.meta = json.load(f)
+        if self.meta["version"] != CORPUS_VERSION:
+            raise ValueError(f"Unsupported corpus version {self.meta['version']}")
+        self.dtype = np.dtype(self.meta["dtype"])
+        self.labels = self.meta["labels"]
+        self.index = np.load(os.path.join(directory, INDEX_FILE), mmap_mode="r")
+        self._shards = {}
+
+    def __len__(self):
+        return len(self.index)
+
+    def __getitem__(self, i):
+        row = self.index[i]
+        return self.signal(i), float(row["fs"]), self.labels[row["label"]]
+
+    def shard(self, k):
+        if k not in self._shards:
+            self._shards[k] = np.memmap(os.path.join(self.directory, self.meta["shards"][k]), dtype=self.dtype,
+                                        mode="r")
+        return self._shards[k]
+
+    def signal(self, i):
+        row = self.index[i]
+        offset = int(row["offset"])
+        return self.shard(int(row["shard"]))[offset:offset + int(row["length"])]
+
+    def recording(self, i):
+        """ecg_io.Recording của bản ghi i (cho ecg_holter / load_recording)"""
+        row = self.index[i]
+        path = os.path.join(self.directory, self.meta["shards"][int(row["shard"])])
+        return Recording(path, self.dtype.str, int(row["offset"]) * self.dtype.itemsize, int(row["length"]))
+
+    def select(self, label=None, fs=None):
+        """Chỉ số các bản ghi có nhãn / fs cho trước"""
+        mask = np.ones(len(self.index), dtype=bool)
+        if label is not None:
+            mask &= self.index["label"] == self.labels.index(label)
+        if fs is not None:
+            mask &= self.index["fs"] == np.float32(fs)
+        return np.flatnonzero(mask)
@@ -0,0 +1,201 @@
+"""
+Tiền xử lý ECG: chuẩn hóa ADC, lọc bandpass, tách beat cho ECGResNet.
+"""
+
+import os
+from collections import namedtuple
+from fractions import Fraction
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# scipy.signal mất ~0.6 s để import: import lười trong từng hàm dưới đây, nên import app không chờ scipy
+# mà bước DSP đầu tiên (warmup) trả chi phí này
+
+from ecg_metrics import StageClock
+from ecg_qrs import detect_qrs
+
+# Tần số lấy mẫu mà pipeline (và model) làm việc; tín hiệu ở fs khác được
+# resample polyphase về tần số này trước khi lọc và tách beat.
+PIPELINE_FS = 250
+
+DSP_PLAN_CACHE_SIZE = int(os.environ.get("ECG_DSP_PLAN_CACHE", "32"))
+
+# Bộ dò R-peak: "find_peaks" (đỉnh cách nhau >= 0.25 s, không có ngưỡng biên độ) hoặc
+# "pan_tompkins" (ecg_qrs: ngưỡng thích nghi, ít beat sai từ sóng T / nhiễu)
+QRS_DETECTORS = ("find_peaks", "pan_tompkins")
+QRS_DETECTOR = os.environ.get("ECG_QRS_DETECTOR", "find_peaks")
+if QRS_DETECTOR not in QRS_DETECTORS:
+    raise ValueError(f"ECG_QRS_DETECTOR must be one of {QRS_DETECTORS}, got {QRS_DETECTOR!r}")
+
+ResamplePlan = namedtuple("ResamplePlan", ["up", "down", "taps"])
+
+
+def preprocess_adc(ecg_adc, mean=None):
+    """mean: trung bình của cả bản ghi khi ecg_adc chỉ là một đoạn (None = trung bình của ecg_adc)"""
+    # Luôn copy: đầu vào có thể là buffer chỉ-đọc (np.frombuffer) hoặc mảng của caller
+    ecg = np.array(ecg_adc, dtype=np.float32)
+    ecg -= np.mean(ecg, axis=-1, keepdims=True) if mean is None else np.float32(mean)
+    ecg /= 512.0
+    return ecg
+
+
+@lru_cache(maxsize=DSP_PLAN_CACHE_SIZE)
+def bandpass_sos(fs, low=0.5, high=40.0):
+    """Butterworth bậc 4 dạng SOS, thiết kế một lần cho mỗi (fs, low, high)"""
+    from scipy.signal import butter
+
+    nyq = 0.5 * fs
+    return butter(4, [low / nyq, high / nyq], btype="band", output="sos")
+
+
+@lru_cache(maxsize=DSP_PLAN_CACHE_SIZE)
+def resample_plan(fs_in, fs_out=PIPELINE_FS):
+    """
+    Kế hoạch resample polyphase fs_in -> fs_out: hệ số up/down và bộ lọc FIR
+    chống alias (cùng thiết kế mặc định với scipy.signal.resample_poly).
+    """
+    from scipy.signal import firwin
+
+    ratio = (Fraction(fs_out) / Fraction(fs_in)).limit_denominator(1000)
+    up, down = ratio.numerator, ratio.denominator
+    max_rate = max(up, down)
+    taps = firwin(2 * 10 * max_rate + 1, 1.0 / max_rate, window=("kaiser", 5.0))
+    return ResamplePlan(up, down, taps)
+
+
+def dsp_cache_info():
+    return {
+        "bandpass_sos": bandpass_sos.cache_info()._asdict(),
+        "resample_plan": resample_plan.cache_info()._asdict(),
+        "resample_matrix": resample_matrix.cache_info()._asdict(),
+    }
+
+
+def bandpass_filter(ecg, fs, low=0.5, high=40.0):
+    from scipy.signal import sosfiltfilt
+
+    return sosfiltfilt(bandpass_sos(fs, low, high), ecg)
+
+
+def to_pipeline_rate(ecg, fs):
+    """Resample tín hiệu về PIPELINE_FS (không làm gì nếu fs đã đúng)"""
+    if fs == PIPELINE_FS:
+        return ecg
+    from scipy.signal import resample_poly
+
+    plan = resample_plan(fs)
+    return resample_poly(ecg, plan.up, plan.down, window=plan.taps, axis=-1)
+
+
+@lru_cache(maxsize=DSP_PLAN_CACHE_SIZE)
+def resample_matrix(window, global_size, out_size):
+    """
+    Ma trận [window, out_size] tương đương với:
+        resample(np.pad(hb, (0, global_size - window)), out_size)
+    cho một beat hb dài `window` mẫu. resample (FFT) là phép biến đổi tuyến tính
+    nên chỉ cần tính một lần rồi áp dụng cho mọi beat bằng một phép nhân ma trận.
+    """
+    from scipy.signal import resample
+
+    eye = np.eye(global_size, window)
+    return np.ascontiguousarray(resample(eye, out_size, axis=0).T)
+
+
+def extract_beats(ecg, peaks, hb_size, fs=250, global_size=450, new_fs=120, beat_len=150):
+    """
+    Cắt tất cả beat quanh các R-peak của tín hiệu đã lọc, resample và chuẩn hóa
+    trong một lượt vector hóa (không lặp từng beat).
+
+    Args:
+        ecg: tín hiệu đã lọc (1-D)
+        peaks: vị trí R-peak
+        hb_size: độ dài cửa sổ beat (mẫu), thường là RR trung bình
+    Returns:
+        mảng [N, beat_len] float64
+    """
+    half = hb_size // 2
+    starts = np.asarray(peaks) - half
+    starts = starts[(starts >= 0) & (starts + 2 * half <= len(ecg))]
+
+    out_size = int(global_size * new_fs / fs)
+    if len(starts) == 0:
+        return np.empty((0, min(beat_len, out_size)))
+
+    window = min(2 * half, global_size)
+    windows = sliding_window_view(ecg, window)[starts]          # [N, window], không copy
+    hb = windows @ resample_matrix(window, global_size, out_size)  # [N, out_size]
+
+    hb -= hb.mean(axis=1, keepdims=True)
+    hb /= hb.std(axis=1, keepdims=True) + 1e-8
+    return hb[:, :beat_len]
+
+
+def detect_r_peaks(ecg, fs, detector=None):
+    """R-peak của tín hiệu đã lọc (1-D) theo detector (None = QRS_DETECTOR)"""
+    detector = detector or QRS_DETECTOR
+    if detector == "pan_tompkins":
+        return detect_qrs(ecg, fs)
+    if detector != "find_peaks":
+        raise ValueError(f"Unknown QRS detector: {detector}")
+    from scipy.signal import find_peaks
+
+    peaks, _ = find_peaks(ecg, distance=int(0.25 * fs))
+    return peaks
+
+
+def filtered_to_beats(ecg, fs=PIPELINE_FS, global_size=450, new_fs=120, timings=None):
+    """Dò R-peak và tách beat từ tín hiệu đã lọc (1-D)"""
+    clock = StageClock(timings)
+    peaks = detect_r_peaks(ecg, fs)
+    clock.lap("find_peaks")
+    if len(peaks) < 2:
+        return np.array([])
+
+    rr = np.diff(peaks)
+    hb_size = int(np.mean(rr))
+
+    beats = extract_beats(ecg, peaks, hb_size, fs=fs, global_size=global_size, new_fs=new_fs)
+    clock.lap("extract_beats")
+    return beats
+
+
+def ecg_to_beats(ecg_adc, fs=PIPELINE_FS, global_size=450, new_fs=120, timings=None):
+    """timings: dict tùy chọn, được cộng thời gian (giây) của từng bước (xem ecg_metrics.STAGES)"""
+    clock = StageClock(timings)
+    ecg = preprocess_adc(ecg_adc)
+    clock.lap("preprocess")
+    ecg = to_pipeline_rate(ecg, fs)
+    clock.lap("resample")
+    fs = PIPELINE_FS
+    ecg = bandpass_filter(ecg, fs)
+    clock.lap("bandpass")
+    return filtered_to_beats(ecg, fs=fs, global_size=global_size, new_fs=new_fs, timings=timings)
+
+
+def ecg_to_beats_many(signals, fs_list, global_size=450, new_fs=120, timings=None):
+    """
+    ecg_to_beats cho nhiều bản ghi: các bản ghi cùng (fs, độ dài) được xếp thành
+    mảng 2-D và lọc/resample cùng lúc; dò peak và tách beat vẫn theo từng bản ghi.
+
+    Returns:
+        list các mảng beats, cùng thứ tự với signals
+    """
+    groups = {}
+    for i, (sig, fs) in enumerate(zip(signals, fs_list)):
+        groups.setdefault((fs, len(sig)), []).append(i)
+
+    results = [None] * len(signals)
+    for (fs, _), idx in groups.items():
+        clock = StageClock(timings)
+        ecg = preprocess_adc(np.stack([np.asarray(signals[i]) for i in idx]))
+        clock.lap("preprocess")
+        ecg = to_pipeline_rate(ecg, fs)
+        clock.lap("resample")
+        ecg = bandpass_filter(ecg, PIPELINE_FS)
+        clock.lap("bandpass")
+        for row, i in zip(ecg, idx):
+            results[i] = filtered_to_beats(row, fs=PIPELINE_FS, global_size=global_size, new_fs=new_fs,
+                                           timings=timings)
+    return results
@@ -0,0 +1,202 @@
+"""
+Chế độ bản ghi dài (Holter 24 giờ ~ 21.6M mẫu @ 250 Hz): tín hiệu đọc qua memory map
+(ecg_io.open_recording) và xử lý theo đoạn, các đoạn có thể chạy song song trên DspPool.
+Bộ nhớ đỉnh phụ thuộc độ dài đoạn chứ không phụ thuộc độ dài bản ghi.
+
+Cho cùng kết quả như ecg_to_beats trên cả bản ghi (sai khác ở mức làm tròn float):
+- Mỗi đoạn đọc thêm MARGIN_SECONDS hai bên: lọc bandpass (filtfilt) và resample có hiệu ứng
+  biên, phần chồng lấn được lọc rồi bỏ đi; chỉ giữ R-peak nằm trong phần lõi của đoạn.
+- Trung bình (preprocess_adc) và độ dài cửa sổ beat (RR trung bình) là số liệu của cả bản ghi:
+  tính ở lượt 1, tín hiệu đã lọc được ghi ra file tạm (float64, tần số pipeline) để lượt 2
+  cắt beat mà không lọc lại.
+- Với ECG_QRS_DETECTOR=pan_tompkins, ngưỡng thích nghi học lại từ đầu mỗi đoạn (trong margin):
+  R-peak gần biên đoạn có thể khác nhẹ so với chạy trên cả bản ghi.
+
+    lượt 1 (song song): đoạn + margin -> preprocess, resample, bandpass, dò R-peak -> file tạm
+    RR trung bình của mọi peak -> độ dài cửa sổ beat
+    lượt 2 (song song, theo thứ tự): cắt beat của từng đoạn từ file tạm
+"""
+
+import math
+import os
+from collections import deque, namedtuple
+
+import numpy as np
+
+from ecg_dsp import (
+    PIPELINE_FS, bandpass_filter, detect_r_peaks, extract_beats, preprocess_adc, resample_plan, to_pipeline_rate
+)
+from ecg_io import load_recording
+from ecg_metrics import StageClock, add_timings
+
+SEGMENT_SECONDS = float(os.environ.get("ECG_HOLTER_SEGMENT_SECONDS", "300"))
+MARGIN_SECONDS = float(os.environ.get("ECG_HOLTER_MARGIN_SECONDS", "20"))
+
+BEAT_DTYPE = np.float32
+
+# Đoạn theo chỉ số mẫu ở fs gốc: lõi [start, end), phần đọc [read_start, read_end) gồm cả margin
+Segment = namedtuple("Segment", ["start", "end", "read_start", "read_end"])
+
+# Tín hiệu đã lọc (tần số pipeline) trong file tạm, dùng chung giữa các process
+FilteredFile = namedtuple("FilteredFile", ["path", "length"])
+
+
+def rate_ratio(fs):
+    """(up, down) của resample fs -> PIPELINE_FS"""
+    if fs == PIPELINE_FS:
+        return 1, 1
+    plan = resample_plan(fs)
+    return plan.up, plan.down
+
+
+def pipeline_length(n, fs):
+    """Số mẫu sau resample_poly của n mẫu ở fs"""
+    up, down = rate_ratio(fs)
+    return -(-n * up // down)
+
+
+def plan_segments(n, fs, segment_seconds=SEGMENT_SECONDS, margin_seconds=MARGIN_SECONDS):
+    """
+    Chia n mẫu thành các đoạn. Biên đoạn và margin là bội của `down` của resample để
+    mẫu đầu mỗi đoạn rơi đúng vào một mẫu của tín hiệu sau resample.
+    """
+    _, down = rate_ratio(fs)
+    core = max(down, int(segment_seconds * fs) // down * down)
+    margin = math.ceil(margin_seconds * fs / down) * down
+    return [Segment(start, min(start + core, n), max(0, start - margin), min(n, start + core + margin))
+            for start in range(0, n, core)]
+
+
+def recording_mean(signal, chunk=1 << 22):
+    """Trung bình của mảng (memory map) tính theo từng khối"""
+    total = 0.0
+    for i in range(0, len(signal), chunk):
+        total += float(np.sum(signal[i:i + chunk], dtype=np.float64))
+    return total / max(len(signal), 1)
+
+
+# =========================================================
+# SEGMENT JOBS (chạy trong DspPool hoặc trực tiếp)
+# =========================================================
+
+def _filter_job(recording, segment, fs, mean, filtered):
+    """Lượt 1: lọc một đoạn, ghi phần lõi vào file tạm; trả về R-peak trong lõi (chỉ số toàn cục)"""
+    timings = {}
+    clock = StageClock(timings)
+    up, down = rate_ratio(fs)
+    ecg = preprocess_adc(load_recording(recording)[segment.read_start:segment.read_end], mean=mean)
+    clock.lap("preprocess")
+    ecg = to_pipeline_rate(ecg, fs)
+    clock.lap("resample")
+    ecg = bandpass_filter(ecg, PIPELINE_FS)
+    clock.lap("bandpass")
+
+    offset = segment.read_start * up // down
+    lo = segment.start * up // down
+    hi = pipeline_length(segment.end, fs)
+    peaks = detect_r_peaks(ecg, PIPELINE_FS)
+    peaks = peaks[(peaks >= lo - offset) & (peaks < hi - offset)] + offset
+    clock.lap("find_peaks")
+
+    out = np.memmap(filtered.path, dtype=np.float64, mode="r+", shape=(filtered.length,))
+    out[lo:hi] = ecg[lo - offset:hi - offset]
+    out.flush()
+    del out
+    return peaks, timings
+
+
+def _beats_job(filtered, lo, hi, peaks, hb_size):
+    """
+    Lượt 2: beat của các peak trong [lo, hi) (tần số pipeline).
+    Returns: (peak của các beat giữ lại, beats float32 [N, 150], timings)
+    """
+    timings = {}
+    clock = StageClock(timings)
+    half = hb_size // 2
+    # Cùng điều kiện với extract_beats trên cả bản ghi: cửa sổ beat phải nằm trọn trong tín hiệu
+    peaks = peaks[(peaks - half >= 0) & (peaks + half <= filtered.length)]
+    start, stop = max(0, lo - half), min(filtered.length, hi + half)
+    ecg = np.memmap(filtered.path, dtype=np.float64, mode="r", shape=(filtered.length,))[start:stop]
+    beats = extract_beats(ecg, peaks - start, hb_size, fs=PIPELINE_FS)
+    del ecg
+    clock.lap("extract_beats")
+    return peaks, beats.astype(BEAT_DTYPE).reshape(-1, 150), timings
+
+
+class _Done:
+    """Kết quả tính ngay, cùng giao diện result() với Future"""
+
+    def __init__(self, value):
+        self.value = value
+
+    def result(self):
+        return self.value
+
+
+# =========================================================
+# LONG RECORDING
+# =========================================================
+
+def segment_beats(recording, fs, workdir, pool=None, segment_seconds=SEGMENT_SECONDS,
+                  margin_seconds=MARGIN_SECONDS, timings=None):
+    """
+    Tách beat của một bản ghi dài theo đoạn.
+
+    Args:
+        recording: ecg_io.Recording (file trên đĩa)
+        fs: tần số lấy mẫu của bản ghi
+        workdir: thư mục cho file tạm (tín hiệu đã lọc: 8 byte / mẫu ở PIPELINE_FS)
+        pool: DspPool để chạy các đoạn song song (None = tuần tự trong process này)
+        timings: dict tùy chọn, cộng thời gian của mọi đoạn (thời gian CPU nếu chạy song song)
+    Yields:
+        (peaks, beats) của từng đoạn theo thứ tự: vị trí R-peak ở PIPELINE_FS [N] và beats float32 [N, 150]
+    """
+    def submit(fn, *args):
+        return pool.submit(fn, *args) if pool is not None else _Done(fn(*args))
+
+    segments = plan_segments(recording.length, fs, segment_seconds, margin_seconds)
+    filtered = FilteredFile(os.path.join(workdir, "filtered.f64"), pipeline_length(recording.length, fs))
+    # File thưa: chưa chiếm đĩa cho tới khi các đoạn ghi vào
+    np.memmap(filtered.path, dtype=np.float64, mode="w+", shape=(max(filtered.length, 1),)).flush()
+
+    started = StageClock(timings)
+    mean = recording_mean(load_recording(recording))
+    started.lap("preprocess")
+    jobs = [submit(_filter_job, recording, segment, fs, mean, filtered) for segment in segments]
+    segment_peaks = []
+    for job in jobs:
+        peaks, job_timings = job.result()
+        segment_peaks.append(peaks)
+        add_timings(timings, job_timings)
+
+    n_peaks = sum(len(p) for p in segment_peaks)
+    if n_peaks < 2:
+        return
+    # = np.mean(np.diff(peaks)) của cả bản ghi (peaks tăng dần)
+    first = next(p[0] for p in segment_peaks if len(p))
+    last = next(p[-1] for p in reversed(segment_peaks) if len(p))
+    hb_size = int((last - first) / (n_peaks - 1))
+
+    up, down = rate_ratio(fs)
+    # Giữ tối đa 2 đoạn mỗi worker trong hàng đợi: beats chờ lấy ra không tăng theo độ dài bản ghi
+    max_pending = 2 * (pool.workers if pool is not None else 1)
+    pending = deque()
+    for segment, peaks in zip(segments, segment_peaks):
+        lo, hi = segment.start * up // down, pipeline_length(segment.end, fs)
+        pending.append(submit(_beats_job, filtered, lo, hi, peaks, hb_size))
+        while len(pending) >= max_pending:
+            yield _take(pending.popleft(), timings)
+    while pending:
+        yield _take(pending.popleft(), timings)
+
+
+def _take(job, timings):
+    peaks, beats, job_timings = job.result()
+    add_timings(timings, job_timings)
+    return peaks, beats
+
+
+def to_input_samples(peaks, fs):
+    """Vị trí ở PIPELINE_FS -> chỉ số mẫu gần nhất ở fs gốc"""
+    up, down = rate_ratio(fs)
+    return (np.asarray(peaks, dtype=np.int64) * down + up // 2) // up
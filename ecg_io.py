@@ -0,0 +1,443 @@
+"""
+Giải mã dữ liệu ECG upload: text (np.loadtxt), ADC nhị phân little-endian
+int16/uint16, .npy, và các biến thể nén gzip/zstd.
+
+Dữ liệu nhị phân được đọc zero-copy bằng np.frombuffer và giữ nguyên kiểu số
+nguyên (2 byte/mẫu) cho tới preprocess_adc.
+
+Bản ghi dài (Holter): spool_payload chép upload ra file theo từng khối (giải nén
+luồng), open_recording mở file đó qua memory map - không đọc cả bản ghi vào RAM.
+
+Dữ liệu sau giải nén bị giới hạn ở MAX_DECOMPRESSED_SIZE (ECG_MAX_DECOMPRESSED_MB): vài KB gzip/zstd
+có thể giải ra hàng GB, vượt giới hạn thì PayloadError thay vì hết RAM / đĩa.
+"""
+
+import ast
+import gzip
+import io
+import json
+import os
+import sys
+import zlib
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+from numpy.lib import format as npy_format
+
+GZIP_MAGIC = b"\x1f\x8b"
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+NPY_MAGIC = b"\x93NUMPY"
+ZIP_MAGIC = b"PK\x03\x04"
+
+RAW_DTYPES = {
+    "int16": np.dtype("<i2"),
+    "uint16": np.dtype("<u2"),
+}
+
+CONTENT_TYPES = {
+    "application/x-npy": "npy",
+    "application/npy": "npy",
+    "application/octet-stream": "int16",
+    "application/x-ecg-int16": "int16",
+    "application/x-ecg-uint16": "uint16",
+    "text/plain": "text",
+    "text/csv": "text",
+    "application/json": "firebase",
+}
+
+EXTENSIONS = {
+    ".npy": "npy",
+    ".bin": "int16",
+    ".i16": "int16",
+    ".u16": "uint16",
+    ".txt": "text",
+    ".csv": "text",
+    ".json": "firebase",
+}
+
+
+# Định dạng firebase: key của chunk, và các ký tự hợp lệ trong chuỗi mẫu (chữ số, dấu, phân cách)
+CHUNK_PREFIX = "chunk_"
+SAMPLE_CHARS = b"0123456789+-, \t\r\n"
+
+# Khối đọc / ghi khi spool và chuyển đổi file (bộ nhớ dùng thêm không phụ thuộc độ dài bản ghi)
+SPOOL_CHUNK = 1 << 20
+
+# Kích thước tối đa sau giải nén (bản ghi Holter 24 giờ dạng text ở 360 Hz khoảng 200 MB)
+MAX_DECOMPRESSED_SIZE = int(float(os.environ.get("ECG_MAX_DECOMPRESSED_MB", "512")) * 1024 * 1024)
+
+# zstd không có max_length như zlib: đầu vào được đưa vào từng lát ZSTD_FEED byte để mỗi lần gọi trả về
+# lượng dữ liệu có giới hạn (một block RLE 4 byte giải ra tối đa 128 KB -> tối đa 32 MB mỗi lát)
+ZSTD_FEED = 1 << 10
+ZLIB_DECOMPRESSOR = type(zlib.decompressobj())
+
+# Tín hiệu 1-D trong file: np.memmap(path, dtype, offset=offset, shape=(length,)); pickle được
+# nên có thể gửi cho process khác để mỗi process tự mở memory map
+Recording = namedtuple("Recording", ["path", "dtype", "offset", "length"])
+
+
+class PayloadError(ValueError):
+    pass
+
+
+@lru_cache(maxsize=None)
+def load_zstandard():
+    """Module zstandard, import lười ở payload zstd đầu tiên; None nếu chưa cài (tùy chọn: pip install zstandard)"""
+    try:
+        import zstandard
+    except ImportError:
+        return None
+    return zstandard
+
+
+def _too_large(max_size):
+    return PayloadError(f"Decompressed payload exceeds {max_size // (1024 * 1024)} MB")
+
+
+def _decompressed_chunks(chunks, decompressor, max_size):
+    """
+    Giải nén luồng các khối đầu vào thành các khối đầu ra có kích thước giới hạn (không giữ cả kết quả
+    trong RAM). decompressor None: trả nguyên các khối. Tổng vượt max_size byte -> PayloadError.
+    """
+    total = 0
+    for chunk in chunks:
+        if decompressor is None:
+            yield chunk
+            continue
+        if isinstance(decompressor, ZLIB_DECOMPRESSOR):
+            pieces = _inflate(decompressor, chunk)
+        else:
+            pieces = (decompressor.decompress(chunk[i:i + ZSTD_FEED]) for i in range(0, len(chunk), ZSTD_FEED))
+        for data in pieces:
+            total += len(data)
+            if total > max_size:
+                raise _too_large(max_size)
+            yield data
+    if decompressor is not None and not decompressor.eof:
+        raise PayloadError("Truncated compressed payload")
+
+
+def _inflate(decompressor, chunk):
+    """zlib: mỗi lần gọi trả tối đa SPOOL_CHUNK byte, phần đầu vào chưa dùng nằm trong unconsumed_tail"""
+    while chunk:
+        yield decompressor.decompress(chunk, SPOOL_CHUNK)
+        chunk = decompressor.unconsumed_tail
+
+
+def decompress(data, content_encoding=None, max_size=None):
+    """
+    Giải nén theo Content-Encoding hoặc magic bytes; trả nguyên data nếu không nén.
+    Kết quả lớn hơn max_size byte (mặc định MAX_DECOMPRESSED_SIZE) -> PayloadError.
+    """
+    max_size = MAX_DECOMPRESSED_SIZE if max_size is None else max_size
+    encoding = (content_encoding or "").lower()
+    if encoding == "gzip" or data[:2] == GZIP_MAGIC:
+        try:
+            # GzipFile.read(n) dừng sau n byte (và đọc được gzip nhiều member như gzip.decompress)
+            with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+                out = f.read(max_size + 1)
+        except (OSError, EOFError, zlib.error) as e:
+            raise PayloadError(f"Invalid gzip payload: {e}")
+        if len(out) > max_size:
+            raise _too_large(max_size)
+        return out
+    if encoding == "zstd" or data[:4] == ZSTD_MAGIC:
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise PayloadError("zstd payload requires the 'zstandard' package")
+        try:
+            return b"".join(_decompressed_chunks([data], zstandard.ZstdDecompressor().decompressobj(), max_size))
+        except zstandard.ZstdError as e:
+            raise PayloadError(f"Invalid zstd payload: {e}")
+    return data
+
+
+def detect_format(data, fmt=None, content_type=None, filename=None):
+    if fmt:
+        fmt = fmt.lower()
+        if fmt not in RAW_DTYPES and fmt not in ("npy", "text", "firebase"):
+            raise PayloadError(f"Unknown ECG format '{fmt}'")
+        return fmt
+    if data[:6] == NPY_MAGIC:
+        return "npy"
+    if filename:
+        name = filename.lower()
+        for suffix in (".gz", ".zst"):
+            if name.endswith(suffix):
+                name = name[:-len(suffix)]
+        for ext, ext_fmt in EXTENSIONS.items():
+            if name.endswith(ext):
+                return ext_fmt
+    if content_type in CONTENT_TYPES:
+        return CONTENT_TYPES[content_type]
+    return "text"
+
+
+def decode_npy(data):
+    """Đọc .npy 1-D từ bytes không copy (np.frombuffer sau header)"""
+    if data[:6] != NPY_MAGIC:
+        raise PayloadError("Not a .npy payload")
+    major = data[6]
+    header_len_size = 2 if major == 1 else 4
+    header_len = int.from_bytes(data[8:8 + header_len_size], "little")
+    offset = 8 + header_len_size + header_len
+    try:
+        header = ast.literal_eval(data[8 + header_len_size:offset].decode("latin1"))
+        dtype = np.dtype(header["descr"])
+        shape = header["shape"]
+    except (ValueError, SyntaxError, KeyError, TypeError) as e:
+        raise PayloadError(f"Invalid .npy header: {e}")
+    if dtype.hasobject:
+        raise PayloadError("Object arrays are not accepted")
+    if len(shape) > 2 or (len(shape) == 2 and min(shape) > 1):
+        raise PayloadError(f"Expected a 1-D signal, got shape {shape}")
+    count = int(np.prod(shape))
+    if len(data) - offset < count * dtype.itemsize:
+        raise PayloadError("Truncated .npy payload")
+    return np.frombuffer(data, dtype=dtype, count=count, offset=offset)
+
+
+def decode_ecg_payload(data, fmt=None, content_type=None, filename=None, content_encoding=None):
+    """
+    Args:
+        data: bytes của file/body upload
+        fmt: 'int16' | 'uint16' | 'npy' | 'text' | 'firebase' (None = tự nhận diện)
+        content_type: mimetype của file/body
+        filename: tên file upload (dùng phần mở rộng để nhận diện)
+        content_encoding: 'gzip' | 'zstd' (hoặc tự nhận diện bằng magic bytes)
+    Returns:
+        mảng 1-D; kiểu int16/uint16 với dữ liệu nhị phân và firebase, float64 với text
+    """
+    data = decompress(data, content_encoding)
+    fmt = detect_format(data, fmt, content_type, filename)
+
+    if fmt == "npy":
+        return decode_npy(data)
+    if fmt == "firebase":
+        try:
+            chunks = json.loads(data)
+        except ValueError as e:
+            raise PayloadError(f"Invalid JSON payload: {e}")
+        return decode_chunks(chunks)
+    if fmt in RAW_DTYPES:
+        dtype = RAW_DTYPES[fmt]
+        if len(data) % dtype.itemsize:
+            raise PayloadError(f"{fmt} payload length must be a multiple of {dtype.itemsize} bytes")
+        return np.frombuffer(data, dtype=dtype)
+    try:
+        return np.atleast_1d(np.loadtxt(io.BytesIO(data)))
+    except ValueError as e:
+        raise PayloadError(f"Invalid text ECG payload: {e}")
+
+
+def decode_chunks(chunks):
+    """
+    Node ECG/raw của Firebase Realtime Database: {"chunk_1": "512,514,...", "chunk_2": ...}.
+    Chunk được nối theo số thứ tự (chunk_2 trước chunk_10, không theo thứ tự chuỗi) rồi parse
+    một lần bằng bộ parse C của numpy, thay vì split / int() từng mẫu.
+    Chỉ số không cần liên tục: chunk bị thiếu (thiết bị mất một lần gửi) được bỏ qua và các chunk còn
+    lại nối liền nhau, như khi client tự ghép ECG/raw; {"chunk_1", "chunk_3"} cho một tín hiệu liền.
+    Returns:
+        int16 [số mẫu]
+    """
+    if not isinstance(chunks, dict):
+        raise PayloadError(f"Expected a JSON object of {CHUNK_PREFIX}<N> strings")
+    keys = list(chunks)
+    for key in keys:
+        if not key.startswith(CHUNK_PREFIX) or not key[len(CHUNK_PREFIX):].isdigit():
+            raise PayloadError(f"Unexpected key {key!r}, expected {CHUNK_PREFIX}<N>")
+        if not isinstance(chunks[key], str):
+            raise PayloadError(f"Chunk {key!r} must be a string of comma-separated samples")
+    index = np.array([int(key[len(CHUNK_PREFIX):]) for key in keys], dtype=np.int64)
+    order = np.argsort(index, kind="stable")
+    duplicated = np.flatnonzero(np.diff(index[order]) == 0)
+    if len(duplicated):
+        raise PayloadError(f"Duplicate chunk index {index[order[duplicated[0]]]}")
+
+    # Dấu phẩy / khoảng trắng thừa ở đầu, cuối chunk (một số firmware) và chunk rỗng được bỏ qua
+    parts = [part for part in (chunks[keys[i]].strip(" ,\t\r\n") for i in order) if part]
+    if not parts:
+        return np.empty(0, dtype=np.int16)
+    text = ",".join(parts)
+    raw = text.encode("latin-1", errors="replace")
+    invalid = raw.translate(None, SAMPLE_CHARS)
+    if invalid:
+        raise PayloadError(f"Invalid character {invalid[:1].decode('latin-1')!r} in ECG chunks")
+    if b"-" in raw or b"+" in raw:
+        # Dấu đứng một mình ("-", "1,-,2") được numpy parse thành 0: dấu phải đứng ngay trước chữ số
+        buf = np.frombuffer(raw, dtype=np.uint8)
+        following = np.append(buf[1:], ord(","))
+        if np.any(((buf == ord("-")) | (buf == ord("+"))) & ((following < ord("0")) | (following > ord("9")))):
+            raise PayloadError("Invalid sample in ECG chunks, expected comma-separated integers")
+    try:
+        samples = np.fromstring(text, dtype=np.int64, sep=",")
+    except ValueError:
+        samples = None
+    # Bộ parse dừng (hoặc báo lỗi) ở mẫu sai, ví dụ "1,,2", "1.5", "5-3"
+    if samples is None or len(samples) != raw.count(b",") + 1:
+        raise PayloadError("Invalid sample in ECG chunks, expected comma-separated integers")
+    if len(samples) and (samples.min() < -32768 or samples.max() > 32767):
+        raise PayloadError("ECG samples must fit in int16")
+    return samples.astype(np.int16)
+
+
+def decode_npz(data, content_encoding=None):
+    """
+    Đọc nhiều bản ghi từ một file .npz: mỗi mảng 1-D là một bản ghi.
+    Tần số lấy mẫu riêng: mục vô hướng `<tên>__fs`; mục `fs` vô hướng áp dụng cho tất cả.
+
+    Returns:
+        list (tên, tín hiệu, fs hoặc None) theo thứ tự trong file
+    """
+    data = decompress(data, content_encoding)
+    if data[:4] != ZIP_MAGIC:
+        raise PayloadError("Not a .npz payload")
+    try:
+        npz = np.load(io.BytesIO(data), allow_pickle=False)
+    except (ValueError, OSError) as e:
+        raise PayloadError(f"Invalid .npz payload: {e}")
+
+    with npz:
+        # savez_compressed nén từng mảng bằng deflate: kích thước sau giải nén ghi sẵn trong header zip
+        if sum(info.file_size for info in npz.zip.infolist()) > MAX_DECOMPRESSED_SIZE:
+            raise _too_large(MAX_DECOMPRESSED_SIZE)
+        names = [n for n in npz.files if not n.endswith("__fs") and n != "fs"]
+        default_fs = float(npz["fs"]) if "fs" in npz.files else None
+        recordings = []
+        for name in names:
+            signal = npz[name]
+            if signal.ndim != 1:
+                raise PayloadError(f"Recording '{name}' must be 1-D, got shape {signal.shape}")
+            fs = float(npz[f"{name}__fs"]) if f"{name}__fs" in npz.files else default_fs
+            recordings.append((name, signal, fs))
+    return recordings
+
+
+# =========================================================
+# FILE-BACKED RECORDINGS
+# =========================================================
+
+def _stream_decompressor(head, content_encoding=None):
+    """Bộ giải nén luồng theo Content-Encoding hoặc magic bytes của khối đầu; None nếu không nén"""
+    encoding = (content_encoding or "").lower()
+    if encoding == "gzip" or head[:2] == GZIP_MAGIC:
+        return zlib.decompressobj(wbits=16 + zlib.MAX_WBITS)
+    if encoding == "zstd" or head[:4] == ZSTD_MAGIC:
+        zstandard = load_zstandard()
+        if zstandard is None:
+            raise PayloadError("zstd payload requires the 'zstandard' package")
+        return zstandard.ZstdDecompressor().decompressobj()
+    return None
+
+
+def _read_chunks(stream, first):
+    chunk = first
+    while chunk:
+        yield chunk
+        chunk = stream.read(SPOOL_CHUNK)
+
+
+def spool_payload(stream, path, content_encoding=None, max_size=None):
+    """
+    Chép upload (file-like) ra file theo từng khối SPOOL_CHUNK, giải nén gzip/zstd nếu có.
+    Dữ liệu giải nén lớn hơn max_size byte (mặc định MAX_DECOMPRESSED_SIZE) -> PayloadError.
+    Returns: số byte đã ghi
+    """
+    max_size = MAX_DECOMPRESSED_SIZE if max_size is None else max_size
+    chunk = stream.read(SPOOL_CHUNK)
+    try:
+        decompressor = _stream_decompressor(chunk, content_encoding)
+        written = 0
+        with open(path, "wb") as out:
+            for data in _decompressed_chunks(_read_chunks(stream, chunk), decompressor, max_size):
+                out.write(data)
+                written += len(data)
+    except zlib.error as e:
+        raise PayloadError(f"Invalid gzip payload: {e}")
+    except Exception as e:
+        # Lỗi zstd chỉ có thể xảy ra khi zstandard đã được import (không import chỉ để kiểm tra)
+        zstandard = sys.modules.get("zstandard")
+        if zstandard is not None and isinstance(e, zstandard.ZstdError):
+            raise PayloadError(f"Invalid zstd payload: {e}")
+        raise
+    return written
+
+
+def _npy_recording(path):
+    with open(path, "rb") as f:
+        try:
+            version = npy_format.read_magic(f)
+            read_header = npy_format.read_array_header_1_0 if version == (1, 0) else npy_format.read_array_header_2_0
+            shape, _, dtype = read_header(f)
+        except ValueError as e:
+            raise PayloadError(f"Invalid .npy header: {e}")
+        offset = f.tell()
+    if dtype.hasobject:
+        raise PayloadError("Object arrays are not accepted")
+    if len(shape) > 2 or (len(shape) == 2 and min(shape) > 1):
+        raise PayloadError(f"Expected a 1-D signal, got shape {shape}")
+    count = int(np.prod(shape))
+    if os.path.getsize(path) - offset < count * dtype.itemsize:
+        raise PayloadError("Truncated .npy payload")
+    return Recording(path, dtype.str, offset, count)
+
+
+def _text_to_raw(path, out_path):
+    """Chuyển file text (số cách nhau bởi khoảng trắng / dấu phẩy) sang float32 thô, từng khối"""
+    count, tail = 0, b""
+    with open(path, "rb") as f, open(out_path, "wb") as out:
+        while True:
+            chunk = f.read(SPOOL_CHUNK)
+            data = tail + chunk
+            if chunk:
+                # Số cuối khối có thể bị cắt đôi: giữ lại phần sau khoảng trắng cuối cùng cho khối sau
+                cut = max(data.rfind(sep) for sep in (b"\n", b" ", b",", b"\t", b"\r")) + 1
+                data, tail = data[:cut], data[cut:]
+            try:
+                values = np.array(data.replace(b",", b" ").split(), dtype=np.float32)
+            except ValueError as e:
+                raise PayloadError(f"Invalid text ECG payload: {e}")
+            out.write(values.tobytes())
+            count += len(values)
+            if not chunk:
+                return count
+
+
+def open_recording(path, fmt=None, content_type=None, filename=None):
+    """
+    Mở file bản ghi (đã giải nén, vd. bởi spool_payload) mà không đọc vào RAM.
+    Nhị phân và .npy được memory map trực tiếp; text được chuyển sang float32 thô
+    (file `<path>.f32` cạnh file gốc) rồi mới map.
+
+    Returns:
+        Recording - mở bằng load_recording
+    """
+    with open(path, "rb") as f:
+        head = f.read(16)
+    fmt = detect_format(head, fmt, content_type, filename)
+    # Chunk firebase (JSON) và .npz phải đọc cả file mới giải được: báo rõ thay vì để bộ đọc text báo lỗi
+    if head[:4] == ZIP_MAGIC:
+        fmt = "npz"
+    elif fmt == "text" and head.lstrip()[:1] in (b"{", b"["):
+        fmt = "firebase"
+    if fmt not in RAW_DTYPES and fmt not in ("npy", "text"):
+        raise PayloadError(f"Holter mode requires a raw int16/uint16/npy or text file, got {fmt}")
+    if fmt == "npy":
+        return _npy_recording(path)
+    if fmt in RAW_DTYPES:
+        dtype = RAW_DTYPES[fmt]
+        size = os.path.getsize(path)
+        if size % dtype.itemsize:
+            raise PayloadError(f"{fmt} payload length must be a multiple of {dtype.itemsize} bytes")
+        return Recording(path, dtype.str, 0, size // dtype.itemsize)
+    raw_path = path + ".f32"
+    return Recording(raw_path, "<f4", 0, _text_to_raw(path, raw_path))
+
+
+def load_recording(recording):
+    """Memory map chỉ-đọc của Recording (mảng 1-D)"""
+    if recording.length == 0:
+        return np.empty(0, dtype=recording.dtype)
+    return np.memmap(recording.path, dtype=np.dtype(recording.dtype), mode="r",
+                     offset=recording.offset, shape=(recording.length,))
@@ -0,0 +1,212 @@
+"""
+Metrics Prometheus (/metrics) của pipeline dự đoán: latency theo route và theo từng bước
+(decode, DSP, inference, encode), beats mỗi bản ghi, batch của MicroBatcher, cache, RSS.
+
+Cần prometheus_client (có trong requirements.txt); cài tối giản không có gói này thì các hàm ghi
+không làm gì và /metrics trả 501. Mỗi lần ghi tốn ~1-2 µs nên có thể bật thường trực. prometheus_client
+được import và các metric được tạo ở lần ghi / scrape đầu tiên, không phải lúc import app.
+
+Pre-fork server: gunicorn.conf.py đặt PROMETHEUS_MULTIPROC_DIR trước khi import app; mỗi
+process ghi vào file riêng trong thư mục đó và /metrics cộng gộp mọi worker.
+"""
+
+import importlib.util
+import os
+import threading
+import time
+
+# prometheus_client là tùy chọn; chỉ kiểm tra có cài hay không, import lười trong _get_metrics
+ENABLED = importlib.util.find_spec("prometheus_client") is not None
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Các bước của pipeline, theo thứ tự (nhãn `stage` của ecg_stage_duration_seconds)
+STAGES = ("decode", "preprocess", "resample", "bandpass", "find_peaks", "extract_beats", "inference",
+          "encode", "compress")
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BEAT_BUCKETS = (0, 1, 10, 30, 100, 300, 1000, 3000, 10000, 30000, 100000, 300000)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024)
+REQUEST_BUCKETS = (1, 2, 4, 8, 16, 32, 64)
+
+# RSS đọc từ /proc tối đa mỗi RSS_INTERVAL giây trên đường nóng (và luôn đọc khi scrape)
+RSS_INTERVAL = 1.0
+
+
+class StageClock:
+    """
+    Cộng thời gian (giây) giữa các lần lap() vào dict timings theo tên bước.
+    timings=None -> không đo gì.
+    """
+    __slots__ = ("timings", "last")
+
+    def __init__(self, timings):
+        self.timings = timings
+        self.last = time.perf_counter() if timings is not None else 0.0
+
+    def lap(self, stage):
+        if self.timings is None:
+            return
+        now = time.perf_counter()
+        self.timings[stage] = self.timings.get(stage, 0.0) + now - self.last
+        self.last = now
+
+
+def add_timings(timings, other):
+    """Cộng timings của một bước con (vd. job trong DspPool) vào timings của request"""
+    if timings is not None:
+        for stage, seconds in other.items():
+            timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+class _Metrics:
+    """Các metric của process; tạo một lần bởi _get_metrics"""
+
+    def __init__(self):
+        import prometheus_client
+        from prometheus_client import Counter, Gauge, Histogram
+
+        # Bỏ các series *_created (không dùng, gấp đôi số dòng của mỗi counter)
+        prometheus_client.disable_created_metrics()
+
+        self.request_seconds = Histogram(
+            "ecg_http_request_duration_seconds", "Request latency by route and status",
+            ["endpoint", "status"], buckets=LATENCY_BUCKETS)
+        self.stage_seconds = Histogram(
+            "ecg_stage_duration_seconds", "Time spent in each prediction pipeline stage per request",
+            ["stage"], buckets=LATENCY_BUCKETS)
+        self.beats_per_recording = Histogram(
+            "ecg_beats_per_recording", "Beats extracted per recording", buckets=BEAT_BUCKETS)
+        self.batch_beats = Histogram(
+            "ecg_batch_size_beats", "Beats per model forward of the micro-batcher", buckets=BATCH_BUCKETS)
+        self.batch_requests = Histogram(
+            "ecg_batch_requests", "Requests merged into one micro-batch", buckets=REQUEST_BUCKETS)
+        self.batch_forward_seconds = Histogram(
+            "ecg_batch_forward_duration_seconds", "Model forward time per micro-batch", buckets=LATENCY_BUCKETS)
+        self.batch_wait_seconds = Histogram(
+            "ecg_batch_queue_wait_seconds", "Time a request waited in the micro-batcher queue", buckets=LATENCY_BUCKETS)
+        self.queue_depth = Gauge(
+            "ecg_batch_queue_depth", "Requests waiting in the micro-batcher queue", multiprocess_mode="livesum")
+        self.cache_lookups = Counter(
+            "ecg_cache_lookups", "Prediction cache lookups by result (hit, miss, coalesced)", ["result"])
+        self.cache_removals = Counter(
+            "ecg_cache_removals", "Prediction cache entries removed (evicted, expired)", ["reason"])
+        self.cache_entries = Gauge(
+            "ecg_cache_entries", "Entries in the prediction cache", multiprocess_mode="livesum")
+        self.cache_bytes = Gauge(
+            "ecg_cache_bytes", "Array bytes held by the prediction cache", multiprocess_mode="livesum")
+        self.rss_bytes = Gauge(
+            "ecg_process_resident_memory_bytes", "Resident set size of the server process", multiprocess_mode="liveall")
+
+        # Nhãn cố định được tạo sẵn: không tốn labels() trên đường nóng
+        self.stage_children = {stage: self.stage_seconds.labels(stage) for stage in STAGES}
+
+
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+def _get_metrics():
+    """Import prometheus_client và tạo các metric ở lần dùng đầu tiên (ENABLED phải True)"""
+    global _metrics
+    if _metrics is None:
+        with _metrics_lock:
+            if _metrics is None:
+                _metrics = _Metrics()
+    return _metrics
+
+
+_cache_removed = {"evicted": 0, "expired": 0}
+# observe_cache chạy đồng thời từ nhiều thread request: đọc-so sánh-cập nhật _cache_removed phải nguyên tử,
+# nếu không hai thread cùng cộng một phần tăng
+_cache_lock = threading.Lock()
+_rss_read_at = 0.0
+_page_size = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def observe_request(endpoint, status, seconds):
+    if ENABLED:
+        _get_metrics().request_seconds.labels(endpoint, str(status)).observe(seconds)
+
+
+def observe_stage(stage, seconds):
+    if ENABLED:
+        metrics = _get_metrics()
+        child = metrics.stage_children.get(stage)
+        (child or metrics.stage_seconds.labels(stage)).observe(seconds)
+
+
+def observe_stages(timings):
+    for stage, seconds in timings.items():
+        observe_stage(stage, seconds)
+
+
+def observe_beats(count):
+    if ENABLED:
+        _get_metrics().beats_per_recording.observe(count)
+
+
+def observe_batch(beats, waits, forward_seconds, queue_depth):
+    """Gọi bởi MicroBatcher sau mỗi lần forward (waits: thời gian chờ của từng request trong batch)"""
+    if not ENABLED:
+        return
+    metrics = _get_metrics()
+    metrics.batch_beats.observe(beats)
+    metrics.batch_requests.observe(len(waits))
+    metrics.batch_forward_seconds.observe(forward_seconds)
+    for wait in waits:
+        metrics.batch_wait_seconds.observe(wait)
+    metrics.queue_depth.set(queue_depth)
+
+
+def observe_cache(status, stats):
+    """status: 'hit' | 'miss' | 'coalesced'; stats: PredictionCache.stats()"""
+    if not ENABLED:
+        return
+    metrics = _get_metrics()
+    metrics.cache_lookups.labels(status).inc()
+    metrics.cache_entries.set(stats["entries"])
+    metrics.cache_bytes.set(stats["bytes"])
+    # PredictionCache chỉ giữ tổng tích lũy -> cộng phần tăng thêm vào counter
+    with _cache_lock:
+        for reason, total in (("evicted", stats["evictions"]), ("expired", stats["expirations"])):
+            if total > _cache_removed[reason]:
+                metrics.cache_removals.labels(reason).inc(total - _cache_removed[reason])
+                _cache_removed[reason] = total
+
+
+def update_rss(force=False):
+    """Đọc RSS từ /proc/self/statm (Linux), tối đa mỗi RSS_INTERVAL giây trừ khi force"""
+    global _rss_read_at
+    if not ENABLED:
+        return
+    now = time.monotonic()
+    if not force and now - _rss_read_at < RSS_INTERVAL:
+        return
+    _rss_read_at = now
+    try:
+        with open("/proc/self/statm") as f:
+            _get_metrics().rss_bytes.set(int(f.read().split()[1]) * _page_size)
+    except (OSError, ValueError, IndexError):
+        pass
+
+
+def render():
+    """Returns: (body bytes, content type) theo định dạng text của Prometheus"""
+    from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest, multiprocess
+
+    update_rss(force=True)
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead(pid):
+    """Gọi trong master khi một worker thoát: bỏ các gauge của worker đó khỏi tổng"""
+    if ENABLED and MULTIPROCESS:
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(pid)
@@ -0,0 +1,226 @@
+"""
+Định nghĩa ECGResNet và các backend inference:
+
+- eager: model gốc như lúc train
+- fused: BatchNorm gộp vào Conv1d, Swish thay bằng SiLU (một kernel)
+- torchscript: model fused đã script + freeze (file .ts.pt)
+- onnx: model fused export sang ONNX, chạy bằng ONNX Runtime (file .onnx)
+- onnx-int8: bản ONNX lượng tử hóa int8 tĩnh bằng quantize_model.py (file .int8.onnx)
+
+Mọi backend trả về một hàm forward nhận beats numpy [N, L] float32, trả probs [N, C].
+"""
+
+import copy
+import hashlib
+import os
+
+import numpy as np
+import torch
+import torch.nn as nn
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+BACKENDS = ("eager", "fused", "torchscript", "onnx", "onnx-int8")
+ARTIFACT_SUFFIXES = {
+    "torchscript": ".ts.pt",
+    "onnx": ".onnx",
+    "onnx-int8": ".int8.onnx",
+}
+BEAT_LEN = 150
+NUM_CLASSES = 5
+
+
+# =========================================================
+# MODEL
+# =========================================================
+
+class Swish(nn.Module):
+    def forward(self, x):
+        return x * torch.sigmoid(x)
+
+
+class ResBlock(nn.Module):
+    def __init__(self, in_channels, out_channels):
+        super().__init__()
+        self.conv1 = nn.Conv1d(in_channels, out_channels, 3, padding=1)
+        self.bn1 = nn.BatchNorm1d(out_channels)
+        self.conv2 = nn.Conv1d(out_channels, out_channels, 3, padding=1)
+        self.bn2 = nn.BatchNorm1d(out_channels)
+        self.conv3 = nn.Conv1d(out_channels, out_channels, 3, padding=1)
+        self.bn3 = nn.BatchNorm1d(out_channels)
+
+        self.shortcut = nn.Sequential()
+        if in_channels != out_channels:
+            self.shortcut = nn.Sequential(
+                nn.Conv1d(in_channels, out_channels, 1),
+                nn.BatchNorm1d(out_channels)
+            )
+
+        self.act = Swish()
+
+    def forward(self, x):
+        identity = x
+        out = self.act(self.bn1(self.conv1(x)))
+        out = self.act(self.bn2(self.conv2(out)))
+        out = self.bn3(self.conv3(out))
+        out += self.shortcut(identity)
+        return self.act(out)
+
+
+class ECGResNet(nn.Module):
+    def __init__(self, num_classes=5):
+        super().__init__()
+        self.block1 = ResBlock(1, 32)
+        self.block2 = ResBlock(32, 64)
+        self.block3 = ResBlock(64, 128)
+
+        self.gmp = nn.AdaptiveMaxPool1d(1)
+        self.gap = nn.AdaptiveAvgPool1d(1)
+        self.fc = nn.Linear(256, num_classes)
+        self.softmax = nn.Softmax(dim=1)
+
+    def forward(self, x):
+        x = self.block1(x)
+        x = self.block2(x)
+        x = self.block3(x)
+        feat = torch.cat([
+            self.gmp(x).squeeze(-1),
+            self.gap(x).squeeze(-1)
+        ], dim=1)
+        return self.softmax(self.fc(feat))
+
+
+def weights_version(path):
+    """Phiên bản model = hash file trọng số"""
+    with open(path, "rb") as f:
+        return hashlib.blake2b(f.read(), digest_size=6).hexdigest()
+
+
+def load_model(path, device="cpu"):
+    model = ECGResNet(num_classes=NUM_CLASSES).to(device)
+    model.load_state_dict(torch.load(path, map_location=device))
+    return model.eval()
+
+
+# =========================================================
+# FUSION
+# =========================================================
+
+def fuse_model(model):
+    """
+    Bản sao của model (eval) với BatchNorm gộp vào conv đứng trước và Swish -> SiLU.
+    Kết quả giống model gốc tới sai số float32.
+    """
+    fused = copy.deepcopy(model).eval()
+    for block in (fused.block1, fused.block2, fused.block3):
+        for conv, bn in (("conv1", "bn1"), ("conv2", "bn2"), ("conv3", "bn3")):
+            setattr(block, conv, fuse_conv_bn_eval(getattr(block, conv), getattr(block, bn)))
+            setattr(block, bn, nn.Identity())
+        if len(block.shortcut):
+            block.shortcut = nn.Sequential(fuse_conv_bn_eval(block.shortcut[0], block.shortcut[1]))
+        block.act = nn.SiLU()
+    return fused
+
+
+# =========================================================
+# EXPORT
+# =========================================================
+
+def artifact_path(model_path, backend):
+    """resetECG_new.pth -> resetECG_new.ts.pt / resetECG_new.onnx / resetECG_new.int8.onnx"""
+    return os.path.splitext(model_path)[0] + ARTIFACT_SUFFIXES[backend]
+
+
+# Artifact ghi lại phiên bản trọng số nguồn; server từ chối artifact cũ hơn file .pth
+
+def export_torchscript(model, path, source_version):
+    scripted = torch.jit.freeze(torch.jit.script(fuse_model(model)))
+    scripted.save(path, _extra_files={"source_version": source_version})
+    return path
+
+
+def set_onnx_source_version(path, source_version):
+    import onnx
+
+    proto = onnx.load(path)
+    onnx.helper.set_model_props(proto, {"source_version": source_version})
+    onnx.save(proto, path)
+
+
+def export_onnx(model, path, source_version, opset=17):
+    example = torch.zeros(1, 1, BEAT_LEN)
+    torch.onnx.export(
+        fuse_model(model), (example,), path,
+        input_names=["beats"], output_names=["probs"],
+        dynamic_axes={"beats": {0: "batch"}, "probs": {0: "batch"}},
+        opset_version=opset, dynamo=False,
+    )
+    set_onnx_source_version(path, source_version)
+    return path
+
+
+# =========================================================
+# BACKENDS
+# =========================================================
+
+def torch_forward(module, device="cpu"):
+    def forward(beats):
+        X = torch.from_numpy(beats).unsqueeze(1).to(device)
+        with torch.inference_mode():
+            return module(X).cpu().numpy()
+    forward.module = module
+    return forward
+
+
+def _check_version(path, found, expected):
+    if expected is not None and found != expected:
+        raise RuntimeError(f"{path} was exported from weights {found or '?'}, expected {expected}; "
+                           "re-run export_model.py")
+
+
+def torchscript_forward(path, device="cpu", expected_version=None):
+    extra = {"source_version": ""}
+    module = torch.jit.load(path, map_location=device, _extra_files=extra)
+    found = extra["source_version"]
+    _check_version(path, found.decode() if isinstance(found, bytes) else found, expected_version)
+    return torch_forward(module, device)
+
+
+def onnx_forward(path, threads=0, expected_version=None):
+    # Import lười: onnxruntime tạo thread nền ngay khi import, tiến trình fork sau đó
+    # (pre-fork server, DspPool) bị treo/abort khi thoát. Backend onnx là tùy chọn.
+    try:
+        import onnxruntime
+    except ImportError:
+        raise RuntimeError("onnx backend requires the 'onnxruntime' package")
+    options = onnxruntime.SessionOptions()
+    options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+    options.intra_op_num_threads = threads
+    session = onnxruntime.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+    _check_version(path, session.get_modelmeta().custom_metadata_map.get("source_version"), expected_version)
+
+    def forward(beats):
+        X = np.ascontiguousarray(beats, dtype=np.float32)[:, None, :]
+        return session.run(None, {"beats": X})[0]
+    return forward
+
+
+def load_backend(backend, model=None, artifact=None, device="cpu", expected_version=None, threads=0):
+    """
+    Args:
+        backend: một trong BACKENDS
+        model: ECGResNet đã nạp trọng số (cần cho eager/fused)
+        artifact: đường dẫn file .ts.pt / .onnx / .int8.onnx (cần cho các backend đọc file)
+        expected_version: weights_version của file .pth; artifact khác phiên bản bị từ chối
+        threads: số thread intra-op của ONNX Runtime (0 = mặc định)
+    Returns:
+        hàm forward(beats [N, L] float32) -> probs [N, C]
+    """
+    if backend == "eager":
+        return torch_forward(model, device)
+    if backend == "fused":
+        return torch_forward(fuse_model(model), device)
+    if backend == "torchscript":
+        return torchscript_forward(artifact, device, expected_version)
+    if backend in ("onnx", "onnx-int8"):
+        return onnx_forward(artifact, threads, expected_version)
+    raise ValueError(f"Unknown model backend '{backend}' (expected one of {', '.join(BACKENDS)})")
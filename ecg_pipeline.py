@@ -0,0 +1,254 @@
+"""
+Chế độ pipeline: tiền xử lý DSP (lọc, dò peak, tách beat) chạy trên một
+ProcessPoolExecutor, trong khi các thread của Flask và batcher lo inference.
+
+Tín hiệu đầu vào và beats trả về được truyền qua shared memory thay vì pickle.
+Worker chết giữa chừng (OOM killer, segfault) làm hỏng pool: job đang chạy được tính lại trong
+process hiện tại và pool được tạo lại ở lần dùng sau. Worker treo (không trả kết quả sau timeout
+giây) được xử lý như vậy, sau khi các worker của pool bị kill.
+"""
+
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from ecg_dsp import ecg_to_beats, ecg_to_beats_many
+from ecg_metrics import add_timings
+
+BEAT_DTYPE = np.float32
+
+
+# =========================================================
+# SHARED MEMORY
+# =========================================================
+
+def shm_put(arr):
+    """Copy mảng vào một segment shared memory mới; trả về metadata để tiến trình khác đọc"""
+    arr = np.ascontiguousarray(arr)
+    shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+    np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+    meta = (shm.name, arr.shape, arr.dtype.str)
+    shm.close()
+    return meta
+
+
+def shm_take(meta, unlink=True):
+    """Đọc mảng từ shared memory (copy ra bộ nhớ thường) rồi giải phóng segment"""
+    name, shape, dtype = meta
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf).copy()
+    finally:
+        shm.close()
+        if unlink:
+            shm.unlink()
+
+
+def shm_unlink(meta):
+    try:
+        shm = shared_memory.SharedMemory(name=meta[0])
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+class _SharedView:
+    """View zero-copy của mảng trong shared memory (dùng trong worker)"""
+
+    def __init__(self, meta):
+        name, shape, dtype = meta
+        self.shm = shared_memory.SharedMemory(name=name)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self.shm.buf)
+
+    def __enter__(self):
+        return self.array
+
+    def __exit__(self, *exc):
+        del self.array
+        self.shm.close()
+
+
+# =========================================================
+# WORKER JOBS
+# =========================================================
+
+# Job trả kèm thời gian từng bước DSP để process chính ghi metrics
+
+def _beats_job(in_meta, fs):
+    timings = {}
+    with _SharedView(in_meta) as ecg_adc:
+        beats = ecg_to_beats(ecg_adc, fs=fs, timings=timings)
+    return shm_put(np.asarray(beats, dtype=BEAT_DTYPE).reshape(-1, 150)), timings
+
+
+def _beats_many_job(in_meta, bounds, fs_list):
+    timings = {}
+    with _SharedView(in_meta) as flat:
+        signals = [flat[s:e] for s, e in bounds]
+        beats_list = ecg_to_beats_many(signals, fs_list, timings=timings)
+        del signals
+    counts = [len(b) for b in beats_list]
+    non_empty = [np.asarray(b, dtype=BEAT_DTYPE) for b in beats_list if len(b)]
+    beats = np.concatenate(non_empty) if non_empty else np.empty((0, 150), dtype=BEAT_DTYPE)
+    return shm_put(beats), counts, timings
+
+
+# =========================================================
+# POOL
+# =========================================================
+
+class _Job:
+    """Future của DspPool: nếu pool hỏng hoặc treo, result() chạy job trong process hiện tại thay vì báo lỗi"""
+
+    def __init__(self, pool, fn, args):
+        self.pool = pool
+        self.fn = fn
+        self.args = args
+        self.executor, self.future = pool._submit(fn, args)
+
+    def result(self):
+        try:
+            return self.future.result(timeout=self.pool.timeout)
+        except BrokenProcessPool:
+            self.pool._discard(self.executor)
+            return self.fn(*self.args)
+        except FutureTimeoutError:
+            # Worker treo (vd. deadlock do fork khi thread khác giữ lock): không chờ mãi trong thread của request
+            self.pool._discard(self.executor, kill=True)
+            self.cleanup()
+            return self.fn(*self.args)
+
+    def cleanup(self):
+        """Giải phóng shared memory kết quả của job đã xong (khi bỏ dở, không gọi result())"""
+        future = self.future
+        if future.done() and not future.cancelled() and future.exception() is None:
+            shm_unlink(future.result()[0])
+
+
+class DspPool:
+    def __init__(self, workers=None, timeout=None):
+        """
+        Args:
+            workers: số tiến trình DSP (None = số core)
+            timeout: số giây tối đa chờ một job (None = không giới hạn); quá hạn thì coi pool như hỏng
+        """
+        self.workers = workers or os.cpu_count() or 1
+        self.timeout = timeout
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Pool được tạo lười trong từng tiến trình: sau fork (pre-fork server) phải tạo lại.
+        # Dùng "fork" để worker không import lại module chính (torch + model).
+        with self._lock:
+            if self._executor is None or self._pid != os.getpid():
+                # Khởi động resource_tracker trước khi fork để parent và worker dùng chung một tracker
+                # (nếu không, segment do worker tạo bị tracker khác báo "leaked")
+                resource_tracker.ensure_running()
+                method = "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn"
+                self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context(method))
+                self._pid = os.getpid()
+            return self._executor
+
+    def _submit(self, fn, args):
+        executor = self._get_executor()
+        try:
+            return executor, executor.submit(fn, *args)
+        except BrokenProcessPool:
+            # Worker chết khi pool đang rảnh: pool bị đánh dấu hỏng ngay, tạo lại một lần
+            self._discard(executor)
+            executor = self._get_executor()
+            return executor, executor.submit(fn, *args)
+
+    def _discard(self, executor, kill=False):
+        """Bỏ pool đã hỏng (kill: giết cả worker còn sống nhưng treo); pool mới được tạo (fork) ở lần dùng sau"""
+        with self._lock:
+            if self._executor is executor:
+                if kill:
+                    # Các job khác của pool này nhận BrokenProcessPool và cũng được tính lại tại chỗ
+                    for process in list((executor._processes or {}).values()):
+                        process.kill()
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+    def start(self):
+        """
+        Tạo pool và fork sẵn các worker. Nên gọi khi tiến trình chưa có thread nào khác
+        (lúc import, hoặc ngay sau fork của server): fork giữa lúc thread khác đang giữ
+        lock (torch, malloc...) có thể làm worker bị treo. Pool tạo lại sau khi hỏng thì
+        không tránh được điều này.
+        """
+        self._get_executor().submit(int).result()
+        return self
+
+    def submit(self, fn, *args):
+        """
+        Chạy một job bất kỳ (hàm cấp module, tham số pickle được) trong pool.
+        Trả về đối tượng có result() như Future; pool hỏng thì job chạy trong process hiện tại.
+        """
+        return _Job(self, fn, args)
+
+    def ecg_to_beats(self, ecg_adc, fs, timings=None):
+        """Như ecg_dsp.ecg_to_beats nhưng chạy trong pool; trả về beats float32 [N, 150]"""
+        in_meta = shm_put(np.asarray(ecg_adc))
+        try:
+            out_meta, job_timings = self.submit(_beats_job, in_meta, fs).result()
+        finally:
+            shm_unlink(in_meta)
+        add_timings(timings, job_timings)
+        return shm_take(out_meta)
+
+    def ecg_to_beats_many(self, signals, fs_list, timings=None):
+        """
+        Như ecg_dsp.ecg_to_beats_many, chia các bản ghi cho các worker
+        (timings cộng thời gian của mọi worker, tức thời gian CPU chứ không phải thời gian thực)
+        """
+        if not signals:
+            return []
+        n_jobs = min(self.workers, len(signals))
+        parts = np.array_split(np.arange(len(signals)), n_jobs)
+
+        jobs = []
+        outputs = []
+        try:
+            for part in parts:
+                lengths = [len(signals[i]) for i in part]
+                ends = np.cumsum(lengths)
+                bounds = list(zip((ends - lengths).tolist(), ends.tolist()))
+                # preprocess_adc đổi sang float32 ngay từ đầu nên nối ở float32 không đổi kết quả
+                flat = np.concatenate([np.asarray(signals[i], dtype=np.float32) for i in part])
+                in_meta = shm_put(flat)
+                jobs.append((in_meta, self.submit(_beats_many_job, in_meta, bounds, [fs_list[i] for i in part])))
+
+            for _, job in jobs:
+                outputs.append(job.result())
+        except BaseException:
+            for out_meta, *_ in outputs:
+                shm_unlink(out_meta)
+            for _, job in jobs:
+                job.cleanup()
+            raise
+        finally:
+            for in_meta, _ in jobs:
+                shm_unlink(in_meta)
+
+        results = []
+        for out_meta, counts, job_timings in outputs:
+            add_timings(timings, job_timings)
+            beats = shm_take(out_meta)
+            offsets = np.concatenate([[0], np.cumsum(counts)])
+            results.extend(beats[s:e] for s, e in zip(offsets[:-1], offsets[1:]))
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None and self._pid == os.getpid():
+                self._executor.shutdown()
+            self._executor = None
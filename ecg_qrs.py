@@ -0,0 +1,227 @@
+"""
+Dò QRS kiểu Pan-Tompkins trên tín hiệu đã lọc bandpass: đạo hàm, bình phương, tích phân
+cửa sổ trượt 150 ms, rồi ngưỡng thích nghi (SPKI / NPKI) với thời gian trơ 200 ms, loại
+sóng T theo độ dốc và tìm lại (searchback) beat bị sót khi RR dài bất thường.
+
+Khác find_peaks(distance=0.25 s): có ngưỡng biên độ nên sóng T, sóng P và gợn nhiễu không
+thành beat (mỗi beat sai tốn một lần resample và một lần forward của model).
+
+Các bước theo từng mẫu đều vector hóa (O(n)): bộ lọc nhân quả, và đỉnh ứng viên là đỉnh cao
+nhất của tín hiệu tích phân trong cửa sổ ±100 ms (hai QRS không thể cách nhau ít hơn thời
+gian trơ). Vòng lặp Python chỉ chạy qua các ứng viên (~3 mỗi giây). Trạng thái được giữ giữa
+các chunk nên xử lý cả mảng một lần (detect_qrs) và từng chunk (QRSDetector.process) cho
+đúng cùng kết quả.
+
+Chọn thay cho find_peaks qua ECG_QRS_DETECTOR=pan_tompkins (xem ecg_dsp.detect_r_peaks).
+"""
+
+from collections import deque
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+# Tham số theo Pan & Tompkins (1985)
+MWI_SECONDS = 0.150         # cửa sổ tích phân
+REFRACTORY_SECONDS = 0.200  # không có hai QRS cách nhau ít hơn
+T_WAVE_SECONDS = 0.360      # đỉnh gần QRS trước hơn mức này có thể là sóng T
+LEARN_SECONDS = 2.0         # khởi tạo ngưỡng từ 2 giây đầu
+SEARCHBACK_RR = 1.66        # tìm lại beat bị sót khi không có QRS sau 1.66 x RR trung bình
+
+
+# detect_qrs xử lý theo khối này (bộ nhớ tạm không phụ thuộc độ dài tín hiệu); ứng viên được
+# tìm R-peak / độ dốc theo lô CANDIDATE_BLOCK
+CHUNK = 1 << 18
+CANDIDATE_BLOCK = 4096
+
+
+class QRSDetector:
+    """
+    Bộ dò có trạng thái: process(chunk) trả về các R-peak đã chốt (chỉ số tuyệt đối tính từ
+    mẫu đầu tiên của stream), flush() khi hết tín hiệu.
+    """
+
+    def __init__(self, fs):
+        self.fs = fs
+        self.window = max(1, int(round(MWI_SECONDS * fs)))
+        self.refractory = int(REFRACTORY_SECONDS * fs)
+        self.half = self.refractory // 2
+        self.t_wave = int(T_WAVE_SECONDS * fs)
+        self.learn = int(LEARN_SECONDS * fs)
+
+        self.n = 0                                   # số mẫu đã nhận
+        self._x_tail = np.zeros(4)                   # 4 mẫu cuối cho bộ lọc đạo hàm
+        self._c_tail = np.zeros(self.window)         # `window` giá trị cuối của tổng tích lũy d²
+        # Tín hiệu đã lọc, d² và tích phân của đoạn [_start, n) còn cần cho các ứng viên chưa xét.
+        # Trước mẫu 0 là `pad` mẫu giả (-inf / 0) để cửa sổ của ứng viên đầu không bị cắt
+        pad = max(self.window, self.half) + 1
+        self._x = np.full(pad, -np.inf)
+        self._sq = np.zeros(pad)
+        self._mwi = np.full(pad, -np.inf)
+        self._start = -pad
+        self._scan_from = 0                          # ứng viên trước vị trí này đã xét
+
+        self._initialized = False
+        self.spk = self.npk = 0.0
+        self._last_qrs = None                        # vị trí (trong tín hiệu tích phân) của QRS trước
+        self._last_slope = 0.0
+        self._last_peak = -1                         # R-peak cuối cùng đã trả về
+        self._rr = deque(maxlen=8)
+        self._rr_mean = None
+        # (độ cao, vị trí, R-peak, độ dốc) của đỉnh nhiễu cao nhất sau QRS trước
+        self._best_noise = None
+
+    def process(self, x):
+        """x: chunk tín hiệu đã lọc bandpass. Returns: mảng R-peak mới (int64, tăng dần)"""
+        x = np.asarray(x, dtype=np.float64)
+        if len(x):
+            self._append(x)
+        # Ứng viên cần `half` mẫu phía sau để biết có là đỉnh cao nhất trong cửa sổ
+        return self._scan(self.n - self.half)
+
+    def flush(self):
+        """Xét nốt các ứng viên còn lại ở cuối tín hiệu"""
+        return self._scan(self.n, final=True)
+
+    @property
+    def pending_from(self):
+        """R-peak trả về sau này đều >= vị trí này (kể cả beat tìm lại bằng searchback)"""
+        first = self._scan_from - self.window
+        if self._best_noise is not None:
+            first = min(first, self._best_noise[2])
+        return max(first, self._last_peak + 1)
+
+    # ---------------------------------------------------------
+    # Các bước theo từng mẫu (vector hóa)
+    # ---------------------------------------------------------
+
+    def _append(self, x):
+        w = self.window
+        xs = np.concatenate([self._x_tail, x])
+        # Đạo hàm 5 điểm: (2x[n] + x[n-1] - x[n-3] - 2x[n-4]) / 8T, rồi bình phương
+        sq = xs[4:] - xs[:-4]
+        sq *= 2
+        sq += xs[3:-1]
+        sq -= xs[1:-3]
+        sq *= self.fs / 8.0
+        np.square(sq, out=sq)
+        # Tích phân cửa sổ trượt = hiệu tổng tích lũy. cumsum cộng tuần tự từ giá trị trước đó
+        # nên nối tiếp giữa các chunk cho đúng cùng giá trị như trên cả mảng
+        c = np.empty(len(x) + 1)
+        c[0] = self._c_tail[-1]
+        c[1:] = sq
+        np.cumsum(c, out=c)
+        c = c[1:]
+        mwi = np.empty(len(x))
+        k = min(w, len(x))
+        mwi[:k] = c[:k] - self._c_tail[:k]
+        mwi[k:] = c[k:] - c[:len(x) - k]
+        mwi /= w
+
+        self._x_tail = xs[-4:]
+        self._c_tail = np.concatenate([self._c_tail, c[-w:]])[-w:]
+        self._x = np.concatenate([self._x, x])
+        self._sq = np.concatenate([self._sq, sq])
+        self._mwi = np.concatenate([self._mwi, mwi])
+        self.n += len(x)
+
+    def _windows(self, candidates):
+        """R-peak (cực đại tín hiệu đã lọc) và độ dốc (d² lớn nhất) trong cửa sổ tích phân của mỗi ứng viên"""
+        w = self.window
+        rel = candidates - self._start - w
+        x_win = sliding_window_view(self._x, w + 1)[rel]
+        r_peaks = rel + np.argmax(x_win, axis=1) + self._start
+        slopes = sliding_window_view(self._sq, w + 1)[rel].max(axis=1)
+        return r_peaks.tolist(), slopes.tolist()
+
+    # ---------------------------------------------------------
+    # Ngưỡng thích nghi (vòng lặp theo ứng viên)
+    # ---------------------------------------------------------
+
+    def _scan(self, end, final=False):
+        """Xét các ứng viên ở vị trí [_scan_from, end)"""
+        if not self._initialized:
+            if self.n < self.learn and not (final and self.n):
+                return np.empty(0, dtype=np.int64)
+            head = self._mwi[-self._start:][:self.learn]
+            self.spk = 0.25 * float(head.max())
+            self.npk = 0.5 * float(head.mean())
+            self._initialized = True
+
+        peaks = []
+        if end > self._scan_from:
+            from scipy.ndimage import maximum_filter1d  # import lười như scipy.signal trong ecg_dsp
+
+            # Mẫu ngoài [0, n) coi như -inf: kết quả không phụ thuộc cách chia chunk
+            a, b = self._scan_from - self.half, min(end + self.half, self.n)
+            m = self._mwi[a - self._start:b - self._start]
+            local_max = maximum_filter1d(m, 2 * self.half + 1, mode="constant", cval=-np.inf)
+            lo, hi = self.half, end - a
+            core = m[lo:hi]
+            candidates = np.flatnonzero((core == local_max[lo:hi]) & (core > m[lo - 1:hi - 1])) + self._scan_from
+            for i in range(0, len(candidates), CANDIDATE_BLOCK):
+                block = candidates[i:i + CANDIDATE_BLOCK]
+                r_peaks, slopes = self._windows(block)
+                for j, height, r, slope in zip(block.tolist(), (m[block - a]).tolist(), r_peaks, slopes):
+                    self._candidate(j, height, r, slope, peaks)
+            self._scan_from = end
+        self._trim()
+        return np.array(peaks, dtype=np.int64)
+
+    def _candidate(self, i, height, r, slope, peaks):
+        threshold = self.npk + 0.25 * (self.spk - self.npk)
+
+        # Searchback: quá lâu không có QRS -> nhận đỉnh nhiễu cao nhất nếu vượt ngưỡng thấp
+        overdue = self._rr_mean is not None and i - self._last_qrs > SEARCHBACK_RR * self._rr_mean
+        if self._best_noise is not None and overdue:
+            h, j, r_noise, slope_noise = self._best_noise
+            if h > 0.5 * threshold:
+                self.spk = 0.25 * h + 0.75 * self.spk
+                self._accept(j, r_noise, slope_noise, peaks)
+                threshold = self.npk + 0.25 * (self.spk - self.npk)
+            self._best_noise = None
+
+        since = i - self._last_qrs if self._last_qrs is not None else None
+        if since is not None and since < self.refractory:
+            return
+        if height > threshold:
+            if since is not None and since < self.t_wave and slope < 0.25 * self._last_slope:
+                # Độ dốc (d²) dưới 1/4 của QRS trước (= độ dốc dưới 1/2): sóng T
+                self.npk = 0.125 * height + 0.875 * self.npk
+                return
+            self.spk = 0.125 * height + 0.875 * self.spk
+            self._accept(i, r, slope, peaks)
+        else:
+            self.npk = 0.125 * height + 0.875 * self.npk
+            if self._best_noise is None or height > self._best_noise[0]:
+                self._best_noise = (height, i, r, slope)
+
+    def _accept(self, i, r, slope, peaks):
+        if self._last_qrs is not None:
+            self._rr.append(i - self._last_qrs)
+            self._rr_mean = sum(self._rr) / len(self._rr)
+        self._last_qrs = i
+        self._last_slope = slope
+        self._best_noise = None
+        if r > self._last_peak:
+            peaks.append(r)
+            self._last_peak = r
+
+    def _trim(self):
+        if not self._initialized:
+            return
+        # Giữ đủ mẫu cho cửa sổ của ứng viên kế tiếp (tích phân, độ dốc, R-peak)
+        keep_from = max(self._start, min(self._scan_from, self.n) - max(self.window, self.half) - 1)
+        drop = keep_from - self._start
+        if drop > 0:
+            self._x = self._x[drop:]
+            self._sq = self._sq[drop:]
+            self._mwi = self._mwi[drop:]
+            self._start = keep_from
+
+
+def detect_qrs(x, fs):
+    """R-peak của cả tín hiệu đã lọc, xử lý theo từng CHUNK (cùng kết quả với QRSDetector theo chunk bất kỳ)"""
+    detector = QRSDetector(fs)
+    peaks = [detector.process(x[i:i + CHUNK]) for i in range(0, len(x), CHUNK)]
+    peaks.append(detector.flush())
+    return np.concatenate(peaks)
@@ -0,0 +1,483 @@
+"""
+Registry các phiên bản model ECGResNet trong bộ nhớ: nạp checkpoint mới ở nền, kiểm tra, warmup
+rồi chuyển traffic sang mà không cần restart và không làm hỏng request nào.
+
+- Phiên bản = weights_version của file .pth (hash nội dung) + backend. Mỗi phiên bản có forward và
+  MicroBatcher riêng nên beat của hai phiên bản không bao giờ chung một lần forward.
+- Self-test (self_test) chạy trên bộ beat thăm dò cố định (ecg_synth) trước khi phiên bản được phép
+  phục vụ: output đúng shape, hữu hạn, mỗi hàng là phân phối xác suất, thay đổi theo input, không phụ
+  thuộc cách chia batch, và với backend khác eager, lệch không quá ngưỡng so với eager của cùng trọng
+  số. Backend lỗi thì lùi về eager; trọng số lỗi thì phiên bản bị từ chối, phiên bản đang chạy giữ nguyên.
+- Kích hoạt chỉ là gán lại một tham chiếu. Request chốt phiên bản bằng acquire() và dùng nó tới hết
+  request (release()), nên mọi beat của một request được phân loại bởi cùng một phiên bản. Phiên bản
+  cũ được giữ lại (tối đa max_versions) để quay lại ngay. Phiên bản bị loại chỉ đóng batcher khi request
+  cuối cùng đang dùng nó kết thúc.
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from ecg_batcher import MicroBatcher
+from ecg_dsp import PIPELINE_FS, ecg_to_beats
+from ecg_model import (
+    ARTIFACT_SUFFIXES, BEAT_LEN, NUM_CLASSES, artifact_path, load_backend, load_model, torch_forward,
+    weights_version
+)
+from ecg_synth import synthesize
+
+# Backend float: lệch tối đa (xác suất) so với eager của cùng trọng số
+BACKEND_TOLERANCE = {"eager": 1e-5, "fused": 1e-4, "torchscript": 1e-4, "onnx": 1e-3}
+# Backend int8: xác suất lệch nhiều hơn, kiểm tra tỉ lệ beat cùng lớp như quantize_model.py
+# (ngưỡng thấp hơn --min-agreement vì bộ thăm dò chỉ có khoảng 100 beat)
+BACKEND_MIN_AGREEMENT = {"onnx-int8": 0.95}
+BATCH_TOLERANCE = 1e-4
+
+# (kind, nhịp tim) của các bản ghi thăm dò, mỗi bản ghi 10 giây ở PIPELINE_FS
+PROBE_RECORDINGS = (("normal", 72), ("arrhythmia", 80), ("bradycardia", 48), ("tachycardia", 130))
+PROBE_BATCH = 7
+MAX_JOBS = 20
+
+
+class SelfTestError(RuntimeError):
+    """Checkpoint / backend không qua self-test"""
+
+
+class ModelUnavailable(RuntimeError):
+    """Chưa có phiên bản nào được kích hoạt"""
+
+
+_probe = None
+
+
+def probe_beats():
+    """Bộ beat thăm dò cố định [N, BEAT_LEN] float32 (tạo một lần)"""
+    global _probe
+    if _probe is None:
+        beats = [ecg_to_beats(synthesize(10 * PIPELINE_FS, PIPELINE_FS, hr, kind=kind, seed=i), fs=PIPELINE_FS)
+                 for i, (kind, hr) in enumerate(PROBE_RECORDINGS)]
+        _probe = np.ascontiguousarray(np.concatenate(beats), dtype=np.float32)
+    return _probe
+
+
+def self_test(forward, reference=None, tolerance=None, min_agreement=None, beats=None):
+    """
+    Kiểm tra forward trên beat thăm dò, raise SelfTestError nếu không đạt.
+    Args:
+        reference: probs của eager cùng trọng số trên cùng beat (None = không so)
+        tolerance: lệch xác suất tối đa so với reference
+        min_agreement: tỉ lệ beat cùng lớp với reference tối thiểu
+    Returns:
+        dict kết quả (số beat, lệch, thời gian)
+    """
+    beats = probe_beats() if beats is None else beats
+    started = time.perf_counter()
+    probs = np.asarray(forward(beats))
+    if probs.shape != (len(beats), NUM_CLASSES):
+        raise SelfTestError(f"Output shape {probs.shape}, expected {(len(beats), NUM_CLASSES)}")
+    if not np.isfinite(probs).all():
+        raise SelfTestError("Output contains NaN or infinity")
+    if probs.min() < -1e-6 or probs.max() > 1 + 1e-6 or np.abs(probs.sum(axis=1) - 1).max() > 1e-3:
+        raise SelfTestError("Output rows are not probability distributions")
+    if np.ptp(probs, axis=0).max() < 1e-4:
+        raise SelfTestError("Output does not depend on the input")
+
+    split = np.concatenate([forward(beats[i:i + PROBE_BATCH]) for i in range(0, len(beats), PROBE_BATCH)])
+    batch_diff = float(np.abs(split - probs).max())
+    if batch_diff > BATCH_TOLERANCE:
+        raise SelfTestError(f"Output depends on batch composition (max diff {batch_diff:.3g})")
+
+    result = {"probe_beats": len(beats), "batch_diff": round(batch_diff, 6)}
+    if reference is not None:
+        diff = float(np.abs(probs - reference).max())
+        agreement = float((probs.argmax(axis=1) == reference.argmax(axis=1)).mean())
+        if tolerance is not None and diff > tolerance:
+            raise SelfTestError(f"Output differs from eager by {diff:.3g} (tolerance {tolerance:g})")
+        if min_agreement is not None and agreement < min_agreement:
+            raise SelfTestError(f"Only {agreement:.1%} of beats agree with eager (min {min_agreement:.0%})")
+        result["eager_diff"] = round(diff, 6)
+        result["eager_agreement"] = round(agreement, 4)
+    result["ms"] = round((time.perf_counter() - started) * 1000, 1)
+    return result
+
+
+# =========================================================
+# PHIÊN BẢN
+# =========================================================
+
+class ModelVersion:
+    """Một checkpoint đã nạp: module torch, forward của backend, batcher riêng"""
+
+    def __init__(self, version, path, backend, module, forward, batcher_options, requested_backend=None,
+                 artifact=None):
+        self.version = version
+        self.path = path
+        # backend: đang chạy; requested_backend: được yêu cầu (khác nhau khi lùi về eager, hoặc trong
+        # master pre-fork khi ONNX Runtime chỉ được tạo sau fork)
+        self.backend = backend
+        self.requested_backend = requested_backend or backend
+        self.artifact = artifact
+        self.module = module
+        self.batcher = MicroBatcher(forward, **batcher_options)
+        self.state = "loaded"  # loaded -> ready (qua self-test) <-> active -> retired
+        self.self_test = None
+        self.warmup = {}
+        self.loaded_at = time.time()
+        self.activated_at = None
+        self.inflight = 0
+
+    @property
+    def forward(self):
+        return self.batcher.forward
+
+    @forward.setter
+    def forward(self, forward):
+        self.batcher.forward = forward
+
+    @property
+    def key(self):
+        return self.version, self.requested_backend
+
+    def predict(self, beats):
+        return self.batcher.predict(beats)
+
+    def warm_up(self, batch_sizes):
+        """Forward với các batch size đại diện, mỗi size 2 lần (kernel theo shape, TorchScript tối ưu từ lần 2)"""
+        for size in batch_sizes:
+            beats = np.zeros((size, BEAT_LEN), dtype=np.float32)
+            started = time.perf_counter()
+            for _ in range(2):
+                self.forward(beats)
+            self.warmup[f"forward_b{size}_ms"] = round((time.perf_counter() - started) * 1000, 1)
+        return self.warmup
+
+    def info(self):
+        return {
+            "version": self.version,
+            "path": self.path,
+            "backend": self.backend,
+            "state": self.state,
+            "loaded_at": round(self.loaded_at, 3),
+            "activated_at": self.activated_at and round(self.activated_at, 3),
+            "inflight": self.inflight,
+            "self_test": self.self_test,
+            "warmup": self.warmup,
+        }
+
+
+# =========================================================
+# REGISTRY
+# =========================================================
+
+class ModelRegistry:
+    def __init__(self, device="cpu", max_versions=3, batcher_options=None, warmup_batches=(), defer_onnx=False):
+        """
+        Args:
+            max_versions: số phiên bản giữ trong bộ nhớ (kể cả phiên bản đang chạy)
+            batcher_options: tham số MicroBatcher của mỗi phiên bản (max_batch_size, max_wait_ms, on_batch)
+            warmup_batches: batch size warmup trước khi kích hoạt
+            defer_onnx: master pre-fork - backend onnx* tạm chạy eager tới khi rebuild() trong worker
+        """
+        self.device = device
+        self.max_versions = max(1, int(max_versions))
+        self.batcher_options = dict(batcher_options or {})
+        self.warmup_batches = list(warmup_batches)
+        self.defer_onnx = defer_onnx
+        self.threads = 0
+
+        self._lock = threading.Lock()
+        self._versions = OrderedDict()  # (version, backend) -> ModelVersion, cũ -> mới
+        self._active = None
+        self._load_lock = threading.Lock()
+        self._jobs = OrderedDict()
+        self._job_count = 0
+        self._watcher = None
+        self._stop = threading.Event()
+
+    # -----------------------------------------------------
+    # Nạp / kiểm tra / kích hoạt
+    # -----------------------------------------------------
+
+    @property
+    def active(self):
+        return self._active
+
+    def add(self, path, backend="eager", artifact=None):
+        """
+        Đọc trọng số và tạo forward (chưa chạy forward nào, an toàn trong master trước khi fork).
+        Backend không dùng được -> eager. Checkpoint đã có trong registry -> trả về bản đang có.
+        """
+        version = weights_version(path)
+        existing = self._find(version, backend)
+        if existing is not None:
+            return existing
+
+        module = load_model(path, self.device)
+        requested = backend
+        if backend.startswith("onnx") and self.defer_onnx:
+            forward = torch_forward(module, self.device)
+            backend = "eager"
+        else:
+            forward, backend = self._backend_forward(module, path, version, backend, artifact)
+            existing = self._find(version, backend)
+            if existing is not None:
+                return existing
+        entry = ModelVersion(version, path, backend, module, forward, self.batcher_options, requested, artifact)
+        with self._lock:
+            self._versions[entry.key] = entry
+        return entry
+
+    def _find(self, version, backend):
+        """Phiên bản cùng trọng số đang chạy backend này (kể cả bản yêu cầu backend khác rồi lùi về eager)"""
+        with self._lock:
+            entry = self._versions.get((version, backend))
+            if entry is None:
+                entry = next((e for e in self._versions.values() if e.version == version and e.backend == backend
+                              and e.state in ("ready", "active")), None)
+        return entry
+
+    def _backend_forward(self, module, path, version, backend, artifact=None):
+        if backend != "eager":
+            if not artifact and backend in ARTIFACT_SUFFIXES:
+                artifact = artifact_path(path, backend)
+            try:
+                forward = load_backend(backend, module, artifact, self.device, expected_version=version,
+                                       threads=self.threads)
+                return forward, backend
+            except Exception as e:
+                print(f"⚠ Backend '{backend}' unavailable for {path}, falling back to eager: {e}")
+        return torch_forward(module, self.device), "eager"
+
+    def verify(self, entry):
+        """
+        Self-test; backend khác eager không đạt -> chạy lại với eager của cùng trọng số.
+        Raise SelfTestError (phiên bản bị gỡ khỏi registry) nếu cả trọng số không đạt.
+        """
+        eager = torch_forward(entry.module, self.device)
+        try:
+            reference = eager(probe_beats())
+            entry.self_test = self_test(eager)
+            if entry.backend != "eager":
+                try:
+                    entry.self_test = self_test(entry.forward, reference, BACKEND_TOLERANCE.get(entry.backend),
+                                                BACKEND_MIN_AGREEMENT.get(entry.backend))
+                except SelfTestError as e:
+                    print(f"⚠ Backend '{entry.backend}' failed the self-test for {entry.path}, "
+                          f"falling back to eager: {e}")
+                    entry.forward, entry.backend = eager, "eager"
+        except Exception as e:
+            self._remove(entry)
+            entry.state = "failed"
+            entry.error = str(e)
+            if isinstance(e, SelfTestError):
+                raise
+            raise SelfTestError(f"Self-test crashed: {e}") from e
+        entry.self_test["backend"] = entry.backend
+        if entry.state == "loaded":
+            entry.state = "ready"
+        # Bản nạp sẵn không kích hoạt (load(activate=False)) cũng chiếm bộ nhớ: bỏ bản cũ ngay, không chờ
+        # tới activate(). Chỉ sau khi self-test đạt, để checkpoint hỏng không đẩy mất bản rollback tốt.
+        with self._lock:
+            retired = self._evict(keep=entry)
+        for old in retired:
+            old.batcher.close()
+        return entry
+
+    def activate(self, entry):
+        """Chuyển traffic sang entry (đã qua self-test); request đang chạy dùng tiếp phiên bản cũ"""
+        with self._lock:
+            if entry.state not in ("ready", "active") or self._versions.get(entry.key) is not entry:
+                raise ValueError(f"Model {entry.version} ({entry.backend}) has not passed the self-test")
+            previous, self._active = self._active, entry
+            entry.state = "active"
+            entry.activated_at = time.time()
+            self._versions.move_to_end(entry.key)
+            if previous is not None and previous is not entry:
+                previous.state = "ready"
+            retired = self._evict()
+        for old in retired:
+            old.batcher.close()
+        if previous is not entry:
+            print(f"✓ Active model: {entry.version} ({entry.backend}, {entry.path})")
+        return entry
+
+    def load(self, path, backend="eager", artifact=None, activate=True):
+        """add + verify + warmup (+ activate); raise nếu checkpoint không đạt"""
+        with self._load_lock:
+            entry = self.add(path, backend, artifact)
+            if entry.state == "loaded":
+                self.verify(entry)
+                entry.warm_up(self.warmup_batches)
+            if activate:
+                self.activate(entry)
+            return entry
+
+    def load_async(self, path, backend="eager", activate=True):
+        """load trong thread nền; trả về job (dict, cập nhật tại chỗ) để theo dõi qua info()"""
+        with self._lock:
+            self._job_count += 1
+            job = {"id": self._job_count, "path": path, "backend": backend, "status": "loading",
+                   "started_at": round(time.time(), 3)}
+            self._jobs[job["id"]] = job
+            while len(self._jobs) > MAX_JOBS:
+                self._jobs.popitem(last=False)
+
+        def run():
+            try:
+                entry = self.load(path, backend, activate=activate)
+                job.update(status="active" if activate else "ready", version=entry.version, backend=entry.backend)
+            except Exception as e:
+                job.update(status="failed", error=str(e))
+                print(f"⚠ Model load failed ({path}): {e}")
+            job["finished_at"] = round(time.time(), 3)
+
+        threading.Thread(target=run, name="ecg-model-load", daemon=True).start()
+        return job
+
+    def verify_pending(self):
+        """
+        Self-test + warmup các phiên bản mới chỉ add (worker pre-fork / khởi động), kích hoạt phiên bản
+        đầu tiên đạt nếu chưa có phiên bản nào chạy. Trả về danh sách lỗi (path, lỗi).
+        """
+        errors = []
+        with self._load_lock:
+            with self._lock:
+                pending = [entry for entry in self._versions.values() if entry.state == "loaded"]
+            for entry in pending:
+                try:
+                    self.verify(entry)
+                    entry.warm_up(self.warmup_batches)
+                except Exception as e:
+                    print(f"⚠ Model {entry.path} refused: {e}")
+                    errors.append((entry.path, str(e)))
+                    continue
+                if self._active is None:
+                    self.activate(entry)
+        return errors
+
+    def rebuild(self, threads=0):
+        """Trong worker sau fork: tạo forward ONNX Runtime cho các phiên bản bị hoãn ở master"""
+        self.threads = threads
+        self.defer_onnx = False
+        with self._lock:
+            entries = list(self._versions.values())
+        for entry in entries:
+            if entry.requested_backend.startswith("onnx") and entry.backend != entry.requested_backend:
+                forward, backend = self._backend_forward(entry.module, entry.path, entry.version,
+                                                         entry.requested_backend, entry.artifact)
+                entry.forward, entry.backend = forward, backend
+
+    def _remove(self, entry):
+        with self._lock:
+            if self._versions.get(entry.key) is entry:
+                del self._versions[entry.key]
+        entry.batcher.close()
+
+    def _evict(self, keep=None):
+        """
+        Khi vượt max_versions: bỏ phiên bản không chạy, đã self-test, cũ nhất trước; bản "failed" bị bỏ
+        trước mọi bản "ready" (giữ self._lock). keep: entry không được bỏ (bản vừa self-test xong).
+        """
+        retired = []
+        candidates = sorted(self._versions, key=lambda key: self._versions[key].state != "failed")
+        for key in candidates:
+            if len(self._versions) <= self.max_versions:
+                break
+            entry = self._versions[key]
+            if entry is self._active or entry is keep or entry.state == "loaded":
+                continue
+            del self._versions[key]
+            entry.state = "retired"
+            if entry.inflight == 0:
+                retired.append(entry)
+        return retired
+
+    # -----------------------------------------------------
+    # Dùng trong request
+    # -----------------------------------------------------
+
+    def acquire(self):
+        """Phiên bản đang chạy, giữ cho tới release(); raise ModelUnavailable nếu chưa có"""
+        with self._lock:
+            entry = self._active
+            if entry is None:
+                raise ModelUnavailable("No model version passed the startup self-test")
+            entry.inflight += 1
+            return entry
+
+    def release(self, entry):
+        with self._lock:
+            entry.inflight -= 1
+            close = entry.state == "retired" and entry.inflight == 0
+        if close:
+            entry.batcher.close()
+
+    # -----------------------------------------------------
+    # File điều khiển (đồng bộ nhiều worker)
+    # -----------------------------------------------------
+
+    def watch(self, control_path, interval=2.0):
+        """
+        Thread nền đọc control_path ({"path": ..., "backend": ...}) mỗi interval giây; khi nội dung đổi
+        thì nạp và kích hoạt checkpoint đó. Mọi worker pre-fork cùng đọc một file nên cùng đổi phiên bản.
+        """
+        def run():
+            applied = None
+            while not self._stop.wait(interval):
+                try:
+                    with open(control_path) as f:
+                        target = json.load(f)
+                except FileNotFoundError:
+                    continue
+                except (OSError, ValueError) as e:
+                    print(f"⚠ Unreadable model control file {control_path}: {e}")
+                    continue
+                key = (target.get("path"), target.get("backend", "eager"))
+                if key == applied:
+                    continue
+                applied = key
+                try:
+                    self.load(*key)
+                except Exception as e:
+                    print(f"⚠ Model load failed ({key[0]}): {e}")
+
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=run, name="ecg-model-watch", daemon=True)
+            self._watcher.start()
+
+    # -----------------------------------------------------
+    # Thông tin / dọn dẹp
+    # -----------------------------------------------------
+
+    def modules(self):
+        """Module torch của mọi phiên bản (share_memory trước khi fork)"""
+        with self._lock:
+            entries = list(self._versions.values())
+        modules = {}
+        for entry in entries:
+            for module in (entry.module, getattr(entry.forward, "module", None)):
+                if module is not None:
+                    modules[id(module)] = module
+        return list(modules.values())
+
+    def info(self):
+        with self._lock:
+            active = self._active
+            versions = [entry.info() for entry in reversed(self._versions.values())]
+            jobs = [dict(job) for job in reversed(self._jobs.values())]
+        return {
+            "active": active and {"version": active.version, "backend": active.backend, "path": active.path},
+            "max_versions": self.max_versions,
+            "versions": versions,
+            "jobs": jobs,
+        }
+
+    def close(self):
+        self._stop.set()
+        with self._lock:
+            entries = list(self._versions.values())
+        for entry in entries:
+            entry.batcher.close()
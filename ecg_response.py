@@ -0,0 +1,110 @@
+"""
+Mã hóa response dự đoán: chọn trường, mảng float dạng list hoặc base64
+float32/float16, run-length cho per_beat_predictions, JSON hoặc MessagePack.
+"""
+
+import base64
+import json
+from functools import lru_cache
+
+import numpy as np
+
+JSON_TYPE = "application/json"
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# Mảng float nhị phân luôn little-endian
+ARRAY_DTYPES = {
+    "f32": np.dtype("<f4"),
+    "f16": np.dtype("<f2"),
+}
+ARRAY_MODES = ("list",) + tuple(ARRAY_DTYPES)
+
+
+class EncodingError(ValueError):
+    pass
+
+
+def rle_encode(values):
+    """[0, 0, 0, 2, 0, 0] -> {"values": [0, 2, 0], "lengths": [3, 1, 2]}"""
+    values = np.asarray(values)
+    if len(values) == 0:
+        return {"values": [], "lengths": []}
+    starts = np.flatnonzero(np.concatenate([[True], values[1:] != values[:-1]]))
+    lengths = np.diff(np.append(starts, len(values)))
+    return {"values": values[starts].tolist(), "lengths": lengths.tolist()}
+
+
+def encode_array(arr, mode="list", binary=False):
+    """
+    Args:
+        arr: mảng numpy
+        mode: 'list' | 'f32' | 'f16' (mảng số nguyên luôn là list)
+        binary: True với MessagePack (bytes thô thay vì base64)
+    Returns:
+        list, hoặc {"dtype", "shape", "b64" | "data"}
+    """
+    arr = np.asarray(arr)
+    if mode == "list" or arr.dtype.kind in "iub":
+        return arr.tolist()
+    data = np.ascontiguousarray(arr, dtype=ARRAY_DTYPES[mode])
+    encoded = {"dtype": data.dtype.name, "shape": list(data.shape)}
+    if binary:
+        encoded["data"] = data.tobytes()
+    else:
+        encoded["b64"] = base64.b64encode(data).decode("ascii")
+    return encoded
+
+
+def select_fields(result, requested, default, known, aliases=None):
+    """
+    Chọn trường cho response.
+
+    Args:
+        result: dict các trường của bản ghi này (tên chuẩn)
+        requested: chuỗi "a,b,c" từ request, hoặc None = default
+        default: danh sách tên trường mặc định của route
+        known: mọi tên chuẩn có thể có
+        aliases: tên trường riêng của route -> tên chuẩn
+    Returns:
+        list (tên trả về, tên chuẩn); trường không có trong result (vd. bản ghi rỗng) bị bỏ qua
+    """
+    aliases = aliases or {}
+    names = default if not requested else [n.strip() for n in requested.split(",") if n.strip()]
+    unknown = [n for n in names if aliases.get(n, n) not in known]
+    if unknown:
+        raise EncodingError(f"Unknown field(s): {', '.join(unknown)}")
+    return [(n, aliases.get(n, n)) for n in names if aliases.get(n, n) in result]
+
+
+def encode_payload(result, fields, arrays="list", rle=False, binary=False):
+    if arrays not in ARRAY_MODES:
+        raise EncodingError(f"Unknown array encoding '{arrays}' (expected one of {', '.join(ARRAY_MODES)})")
+    payload = {}
+    for name, key in fields:
+        value = result[key]
+        if key == "per_beat_predictions" and rle:
+            value = rle_encode(value)
+        elif isinstance(value, np.ndarray):
+            value = encode_array(value, arrays, binary)
+        payload[name] = value
+    return payload
+
+
+@lru_cache(maxsize=None)
+def load_msgpack():
+    """Module msgpack, import lười ở lần dùng đầu tiên; None nếu chưa cài (tùy chọn: pip install msgpack)"""
+    try:
+        import msgpack
+    except ImportError:
+        return None
+    return msgpack
+
+
+def render(payload, use_msgpack=False):
+    """Returns: (body bytes, content type)"""
+    if use_msgpack:
+        msgpack = load_msgpack()
+        if msgpack is None:
+            raise EncodingError("MessagePack responses require the 'msgpack' package")
+        return msgpack.packb(payload, use_bin_type=True), MSGPACK_TYPES[0]
+    return json.dumps(payload, separators=(",", ":")).encode(), JSON_TYPE
@@ -0,0 +1,331 @@
+"""
+Xử lý ECG dạng streaming: nhận từng chunk mẫu, giữ trạng thái bộ lọc (causal)
+và bộ dò R-peak giữa các chunk, trả về các beat mới hoàn chỉnh.
+
+Chi phí mỗi chunk là O(chunk): chỉ giữ một buffer có giới hạn quanh các
+R-peak chưa xử lý, không giữ toàn bộ bản ghi.
+"""
+
+import threading
+import time
+import uuid
+from collections import deque
+
+import numpy as np
+
+from ecg_dsp import PIPELINE_FS, QRS_DETECTOR, QRS_DETECTORS, bandpass_sos, extract_beats, resample_plan
+from ecg_qrs import QRSDetector
+
+
+class StreamingResampler:
+    """
+    Resample polyphase theo từng chunk, cho kết quả trùng với resample_poly trên
+    toàn bộ tín hiệu (trừ đoạn cuối chưa đủ mẫu phía sau, được giữ lại chờ chunk sau).
+    """
+
+    def __init__(self, fs_in, fs_out=PIPELINE_FS):
+        self.up, self.down, self.taps = resample_plan(fs_in, fs_out)
+        half_len = (len(self.taps) - 1) // 2
+        self.margin = -(-half_len // self.up) + 1   # số mẫu đầu vào cần ở mỗi phía
+        self._raw = np.empty(0)
+        self._raw_start = 0
+        self._n_in = 0
+        self._next_out = 0
+
+    def _segment_start(self, out_index):
+        # Điểm bắt đầu phải là bội của `down` để chỉ số output toàn cục là số nguyên
+        first_in = out_index * self.down // self.up - self.margin
+        return max(0, first_in // self.down * self.down)
+
+    def process(self, x):
+        self._raw = np.concatenate([self._raw, x])
+        self._n_in += len(x)
+
+        last_out = (self._n_in - 1 - self.margin) * self.up // self.down
+        if last_out < self._next_out:
+            return np.empty(0)
+
+        from scipy.signal import resample_poly  # import lười như ecg_dsp
+
+        start = self._segment_start(self._next_out)
+        y = resample_poly(self._raw[start - self._raw_start:], self.up, self.down, window=self.taps)
+        offset = start * self.up // self.down
+        out = y[self._next_out - offset:last_out + 1 - offset]
+        self._next_out = last_out + 1
+
+        keep_from = self._segment_start(self._next_out)
+        self._raw = self._raw[keep_from - self._raw_start:]
+        self._raw_start = keep_from
+        return out
+
+
+class StreamingBeatExtractor:
+    def __init__(self, fs=PIPELINE_FS, low=0.5, high=40.0, global_size=450, new_fs=120, max_rr_seconds=4.0,
+                 detector=None):
+        """
+        Args:
+            fs: tần số lấy mẫu của các chunk đầu vào
+            max_rr_seconds: khoảng RR dài nhất mà buffer còn giữ đủ mẫu để cắt beat
+            detector: "find_peaks" | "pan_tompkins" (None = ecg_dsp.QRS_DETECTOR)
+        """
+        self.fs = fs
+        self.resampler = None if fs == PIPELINE_FS else StreamingResampler(fs)
+        self.sos = bandpass_sos(PIPELINE_FS, low, high)
+        self.global_size = global_size
+        self.new_fs = new_fs
+        self.distance = int(0.25 * PIPELINE_FS)
+        self.max_half = int(max_rr_seconds * PIPELINE_FS) // 2
+        self.detector = detector or QRS_DETECTOR
+        if self.detector not in QRS_DETECTORS:
+            raise ValueError(f"Unknown QRS detector: {self.detector}")
+        # Pan-Tompkins giữ trạng thái riêng giữa các chunk (ecg_qrs.QRSDetector)
+        self._qrs = QRSDetector(PIPELINE_FS) if self.detector == "pan_tompkins" else None
+
+        self._offset = None
+        self._zi = None
+        self._buf = np.empty(0)
+        self._buf_start = 0        # chỉ số tuyệt đối (ở PIPELINE_FS) của _buf[0]
+        self._scan_from = 0        # peak trước vị trí này đã được chốt
+        self._last_peak = None
+        self._pending = []
+        self._rr_sum = 0
+        self._rr_count = 0
+        self.samples_in = 0
+
+    @property
+    def _end(self):
+        return self._buf_start + len(self._buf)
+
+    def process(self, samples):
+        """
+        Returns:
+            (beats [N, 150], peaks [N]) - beat mới và vị trí R-peak tuyệt đối (ở PIPELINE_FS)
+        """
+        x = np.asarray(samples, dtype=np.float64)
+        self.samples_in += len(x)
+        if len(x) == 0:
+            return self._emit()
+
+        # Giống preprocess_adc nhưng offset lấy từ chunk đầu tiên thay vì cả bản ghi
+        if self._offset is None:
+            self._offset = float(np.mean(x))
+        x = (x - self._offset) / 512.0
+        if self.resampler is not None:
+            x = self.resampler.process(x)
+            if len(x) == 0:
+                return self._emit()
+
+        from scipy.signal import sosfilt, sosfilt_zi
+
+        if self._zi is None:
+            self._zi = sosfilt_zi(self.sos) * x[0]
+        y, self._zi = sosfilt(self.sos, x, zi=self._zi)
+        self._buf = np.concatenate([self._buf, y])
+
+        if self._qrs is not None:
+            self._accept_qrs(self._qrs.process(y))
+        else:
+            self._detect(self._end - self.distance)
+        return self._emit()
+
+    def flush(self):
+        """Chốt các peak ở cuối stream (khi đóng session)"""
+        if self._qrs is not None:
+            self._accept_qrs(self._qrs.flush())
+        else:
+            self._detect(self._end)
+        return self._emit()
+
+    def _accept_qrs(self, peaks):
+        for p in peaks.tolist():
+            if self._last_peak is not None:
+                self._rr_sum += p - self._last_peak
+                self._rr_count += 1
+            self._last_peak = p
+            self._pending.append(p)
+        # Buffer phải còn giữ vùng mà bộ dò có thể trả peak về sau (_trim lùi thêm distance)
+        self._scan_from = self._qrs.pending_from
+
+    def _detect(self, confirm_before):
+        from scipy.signal import find_peaks
+
+        lo = max(self._buf_start, self._scan_from - self.distance)
+        peaks, _ = find_peaks(self._buf[lo - self._buf_start:], distance=self.distance)
+        for p in peaks + lo:
+            if p < self._scan_from or p >= confirm_before:
+                continue
+            if self._last_peak is not None:
+                if p - self._last_peak < self.distance:
+                    continue
+                self._rr_sum += p - self._last_peak
+                self._rr_count += 1
+            self._last_peak = p
+            self._pending.append(p)
+        self._scan_from = max(self._scan_from, confirm_before)
+
+    def _emit(self):
+        empty = (np.empty((0, 150)), np.empty(0, dtype=np.int64))
+        if self._rr_count == 0:
+            self._trim()
+            return empty
+
+        # hb_size = RR trung bình tới thời điểm hiện tại (bản batch dùng RR trung bình cả bản ghi)
+        hb_size = self._rr_sum // self._rr_count
+        half = hb_size // 2
+        end = self._end
+        ready = [p for p in self._pending if p + half <= end]
+        self._pending = [p for p in self._pending if p + half > end]
+        peaks = np.array([p for p in ready if p - half >= self._buf_start], dtype=np.int64)
+
+        if len(peaks):
+            beats = extract_beats(self._buf, peaks - self._buf_start, hb_size, fs=PIPELINE_FS,
+                                  global_size=self.global_size, new_fs=self.new_fs)
+        else:
+            beats, peaks = empty
+
+        self._trim()
+        return beats, peaks
+
+    def _trim(self):
+        # Chỉ giữ phần buffer còn cần cho việc dò peak và cắt các beat đang chờ; peak chốt sau này
+        # (>= _scan_from) cũng cần tới nửa cửa sổ beat phía trước
+        keep_from = min([self._scan_from - max(self.distance, self.max_half)]
+                        + [p - self.max_half for p in self._pending])
+        # Tín hiệu phẳng / mất điện cực / bão hòa: không có peak, _scan_from của Pan-Tompkins có thể đứng yên
+        # -> giới hạn buffer để mỗi chunk vẫn tốn O(chunk). Peak đang chờ cần tối đa max_half mẫu mỗi phía.
+        limit = self.max_half + self.distance if not self._pending else 2 * self.max_half + self.distance
+        keep_from = max(keep_from, self._end - limit)
+        keep_from = min(max(keep_from, self._buf_start), self._end)
+        self._buf = self._buf[keep_from - self._buf_start:]
+        self._buf_start = keep_from
+
+
+def beat_results(peaks, probs, fs, first_index=0, sample_offset=0):
+    """
+    Kết quả từng beat: peaks là vị trí R-peak ở PIPELINE_FS (như StreamingBeatExtractor trả về),
+    sample / time tính theo fs gốc, cộng thêm sample_offset mẫu (bộ trích beat bắt đầu giữa bản ghi)
+    """
+    preds = probs.argmax(axis=1)
+    conf = probs.max(axis=1)
+    results = []
+    for i, (p, pred, c) in enumerate(zip(peaks, preds, conf)):
+        results.append({
+            "index": first_index + i,
+            "sample": sample_offset + int(round(p * fs / PIPELINE_FS)),
+            "time": round(sample_offset / fs + p / PIPELINE_FS, 4),
+            "prediction": int(pred),
+            "confidence": float(c),
+        })
+    return results
+
+
+class StreamSession:
+    def __init__(self, session_id, fs, classify, max_events=10000):
+        """
+        Args:
+            classify: hàm nhận beats [N, 150], trả về probs [N, C]
+            max_events: số kết quả tối đa chờ client SSE đọc (cũ nhất bị bỏ)
+        """
+        self.id = session_id
+        self.fs = fs
+        self.classify = classify
+        self.extractor = StreamingBeatExtractor(fs=fs)
+        self.beat_count = 0
+        self.created = self.last_active = time.time()
+        self.closed = False
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=max_events)
+        self._cond = threading.Condition()
+
+    def feed(self, samples):
+        with self._lock:
+            self.last_active = time.time()
+            beats, peaks = self.extractor.process(samples)
+            return self._publish(beats, peaks)
+
+    def close(self):
+        with self._lock:
+            beats, peaks = self.extractor.flush()
+            results = self._publish(beats, peaks)
+            self.closed = True
+        with self._cond:
+            self._cond.notify_all()
+        return results
+
+    def discard(self):
+        """
+        Đóng mà không flush: beat còn chờ trong extractor bị bỏ, không gọi classify. Dùng khi hết hạn
+        (client đã bỏ đi), nên không giữ lock của phiên và không làm chậm request của client khác.
+        """
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+
+    def _publish(self, beats, peaks):
+        if len(beats) == 0:
+            return []
+        probs = self.classify(beats.astype(np.float32))
+        results = beat_results(peaks, probs, self.fs, self.beat_count)
+        self.beat_count += len(results)
+
+        with self._cond:
+            self._events.extend(results)
+            self._cond.notify_all()
+        return results
+
+    def events(self, heartbeat=15.0):
+        """Generator các kết quả beat cho SSE; trả None khi rảnh quá heartbeat giây"""
+        while True:
+            with self._cond:
+                if not self._events and not self.closed:
+                    self._cond.wait(heartbeat)
+                items = list(self._events)
+                self._events.clear()
+                closed = self.closed
+            if items:
+                yield from items
+            elif closed:
+                return
+            else:
+                yield None
+
+
+class StreamSessionStore:
+    def __init__(self, classify, max_sessions=256, idle_timeout=300.0):
+        self.classify = classify
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def create(self, fs):
+        self._expire()
+        with self._lock:
+            if len(self._sessions) >= self.max_sessions:
+                raise RuntimeError("Too many open stream sessions")
+            session = StreamSession(uuid.uuid4().hex, fs, self.classify)
+            self._sessions[session.id] = session
+            return session
+
+    def get(self, session_id):
+        self._expire()
+        with self._lock:
+            return self._sessions.get(session_id)
+
+    def close(self, session_id):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is None:
+            return None
+        return session, session.close()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _expire(self):
+        # Chạy trong create / get của một request khác: chỉ gỡ và discard, không flush + classify phiên hết hạn
+        now = time.time()
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if now - s.last_active > self.idle_timeout]
+            for sid in expired:
+                self._sessions.pop(sid).discard()
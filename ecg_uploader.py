@@ -0,0 +1,197 @@
+"""
+Upload tín hiệu ECG lên Firebase Realtime Database (REST) theo định dạng app React đọc:
+node ECG/raw gồm các chunk {"chunk_1": "512,515,...", "chunk_2": ...}, mỗi chunk chunk_size mẫu.
+
+- Một requests.Session với pool kết nối keep-alive cho mọi request (không bắt tay TCP/TLS lại).
+- stream(): giả lập cảm biến thật. Chunk k chỉ "có" sau (k x chunk_size / fs) giây và được nối
+  thêm bằng PATCH. Khi upload chậm hơn tín hiệu (mạng chậm, retry), mọi chunk đang chờ được gộp
+  vào một PATCH (tối đa max_batch) để đuổi kịp thay vì trễ dần.
+- upload(): đẩy cả bản ghi nhanh nhất có thể (các script push_* dùng).
+- Lỗi mạng, 429 và 5xx được thử lại với backoff lũy thừa có jitter (theo Retry-After nếu có).
+  Hết số lần thử thì ném lỗi của requests.
+
+Chạy offline với rtdb_local.LocalRTDB (xem simulate_device.py --local).
+"""
+
+import json
+import os
+import random
+import time
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+
+DATABASE_URL = os.environ.get("FIREBASE_DATABASE_URL", "https://heartecg-4e084-default-rtdb.firebaseio.com")
+ECG_PATH = "ECG/raw"
+CHUNK_SIZE = 100
+
+# Lỗi tạm thời: thử lại
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+def format_chunks(ecg, chunk_size=CHUNK_SIZE, first=1):
+    """{"chunk_<first>": "v,v,...", ...}: mỗi chunk chunk_size mẫu, chunk cuối có thể ngắn hơn"""
+    values = np.asarray(ecg).tolist()
+    return {
+        f"chunk_{first + i}": ",".join(map(str, values[start:start + chunk_size]))
+        for i, start in enumerate(range(0, len(values), chunk_size))
+    }
+
+
+class UploadStats:
+    """Thống kê một lần upload / stream"""
+
+    def __init__(self, fs=None):
+        self.fs = fs
+        self.samples = 0
+        self.chunks = 0
+        self.requests = 0
+        self.retries = 0
+        self.bytes = 0
+        self.seconds = 0.0
+        self.latencies = []         # thời gian mỗi request thành công (kể cả retry), giây
+        self.max_lag = 0.0          # stream: chunk được ghi xong muộn nhất bao lâu sau khi "có", giây
+
+    def summary(self):
+        latencies = np.array(self.latencies) * 1000
+        out = {
+            "samples": self.samples,
+            "chunks": self.chunks,
+            "requests": self.requests,
+            "retries": self.retries,
+            "bytes": self.bytes,
+            "seconds": round(self.seconds, 3),
+            "samples_per_s": round(self.samples / self.seconds, 1) if self.seconds else None,
+            "latency_p50_ms": round(float(np.percentile(latencies, 50)), 2) if len(latencies) else None,
+            "latency_p95_ms": round(float(np.percentile(latencies, 95)), 2) if len(latencies) else None,
+        }
+        if self.fs:
+            out["realtime_factor"] = round(out["samples_per_s"] / self.fs, 3) if self.seconds else None
+            out["max_lag_ms"] = round(self.max_lag * 1000, 1)
+        return out
+
+
+class RTDBUploader:
+    def __init__(self, database_url=None, path=ECG_PATH, auth=None, timeout=10.0, retries=5, backoff=0.25,
+                 max_backoff=8.0, pool_size=4):
+        """
+        Args:
+            database_url: None = FIREBASE_DATABASE_URL / DATABASE_URL
+            path: node chứa các chunk
+            auth: token (tham số ?auth= của REST API), None nếu rules cho phép ghi
+            retries: số lần thử lại tối đa mỗi request
+            backoff, max_backoff: chờ min(max_backoff, backoff x 2^lần) x [0.5, 1) giây trước lần thử lại
+        """
+        self.url = f"{(database_url or DATABASE_URL).rstrip('/')}/{path.strip('/')}.json"
+        self.params = {"print": "silent"}
+        if auth:
+            self.params["auth"] = auth
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.session.headers["Content-Type"] = "application/json"
+        self._retried = 0
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # ---------------------------------------------------------
+    # REST
+    # ---------------------------------------------------------
+
+    def request(self, method, data=None, params=None):
+        """Một request tới node, thử lại lỗi tạm thời. Returns: requests.Response"""
+        body = None if data is None else json.dumps(data, separators=(",", ":")).encode()
+        params = {**self.params, **(params or {})}
+        for attempt in range(self.retries + 1):
+            try:
+                response = self.session.request(method, self.url, data=body, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.retries:
+                    raise
+                delay = None
+            else:
+                if response.status_code not in RETRY_STATUS or attempt == self.retries:
+                    response.raise_for_status()
+                    return response
+                delay = _retry_after(response)
+            self._retried += 1
+            if delay is None:
+                delay = min(self.max_backoff, self.backoff * 2 ** attempt) * random.uniform(0.5, 1.0)
+            time.sleep(delay)
+
+    def next_chunk(self):
+        """Số thứ tự chunk tiếp theo ở node (1 nếu node rỗng)"""
+        keys = self.request("GET", params={"shallow": "true", "print": "pretty"}).json() or {}
+        numbers = [int(key[6:]) for key in keys if key.startswith("chunk_") and key[6:].isdigit()]
+        return max(numbers, default=0) + 1
+
+    # ---------------------------------------------------------
+    # Upload
+    # ---------------------------------------------------------
+
+    def upload(self, ecg, chunk_size=CHUNK_SIZE, reset=True, max_batch=1000):
+        """Đẩy cả tín hiệu nhanh nhất có thể. reset: thay nội dung node, ngược lại nối thêm"""
+        return self._send(ecg, chunk_size, None, None, reset, max_batch)
+
+    def stream(self, ecg, fs, chunk_size=CHUNK_SIZE, speed=1.0, reset=True, max_batch=50):
+        """
+        Đẩy tín hiệu theo tốc độ lấy mẫu thật như một thiết bị đo (speed > 1: nhanh hơn thời gian thực).
+        reset: node được thay khi gửi chunk đầu, ngược lại nối tiếp số thứ tự chunk đang có.
+        """
+        return self._send(ecg, chunk_size, fs, chunk_size / fs / speed, reset, max_batch)
+
+    def _send(self, ecg, chunk_size, fs, period, reset, max_batch):
+        n = len(ecg)
+        n_chunks = -(-n // chunk_size)
+        first = 1 if reset else self.next_chunk()
+        stats = UploadStats(fs)
+        retried = self._retried
+        end = None if period is None else n * period / chunk_size     # thời điểm có mẫu cuối
+        started = time.perf_counter()
+        sent = 0
+        while sent < n_chunks:
+            ready = n_chunks
+            if period is not None:
+                # Chunk i "có" tại started + (i + 1) x period (chunk cuối: khi hết mẫu)
+                elapsed = time.perf_counter() - started
+                ready = n_chunks if elapsed >= end else min(n_chunks, int(elapsed / period))
+                if ready <= sent:
+                    time.sleep(max(0.0, started + min((sent + 1) * period, end) - time.perf_counter()))
+                    continue
+            stop = min(ready, sent + max_batch)
+            chunks = format_chunks(ecg[sent * chunk_size:stop * chunk_size], chunk_size, first + sent)
+            sent_at = time.perf_counter()
+            # Chunk đầu khi reset: PUT thay cả node (xóa phiên đo trước) trong cùng request
+            response = self.request("PUT" if reset and sent == 0 else "PATCH", chunks)
+            done = time.perf_counter()
+            stats.latencies.append(done - sent_at)
+            stats.bytes += len(response.request.body or b"")
+            if period is not None:
+                stats.max_lag = max(stats.max_lag, done - started - min(stop * period, end))
+            stats.requests += 1
+            sent = stop
+        stats.seconds = time.perf_counter() - started
+        stats.samples = n
+        stats.chunks = n_chunks
+        stats.retries = self._retried - retried
+        return stats
+
+
+def _retry_after(response):
+    try:
+        return min(60.0, float(response.headers["Retry-After"]))
+    except (KeyError, ValueError):
+        return None
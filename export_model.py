@@ -0,0 +1,79 @@
+"""
+Export ECGResNet (resetECG_new.pth) sang TorchScript và ONNX cho server:
+BatchNorm được gộp vào Conv1d, Swish thay bằng SiLU.
+
+Sau khi export, so probabilities của từng artifact với model eager trên beats
+tách từ tín hiệu mock (ecg_to_beats); thoát với mã 1 nếu lệch quá ngưỡng.
+
+Chạy:
+    python export_model.py                      # cả torchscript và onnx
+    python export_model.py --backends onnx --atol 1e-5
+Sau đó chạy server với ECG_MODEL_BACKEND=torchscript hoặc ECG_MODEL_BACKEND=onnx.
+"""
+
+import argparse
+import sys
+
+import numpy as np
+
+from ecg_dsp import ecg_to_beats
+from ecg_model import (
+    artifact_path, export_onnx, export_torchscript, load_backend, load_model, weights_version
+)
+from ecg_synth import synthesize
+
+EXPORTERS = {
+    "torchscript": export_torchscript,
+    "onnx": export_onnx,
+}
+
+
+def parity_beats(seconds=60, seed=0):
+    """Beats thật (qua pipeline DSP) từ tín hiệu mock bình thường và bất thường"""
+    # RandomState riêng: cùng tín hiệu như np.random.seed(seed) + generate_normal_ecg / generate_abnormal_ecg
+    # mà không đụng trạng thái np.random toàn cục
+    rng = np.random.RandomState(seed)
+    n = seconds * 250
+    signals = [synthesize(n, 250, 72, kind="normal", seed=rng),
+               synthesize(n, 250, 48, kind="arrhythmia", seed=rng)]
+    return np.concatenate([ecg_to_beats(s, fs=250) for s in signals]).astype(np.float32)
+
+
+def compare(reference, probs):
+    """(max |Δp|, tỉ lệ beat cùng lớp dự đoán)"""
+    return float(np.abs(reference - probs).max()), float((reference.argmax(1) == probs.argmax(1)).mean())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="resetECG_new.pth")
+    parser.add_argument("--backends", nargs="+", choices=list(EXPORTERS), default=list(EXPORTERS))
+    parser.add_argument("--atol", type=float, default=1e-4, help="sai lệch probability tối đa cho phép")
+    args = parser.parse_args()
+
+    model = load_model(args.model)
+    version = weights_version(args.model)
+    beats = parity_beats()
+    reference = load_backend("eager", model)(beats)
+    print(f"Model {args.model} ({version}), {len(beats)} beats kiểm tra\n")
+
+    ok = True
+    for backend in ["fused"] + args.backends:
+        if backend in EXPORTERS:
+            path = EXPORTERS[backend](model, artifact_path(args.model, backend), version)
+            forward = load_backend(backend, artifact=path, expected_version=version)
+        else:
+            path = "(in-process)"
+            forward = load_backend(backend, model)
+        max_diff, agreement = compare(reference, forward(beats))
+        passed = max_diff <= args.atol
+        ok &= passed
+        print(f"{backend:<12} {path:<24} max|Δp|={max_diff:.2e}  argmax={agreement:.2%}  {'OK' if passed else 'FAIL'}")
+
+    if not ok:
+        print(f"\n✗ Sai lệch vượt ngưỡng {args.atol:g}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
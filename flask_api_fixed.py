@@ -1,253 +1,936 @@
-from flask import Flask, request, jsonify
+import gzip
+import hmac
+import json
+import os
+import tempfile
+import threading
+import time
+
+from flask import Flask, Response, g, has_request_context, request, jsonify
 from flask_cors import CORS
 import numpy as np
 import torch
-import torch.nn as nn
-from scipy.signal import find_peaks, resample, butter, filtfilt
+
+import ecg_metrics
+from ecg_model import Swish, ResBlock, ECGResNet, BACKENDS  # noqa: F401
+from ecg_registry import ModelRegistry, ModelUnavailable
+from ecg_cache import PredictionCache, make_key
+from ecg_pipeline import DspPool
+from ecg_response import (
+    JSON_TYPE, MSGPACK_TYPES, EncodingError, encode_payload, load_msgpack, render, select_fields
+)
+from ecg_io import (
+    CONTENT_TYPES, NPY_MAGIC, ZIP_MAGIC, PayloadError, decode_ecg_payload, decode_npz, decompress, open_recording,
+    spool_payload
+)
+from ecg_holter import segment_beats, to_input_samples
+from ecg_stream import StreamSessionStore
+from ecg_dsp import (  # noqa: F401
+    PIPELINE_FS, QRS_DETECTOR, preprocess_adc, bandpass_filter, ecg_to_beats, ecg_to_beats_many, dsp_cache_info
+)
+
 
 # =========================================================
-# MODEL
+# STARTUP
 # =========================================================
 
-class Swish(nn.Module):
-    def forward(self, x):
-        return x * torch.sigmoid(x)
-
+def process_age():
+    """Số giây kể từ khi process khởi động (đọc /proc, Linux); None nếu không đọc được"""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return round(uptime - start_ticks / os.sysconf("SC_CLK_TCK"), 2)
 
-class ResBlock(nn.Module):
-    def __init__(self, in_channels, out_channels):
-        super().__init__()
-        self.conv1 = nn.Conv1d(in_channels, out_channels, 3, padding=1)
-        self.bn1 = nn.BatchNorm1d(out_channels)
-        self.conv2 = nn.Conv1d(out_channels, out_channels, 3, padding=1)
-        self.bn2 = nn.BatchNorm1d(out_channels)
-        self.conv3 = nn.Conv1d(out_channels, out_channels, 3, padding=1)
-        self.bn3 = nn.BatchNorm1d(out_channels)
 
-        self.shortcut = nn.Sequential()
-        if in_channels != out_channels:
-            self.shortcut = nn.Sequential(
-                nn.Conv1d(in_channels, out_channels, 1),
-                nn.BatchNorm1d(out_channels)
-            )
+def elapsed_ms(start):
+    return round((time.perf_counter() - start) * 1000, 1)
 
-        self.act = Swish()
 
-    def forward(self, x):
-        identity = x
-        out = self.act(self.bn1(self.conv1(x)))
-        out = self.act(self.bn2(self.conv2(out)))
-        out = self.bn3(self.conv3(out))
-        out += self.shortcut(identity)
-        return self.act(out)
+# Mốc khởi động (giây kể từ khi process bắt đầu) và thời gian từng bước, trả về ở /ready
+startup = {"ready": False, "imports_done_s": process_age(), "warmup": {}}
 
 
-class ECGResNet(nn.Module):
-    def __init__(self, num_classes=5):
-        super().__init__()
-        self.block1 = ResBlock(1, 32)
-        self.block2 = ResBlock(32, 64)
-        self.block3 = ResBlock(64, 128)
+# =========================================================
+# LOAD MODEL
+# =========================================================
 
-        self.gmp = nn.AdaptiveMaxPool1d(1)
-        self.gap = nn.AdaptiveAvgPool1d(1)
-        self.fc = nn.Linear(256, num_classes)
-        self.softmax = nn.Softmax(dim=1)
+device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
 
-    def forward(self, x):
-        x = self.block1(x)
-        x = self.block2(x)
-        x = self.block3(x)
-        feat = torch.cat([
-            self.gmp(x).squeeze(-1),
-            self.gap(x).squeeze(-1)
-        ], dim=1)
-        return self.softmax(self.fc(feat))
+# Checkpoint phục vụ lúc khởi động và các checkpoint nạp sẵn để đổi sang ngay (POST /models)
+MODEL_PATH = os.environ.get("ECG_MODEL_PATH", "resetECG_new.pth")
+MODEL_PATHS = [MODEL_PATH] + [p for p in os.environ.get("ECG_MODEL_PATHS", "").split(",") if p and p != MODEL_PATH]
+# Backend inference: eager | fused | torchscript | onnx | onnx-int8
+# (artifact tạo bằng export_model.py / quantize_model.py)
+MODEL_BACKEND = os.environ.get("ECG_MODEL_BACKEND", "eager")
+# POST /models chỉ nạp file .pth trong thư mục này
+MODEL_DIR = os.path.realpath(os.environ.get("ECG_MODEL_DIR") or os.path.dirname(os.path.abspath(__file__)))
+# File điều khiển dùng chung: mọi worker pre-fork đọc file này và cùng đổi phiên bản
+MODEL_CONTROL = os.environ.get("ECG_MODEL_CONTROL")
+MODEL_CONTROL_INTERVAL = float(os.environ.get("ECG_MODEL_CONTROL_INTERVAL", "2"))
+ADMIN_TOKEN = os.environ.get("ECG_ADMIN_TOKEN")
+
+# Pre-fork server (gunicorn.conf.py đặt ECG_PREFORK=1): session ONNX Runtime không dùng được
+# qua fork nên chỉ được tạo trong từng worker (init_worker); master giữ forward eager
+PREFORK = os.environ.get("ECG_PREFORK") == "1"
+
+# Mỗi phiên bản có MicroBatcher riêng; self-test + warmup chạy trong warm_up (sau fork nếu pre-fork)
+registry = ModelRegistry(
+    device,
+    max_versions=int(os.environ.get("ECG_MODEL_MAX_VERSIONS", "3")),
+    batcher_options={
+        "max_batch_size": int(os.environ.get("ECG_BATCH_MAX_SIZE", "256")),
+        "max_wait_ms": float(os.environ.get("ECG_BATCH_MAX_WAIT_MS", "2")),
+        "on_batch": ecg_metrics.observe_batch,
+    },
+    defer_onnx=PREFORK,
+)
+
+load_started = time.perf_counter()
+for path in MODEL_PATHS:
+    try:
+        registry.add(path, MODEL_BACKEND, os.environ.get("ECG_MODEL_ARTIFACT") if path == MODEL_PATH else None)
+        print(f"✓ Model loaded on {device}: {path}")
+    except Exception as e:
+        print(f"⚠ Model load failed ({path}): {e}")
+        startup.setdefault("model_errors", {})[path] = f"load failed: {e}"
+startup["model_load_ms"] = elapsed_ms(load_started)
+
+
+def current_model():
+    """
+    Phiên bản model của request: chốt ở lần gọi đầu tiên và giữ tới khi request kết thúc, nên mọi beat
+    của request (cả cache key) dùng cùng một phiên bản dù có đổi phiên bản giữa chừng
+    """
+    if not has_request_context():
+        model = registry.active
+        if model is None:
+            raise ModelUnavailable("No model version passed the startup self-test")
+        return model
+    if "model" not in g:
+        g.model = registry.acquire()
+    return g.model
+
+
+def classify_beats(beats):
+    return current_model().predict(beats)
+
+
+# Chế độ pipeline: DSP chạy trên process pool ("auto" = số core, "0" = tắt)
+DSP_WORKERS = os.environ.get("ECG_DSP_WORKERS", "0")
+# Giây tối đa chờ một job DSP; worker treo quá hạn -> tính lại trong process này ("0" = không giới hạn)
+DSP_TIMEOUT = float(os.environ.get("ECG_DSP_TIMEOUT", "120"))
+dsp_pool = None
+if DSP_WORKERS not in ("", "0"):
+    # Khởi động (fork) trong start_serving / init_worker, trước forward đầu tiên của torch
+    dsp_pool = DspPool(None if DSP_WORKERS == "auto" else int(DSP_WORKERS), timeout=DSP_TIMEOUT or None)
+
+
+prediction_cache = PredictionCache(
+    max_entries=int(os.environ.get("ECG_CACHE_MAX_ENTRIES", "256")),
+    ttl=float(os.environ.get("ECG_CACHE_TTL", "60")),
+    max_bytes=int(float(os.environ.get("ECG_CACHE_MAX_MB", "256")) * 1024 * 1024),
+)
+
+
+def predict_beats(ecg_adc, fs):
+    """
+    Tách beat + phân loại, dùng chung kết quả cho các request cùng tín hiệu.
+    Returns:
+        (beats [N, 150], probs [N, C]) - mảng chỉ-đọc, có thể được chia sẻ
+    """
+    timings = {}
+
+    def compute():
+        if dsp_pool:
+            beats = dsp_pool.ecg_to_beats(ecg_adc, fs, timings=timings)
+        else:
+            beats = ecg_to_beats(ecg_adc, fs=fs, timings=timings)
+        started = time.perf_counter()
+        probs = classify_beats(beats.astype(np.float32)) if len(beats) else np.empty((0, 5), dtype=np.float32)
+        timings["inference"] = time.perf_counter() - started
+        return beats, probs
+
+    model = current_model()
+    key = make_key(ecg_adc, model.version, fs=fs, pipeline_fs=PIPELINE_FS, backend=model.backend,
+                   detector=QRS_DETECTOR)
+    value, status = prediction_cache.get_or_compute(key, compute)
+    ecg_metrics.observe_stages(timings)
+    ecg_metrics.observe_cache(status, prediction_cache.stats())
+    ecg_metrics.observe_beats(len(value[0]))
+    return value
+
+
+def classification_result(probs):
+    """Các trường dự đoán từ xác suất của từng beat [N, C]"""
+    if len(probs) == 0:
+        return {
+            "per_beat_predictions": np.empty(0, dtype=np.int64),
+            "beat_confidence": np.empty(0, dtype=np.float32),
+            "final_prediction": -1,
+        }
+
+    preds = probs.argmax(axis=1)
+    final_pred = int(np.bincount(preds).argmax())
+    mean_prob = probs.mean(axis=0)
+    return {
+        "per_beat_predictions": preds,
+        "beat_confidence": probs.max(axis=1),
+        "final_prediction": final_pred,
+        "class_confidence": mean_prob,
+        "confidence": float(mean_prob[final_pred]),
+        "probabilities": probs,
+    }
+
+
+def prediction_result(beats, probs):
+    """Mọi trường có thể trả về cho một bản ghi (mảng numpy, chưa mã hóa)"""
+    return {"num_beats": len(beats), "beats": beats, **classification_result(probs),
+            "model_version": current_model().version}
+
+
+RESULT_FIELDS = ("num_beats", "beats", "per_beat_predictions", "beat_confidence", "final_prediction",
+                 "class_confidence", "confidence", "probabilities", "model_version")
+
+# Trường mặc định của từng route (giữ nguyên response cũ) và tên riêng -> tên chuẩn
+PREDICT_FIELDS = ["beats", "per_beat_predictions", "beat_confidence", "final_prediction",
+                  "class_confidence", "confidence"]
+PREDICT_ALIASES = {"beats": "num_beats"}
+PREDICTT_FIELDS = ["num_beats", "beats", "per_beat_predictions", "per_beat_confidence", "final_prediction"]
+PREDICTT_ALIASES = {"per_beat_confidence": "beat_confidence"}
+
+
+def summarize_predictions(beats, probs):
+    """Response dạng /predict cho một bản ghi"""
+    result = prediction_result(beats, probs)
+    return encode_payload(result, select_fields(result, None, PREDICT_FIELDS, RESULT_FIELDS, PREDICT_ALIASES))
+
+
+stream_sessions = StreamSessionStore(
+    classify_beats,
+    max_sessions=int(os.environ.get("ECG_STREAM_MAX_SESSIONS", "256")),
+    idle_timeout=float(os.environ.get("ECG_STREAM_IDLE_TIMEOUT", "300")),
+)
 
 
 # =========================================================
-# ECG PREPROCESSING
+# FLASK API
 # =========================================================
 
-def preprocess_adc(ecg_adc):
-    ecg = np.asarray(ecg_adc, dtype=np.float32)
-    ecg -= np.mean(ecg)
-    ecg /= 512.0
-    return ecg
+app = Flask(__name__)
+CORS(app)
+# Giới hạn body upload (đã nén); dữ liệu sau giải nén bị giới hạn riêng bởi ECG_MAX_DECOMPRESSED_MB (ecg_io)
+app.config["MAX_CONTENT_LENGTH"] = int(float(os.environ.get("ECG_MAX_UPLOAD_MB", "256")) * 1024 * 1024)
 
 
-def bandpass_filter(ecg, fs, low=0.5, high=40.0):
-    nyq = 0.5 * fs
-    b, a = butter(4, [low / nyq, high / nyq], btype="band")
-    return filtfilt(b, a, ecg)
+# Route cần model: trả 503 khi chưa có phiên bản nào qua self-test (thay vì dự đoán toàn 0)
+MODEL_ENDPOINTS = {"predict", "predict_firebase", "predict_batch", "predict_with_beats", "predict_holter",
+                   "stream_open", "stream_chunk", "stream_close"}
 
 
-def ecg_to_beats(ecg_adc, fs=250, global_size=450, new_fs=120):
-    ecg = preprocess_adc(ecg_adc)
-    ecg = bandpass_filter(ecg, fs)
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    # Werkzeug báo 413 khi đọc body, nhưng các route bắt Exception và sẽ trả 500: kiểm tra trước
+    if (request.content_length or 0) > app.config["MAX_CONTENT_LENGTH"]:
+        return jsonify({"error": f"Upload exceeds {app.config['MAX_CONTENT_LENGTH'] // (1024 * 1024)} MB"}), 413
+    if request.endpoint in MODEL_ENDPOINTS and registry.active is None:
+        return jsonify({"error": "No model version passed the startup self-test"}), 503
 
-    peaks, _ = find_peaks(ecg, distance=int(0.25 * fs))
-    if len(peaks) < 2:
-        return np.array([])
 
-    rr = np.diff(peaks)
-    hb_size = int(np.mean(rr))
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        ecg_metrics.observe_request(request.endpoint or "unmatched", response.status_code,
+                                    time.perf_counter() - started)
+    ecg_metrics.update_rss()
+    # Phiên bản đã phân loại request này, hoặc phiên bản đang chạy nếu request không dùng model
+    model = g.get("model") or registry.active
+    if model is not None:
+        response.headers["X-Model-Version"] = model.version
+        response.headers["X-Model-Backend"] = model.backend
+    return response
 
-    beats = []
-    for p in peaks:
-        s = p - hb_size // 2
-        e = p + hb_size // 2
-        if s < 0 or e > len(ecg):
-            continue
 
-        hb = ecg[s:e]
-        hb = np.pad(hb, (0, max(0, global_size - len(hb))), "constant")[:global_size]
-        hb = resample(hb, int(global_size * new_fs / fs))
-        hb = (hb - hb.mean()) / (hb.std() + 1e-8)
-        beats.append(hb[:150])
+@app.teardown_request
+def release_model(exc):
+    model = g.pop("model", None)
+    if model is not None:
+        registry.release(model)
 
-    return np.array(beats)
 
+MIN_SAMPLE_RATE = 100.0
+MAX_SAMPLE_RATE = 5000.0
 
-# =========================================================
-# LOAD MODEL
-# =========================================================
 
-device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-model = ECGResNet(num_classes=5).to(device)
+def validate_sample_rate(value, default=PIPELINE_FS):
+    """Chuẩn hóa fs; trả về None nếu giá trị không hợp lệ"""
+    if value is None or value == "":
+        return default
+    try:
+        fs = float(value)
+    except (TypeError, ValueError):
+        return None
+    if not MIN_SAMPLE_RATE <= fs <= MAX_SAMPLE_RATE:
+        return None
+    return int(fs) if fs.is_integer() else fs
+
+
+def parse_sample_rate():
+    """
+    Tần số lấy mẫu của request: form/query `fs` hoặc header `X-Sample-Rate`,
+    mặc định PIPELINE_FS. Trả về None nếu giá trị không hợp lệ.
+    """
+    return validate_sample_rate(request.values.get("fs") or request.headers.get("X-Sample-Rate"))
+
+
+def read_ecg_upload(fmt=None):
+    """
+    Đọc tín hiệu ECG của request: multipart `file` (như trước) hoặc toàn bộ body.
+    Định dạng chọn bởi tham số fmt, form/query `format`, header `X-ECG-Format`, Content-Type,
+    phần mở rộng tên file hoặc magic bytes; nén gzip/zstd qua Content-Encoding
+    hoặc magic bytes. Trả về None nếu không có dữ liệu.
+    """
+    fmt = fmt or request.headers.get("X-ECG-Format") or request.args.get("format")
+    file = request.files.get("file")
+    if file is not None:
+        data = file.read()
+        fmt = fmt or request.form.get("format")
+        # Trình duyệt gửi application/octet-stream cho mọi file không rõ loại -> không suy ra nhị phân
+        content_type = file.mimetype if file.mimetype != "application/octet-stream" else None
+        filename = file.filename
+    elif request.mimetype not in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        data = request.get_data(cache=False)
+        content_type = request.mimetype
+        filename = None
+    else:
+        return None
+    if not data:
+        return None
+    return decode_ecg_payload(data, fmt=fmt, content_type=content_type, filename=filename,
+                              content_encoding=request.headers.get("Content-Encoding"))
+
+
+GZIP_MIN_BYTES = int(os.environ.get("ECG_GZIP_MIN_BYTES", "1024"))
+GZIP_LEVEL = int(os.environ.get("ECG_GZIP_LEVEL", "1"))
+
+
+def encoded_response(body, content_type):
+    """Response nhị phân, nén gzip nếu client chấp nhận và body đủ lớn"""
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if len(body) >= GZIP_MIN_BYTES and request.accept_encodings.best_match(["gzip"]):
+        started = time.perf_counter()
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        headers["Content-Encoding"] = "gzip"
+        ecg_metrics.observe_stage("compress", time.perf_counter() - started)
+    return Response(body, content_type=content_type, headers=headers)
+
+
+def prediction_response(default_fields, aliases, fmt=None):
+    """
+    Phần chung của /predict, /predictt và /predict/firebase (fmt: định dạng cố định của route). Tham số form/query:
+        fields: danh sách trường cách nhau bởi dấu phẩy (mặc định: trường cũ của route)
+        arrays: list | f32 | f16 - mã hóa mảng float (f32/f16 = base64, hoặc bytes với MessagePack)
+        rle: 1 - per_beat_predictions dạng run-length {"values", "lengths"}
+    Header Accept: application/msgpack để nhận MessagePack thay vì JSON.
+    """
+    fs = parse_sample_rate()
+    if fs is None:
+        return jsonify({"error": f"Invalid sample rate, expected {MIN_SAMPLE_RATE:g}-{MAX_SAMPLE_RATE:g} Hz"}), 400
+
+    use_msgpack = request.accept_mimetypes.best_match((JSON_TYPE,) + MSGPACK_TYPES) in MSGPACK_TYPES
+    if use_msgpack and load_msgpack() is None:
+        return jsonify({"error": "MessagePack responses require the 'msgpack' package"}), 406
+
+    started = time.perf_counter()
+    try:
+        ecg_adc = read_ecg_upload(fmt)
+    except PayloadError as e:
+        return jsonify({"error": str(e)}), 400
+    ecg_metrics.observe_stage("decode", time.perf_counter() - started)
+    if ecg_adc is None:
+        return jsonify({"error": "No ECG file uploaded"}), 400
+    if len(ecg_adc) == 0:
+        return jsonify({"error": "Empty ECG file"}), 400
+
+    beats, probs = predict_beats(ecg_adc, fs)
+    return result_response(prediction_result(beats, probs), default_fields, aliases, RESULT_FIELDS, use_msgpack)
+
+
+def result_response(result, default_fields, aliases, known, use_msgpack):
+    """Chọn trường và mã hóa kết quả theo tham số fields / arrays / rle của request"""
+    started = time.perf_counter()
+    try:
+        fields = select_fields(result, request.values.get("fields"), default_fields, known, aliases)
+        payload = encode_payload(result, fields,
+                                 arrays=request.values.get("arrays", "list"),
+                                 rle=request.values.get("rle", "").lower() in ("1", "true"),
+                                 binary=use_msgpack)
+        body, content_type = render(payload, use_msgpack)
+    except EncodingError as e:
+        return jsonify({"error": str(e)}), 400
+    ecg_metrics.observe_stage("encode", time.perf_counter() - started)
+    return encoded_response(body, content_type)
 
-model_loaded = False
-try:
-    model.load_state_dict(torch.load("resetECG_new.pth", map_location=device))
-    model.eval()
-    model_loaded = True
-    print(f"✓ Model loaded on {device}")
-except Exception as e:
-    print(f"⚠ Model load failed: {e}")
-    model.eval()
 
+@app.route("/predict", methods=["POST"])
+def predict():
+    try:
+        return prediction_response(PREDICT_FIELDS, PREDICT_ALIASES)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-# =========================================================
-# FLASK API
-# =========================================================
 
-app = Flask(__name__)
-CORS(app)
+@app.route("/predict/firebase", methods=["POST"])
+def predict_firebase():
+    """
+    Body là node ECG/raw của Firebase Realtime Database, gửi thẳng (JSON, có thể nén gzip/zstd):
+    {"chunk_1": "512,514,...", "chunk_2": ...}. Chunk được nối theo số thứ tự (xem ecg_io.decode_chunks),
+    client không phải ghép lại rồi upload file text. Tham số và response như /predict.
+    """
+    try:
+        return prediction_response(PREDICT_FIELDS, PREDICT_ALIASES, fmt="firebase")
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
 
-@app.route("/predict", methods=["POST"])
-def predict():
+MAX_BATCH_RECORDINGS = int(os.environ.get("ECG_BATCH_MAX_RECORDINGS", "10000"))
+BATCH_INFER_SIZE = int(os.environ.get("ECG_BATCH_INFER_SIZE", "256"))
+
+
+def read_batch_upload(default_fs):
+    """
+    Các bản ghi của /predict/batch: một file/body .npz, hoặc nhiều file multipart
+    (fs riêng qua form `fs.<tên file>`). Bản ghi lỗi được trả về với khóa "error".
+    """
+    npz_file = next((f for f in request.files.values() if (f.filename or "").lower().endswith(".npz")), None)
+    if npz_file is not None or (not request.files and request.get_data(cache=True)[:4] == ZIP_MAGIC):
+        data = npz_file.read() if npz_file is not None else request.get_data()
+        return [
+            {"name": name, "signal": signal, "fs": validate_sample_rate(fs, default_fs)}
+            for name, signal, fs in decode_npz(data, request.headers.get("Content-Encoding"))
+        ]
+
+    recordings = []
+    for key, file in request.files.items(multi=True):
+        name = file.filename or key
+        entry = {"name": name, "fs": validate_sample_rate(request.form.get(f"fs.{name}"), default_fs)}
+        try:
+            content_type = file.mimetype if file.mimetype != "application/octet-stream" else None
+            entry["signal"] = decode_ecg_payload(file.read(), fmt=request.form.get("format"),
+                                                 content_type=content_type, filename=file.filename)
+        except PayloadError as e:
+            entry["error"] = str(e)
+        recordings.append(entry)
+    return recordings
+
+
+def classify_in_chunks(beats, chunk_size=BATCH_INFER_SIZE):
+    """Phân loại nhiều beat theo từng batch cố định, nhường batcher cho request khác giữa các batch"""
+    if len(beats) == 0:
+        return np.empty((0, 5), dtype=np.float32)
+    beats = beats.astype(np.float32)
+    return np.concatenate([classify_beats(beats[i:i + chunk_size]) for i in range(0, len(beats), chunk_size)])
+
+
+@app.route("/predict/batch", methods=["POST"])
+def predict_batch():
     try:
-        file = request.files.get("file")
-        if file is None:
-            return jsonify({"error": "No ECG file uploaded"}), 400
-
-        ecg_adc = np.loadtxt(file)
-        if len(ecg_adc) == 0:
-            return jsonify({"error": "Empty ECG file"}), 400
-
-        beats = ecg_to_beats(ecg_adc)
-        if len(beats) == 0:
-            return jsonify({
-                "beats": 0,
-                "per_beat_predictions": [],
-                "beat_confidence": [],
-                "final_prediction": -1
-            })
-
-        X = torch.tensor(beats, dtype=torch.float32).unsqueeze(1).to(device)
-
-        if not model_loaded:
-            return jsonify({
-                "beats": len(beats),
-                "per_beat_predictions": [0] * len(beats),
-                "beat_confidence": [0.0] * len(beats),
-                "final_prediction": 0
-            })
-
-        with torch.no_grad():
-            outputs = model(X)
-            probs = outputs.cpu().numpy()
-            preds = probs.argmax(axis=1)
-
-        final_pred = int(np.bincount(preds).argmax())
-        beat_confidence = probs.max(axis=1).tolist()
-        mean_prob = probs.mean(axis=0)
-
-        return jsonify({
-            "beats": len(preds),
-            "per_beat_predictions": preds.tolist(),
-            "beat_confidence": beat_confidence,
-            "final_prediction": final_pred,
-            "class_confidence": mean_prob.tolist(),
-            "confidence": float(mean_prob[final_pred])
+        default_fs = parse_sample_rate()
+        if default_fs is None:
+            return jsonify({"error": f"Invalid sample rate, expected {MIN_SAMPLE_RATE:g}-{MAX_SAMPLE_RATE:g} Hz"}), 400
+
+        started = time.perf_counter()
+        try:
+            recordings = read_batch_upload(default_fs)
+        except PayloadError as e:
+            return jsonify({"error": str(e)}), 400
+        ecg_metrics.observe_stage("decode", time.perf_counter() - started)
+        if not recordings:
+            return jsonify({"error": "No ECG recordings uploaded"}), 400
+        if len(recordings) > MAX_BATCH_RECORDINGS:
+            return jsonify({"error": f"Too many recordings, max {MAX_BATCH_RECORDINGS}"}), 413
+
+        for r in recordings:
+            if "error" in r:
+                continue
+            if r["fs"] is None:
+                r["error"] = f"Invalid sample rate, expected {MIN_SAMPLE_RATE:g}-{MAX_SAMPLE_RATE:g} Hz"
+            elif len(r["signal"]) == 0:
+                r["error"] = "Empty ECG file"
+            elif len(r["signal"]) < r["fs"]:
+                r["error"] = "Recording shorter than 1 second"
+
+        valid = [r for r in recordings if "error" not in r]
+        timings = {}
+        to_beats_many = dsp_pool.ecg_to_beats_many if dsp_pool else ecg_to_beats_many
+        beats_list = to_beats_many([r["signal"] for r in valid], [r["fs"] for r in valid], timings=timings)
+        counts = [len(b) for b in beats_list]
+        non_empty = [b for b in beats_list if len(b)]
+        started = time.perf_counter()
+        probs = classify_in_chunks(np.concatenate(non_empty) if non_empty else np.empty((0, 150)))
+        timings["inference"] = time.perf_counter() - started
+        ecg_metrics.observe_stages(timings)
+        for count in counts:
+            ecg_metrics.observe_beats(count)
+
+        started = time.perf_counter()
+        offsets = np.concatenate([[0], np.cumsum(counts)])
+        for r, beats, start, end in zip(valid, beats_list, offsets[:-1], offsets[1:]):
+            r["result"] = summarize_predictions(beats, probs[start:end])
+
+        results = []
+        for r in recordings:
+            item = {"name": r["name"], "fs": r["fs"]}
+            if "error" in r:
+                item["error"] = r["error"]
+            else:
+                item.update(r["result"])
+            results.append(item)
+
+        response = jsonify({
+            "recordings": len(results),
+            "total_beats": int(offsets[-1]),
+            "results": results
         })
+        ecg_metrics.observe_stage("encode", time.perf_counter() - started)
+        return response
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
-    
-    
 
 
 @app.route("/predictt", methods=["POST"])
 def predict_with_beats():
     try:
-        file = request.files.get("file")
-        if file is None:
-            return jsonify({"error": "No ECG file uploaded"}), 400
-
-        ecg_adc = np.loadtxt(file)
-        if len(ecg_adc) == 0:
-            return jsonify({"error": "Empty ECG file"}), 400
-
-        beats = ecg_to_beats(ecg_adc)
-        if len(beats) == 0:
-            return jsonify({
-                "beats": 0,
-                "per_beat_predictions": [],
-                "beat_confidence": [],
-                "final_prediction": -1
-            })
-
-        X = torch.tensor(beats, dtype=torch.float32).unsqueeze(1).to(device)
-
-        if not model_loaded:
-            return jsonify({
-                "beats": len(beats),
-                "per_beat_predictions": [0] * len(beats),
-                "beat_confidence": [0.0] * len(beats),
-                "final_prediction": 0
-            })
-
-        with torch.no_grad():
-            outputs = model(X)
-            probs = outputs.cpu().numpy()
-            preds = probs.argmax(axis=1)
-
-        final_pred = int(np.bincount(preds).argmax())
-        beat_confidence = probs.max(axis=1).tolist()
-        mean_prob = probs.mean(axis=0)
+        return prediction_response(PREDICTT_FIELDS, PREDICTT_ALIASES)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        return jsonify({
-                "num_beats": len(beats),
-                "beats": beats.tolist(),                 # [N, beat_len]
-                "per_beat_predictions": preds.tolist(),  # [N]
-                "per_beat_confidence": beat_confidence,  # [N]
-                "final_prediction": final_pred
-            })
 
+# =========================================================
+# HOLTER (BẢN GHI DÀI)
+# =========================================================
+
+# Thư mục cho file tạm của /predict/holter (upload + tín hiệu đã lọc ~ 10 byte / mẫu)
+HOLTER_TMPDIR = os.environ.get("ECG_HOLTER_TMPDIR") or None
+
+HOLTER_FIELDS = ["num_beats", "duration_s", "beat_samples", "per_beat_predictions", "beat_confidence",
+                 "final_prediction", "class_confidence", "confidence"]
+HOLTER_RESULT_FIELDS = tuple(f for f in RESULT_FIELDS if f != "beats") + ("duration_s", "beat_samples")
+
+
+def spool_ecg_upload(workdir):
+    """
+    Như read_ecg_upload nhưng chép upload ra file trong workdir theo từng khối và mở qua
+    memory map thay vì đọc vào RAM. Trả về ecg_io.Recording, hoặc None nếu không có dữ liệu.
+    """
+    fmt = request.headers.get("X-ECG-Format") or request.args.get("format")
+    file = request.files.get("file")
+    if file is not None:
+        stream = file.stream
+        fmt = fmt or request.form.get("format")
+        content_type = file.mimetype if file.mimetype != "application/octet-stream" else None
+        filename = file.filename
+    elif request.mimetype not in ("multipart/form-data", "application/x-www-form-urlencoded"):
+        stream = request.stream
+        content_type = request.mimetype
+        filename = None
+    else:
+        return None
+    path = os.path.join(workdir, "upload")
+    if not spool_payload(stream, path, request.headers.get("Content-Encoding")):
+        return None
+    return open_recording(path, fmt=fmt, content_type=content_type, filename=filename)
+
+
+@app.route("/predict/holter", methods=["POST"])
+def predict_holter():
+    """
+    Bản ghi dài (Holter 24 giờ): bộ nhớ không phụ thuộc độ dài bản ghi. DSP chạy theo đoạn
+    (song song trên pool DSP nếu bật ECG_DSP_WORKERS), beat của mỗi đoạn được phân loại rồi
+    bỏ đi ngay. Không trả beats; beat_samples là vị trí R-peak (chỉ số mẫu ở fs của bản ghi).
+    Tham số fs / format / fields / arrays / rle / Accept như /predict; không dùng cache dự đoán.
+    """
+    try:
+        fs = parse_sample_rate()
+        if fs is None:
+            return jsonify({"error": f"Invalid sample rate, expected {MIN_SAMPLE_RATE:g}-{MAX_SAMPLE_RATE:g} Hz"}), 400
+        use_msgpack = request.accept_mimetypes.best_match((JSON_TYPE,) + MSGPACK_TYPES) in MSGPACK_TYPES
+        if use_msgpack and load_msgpack() is None:
+            return jsonify({"error": "MessagePack responses require the 'msgpack' package"}), 406
+
+        timings = {}
+        peaks, probs = [], []
+        with tempfile.TemporaryDirectory(prefix="ecg-holter-", dir=HOLTER_TMPDIR) as workdir:
+            started = time.perf_counter()
+            try:
+                recording = spool_ecg_upload(workdir)
+            except PayloadError as e:
+                return jsonify({"error": str(e)}), 400
+            ecg_metrics.observe_stage("decode", time.perf_counter() - started)
+            if recording is None:
+                return jsonify({"error": "No ECG file uploaded"}), 400
+            if recording.length < fs:
+                return jsonify({"error": "Recording shorter than 1 second"}), 400
+
+            for segment_peaks, beats in segment_beats(recording, fs, workdir, pool=dsp_pool, timings=timings):
+                started = time.perf_counter()
+                probs.append(classify_in_chunks(beats))
+                timings["inference"] = timings.get("inference", 0.0) + time.perf_counter() - started
+                peaks.append(segment_peaks)
+
+        ecg_metrics.observe_stages(timings)
+        probs = np.concatenate(probs) if probs else np.empty((0, 5), dtype=np.float32)
+        ecg_metrics.observe_beats(len(probs))
+        result = {
+            "num_beats": len(probs),
+            "duration_s": recording.length / fs,
+            "beat_samples": to_input_samples(np.concatenate(peaks), fs) if peaks else np.empty(0, dtype=np.int64),
+            **classification_result(probs),
+            "model_version": current_model().version,
+        }
+        return result_response(result, HOLTER_FIELDS, {}, HOLTER_RESULT_FIELDS, use_msgpack)
 
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 
+# =========================================================
+# STREAMING
+# =========================================================
+
+def read_stream_chunk():
+    """
+    Chunk mẫu: JSON {"samples": [...]}, text các số cách nhau bởi dấu phẩy/xuống dòng,
+    hoặc nhị phân int16/uint16/.npy như /predict (chọn bằng Content-Type / X-ECG-Format)
+    """
+    if request.is_json:
+        body = request.get_json(silent=True)
+        if not isinstance(body, dict):
+            raise PayloadError('JSON chunk must be an object {"samples": [...]}')
+        samples = body.get("samples", [])
+        if not isinstance(samples, list):
+            raise PayloadError('"samples" must be a list of numbers')
+        try:
+            samples = np.asarray(samples, dtype=np.float64)
+        except (TypeError, ValueError):
+            raise PayloadError('"samples" must be a list of numbers') from None
+        if samples.ndim != 1:
+            raise PayloadError('"samples" must be a list of numbers')
+        return samples
+    fmt = request.headers.get("X-ECG-Format") or request.args.get("format")
+    data = decompress(request.get_data(cache=False), request.headers.get("Content-Encoding"))
+    if fmt or data[:6] == NPY_MAGIC or CONTENT_TYPES.get(request.mimetype, "text") != "text":
+        return decode_ecg_payload(data, fmt=fmt, content_type=request.mimetype)
+    return np.array(data.decode().replace(",", " ").split(), dtype=np.float64)
+
+
+@app.route("/stream", methods=["POST"])
+def stream_open():
+    fs = parse_sample_rate()
+    if fs is None:
+        return jsonify({"error": f"Invalid sample rate, expected {MIN_SAMPLE_RATE:g}-{MAX_SAMPLE_RATE:g} Hz"}), 400
+    try:
+        session = stream_sessions.create(fs)
+    except RuntimeError as e:
+        return jsonify({"error": str(e)}), 503
+    return jsonify({"session_id": session.id, "fs": fs}), 201
+
+
+@app.route("/stream/<session_id>", methods=["POST"])
+def stream_chunk(session_id):
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown stream session"}), 404
+    try:
+        samples = read_stream_chunk()
+    except (PayloadError, ValueError) as e:
+        return jsonify({"error": str(e)}), 400
+    try:
+        beats = session.feed(samples)
+        return jsonify({
+            "samples_received": session.extractor.samples_in,
+            "total_beats": session.beat_count,
+            "beats": beats
+        })
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/stream/<session_id>/events", methods=["GET"])
+def stream_events(session_id):
+    session = stream_sessions.get(session_id)
+    if session is None:
+        return jsonify({"error": "Unknown stream session"}), 404
+
+    def generate():
+        for item in session.events():
+            if item is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield f"event: beat\ndata: {json.dumps(item)}\n\n"
+        yield f"event: end\ndata: {json.dumps({'total_beats': session.beat_count})}\n\n"
+
+    return Response(generate(), mimetype="text/event-stream",
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route("/stream/<session_id>", methods=["DELETE"])
+def stream_close(session_id):
+    closed = stream_sessions.close(session_id)
+    if closed is None:
+        return jsonify({"error": "Unknown stream session"}), 404
+    session, beats = closed
+    return jsonify({
+        "samples_received": session.extractor.samples_in,
+        "total_beats": session.beat_count,
+        "beats": beats
+    })
+
+
+@app.route("/stats/batcher", methods=["GET"])
+def batcher_stats():
+    """Batcher của phiên bản đang chạy"""
+    model = registry.active
+    if model is None:
+        return jsonify({"error": "No model version passed the startup self-test"}), 503
+    return jsonify({"model_version": model.version, **model.batcher.stats()})
+
+
+@app.route("/stats/cache", methods=["GET"])
+def cache_stats():
+    return jsonify(prediction_cache.stats())
+
+
+@app.route("/stats/dsp", methods=["GET"])
+def dsp_stats():
+    return jsonify(dsp_cache_info())
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Metrics dạng text của Prometheus (cần prometheus_client)"""
+    if not ecg_metrics.ENABLED:
+        return jsonify({"error": "Metrics require the 'prometheus_client' package"}), 501
+    body, content_type = ecg_metrics.render()
+    return Response(body, content_type=content_type)
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Readiness (khác /health = liveness): 200 khi model đã nạp và warmup xong, 503 nếu chưa"""
+    model = registry.active
+    body = {**startup, "pid": os.getpid(), "backend": model.backend if model else MODEL_BACKEND,
+            "model_version": model and model.version, "uptime_s": process_age()}
+    return jsonify(body), 200 if startup["ready"] else 503
+
+
 @app.route("/health", methods=["GET"])
 def health():
+    model = registry.active
     return jsonify({
         "status": "ok",
-        "device": str(device)
+        "device": str(device),
+        "backend": model.backend if model else MODEL_BACKEND,
+        "model_version": model and model.version,
+        "qrs_detector": QRS_DETECTOR,
+        "pid": os.getpid(),
+        "torch_threads": torch.get_num_threads()
     })
 
 
+# =========================================================
+# QUẢN LÝ PHIÊN BẢN MODEL
+# =========================================================
+
+def resolve_model_path(name):
+    """Đường dẫn tuyệt đối của file .pth trong MODEL_DIR; None nếu không hợp lệ"""
+    if not isinstance(name, str) or not name:
+        return None
+    path = os.path.realpath(os.path.join(MODEL_DIR, name))
+    if not path.startswith(MODEL_DIR + os.sep) or not path.endswith(".pth") or not os.path.isfile(path):
+        return None
+    return path
+
+
+def write_model_control(path, backend):
+    """Ghi file điều khiển (thay nguyên file) để mọi worker cùng nạp checkpoint"""
+    tmp = f"{MODEL_CONTROL}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump({"path": path, "backend": backend, "requested_at": round(time.time(), 3)}, f)
+    os.replace(tmp, MODEL_CONTROL)
+
+
+@app.route("/models", methods=["GET"])
+def list_models():
+    """Phiên bản đang chạy, các phiên bản trong bộ nhớ (kết quả self-test, warmup) và các lần nạp gần đây"""
+    return jsonify({**registry.info(), "pid": os.getpid(), "control_file": MODEL_CONTROL})
+
+
+@app.route("/models", methods=["POST"])
+def load_model_version():
+    """
+    Nạp checkpoint ở nền rồi chuyển traffic sang nếu qua self-test: JSON {"path": "resetECG.pth", "backend": "eager"}.
+    Phiên bản đã có trong bộ nhớ được kích hoạt ngay (quay lại phiên bản cũ). Cần header X-Admin-Token.
+    Với ECG_MODEL_CONTROL, yêu cầu được ghi vào file điều khiển và mọi worker tự nạp.
+    """
+    if not ADMIN_TOKEN:
+        return jsonify({"error": "Model management is disabled, set ECG_ADMIN_TOKEN"}), 403
+    if not hmac.compare_digest(request.headers.get("X-Admin-Token", ""), ADMIN_TOKEN):
+        return jsonify({"error": "Invalid admin token"}), 401
+    body = request.get_json(silent=True) or {}
+    backend = body.get("backend", MODEL_BACKEND)
+    if backend not in BACKENDS:
+        return jsonify({"error": f"Unknown backend '{backend}' (expected one of {', '.join(BACKENDS)})"}), 400
+    path = resolve_model_path(body.get("path"))
+    if path is None:
+        return jsonify({"error": "path must name an existing .pth file in the model directory"}), 400
+
+    if MODEL_CONTROL:
+        write_model_control(path, backend)
+        return jsonify({"status": "scheduled", "path": path, "backend": backend, "control_file": MODEL_CONTROL}), 202
+    return jsonify(registry.load_async(path, backend)), 202
+
+
+# =========================================================
+# WARMUP
+# =========================================================
+
+# sync: warmup xong mới import xong | background: warmup trong thread, /ready trả 503 tới khi xong | off
+WARMUP = os.environ.get("ECG_WARMUP", "sync")
+WARMUP_FS = [float(v) for v in os.environ.get("ECG_WARMUP_FS", "250,360").split(",") if v]
+WARMUP_BATCHES = [int(v) for v in os.environ.get("ECG_WARMUP_BATCHES", "1,32,256").split(",") if v]
+# Phiên bản nạp sau (POST /models) cũng được warmup trước khi nhận traffic
+registry.warmup_batches = WARMUP_BATCHES if WARMUP != "off" else []
+
+
+def synthetic_ecg(fs, seconds=10, heart_rate=75):
+    """Chuỗi xung giống QRS quanh mức ADC 512 - đủ để bộ tách beat tìm thấy đỉnh"""
+    t = np.arange(int(seconds * fs)) / fs
+    phase = t % (60.0 / heart_rate) - 0.3
+    return (512 + 300 * np.exp(-phase ** 2 / (2 * 0.012 ** 2))).astype(np.int16)
+
+
+def warmup_dsp():
+    """Tạo sẵn plan DSP (bộ lọc, ma trận resample) cho các fs thường gặp"""
+    timings = {}
+    for fs in WARMUP_FS:
+        started = time.perf_counter()
+        ecg_to_beats(synthetic_ecg(fs), fs=fs)
+        timings[f"dsp_{fs:g}hz_ms"] = elapsed_ms(started)
+    return timings
+
+
+def warmup_forward():
+    """
+    Self-test các checkpoint đã nạp rồi forward với các batch size đại diện, mỗi size 2 lần (kernel
+    oneDNN được tạo theo shape, TorchScript chỉ tối ưu graph từ lần chạy thứ 2). Phiên bản đầu tiên
+    qua self-test được kích hoạt. ECG_WARMUP=off: chỉ self-test.
+    """
+    for path, error in registry.verify_pending():
+        startup.setdefault("model_errors", {})[path] = error
+    model = registry.active
+    if model is None:
+        startup["error"] = "no model version passed the startup self-test"
+        return {}
+    startup["self_test"] = model.self_test
+    return model.warmup
+
+
+def warm_up(dsp=True, forward=True):
+    """
+    Chạy các bước warmup (DSP bỏ qua nếu ECG_WARMUP=off). Sau bước forward process được đánh dấu
+    sẵn sàng: /ready trả 200 nếu có phiên bản model qua self-test và warmup không lỗi.
+    """
+    started = time.perf_counter()
+    try:
+        if dsp and WARMUP != "off":
+            startup["warmup"].update(warmup_dsp())
+        if forward:
+            startup["warmup"].update(warmup_forward())
+    except Exception as e:
+        print(f"⚠ Warmup failed: {e}")
+        startup["error"] = f"warmup failed: {e}"
+        return
+    startup["warmup_ms"] = round(startup.get("warmup_ms", 0) + elapsed_ms(started), 1)
+    if forward:
+        startup["ready_s"] = process_age()
+        startup["ready"] = registry.active is not None and "error" not in startup
+        if startup["ready"]:
+            print(f"✓ Ready in {startup['ready_s']}s (warmup {startup['warmup_ms']:.0f} ms)")
+        else:
+            print(f"⚠ Not ready: {startup.get('error')}")
+
+
+def start_serving():
+    """
+    Server một process. Pool DSP được fork trước forward đầu tiên (self-test) của torch: forward tạo
+    thread pool OpenMP/oneDNN, fork khi các thread đó tồn tại có thể làm worker bị treo. Ở chế độ sync
+    warmup DSP chạy trước fork để worker thừa hưởng plan đã tạo.
+    """
+    if WARMUP == "background":
+        # Fork trước khi có thread warmup (fork khi thread khác đang chạy có thể deadlock)
+        if dsp_pool is not None:
+            dsp_pool.start()
+        threading.Thread(target=warm_up, name="ecg-warmup", daemon=True).start()
+    else:
+        warm_up(forward=False)
+        if dsp_pool is not None:
+            dsp_pool.start()
+        warm_up(dsp=False)
+    if MODEL_CONTROL:
+        registry.watch(MODEL_CONTROL, MODEL_CONTROL_INTERVAL)
+
+
+# Pre-fork server: gunicorn.conf.py gọi warm_up trong master (DSP) và init_worker trong worker (forward)
+if not PREFORK:
+    start_serving()
+
+
+# =========================================================
+# PRE-FORK SERVER (gunicorn.conf.py)
+# =========================================================
+
+def share_weights():
+    """
+    Gọi trong master trước khi fork: chuyển trọng số torch sang shared memory để mọi
+    worker dùng chung một bản (không bị copy-on-write khi worker chạm vào tensor).
+    """
+    for module in registry.modules():
+        module.share_memory()
+
+
+def init_worker(threads):
+    """
+    Gọi trong mỗi worker ngay sau fork: thread torch, session ONNX Runtime, pool DSP riêng, self-test
+    và warmup forward. Worker chỉ nhận kết nối sau khi hàm này trả về (kết nối đến sớm chờ trong backlog).
+    """
+    # Pool DSP fork trước khi session ONNX Runtime / forward torch tạo thread pool
+    if dsp_pool is not None:
+        dsp_pool.start()
+    torch.set_num_threads(threads)
+    # Thread pool của ONNX Runtime không sống sót qua fork -> tạo session mới trong worker
+    registry.rebuild(threads)
+    # Forward trong từng worker, không trong master: OpenMP của torch không an toàn khi fork
+    warm_up(dsp=False)
+    if MODEL_CONTROL:
+        registry.watch(MODEL_CONTROL, MODEL_CONTROL_INTERVAL)
+    ecg_metrics.update_rss(force=True)
+
+
+def shutdown_worker():
+    """Gọi khi worker dừng (sau khi các request đang xử lý đã xong): xử lý nốt hàng đợi batcher"""
+    registry.close()
+    if dsp_pool is not None:
+        dsp_pool.close()
+
+
 if __name__ == "__main__":
-    app.run(host="0.0.0.0", port=5001, debug=True)
+    # Không dùng reloader: start_serving() chạy lúc import, process cha của reloader sẽ nạp + self-test model,
+    # fork pool DSP và warmup lần nữa chỉ để theo dõi file
+    app.run(host="0.0.0.0", port=5001, debug=True, use_reloader=False)
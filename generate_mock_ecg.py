@@ -4,12 +4,12 @@ Sử dụng khi không có thiết bị đo thật
 """
 
 import numpy as np
-import firebase_admin
-from firebase_admin import credentials, db
 import time
 import json
 import os
 
+from ecg_synth import synthesize
+
 # ==================== GENERATE ECG DATA ====================
 
 def generate_normal_ecg(num_points=5000, sample_rate=360, heart_rate=72):
@@ -21,52 +21,9 @@ def generate_normal_ecg(num_points=5000, sample_rate=360, heart_rate=72):
         sample_rate: Tần số lấy mẫu (Hz)
         heart_rate: Nhịp tim (BPM)
     """
-    t = np.linspace(0, num_points / sample_rate, num_points)
-    
-    # Tần số tim (Hz)
-    f_heart = heart_rate / 60.0
-    
-    # Tạo tín hiệu ECG giả bằng cách kết hợp các thành phần
-    # QRS complex (nhịp tim)
-    qrs = np.zeros_like(t)
-    rr_interval = 1.0 / f_heart
-    num_beats = int(t[-1] / rr_interval)
-    
-    for i in range(num_beats):
-        beat_time = i * rr_interval
-        # QRS complex
-        qrs_mask = (t >= beat_time) & (t < beat_time + 0.1)
-        qrs[qrs_mask] = 2.0 * np.exp(-((t[qrs_mask] - beat_time - 0.05) / 0.02) ** 2)
-        
-        # P wave (nhỏ hơn, trước QRS)
-        p_mask = (t >= beat_time - 0.15) & (t < beat_time - 0.05)
-        qrs[p_mask] += 0.3 * np.exp(-((t[p_mask] - beat_time + 0.1) / 0.03) ** 2)
-        
-        # T wave (sau QRS)
-        t_mask = (t >= beat_time + 0.15) & (t < beat_time + 0.35)
-        qrs[t_mask] += 0.5 * np.exp(-((t[t_mask] - beat_time - 0.25) / 0.05) ** 2)
-    
-    # Thêm noise nhẹ
-    noise = np.random.normal(0, 0.05, num_points)
-    
-    # Thêm baseline drift
-    baseline = 0.1 * np.sin(2 * np.pi * 0.5 * t)
-    
-    # Kết hợp
-    ecg = qrs + noise + baseline
-    
-    # Convert sang ADC values (0-1023), center tại 512
-    adc_min = 0
-    adc_max = 1023
-    adc_center = 512
-    adc_range = 200  # Range của ECG signal trong ADC
-    
-    # Normalize và scale
-    ecg_normalized = (ecg - np.min(ecg)) / (np.max(ecg) - np.min(ecg) + 1e-8)
-    ecg_adc = adc_center + (ecg_normalized - 0.5) * adc_range
-    ecg_adc = np.clip(ecg_adc, adc_min, adc_max)
-    
-    return ecg_adc.astype(int)
+    # Bộ sinh vector hóa (ecg_synth), dùng trạng thái np.random toàn cục như trước:
+    # np.random.seed(...) rồi gọi hàm này vẫn cho cùng tín hiệu
+    return synthesize(num_points, sample_rate, heart_rate, kind="normal", seed=np.random)
 
 
 def generate_abnormal_ecg(num_points=5000, sample_rate=360, heart_rate=48, abnormality='arrhythmia'):
@@ -79,58 +36,9 @@ def generate_abnormal_ecg(num_points=5000, sample_rate=360, heart_rate=48, abnor
         heart_rate: Nhịp tim (BPM) - có thể thấp hơn bình thường
         abnormality: Loại bất thường ('arrhythmia', 'tachycardia', 'bradycardia')
     """
-    t = np.linspace(0, num_points / sample_rate, num_points)
-    
-    # Tần số tim (Hz)
-    f_heart = heart_rate / 60.0
-    
-    # Tạo tín hiệu ECG
-    qrs = np.zeros_like(t)
-    rr_interval = 1.0 / f_heart
-    num_beats = int(t[-1] / rr_interval)
-    
-    for i in range(num_beats):
-        # Thêm biến thiên nhịp tim nếu là arrhythmia
-        if abnormality == 'arrhythmia':
-            variation = np.random.uniform(-0.1, 0.1)
-            beat_time = i * rr_interval + variation
-        else:
-            beat_time = i * rr_interval
-        
-        if beat_time < 0 or beat_time > t[-1]:
-            continue
-            
-        # QRS complex
-        qrs_mask = (t >= beat_time) & (t < beat_time + 0.12)
-        qrs[qrs_mask] = 2.5 * np.exp(-((t[qrs_mask] - beat_time - 0.06) / 0.025) ** 2)
-        
-        # P wave không rõ ràng (bất thường)
-        if abnormality in ['arrhythmia', 'bradycardia']:
-            p_mask = (t >= beat_time - 0.2) & (t < beat_time - 0.08)
-            qrs[p_mask] += 0.2 * np.exp(-((t[p_mask] - beat_time + 0.14) / 0.04) ** 2)
-        
-        # T wave lớn hơn (có thể bất thường)
-        t_mask = (t >= beat_time + 0.2) & (t < beat_time + 0.4)
-        qrs[t_mask] += 0.6 * np.exp(-((t[t_mask] - beat_time - 0.3) / 0.06) ** 2)
-    
-    # Thêm noise nhiều hơn
-    noise = np.random.normal(0, 0.1, num_points)
-    
-    # Baseline drift mạnh hơn
-    baseline = 0.2 * np.sin(2 * np.pi * 0.3 * t)
-    
-    # Kết hợp
-    ecg = qrs + noise + baseline
-    
-    # Convert sang ADC values
-    adc_center = 512
-    adc_range = 250
-    
-    ecg_normalized = (ecg - np.min(ecg)) / (np.max(ecg) - np.min(ecg) + 1e-8)
-    ecg_adc = adc_center + (ecg_normalized - 0.5) * adc_range
-    ecg_adc = np.clip(ecg_adc, 0, 1023)
-    
-    return ecg_adc.astype(int)
+    if abnormality not in ('arrhythmia', 'tachycardia', 'bradycardia'):
+        raise ValueError(f"Unknown abnormality: {abnormality!r}")
+    return synthesize(num_points, sample_rate, heart_rate, kind=abnormality, seed=np.random)
 
 
 def load_ecg_from_file(filename='ecg_12s.txt'):
@@ -159,6 +67,10 @@ def load_ecg_from_file(filename='ecg_12s.txt'):
 
 def init_firebase():
     """Initialize Firebase Admin SDK"""
+    # firebase_admin không có trong requirements.txt: chỉ import khi thật sự dùng,
+    # để các bộ sinh ở trên (benchmarks, export_model, ...) chạy được khi không cài
+    import firebase_admin
+    
     try:
         # Kiểm tra xem đã initialize chưa
         firebase_admin.get_app()
@@ -183,31 +95,15 @@ def init_firebase():
 
 # ==================== PUSH TO FIREBASE ====================
 
-def push_to_firebase_rest(ecg_data, chunk_size=100, database_url='https://heartecg-4e084-default-rtdb.firebaseio.com'):
+def push_to_firebase_rest(ecg_data, chunk_size=100, database_url=None):
     """
-    Push ECG data lên Firebase bằng REST API
+    Push ECG data lên Firebase bằng REST API (ecg_uploader, thay nội dung ECG/raw)
     
     Args:
         ecg_data: Mảng số ECG data
         chunk_size: Kích thước mỗi chunk
-        database_url: URL của Firebase Realtime Database
+        database_url: URL của Firebase Realtime Database (None = FIREBASE_DATABASE_URL / mặc định)
     """
-    import requests
-    
-    # Chia thành chunks
-    chunks = {}
-    num_chunks = (len(ecg_data) + chunk_size - 1) // chunk_size
-    
-    for i in range(num_chunks):
-        start_idx = i * chunk_size
-        end_idx = min((i + 1) * chunk_size, len(ecg_data))
-        chunk_data = ecg_data[start_idx:end_idx]
-        
-        # Convert sang string với dấu phẩy
-        chunk_str = ','.join(map(str, chunk_data))
-        chunks[f'chunk_{i+1}'] = chunk_str
-    
-    # Push lên Firebase
     # LƯU Ý: Firebase rules phải cho phép write
     # Trong Firebase Console, vào Realtime Database > Rules, set:
     # {
@@ -218,19 +114,20 @@ def push_to_firebase_rest(ecg_data, chunk_size=100, database_url='https://hearte
     #     }
     #   }
     # }
-    
-    url = f"{database_url}/ECG/raw.json"
+    # Giả lập thiết bị đo (gửi dần theo tốc độ lấy mẫu): python simulate_device.py
+    import requests
+    from ecg_uploader import RTDBUploader
     
     try:
-        response = requests.put(url, json=chunks, params={'print': 'silent'})
-        if response.status_code == 200:
-            print(f"✅ Đã push {num_chunks} chunks lên Firebase thành công!")
-            print(f"   Tổng số điểm dữ liệu: {len(ecg_data)}")
-            return True
-        else:
-            print(f"❌ Lỗi khi push lên Firebase: {response.status_code}")
-            print(f"   Response: {response.text}")
-            return False
+        with RTDBUploader(database_url) as uploader:
+            stats = uploader.upload(ecg_data, chunk_size=chunk_size)
+        print(f"✅ Đã push {stats.chunks} chunks lên Firebase thành công!")
+        print(f"   Tổng số điểm dữ liệu: {len(ecg_data)}")
+        return True
+    except requests.HTTPError as e:
+        print(f"❌ Lỗi khi push lên Firebase: {e.response.status_code}")
+        print(f"   Response: {e.response.text}")
+        return False
     except Exception as e:
         print(f"❌ Lỗi khi kết nối Firebase: {str(e)}")
         print("   Hãy kiểm tra:")
@@ -0,0 +1,102 @@
+"""
+Chế độ production: gunicorn pre-fork nhiều worker.
+
+    gunicorn -c gunicorn.conf.py flask_api_fixed:app
+    (hoặc ./start_flask.sh prod)
+
+Model được nạp một lần trong master (preload_app), trọng số chuyển sang shared
+memory rồi mới fork, nên mỗi worker thêm gần như không tốn bộ nhớ cho trọng số.
+Số thread torch của mỗi worker = số core / số worker để các worker không tranh core.
+
+Biến môi trường:
+    ECG_BIND               địa chỉ lắng nghe (mặc định 0.0.0.0:5001)
+    ECG_WORKERS            số worker (mặc định = số core)
+    ECG_THREADS            số thread xử lý request mỗi worker (mặc định 8)
+    ECG_TORCH_THREADS      số thread torch mỗi worker (mặc định core / worker)
+    ECG_GRACEFUL_TIMEOUT   thời gian (giây) chờ request đang chạy khi restart (mặc định 30)
+    ECG_MAX_REQUESTS       tự restart worker sau N request (mặc định 0 = không)
+    ECG_PRELOAD            0 = mỗi worker tự nạp model (chỉ để so sánh bộ nhớ)
+    PROMETHEUS_MULTIPROC_DIR  thư mục file metrics của các worker (mặc định: thư mục tạm mới)
+"""
+
+import gc
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
+
+# Báo cho flask_api_fixed (được preload sau file này) biết đang chạy dưới master pre-fork
+os.environ["ECG_PREFORK"] = "1"
+
+# /metrics cộng gộp mọi worker qua file trong thư mục này (phải đặt trước khi import prometheus_client).
+# File của lần chạy trước phải được xóa, nếu không counter sẽ cộng dồn cả số liệu cũ. File này được
+# chạy lại mỗi lần SIGHUP nên chỉ chuẩn bị thư mục ở lần đầu (biến môi trường của master vẫn còn).
+if not os.environ.get("ECG_METRICS_DIR_READY"):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        os.makedirs(os.environ["PROMETHEUS_MULTIPROC_DIR"], exist_ok=True)
+        for path in glob.glob(os.path.join(os.environ["PROMETHEUS_MULTIPROC_DIR"], "*.db")):
+            os.remove(path)
+    else:
+        os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="ecg-metrics-")
+        os.environ["ECG_METRICS_TEMP_DIR"] = os.environ["PROMETHEUS_MULTIPROC_DIR"]
+    os.environ["ECG_METRICS_DIR_READY"] = "1"
+
+cores = multiprocessing.cpu_count()
+
+bind = os.environ.get("ECG_BIND", "0.0.0.0:5001")
+workers = int(os.environ.get("ECG_WORKERS", "0")) or cores
+# gthread: nhiều request đồng thời trong một worker -> MicroBatcher gom được batch
+worker_class = "gthread"
+threads = int(os.environ.get("ECG_THREADS", "8"))
+preload_app = os.environ.get("ECG_PRELOAD", "1") == "1"
+
+# SIGHUP / SIGTERM: worker ngừng nhận kết nối mới, chờ request đang chạy tối đa graceful_timeout
+graceful_timeout = int(os.environ.get("ECG_GRACEFUL_TIMEOUT", "30"))
+timeout = 120
+keepalive = 5
+max_requests = int(os.environ.get("ECG_MAX_REQUESTS", "0"))
+max_requests_jitter = max_requests // 10
+
+torch_threads = int(os.environ.get("ECG_TORCH_THREADS", "0")) or max(1, cores // workers)
+
+
+def when_ready(server):
+    # Master, sau preload và trước khi fork worker đầu tiên
+    if not preload_app:
+        return
+    import flask_api_fixed
+
+    # Plan DSP tạo trong master được mọi worker thừa hưởng; forward warmup chạy trong từng worker
+    flask_api_fixed.warm_up(forward=False)
+    flask_api_fixed.share_weights()
+    # RSS của master (trọng số dùng chung) cũng xuất hiện trong /metrics
+    flask_api_fixed.ecg_metrics.update_rss(force=True)
+    # Đưa mọi object hiện có ra khỏi GC: GC của worker không ghi vào các trang nhớ dùng chung
+    gc.freeze()
+    server.log.info("Preloaded model (%s backend), %d workers x %d torch threads",
+                    flask_api_fixed.MODEL_BACKEND, workers, torch_threads)
+
+
+def post_fork(server, worker):
+    import flask_api_fixed
+
+    flask_api_fixed.init_worker(torch_threads)
+
+
+def worker_exit(server, worker):
+    import flask_api_fixed
+
+    flask_api_fixed.shutdown_worker()
+
+
+def child_exit(server, worker):
+    # Master: gauge của worker đã thoát không còn được cộng vào /metrics
+    import ecg_metrics
+
+    ecg_metrics.mark_process_dead(worker.pid)
+
+
+def on_exit(server):
+    if os.environ.get("ECG_METRICS_TEMP_DIR"):
+        shutil.rmtree(os.environ["ECG_METRICS_TEMP_DIR"], ignore_errors=True)
@@ -9,6 +9,9 @@ import time
 import sys
 import io
 
+from ecg_synth import synthesize
+from ecg_uploader import RTDBUploader
+
 # Fix encoding cho Windows PowerShell
 if sys.platform == 'win32':
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8', errors='replace')
@@ -20,146 +23,33 @@ def generate_good_ecg(num_points=10000, heart_rate=72, sample_rate=360):
     """
     print(f"Generating ECG: {num_points} points, {heart_rate} BPM, {sample_rate} Hz...")
     
-    # Thời gian
-    duration = num_points / sample_rate  # seconds
-    t = np.linspace(0, duration, num_points)
-    
-    # Tần số tim (Hz)
-    f_heart = heart_rate / 60.0
-    rr_interval = 1.0 / f_heart  # Khoảng cách giữa các nhịp (seconds)
-    
-    # Tạo tín hiệu ECG
-    ecg = np.zeros(num_points)
-    
-    # Số lượng nhịp tim trong dữ liệu
-    num_beats = int(duration * f_heart)
-    print(f"  Số nhịp tim: {num_beats} beats")
-    
-    # Tạo từng nhịp tim
-    for beat_idx in range(num_beats):
-        # Thời gian của nhịp tim này
-        beat_time = beat_idx * rr_interval
-        
-        # Chỉ tạo nhịp nếu nằm trong khoảng dữ liệu
-        if beat_time >= duration:
-            break
-            
-        # Tìm index trong mảng t
-        beat_idx_array = int(beat_time * sample_rate)
-        if beat_idx_array >= num_points:
-            break
-        
-        # === P WAVE (trước QRS) ===
-        p_start = beat_idx_array - int(0.15 * sample_rate)
-        p_end = beat_idx_array - int(0.05 * sample_rate)
-        if p_start >= 0:
-            for i in range(max(0, p_start), min(num_points, p_end)):
-                p_time = (i - beat_idx_array) / sample_rate
-                p_value = 0.3 * np.exp(-((p_time + 0.1) / 0.03) ** 2)
-                ecg[i] += p_value
-        
-        # === QRS COMPLEX (chính) ===
-        qrs_start = beat_idx_array - int(0.02 * sample_rate)
-        qrs_end = beat_idx_array + int(0.08 * sample_rate)
-        for i in range(max(0, qrs_start), min(num_points, qrs_end)):
-            qrs_time = (i - beat_idx_array) / sample_rate
-            # Tạo QRS với shape giống thật
-            if -0.02 <= qrs_time <= 0:
-                # Q wave (âm)
-                qrs_value = -0.5 * np.exp(-((qrs_time + 0.01) / 0.005) ** 2)
-            elif 0 < qrs_time <= 0.04:
-                # R wave (dương, cao nhất)
-                qrs_value = 2.5 * np.exp(-((qrs_time - 0.02) / 0.01) ** 2)
-            elif 0.04 < qrs_time <= 0.08:
-                # S wave (âm)
-                qrs_value = -0.8 * np.exp(-((qrs_time - 0.06) / 0.01) ** 2)
-            else:
-                qrs_value = 0
-            ecg[i] += qrs_value
-        
-        # === T WAVE (sau QRS) ===
-        t_start = beat_idx_array + int(0.15 * sample_rate)
-        t_end = beat_idx_array + int(0.4 * sample_rate)
-        for i in range(max(0, t_start), min(num_points, t_end)):
-            t_time = (i - beat_idx_array) / sample_rate
-            t_value = 0.6 * np.exp(-((t_time - 0.275) / 0.06) ** 2)
-            ecg[i] += t_value
-    
-    # Thêm noise nhẹ (giống nhiễu thực tế)
-    noise = np.random.normal(0, 0.03, num_points)
-    ecg += noise
-    
-    # Thêm baseline drift nhẹ
-    baseline = 0.05 * np.sin(2 * np.pi * 0.3 * t)
-    ecg += baseline
-    
-    # Convert sang ADC values (0-1023)
-    # Center tại 512, range khoảng 300
-    adc_center = 512
-    adc_range = 300
-    
-    # Normalize về -1 đến 1
-    ecg_min = np.min(ecg)
-    ecg_max = np.max(ecg)
-    ecg_range = ecg_max - ecg_min
-    if ecg_range > 0:
-        ecg_normalized = 2 * (ecg - ecg_min) / ecg_range - 1
-    else:
-        ecg_normalized = ecg
-    
-    # Scale về ADC range
-    ecg_adc = adc_center + ecg_normalized * (adc_range / 2)
-    ecg_adc = np.clip(ecg_adc, 0, 1023)
-    
-    return ecg_adc.astype(int)
+    # Bộ sinh vector hóa (ecg_synth): sóng Q, R, S tách riêng, P, T, nhiễu nhẹ và baseline drift
+    ecg_adc, r_peaks = synthesize(num_points, sample_rate, heart_rate, kind="good", seed=np.random,
+                                  return_r_peaks=True)
+    print(f"  Số nhịp tim: {len(r_peaks)} beats")
+    return ecg_adc
 
 
 def push_to_firebase(ecg_data, chunk_size=100):
     """
-    Push ECG data lên Firebase Realtime Database
+    Push ECG data lên Firebase Realtime Database (ecg_uploader, thay nội dung ECG/raw)
     """
-    print(f"\nPreparing to push {len(ecg_data)} points to Firebase...")
-    
-    # Chia thành chunks
-    chunks = {}
     num_chunks = (len(ecg_data) + chunk_size - 1) // chunk_size
-    
-    print(f"  Chia thành {num_chunks} chunks (mỗi chunk {chunk_size} points)...")
-    
-    for i in range(num_chunks):
-        start_idx = i * chunk_size
-        end_idx = min((i + 1) * chunk_size, len(ecg_data))
-        chunk_data = ecg_data[start_idx:end_idx]
-        
-        # Convert sang string với dấu phẩy
-        chunk_str = ','.join(map(str, chunk_data))
-        chunks[f'chunk_{i+1}'] = chunk_str
-        
-        if (i + 1) % 10 == 0:
-            print(f"  Đã chuẩn bị {i + 1}/{num_chunks} chunks...")
-    
-    # Push lên Firebase
-    url = "https://heartecg-4e084-default-rtdb.firebaseio.com/ECG/raw.json"
-    
-    print(f"\nPushing {num_chunks} chunks to Firebase...")
+    print(f"\nPushing {len(ecg_data)} points ({num_chunks} chunks, mỗi chunk {chunk_size} points) to Firebase...")
     
     try:
-        response = requests.put(url, json=chunks, params={'print': 'silent'}, timeout=30)
-        
-        # HTTP 200 và 204 đều là thành công
-        # 204 = No Content (Firebase trả về khi PUT thành công)
-        if response.status_code in [200, 204]:
-            print(f"✅ THÀNH CÔNG! Đã push {num_chunks} chunks lên Firebase")
-            print(f"   Tổng số điểm dữ liệu: {len(ecg_data)}")
-            print(f"   Thời gian dữ liệu: {len(ecg_data) / 360:.2f} seconds")
-            if response.status_code == 204:
-                print(f"   (HTTP 204 = No Content - thành công bình thường)")
-            return True
-        else:
-            print(f"❌ Lỗi HTTP {response.status_code}")
-            print(f"   Response: {response.text[:200] if response.text else 'No response body'}")
-            return False
+        with RTDBUploader(timeout=30) as uploader:
+            stats = uploader.upload(ecg_data, chunk_size=chunk_size)
+        print(f"✅ THÀNH CÔNG! Đã push {stats.chunks} chunks lên Firebase")
+        print(f"   Tổng số điểm dữ liệu: {len(ecg_data)}")
+        print(f"   Thời gian dữ liệu: {len(ecg_data) / 360:.2f} seconds")
+        print(f"   {stats.requests} request, {stats.retries} lần thử lại, {stats.seconds:.2f} s")
+        return True
             
+    except requests.exceptions.HTTPError as e:
+        print(f"❌ Lỗi HTTP {e.response.status_code}")
+        print(f"   Response: {e.response.text[:200] if e.response.text else 'No response body'}")
+        return False
     except requests.exceptions.Timeout:
         print("❌ Timeout - Kết nối Firebase quá lâu")
         print("   Hãy kiểm tra Internet connection")
@@ -0,0 +1,183 @@
+"""
+Lượng tử hóa int8 tĩnh (post-training) ECGResNet bằng ONNX Runtime.
+
+1. Tách beats bằng ecg_to_beats từ một corpus bản ghi; chia theo bản ghi thành
+   tập calibration và tập held-out.
+2. Export model fused sang ONNX, calibrate (MinMax) trên tập calibration,
+   lượng tử hóa Conv sang int8 (QDQ, per-channel).
+3. So với model float trên tập held-out: tỉ lệ beat cùng lớp và tỉ lệ bản ghi
+   cùng final_prediction. Nếu chưa đạt ngưỡng, lần lượt giữ float cho các Conv
+   đầu mạng (nhạy nhất) và thử lại, tối đa --max-fallback lớp.
+4. Chỉ ghi resetECG_new.int8.onnx khi đạt ngưỡng; ngược lại thoát với mã 1.
+
+Chạy:
+    python quantize_model.py                                   # corpus mock
+    python quantize_model.py --corpus data/*.txt --fs 360 --min-agreement 0.99
+Server: ECG_MODEL_BACKEND=onnx-int8 python flask_api_fixed.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+import onnx
+
+from ecg_dsp import ecg_to_beats
+from ecg_io import decode_ecg_payload
+from ecg_model import (
+    artifact_path, export_onnx, load_backend, load_model, set_onnx_source_version, weights_version
+)
+from ecg_synth import synthesize
+
+
+# =========================================================
+# CORPUS
+# =========================================================
+
+def synthetic_corpus(count=40, seconds=60, seed=0):
+    """Bản ghi mock 250 Hz, xen kẽ bình thường / bất thường với nhịp tim ngẫu nhiên"""
+    rng = np.random.default_rng(seed)
+    n = seconds * 250
+    recordings = []
+    for i in range(count):
+        if i % 2:
+            signal = synthesize(n, 250, rng.uniform(40, 70), kind="arrhythmia", seed=rng)
+        else:
+            signal = synthesize(n, 250, rng.uniform(50, 110), kind="normal", seed=rng)
+        recordings.append((signal, 250))
+    return recordings
+
+
+def file_corpus(paths, fs):
+    recordings = []
+    for path in paths:
+        with open(path, "rb") as f:
+            recordings.append((decode_ecg_payload(f.read(), filename=path), fs))
+    return recordings
+
+
+def split_beats(recordings, holdout, seed=0):
+    """Chia theo bản ghi (không theo beat) để tập held-out không lẫn beat của bản ghi calibration"""
+    beats = [ecg_to_beats(signal, fs=fs).astype(np.float32) for signal, fs in recordings]
+    beats = [b for b in beats if len(b)]
+    order = np.random.RandomState(seed).permutation(len(beats))
+    n_holdout = max(1, int(round(len(beats) * holdout)))
+    calib = np.concatenate([beats[i] for i in order[n_holdout:]])
+    return calib, [beats[i] for i in order[:n_holdout]]
+
+
+# =========================================================
+# QUANTIZATION
+# =========================================================
+
+def quantize(fp32_path, out_path, calib, exclude, batch=64):
+    from onnxruntime.quantization import (
+        CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType, quantize_static
+    )
+
+    class BeatReader(CalibrationDataReader):
+        def __init__(self):
+            self._it = ({"beats": calib[i:i + batch, None, :]} for i in range(0, len(calib), batch))
+
+        def get_next(self):
+            return next(self._it, None)
+
+    quantize_static(
+        fp32_path, out_path, BeatReader(),
+        quant_format=QuantFormat.QDQ, per_channel=True,
+        activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8,
+        op_types_to_quantize=["Conv"], nodes_to_exclude=exclude,
+        calibrate_method=CalibrationMethod.MinMax,
+    )
+
+
+def agreement(reference, forward, holdout):
+    """(tỉ lệ beat cùng lớp, tỉ lệ bản ghi cùng final_prediction)"""
+    beat_hits, records = [], []
+    for ref, beats in zip(reference, holdout):
+        pred = forward(beats).argmax(1)
+        ref_pred = ref.argmax(1)
+        beat_hits.append(pred == ref_pred)
+        records.append(np.bincount(pred).argmax() == np.bincount(ref_pred).argmax())
+    return float(np.concatenate(beat_hits).mean()), float(np.mean(records))
+
+
+def latency_us(forward, beats, batch=256, repeat=5):
+    x = beats[:batch]
+    forward(x)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        forward(x)
+    return (time.perf_counter() - start) / (repeat * len(x)) * 1e6
+
+
+def weight_bytes(path):
+    return sum(len(init.raw_data) or onnx.numpy_helper.to_array(init).nbytes
+               for init in onnx.load(path).graph.initializer)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="resetECG_new.pth")
+    parser.add_argument("--corpus", nargs="*", help="file bản ghi (text/.npy/.i16...); mặc định: corpus mock")
+    parser.add_argument("--fs", type=float, default=250.0, help="tần số lấy mẫu của --corpus")
+    parser.add_argument("--holdout", type=float, default=0.3, help="tỉ lệ bản ghi dành cho kiểm tra")
+    parser.add_argument("--min-agreement", type=float, default=0.98, help="tỉ lệ beat cùng lớp tối thiểu")
+    parser.add_argument("--min-record-agreement", type=float, default=1.0,
+                        help="tỉ lệ bản ghi cùng final_prediction tối thiểu")
+    parser.add_argument("--max-fallback", type=int, default=8, help="số Conv tối đa được giữ float")
+    parser.add_argument("--output", help="mặc định: <model>.int8.onnx")
+    args = parser.parse_args()
+
+    output = args.output or artifact_path(args.model, "onnx-int8")
+    model = load_model(args.model)
+    version = weights_version(args.model)
+    recordings = file_corpus(args.corpus, args.fs) if args.corpus else synthetic_corpus()
+    calib, holdout = split_beats(recordings, args.holdout)
+    eager = load_backend("eager", model)
+    reference = [eager(b) for b in holdout]
+    print(f"{len(recordings)} bản ghi: {len(calib)} beats calibration, "
+          f"{sum(map(len, holdout))} beats held-out ({len(holdout)} bản ghi)\n")
+
+    # Thư mục tạm cạnh file đích để os.replace là thao tác atomic
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(output))) as tmp:
+        fp32_path = export_onnx(model, os.path.join(tmp, "fp32.onnx"), version)
+        fp32 = load_backend("onnx", artifact=fp32_path)
+        convs = [n.name for n in onnx.load(fp32_path).graph.node if n.op_type == "Conv"]
+
+        # Giữ float lần lượt từ Conv đầu mạng: block1 (1 kênh vào) nhạy nhất và rẻ nhất
+        passed = None
+        for n_float in range(min(args.max_fallback, len(convs)) + 1):
+            int8_path = os.path.join(tmp, f"int8_{n_float}.onnx")
+            quantize(fp32_path, int8_path, calib, convs[:n_float])
+            forward = load_backend("onnx-int8", artifact=int8_path)
+            beat_agree, record_agree = agreement(reference, forward, holdout)
+            ok = beat_agree >= args.min_agreement and record_agree >= args.min_record_agreement
+            print(f"int8 {len(convs) - n_float:>2}/{len(convs)} Conv: beat {beat_agree:.2%}, "
+                  f"bản ghi {record_agree:.2%}  {'OK' if ok else '✗'}")
+            if ok:
+                passed = (int8_path, forward)
+                break
+
+        if passed is None:
+            print(f"\n✗ Không đạt ngưỡng (beat ≥ {args.min_agreement:.2%}, bản ghi ≥ {args.min_record_agreement:.2%}) "
+                  f"khi giữ float tối đa {args.max_fallback} Conv; không ghi {output}")
+            sys.exit(1)
+
+        int8_path, forward = passed
+        all_beats = np.concatenate(holdout)
+        t_fp32, t_int8 = latency_us(fp32, all_beats), latency_us(forward, all_beats)
+        w_fp32, w_int8 = weight_bytes(fp32_path), weight_bytes(int8_path)
+        set_onnx_source_version(int8_path, version)
+        os.replace(int8_path, output)
+
+    print(f"\n✓ Đã ghi {output}")
+    print(f"  tốc độ:  fp32 {t_fp32:.0f} µs/beat -> int8 {t_int8:.0f} µs/beat (x{t_fp32 / t_int8:.2f})")
+    print(f"  trọng số: {w_fp32 / 1e3:.0f} KB -> {w_int8 / 1e3:.0f} KB (x{w_fp32 / w_int8:.2f} nhỏ hơn)")
+
+
+if __name__ == "__main__":
+    main()
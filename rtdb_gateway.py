@@ -0,0 +1,661 @@
+"""
+Gateway suy luận theo luồng thay đổi của Firebase Realtime Database: thay vì chờ người dùng bấm
+"Dự đoán" rồi tải lại cả node ECG/raw, gateway nghe luồng SSE (REST streaming) của các node thiết bị
+và chỉ xử lý các chunk mới được nối thêm.
+
+- Một kết nối GET text/event-stream tới node cha của các thiết bị (--path "ECG/fleet/{device}/raw"
+  -> nghe ECG/fleet). Sự kiện "put" / "patch" được quy về các lần ghi vào <thiết bị>/raw/chunk_N.
+- Mỗi thiết bị giữ số thứ tự chunk kế tiếp: chỉ chunk mới được decode (ecg_io.decode_chunks, một lần
+  cho cả đoạn chunk liên tiếp), chunk đến trước được giữ chờ chunk thiếu. Chunk thiếu quá
+  --gap-timeout giây (thiết bị bỏ chunk) thì bỏ qua khoảng trống và bắt đầu bộ trích beat mới.
+- Mỗi thiết bị một ecg_stream.StreamingBeatExtractor: bộ lọc và bộ dò R-peak giữ trạng thái giữa các
+  chunk, buffer chỉ giữ phần chồng lấn cần cho các beat chưa cắt, nên mỗi chunk tốn O(chunk) dù bản
+  ghi dài bao lâu. Beat mới của mọi thiết bị được gộp vào một lần forward ECGResNet.
+- Kết quả được ghi lại theo lô: mỗi --flush-interval giây một PATCH nhiều đường dẫn
+  (<results>/beats/beat_N và <results>/summary của mọi thiết bị có beat mới).
+- Mất kết nối: kết nối lại với backoff. Firebase gửi lại cả node ("put" path "/"); chunk đã xử lý
+  được bỏ qua nếu chunk đầu của thiết bị không đổi, ngược lại (thiết bị PUT lại node: phiên đo mới)
+  thiết bị bắt đầu lại từ beat 0.
+
+Trạng thái không được lưu: khởi động lại gateway sẽ xử lý lại cả node, với cùng chỉ số beat_N nên
+kết quả ghi đè đúng chỗ.
+
+Kiểm thử offline: --record ghi mọi sự kiện nhận được ra file JSONL; rtdb_local.py --replay phát lại
+đúng chuỗi sự kiện đó (--local --replay chạy cả hai trong một lệnh).
+
+Chạy:
+    python rtdb_gateway.py                                          # FIREBASE_DATABASE_URL, ECG/fleet/{device}/raw
+    python rtdb_gateway.py --path ECG/raw --fs 360 --record session.jsonl
+    python rtdb_gateway.py --local --replay session.jsonl --speed 10 --idle-exit 2
+"""
+
+import argparse
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+import requests
+
+from ecg_dsp import QRS_DETECTOR, QRS_DETECTORS
+from ecg_io import CHUNK_PREFIX, PayloadError, decode_chunks
+from ecg_model import (
+    ARTIFACT_SUFFIXES, BACKENDS, NUM_CLASSES, artifact_path, load_backend, load_model, weights_version
+)
+from ecg_stream import StreamingBeatExtractor, beat_results
+from ecg_uploader import DATABASE_URL, RTDBUploader
+from rtdb_local import LocalRTDB, load_events
+
+DEVICE = "{device}"
+DEVICE_PATH = "ECG/fleet/{device}/raw"
+RESULTS_PATH = "predictions/{device}"
+MODEL_PATH = "resetECG_new.pth"
+FS_KEY = "fs"                       # node cạnh raw: tần số lấy mẫu riêng của thiết bị (nếu có)
+
+
+def split_path(path):
+    return [part for part in path.strip("/").split("/") if part]
+
+
+# =========================================================
+# SSE
+# =========================================================
+
+def parse_sse(stream):
+    """
+    Tách luồng byte text/event-stream thành các sự kiện.
+    Yields:
+        (event, data) - data là JSON đã parse (None với keep-alive)
+    """
+    buffer = b""
+    for block in stream:
+        buffer += block.replace(b"\r\n", b"\n")
+        while b"\n\n" in buffer:
+            message, buffer = buffer.split(b"\n\n", 1)
+            event, data = "message", []
+            for line in message.decode().split("\n"):
+                name, _, value = line.partition(":")
+                value = value[1:] if value.startswith(" ") else value
+                if name == "event":
+                    event = value
+                elif name == "data":
+                    data.append(value)
+            if data:
+                yield event, json.loads("\n".join(data))
+
+
+class GatewayStats:
+    def __init__(self):
+        self.events = 0             # sự kiện put / patch
+        self.reconnects = 0
+        self.chunks = 0             # chunk đã decode
+        self.samples = 0
+        self.invalid_chunks = 0
+        self.skipped_chunks = 0     # chunk thiếu bị bỏ qua sau gap_timeout
+        self.beats = 0
+        self.batches = 0            # số lần forward
+        self.writes = 0
+        self.write_errors = 0
+        self.dsp_seconds = 0.0
+        self.infer_seconds = 0.0
+        self.seconds = 0.0
+        self.lags = []              # giây từ khi nhận chunk hoàn tất một beat tới khi beat được ghi
+
+    def summary(self):
+        lags = np.array(self.lags) * 1000
+        p50, p95, high = np.percentile(lags, [50, 95, 100]) if len(lags) else (None,) * 3
+        return {
+            "events": self.events,
+            "reconnects": self.reconnects,
+            "chunks": self.chunks,
+            "samples": self.samples,
+            "invalid_chunks": self.invalid_chunks,
+            "skipped_chunks": self.skipped_chunks,
+            "beats": self.beats,
+            "batches": self.batches,
+            "writes": self.writes,
+            "write_errors": self.write_errors,
+            "seconds": round(self.seconds, 3),
+            "dsp_us_per_sample": round(self.dsp_seconds / self.samples * 1e6, 3) if self.samples else None,
+            "infer_ms_per_beat": round(self.infer_seconds / self.beats * 1e3, 3) if self.beats else None,
+            "result_lag_p50_ms": None if p50 is None else round(float(p50), 1),
+            "result_lag_p95_ms": None if p95 is None else round(float(p95), 1),
+            "result_lag_max_ms": None if high is None else round(float(high), 1),
+        }
+
+
+class DeviceState:
+    """Một phiên đo của một thiết bị: chunk kế tiếp, chunk chờ và bộ trích beat"""
+
+    def __init__(self, device_id, node, fs, first_chunk=None, detector=None):
+        self.device_id = device_id
+        self.node = node                    # đường dẫn node thiết bị (tương đối so với node đang nghe)
+        self.fs = fs
+        self.first_chunk = first_chunk      # (số thứ tự, nội dung) chunk đầu: nhận ra node được PUT lại
+        self.next_chunk = first_chunk[0] if first_chunk else 1
+        self.pending = {}                   # số thứ tự -> chuỗi mẫu, chunk đến trước chunk còn thiếu
+        self.gap_since = None
+        self.chunk_len = None               # số mẫu mỗi chunk (ước lượng độ dài khoảng trống)
+        self.detector = detector
+        self.extractor = StreamingBeatExtractor(fs=fs, detector=detector)
+        self.sample_offset = 0              # số mẫu trước bộ trích beat hiện tại
+        self.beat_count = 0
+        self.counts = np.zeros(NUM_CLASSES, dtype=np.int64)
+        self.received = 0.0                 # thời điểm nhận chunk mới nhất
+
+    @property
+    def samples(self):
+        return self.sample_offset + self.extractor.samples_in
+
+
+# =========================================================
+# GATEWAY
+# =========================================================
+
+class RTDBGateway:
+    def __init__(self, classify, database_url=None, path=DEVICE_PATH, results=RESULTS_PATH, fs=360.0, auth=None,
+                 flush_interval=1.0, gap_timeout=5.0, max_pending=100, batch_size=256, detector=None,
+                 model_version=None, record=None, timeout=10.0, read_timeout=90.0, retries=5):
+        """
+        Args:
+            classify: hàm nhận beats [N, 150] float32, trả về probs [N, C]
+            path: node chunk của mỗi thiết bị; đoạn "{device}" là id thiết bị
+            results: node kết quả của mỗi thiết bị ({device} = id)
+            fs: tần số lấy mẫu khi thiết bị không có node fs cạnh raw
+            flush_interval: giây giữa hai lần ghi kết quả
+            gap_timeout, max_pending: chờ chunk thiếu tối đa bao lâu / bao nhiêu chunk đến sau
+            batch_size: số beat tối đa mỗi lần forward
+            detector: bộ dò R-peak của StreamingBeatExtractor (None = ecg_dsp.QRS_DETECTOR)
+            record: file JSONL ghi lại mọi sự kiện put / patch nhận được (rtdb_local.py --replay)
+            read_timeout: giây không nhận được gì (kể cả keep-alive 30 giây của Firebase) thì kết nối lại
+        """
+        parts = split_path(path)
+        if len(parts) < 2 or any(DEVICE in part and part != DEVICE for part in parts) or parts[-1] == DEVICE:
+            raise ValueError(f"Invalid device path {path!r}, expected e.g. {DEVICE_PATH!r}")
+        # Nghe từ node cha gần nhất chứa mọi thiết bị (node thiết bị = cha của node chunk)
+        depth = parts.index(DEVICE) if DEVICE in parts else len(parts) - 1
+        self.root = parts[:depth]
+        self.pattern = parts[depth:-1]      # node thiết bị, tương đối so với root
+        self.leaf = parts[-1]               # node chunk trong node thiết bị
+        self.results = results
+        self.classify = classify
+        self.fs = fs
+        self.flush_interval = flush_interval
+        self.gap_timeout = gap_timeout
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.detector = detector
+        self.model_version = model_version
+        self.read_timeout = read_timeout
+        self.record = record
+
+        base = (database_url or DATABASE_URL).rstrip("/")
+        self.stream_url = f"{base}/{'/'.join(self.root)}.json"
+        self.params = {"auth": auth} if auth else {}
+        self.writer = RTDBUploader(base, "", auth=auth, timeout=timeout, retries=retries)
+        self.devices = {}
+        self.device_fs = {}
+        self.stats = GatewayStats()
+        self._events = queue.Queue()
+        self._ready = []                    # (state, beats, peaks, thời điểm nhận) chờ forward
+        self._outbox = {}                   # đường dẫn -> giá trị chờ ghi
+        self._received = {}                 # đường dẫn beat trong _outbox -> thời điểm nhận chunk
+        self._dirty = set()                 # thiết bị cần ghi lại summary
+        self._cleared = set()               # node kết quả cần xóa trước lần ghi kế tiếp
+        self._stop = threading.Event()
+
+    # ---------------------------------------------------------
+    # Luồng SSE (thread nền)
+    # ---------------------------------------------------------
+
+    def _listen(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                with requests.get(self.stream_url, params=self.params, stream=True, timeout=(10.0, self.read_timeout),
+                                  headers={"Accept": "text/event-stream"}) as response:
+                    response.raise_for_status()
+                    for event, data in parse_sse(response.iter_content(chunk_size=None)):
+                        # Không ngắt được lần đọc đang chờ: dừng ở sự kiện kế tiếp (keep-alive)
+                        if self._stop.is_set():
+                            return
+                        attempt = 0
+                        if event in ("put", "patch"):
+                            self._events.put((event, data["path"], data["data"], time.perf_counter()))
+                        elif event == "cancel":
+                            # Rules không cho đọc node: kết nối lại cũng không giúp được
+                            self._events.put(("error", f"Stream cancelled by the database: {data}", None, None))
+                            return
+                        # auth_revoked: kết nối lại (token hết hạn); keep-alive: bỏ qua
+            except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+                print(f"⚠ Stream error: {e}", file=sys.stderr)
+            if self._stop.is_set():
+                return
+            attempt += 1
+            self.stats.reconnects += 1
+            self._stop.wait(min(30.0, 0.5 * 2 ** attempt) * random.uniform(0.5, 1.0))
+
+    # ---------------------------------------------------------
+    # Quy sự kiện về node thiết bị / chunk
+    # ---------------------------------------------------------
+
+    def handle(self, event, path, data, received):
+        """Một sự kiện put / patch (path tương đối so với node đang nghe)"""
+        self.stats.events += 1
+        parts = split_path(path)
+        if event == "put":
+            writes = [(parts, data)]
+        else:
+            writes = [(parts + split_path(key), value) for key, value in data.items()]
+        # Chunk lẻ của cùng thiết bị (PATCH nhiều chunk) được gom lại: thứ tự key trong JSON không quan trọng
+        chunks = {}
+        for write_parts, value in writes:
+            self._write(write_parts, value, received, chunks)
+        for node, group in chunks.items():
+            self._add_chunks(self._state(node, group), group, received)
+
+    def _write(self, parts, value, received, chunks):
+        n = len(self.pattern)
+        for expected, part in zip(self.pattern, parts):
+            if expected != DEVICE and expected != part:
+                return
+        if len(parts) < n:
+            # Ghi ở trên node thiết bị (ảnh chụp đầu tiên, kết nối lại): thay mọi thiết bị bên dưới
+            found = dict(self._walk(value, parts, len(parts)))
+            for node in [node for node in self._nodes() if list(node[:len(parts)]) == parts and node not in found]:
+                self._replace_node(node, None, received)
+            for node, device_value in found.items():
+                self._replace_node(node, device_value, received)
+        elif len(parts) == n:
+            self._replace_node(tuple(parts), value, received)
+        elif parts[n] == self.leaf:
+            if len(parts) == n + 1:
+                self._replace_chunks(tuple(parts[:n]), value, received)
+            elif len(parts) == n + 2:
+                index = _chunk_index(parts[n + 1])
+                if index is not None and isinstance(value, str):
+                    chunks.setdefault(tuple(parts[:n]), {})[index] = value
+        elif parts[n] == FS_KEY and len(parts) == n + 1:
+            self._set_fs(tuple(parts[:n]), value)
+
+    def _walk(self, value, parts, k):
+        if k == len(self.pattern):
+            yield tuple(parts), value
+            return
+        if not isinstance(value, dict):
+            return
+        if self.pattern[k] == DEVICE:
+            for key, child in value.items():
+                yield from self._walk(child, parts + [key], k + 1)
+        elif self.pattern[k] in value:
+            yield from self._walk(value[self.pattern[k]], parts + [self.pattern[k]], k + 1)
+
+    def _nodes(self):
+        return [state.node for state in self.devices.values()]
+
+    def _device_id(self, node):
+        if DEVICE in self.pattern:
+            return node[self.pattern.index(DEVICE)]
+        return (self.root + list(node))[-1]
+
+    def _replace_node(self, node, value, received):
+        value = value if isinstance(value, dict) else {}
+        if FS_KEY in value:
+            self._set_fs(node, value[FS_KEY])
+        self._replace_chunks(node, value.get(self.leaf), received)
+
+    def _replace_chunks(self, node, chunks, received):
+        """Node chunk bị thay cả: kết nối lại (cùng phiên đo) hoặc thiết bị bắt đầu phiên đo mới"""
+        chunks = {index: text for index, text in
+                  ((_chunk_index(key), text) for key, text in (chunks.items() if isinstance(chunks, dict) else ()))
+                  if index is not None and isinstance(text, str)}
+        state = self.devices.get(self._device_id(node))
+        if not chunks:
+            if state is not None:
+                self._discard(state)
+            return
+        first = min(chunks)
+        if state is not None and state.first_chunk != (first, chunks[first]):
+            self._discard(state)
+            state = None
+        if state is None:
+            state = self._state(node, chunks)
+        self._add_chunks(state, chunks, received)
+
+    def _state(self, node, chunks):
+        device_id = self._device_id(node)
+        state = self.devices.get(device_id)
+        if state is None:
+            first = min(chunks)
+            state = DeviceState(device_id, node, self.device_fs.get(device_id, self.fs), (first, chunks[first]),
+                                self.detector)
+            self.devices[device_id] = state
+        return state
+
+    def _discard(self, state):
+        """Node chunk bị xóa / thay bằng phiên đo mới: bỏ trạng thái và kết quả cũ của thiết bị"""
+        del self.devices[state.device_id]
+        prefix = self.results.format(device=state.device_id)
+        self._ready = [item for item in self._ready if item[0] is not state]
+        self._outbox = {path: value for path, value in self._outbox.items() if not path.startswith(prefix + "/")}
+        self._received = {path: t for path, t in self._received.items() if path in self._outbox}
+        self._dirty.discard(state)
+        self._cleared.add(prefix)
+
+    def _set_fs(self, node, value):
+        if isinstance(value, bool) or not isinstance(value, (int, float)) or not 0 < value < 1e5:
+            return
+        device_id = self._device_id(node)
+        self.device_fs[device_id] = value
+        state = self.devices.get(device_id)
+        if state is not None and state.fs != value:
+            # fs đổi giữa chừng: chốt bộ trích beat cũ, phần sau tính theo fs mới
+            self._restart(state, 0, fs=value)
+
+    # ---------------------------------------------------------
+    # Chunk mới -> beat
+    # ---------------------------------------------------------
+
+    def _add_chunks(self, state, chunks, received):
+        new = {index: text for index, text in chunks.items() if index >= state.next_chunk}
+        if not new:
+            return
+        state.pending.update(new)
+        state.received = received
+        self._drain(state)
+
+    def _drain(self, state, now=None, force=False):
+        while True:
+            run = {}
+            while state.next_chunk + len(run) in state.pending:
+                index = state.next_chunk + len(run)
+                run[f"{CHUNK_PREFIX}{index}"] = state.pending.pop(index)
+            if run:
+                self._feed(state, run)
+                state.next_chunk += len(run)
+                state.gap_since = None
+            if not state.pending:
+                return
+            # Còn chunk đến trước chunk thiếu: chờ, quá hạn thì bỏ qua khoảng trống
+            now = time.perf_counter() if now is None else now
+            if state.gap_since is None:
+                state.gap_since = now
+            if not force and now - state.gap_since < self.gap_timeout and len(state.pending) <= self.max_pending:
+                return
+            resume = min(state.pending)
+            self.stats.skipped_chunks += resume - state.next_chunk
+            self._restart(state, (resume - state.next_chunk) * (state.chunk_len or 0))
+            state.next_chunk = resume
+
+    def _feed(self, state, run):
+        started = time.perf_counter()
+        try:
+            samples = [decode_chunks(run)]
+        except PayloadError:
+            # Decode từng chunk; chunk hỏng được coi như khoảng trống
+            samples = []
+            for key, text in run.items():
+                try:
+                    samples.append(decode_chunks({key: text}))
+                except PayloadError:
+                    self.stats.invalid_chunks += 1
+                    samples.append(None)
+        valid = [x for x in samples if x is not None]
+        if state.chunk_len is None and valid:
+            state.chunk_len = round(sum(map(len, valid)) / (len(run) if len(samples) == 1 else len(valid)))
+        for x in samples:
+            if x is None:
+                self._restart(state, state.chunk_len or 0)
+                continue
+            beats, peaks = state.extractor.process(x)
+            self.stats.samples += len(x)
+            self._collect(state, beats, peaks)
+        self.stats.chunks += len(run)
+        self.stats.dsp_seconds += time.perf_counter() - started
+
+    def _restart(self, state, missing, fs=None):
+        """Chốt beat cuối của bộ trích beat hiện tại rồi bắt đầu bộ mới sau `missing` mẫu bị thiếu"""
+        self._end(state)
+        state.sample_offset = state.samples + missing
+        state.fs = fs or state.fs
+        state.extractor = StreamingBeatExtractor(fs=state.fs, detector=state.detector)
+
+    def _end(self, state):
+        self._collect(state, *state.extractor.flush())
+        self._dirty.add(state)
+
+    def _collect(self, state, beats, peaks):
+        # Vị trí beat tính theo bộ trích beat lúc này (bộ trích có thể được thay trước lần forward)
+        if len(beats):
+            self._ready.append((state, beats, peaks, state.received, state.fs, state.sample_offset))
+
+    def check_gaps(self):
+        now = time.perf_counter()
+        for state in list(self.devices.values()):
+            if state.pending:
+                self._drain(state, now)
+
+    # ---------------------------------------------------------
+    # Suy luận và ghi kết quả
+    # ---------------------------------------------------------
+
+    def infer(self):
+        """Một lần forward (chia theo batch_size) cho beat mới của mọi thiết bị"""
+        if not self._ready:
+            return
+        ready, self._ready = self._ready, []
+        started = time.perf_counter()
+        beats = np.concatenate([item[1] for item in ready]).astype(np.float32)
+        probs = np.concatenate([self.classify(beats[i:i + self.batch_size])
+                                for i in range(0, len(beats), self.batch_size)])
+        self.stats.infer_seconds += time.perf_counter() - started
+        self.stats.batches += 1
+
+        start = 0
+        for state, device_beats, peaks, received, fs, sample_offset in ready:
+            device_probs = probs[start:start + len(device_beats)]
+            start += len(device_beats)
+            prefix = self.results.format(device=state.device_id)
+            for result in beat_results(peaks, device_probs, fs, state.beat_count, sample_offset):
+                path = f"{prefix}/beats/beat_{result.pop('index')}"
+                self._outbox[path] = result
+                self._received[path] = received
+            state.beat_count += len(device_beats)
+            np.add.at(state.counts, device_probs.argmax(axis=1), 1)
+            self._dirty.add(state)
+        self.stats.beats += len(beats)
+
+    def flush(self):
+        """Ghi các kết quả đang chờ trong một PATCH nhiều đường dẫn"""
+        for state in self._dirty:
+            self._outbox[f"{self.results.format(device=state.device_id)}/summary"] = {
+                "total_beats": state.beat_count,
+                "samples": state.samples,
+                "chunks": state.next_chunk - 1,
+                "fs": state.fs,
+                "counts": state.counts.tolist(),
+                "model_version": self.model_version,
+                "updated": int(time.time() * 1000),
+            }
+        self._dirty = set()
+        if not self._outbox and not self._cleared:
+            return
+        try:
+            if self._cleared:
+                # Riêng một request: một PATCH không được chứa cả node cha lẫn node con
+                self.writer.request("PATCH", {prefix: None for prefix in self._cleared})
+                self._cleared = set()
+            if self._outbox:
+                self.writer.request("PATCH", self._outbox)
+        except requests.RequestException as e:
+            # Giữ lại, ghi ở lần flush sau
+            self.stats.write_errors += 1
+            print(f"⚠ Writing results failed: {e}", file=sys.stderr)
+            return
+        done = time.perf_counter()
+        self.stats.writes += 1
+        self.stats.lags.extend(done - t for t in self._received.values())
+        self._outbox = {}
+        self._received = {}
+
+    # ---------------------------------------------------------
+    # Vòng lặp chính
+    # ---------------------------------------------------------
+
+    def run(self, duration=None, idle_exit=None, max_events=1000):
+        """
+        Xử lý sự kiện tới khi hết duration giây, rảnh quá idle_exit giây (không có put / patch)
+        hoặc stop(). Khi dừng, beat cuối của mọi thiết bị được chốt và ghi. Returns: GatewayStats
+        """
+        listener = threading.Thread(target=self._listen, daemon=True, name="rtdb-gateway-sse")
+        listener.start()
+        record = open(self.record, "w") if self.record else None
+        started = last_event = time.perf_counter()
+        next_flush = started + self.flush_interval
+        error = None
+        try:
+            while not self._stop.is_set():
+                now = time.perf_counter()
+                if duration is not None and now - started >= duration:
+                    break
+                if idle_exit is not None and now - last_event >= idle_exit:
+                    break
+                try:
+                    item = self._events.get(timeout=max(0.0, min(next_flush - now, 0.25)))
+                except queue.Empty:
+                    item = None
+                # Gom mọi sự kiện đang chờ: DSP từng thiết bị rồi một lần forward cho tất cả
+                handled = 0
+                while item is not None:
+                    if item[0] == "error":
+                        error = item[1]
+                        break
+                    self.handle(*item)
+                    if record is not None:
+                        event, path, data, received = item
+                        record.write(json.dumps({"t": round(received - started, 4), "event": event,
+                                                 "path": "/" + "/".join(self.root + split_path(path)),
+                                                 "data": data}) + "\n")
+                    handled += 1
+                    if handled >= max_events:
+                        break
+                    try:
+                        item = self._events.get_nowait()
+                    except queue.Empty:
+                        item = None
+                if error is not None:
+                    break
+                if handled:
+                    last_event = time.perf_counter()
+                self.check_gaps()
+                self.infer()
+                if time.perf_counter() >= next_flush:
+                    self.flush()
+                    next_flush = time.perf_counter() + self.flush_interval
+        finally:
+            self.stop()
+            if record is not None:
+                record.close()
+            for state in self.devices.values():
+                if state.pending:
+                    self._drain(state, force=True)
+                self._end(state)
+            self.infer()
+            self.flush()
+            self.writer.close()
+            self.stats.seconds = time.perf_counter() - started
+        if error is not None:
+            raise RuntimeError(error)
+        return self.stats
+
+    def stop(self):
+        self._stop.set()
+
+
+def _chunk_index(key):
+    if key.startswith(CHUNK_PREFIX) and key[len(CHUNK_PREFIX):].isdigit():
+        return int(key[len(CHUNK_PREFIX):])
+    return None
+
+
+# =========================================================
+# MAIN
+# =========================================================
+
+def load_classifier(path, backend="eager", artifact=None):
+    """Returns: (hàm classify, phiên bản trọng số)"""
+    model = load_model(path)
+    version = weights_version(path)
+    if not artifact and backend in ARTIFACT_SUFFIXES:
+        artifact = artifact_path(path, backend)
+    return load_backend(backend, model, artifact, expected_version=version), version
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--path", default=DEVICE_PATH, help="node chunk của mỗi thiết bị, {device} = id")
+    parser.add_argument("--results", default=RESULTS_PATH, help="node kết quả của mỗi thiết bị, {device} = id")
+    parser.add_argument("--auth", default=os.environ.get("FIREBASE_AUTH"))
+    parser.add_argument("--fs", type=float, default=360.0, help="fs khi thiết bị không có node fs cạnh raw")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("ECG_MODEL_BACKEND", "eager"))
+    parser.add_argument("--artifact", default=os.environ.get("ECG_MODEL_ARTIFACT"))
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--detector", choices=QRS_DETECTORS, default=QRS_DETECTOR,
+                        help="bộ dò R-peak (pan_tompkins: kết quả không phụ thuộc cách chia chunk)")
+    parser.add_argument("--flush-interval", type=float, default=1.0, help="giây giữa hai lần ghi kết quả")
+    parser.add_argument("--gap-timeout", type=float, default=5.0, help="giây chờ chunk thiếu trước khi bỏ qua")
+    parser.add_argument("--record", help="ghi các sự kiện nhận được ra file JSONL (để phát lại)")
+    parser.add_argument("--duration", type=float, default=None, help="dừng sau số giây này")
+    parser.add_argument("--idle-exit", type=float, default=None, help="dừng khi không có sự kiện trong số giây này")
+    parser.add_argument("--local", action="store_true", help="dùng rtdb_local chạy trong tiến trình này")
+    parser.add_argument("--replay", help="(--local) phát lại file sự kiện JSONL vào rtdb_local")
+    parser.add_argument("--speed", type=float, default=1.0, help="(--replay) hệ số tốc độ phát lại")
+    parser.add_argument("--output", help="ghi thống kê ra file JSON")
+    args = parser.parse_args()
+
+    try:
+        classify, version = load_classifier(args.model, args.backend, args.artifact)
+    except Exception as e:
+        sys.exit(f"Cannot load model {args.model} ({args.backend}): {e}")
+
+    local = None
+    database_url = args.database_url
+    if args.local:
+        local = LocalRTDB().start()
+        database_url = local.url
+        if args.replay:
+            events = load_events(args.replay)
+            local.replay(events, args.speed)
+            print(f"rtdb_local: phát lại {len(events)} sự kiện từ {args.replay} (x{args.speed:g})")
+    gateway = RTDBGateway(classify, database_url, args.path, args.results, fs=args.fs, auth=args.auth,
+                          flush_interval=args.flush_interval, gap_timeout=args.gap_timeout,
+                          batch_size=args.batch_size, detector=args.detector, model_version=version,
+                          record=args.record)
+    print(f"← {gateway.stream_url} ({args.path}) → {args.results}, model {version} ({args.backend})")
+    try:
+        stats = gateway.run(args.duration, args.idle_exit)
+    except KeyboardInterrupt:
+        stats = gateway.stats
+    except RuntimeError as e:
+        sys.exit(str(e))
+    finally:
+        if local is not None:
+            local.stop()
+
+    summary = stats.summary()
+    summary["devices"] = {state.device_id: {"samples": state.samples, "beats": state.beat_count,
+                                            "counts": state.counts.tolist()} for state in gateway.devices.values()}
+    print(json.dumps(summary, indent=1))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,342 @@
+"""
+Bản thay thế cục bộ cho REST API của Firebase Realtime Database, dùng để chạy và benchmark
+bộ giả lập thiết bị (ecg_uploader / simulate_device.py) mà không cần mạng hay project Firebase.
+
+Hỗ trợ phần REST mà các script dùng, trên một cây JSON trong bộ nhớ:
+    GET    /<path>.json            (?shallow=true: chỉ lấy key của node con)
+    PUT    /<path>.json            thay node
+    PATCH  /<path>.json            cập nhật các node con (key dạng "a/b" được hiểu là đường dẫn)
+    DELETE /<path>.json
+    GET    /<path>.json  + Accept: text/event-stream   luồng thay đổi (SSE) như REST streaming của Firebase:
+           "put" đầu tiên (path "/") là cả node, sau đó "put" / "patch" cho mỗi lần ghi vào node,
+           "keep-alive" khi rảnh
+?print=silent trả 204 không có body, như Firebase. Kết nối HTTP/1.1 keep-alive.
+
+Phát lại (--replay): các lần ghi trong một file JSONL được ghi lại bởi rtdb_gateway.py --record
+({"t": giây, "event": "put"|"patch", "path": "/ECG/...", "data": ...}) được áp dụng lại đúng nhịp
+thời gian (x --speed), nên client SSE nhận lại cùng chuỗi sự kiện chunk mà không cần thiết bị.
+
+Giả lập mạng: latency (giây, mỗi request) và fail_rate (tỉ lệ request bị trả 503) để thử retry.
+
+Chạy:
+    python rtdb_local.py --port 9000
+    python simulate_device.py --database-url http://127.0.0.1:9000
+    python rtdb_local.py --port 9000 --replay session.jsonl --speed 10
+"""
+
+import argparse
+import json
+import queue
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+    # Hàng đợi kết nối đủ cho hàng trăm thiết bị kết nối cùng lúc (device_fleet.py)
+    request_queue_size = 1024
+
+
+def _split(path):
+    return [part for part in path.strip("/").split("/") if part]
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n".encode()
+
+
+def load_events(path):
+    """Đọc file sự kiện JSONL (rtdb_gateway.py --record), bỏ dòng trống"""
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+class LocalRTDB:
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fail_rate=0.0, seed=None, keepalive=30.0):
+        """
+        Args:
+            latency: giây thêm vào mỗi request
+            fail_rate: tỉ lệ request bị trả 503
+            keepalive: giây rảnh giữa hai sự kiện "keep-alive" của luồng SSE (Firebase: 30 giây)
+        """
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self._random = random.Random(seed)
+        self._root = None
+        self._lock = threading.Lock()
+        self.requests = {}          # method -> số request
+        self.failures = 0           # số request bị trả 503 (fail_rate)
+        self.connections = 0        # số kết nối TCP đã nhận
+        self.keepalive = keepalive
+        self.streams = 0            # số luồng SSE đã mở
+        self.replayed = 0           # số sự kiện đã phát lại (replay)
+        self._listeners = []        # (đường dẫn, queue các sự kiện SSE đã mã hóa)
+        self._listening = threading.Event()
+
+        db = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with db._lock:
+                    db.connections += 1
+
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                db._handle(self, "GET")
+
+            def do_PUT(self):
+                db._handle(self, "PUT")
+
+            def do_PATCH(self):
+                db._handle(self, "PATCH")
+
+            def do_DELETE(self):
+                db._handle(self, "DELETE")
+
+        self._server = _Server((host, port), Handler)
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True, name="rtdb-local")
+        self._thread.start()
+        return self
+
+    def stop(self):
+        with self._lock:
+            for _, events in self._listeners:
+                events.put(None)
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ---------------------------------------------------------
+    # Cây dữ liệu
+    # ---------------------------------------------------------
+
+    def get(self, path=""):
+        with self._lock:
+            return self._get(_split(path))
+
+    def _get(self, parts):
+        node = self._root
+        for part in parts:
+            if not isinstance(node, dict) or part not in node:
+                return None
+            node = node[part]
+        return node
+
+    def _set(self, parts, value):
+        """Đặt node (value None = xóa), bỏ các node cha trở thành rỗng như Firebase"""
+        if not parts:
+            self._root = value if value not in ({}, []) else None
+            return
+        if not isinstance(self._root, dict):
+            if value is None:
+                return
+            self._root = {}
+        node, parents = self._root, []
+        for part in parts[:-1]:
+            if not isinstance(node.get(part), dict):
+                if value is None:
+                    return
+                node[part] = {}
+            parents.append((node, part))
+            node = node[part]
+        if value is None or value in ({}, []):
+            node.pop(parts[-1], None)
+            for parent, key in reversed(parents):
+                if parent[key]:
+                    break
+                del parent[key]
+            if not self._root:
+                self._root = None
+        else:
+            node[parts[-1]] = value
+
+    # ---------------------------------------------------------
+    # HTTP
+    # ---------------------------------------------------------
+
+    def _handle(self, handler, method):
+        url = urlsplit(handler.path)
+        query = parse_qs(url.query)
+        body = handler.rfile.read(int(handler.headers.get("Content-Length") or 0))
+        with self._lock:
+            self.requests[method] = self.requests.get(method, 0) + 1
+            fail = self.fail_rate and self._random.random() < self.fail_rate
+        if self.latency:
+            time.sleep(self.latency)
+        if fail:
+            with self._lock:
+                self.failures += 1
+            return self._reply(handler, 503, {"error": "Service unavailable (injected failure)"})
+        if not url.path.endswith(".json"):
+            return self._reply(handler, 404, {"error": "Path must end with .json"})
+        parts = _split(url.path[:-len(".json")])
+
+        data = None
+        if method in ("PUT", "PATCH"):
+            try:
+                data = json.loads(body)
+            except ValueError:
+                return self._reply(handler, 400, {"error": "Invalid data; couldn't parse JSON object."})
+            if method == "PATCH" and not isinstance(data, dict):
+                return self._reply(handler, 400, {"error": "Invalid data; couldn't parse JSON object."})
+
+        if method == "GET" and "text/event-stream" in handler.headers.get("Accept", ""):
+            return self._stream(handler, parts)
+
+        with self._lock:
+            if method == "GET":
+                result = self._get(parts)
+                if query.get("shallow") == ["true"] and isinstance(result, dict):
+                    result = {key: True if isinstance(value, (dict, list)) else value for key, value in result.items()}
+            else:
+                result = self._write(method, parts, data)
+
+        if method != "GET" and query.get("print") == ["silent"]:
+            return self._reply(handler, 204, None)
+        self._reply(handler, 200, result)
+
+    def _write(self, method, parts, data):
+        """PUT / PATCH / DELETE khi đang giữ _lock, rồi báo cho các luồng SSE liên quan"""
+        if method == "PATCH":
+            for key, value in data.items():
+                self._set(parts + _split(key), value)
+        else:
+            data = data if method == "PUT" else None
+            self._set(parts, data)
+
+        for path, events in self._listeners:
+            if parts[:len(path)] == path:
+                # Ghi bên trong node đang nghe: gửi đúng lần ghi, path tương đối
+                relative = "/" + "/".join(parts[len(path):])
+                events.put(_sse("patch" if method == "PATCH" else "put", {"path": relative, "data": data}))
+            elif path[:len(parts)] == parts:
+                # Ghi ở node cha: gửi lại cả node đang nghe nếu lần ghi chạm tới nó
+                if method == "PATCH":
+                    touched = [parts + _split(key) for key in data]
+                    if not any(t[:len(path)] == path or path[:len(t)] == t for t in touched):
+                        continue
+                events.put(_sse("put", {"path": "/", "data": self._get(path)}))
+        return data
+
+    def _stream(self, handler, parts):
+        events = queue.Queue()
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("Transfer-Encoding", "chunked")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        with self._lock:
+            # Đăng ký và chụp node trong cùng lock: không lần ghi nào lọt giữa ảnh chụp và luồng
+            events.put(_sse("put", {"path": "/", "data": self._get(parts)}))
+            self._listeners.append((parts, events))
+            self.streams += 1
+        self._listening.set()
+        try:
+            while True:
+                try:
+                    message = events.get(timeout=self.keepalive)
+                except queue.Empty:
+                    message = _sse("keep-alive", None)
+                if message is None:
+                    handler.wfile.write(b"0\r\n\r\n")
+                    break
+                # Mỗi sự kiện một chunk HTTP: client nhận ngay, không chờ đầy buffer
+                handler.wfile.write(b"%x\r\n%s\r\n" % (len(message), message))
+                handler.wfile.flush()
+        except OSError:
+            pass                    # client đã ngắt
+        finally:
+            with self._lock:
+                self._listeners = [item for item in self._listeners if item[1] is not events]
+
+    # ---------------------------------------------------------
+    # Phát lại
+    # ---------------------------------------------------------
+
+    def replay(self, events, speed=1.0, wait=True):
+        """
+        Áp dụng lại các lần ghi đã ghi lại ({"t", "event", "path", "data"}) theo nhịp t / speed
+        trên một thread nền. wait: chỉ bắt đầu khi có client SSE đầu tiên. Returns: thread
+        """
+        def run():
+            if wait:
+                self._listening.wait()
+            started = time.perf_counter()
+            for event in events:
+                delay = started + event.get("t", 0.0) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                method = {"put": "PUT", "patch": "PATCH"}[event["event"]]
+                with self._lock:
+                    self._write(method, _split(event["path"]), event["data"])
+                    self.replayed += 1
+
+        thread = threading.Thread(target=run, daemon=True, name="rtdb-replay")
+        thread.start()
+        return thread
+
+    @staticmethod
+    def _reply(handler, status, payload):
+        body = b"" if status == 204 else json.dumps(payload, separators=(",", ":")).encode()
+        handler.send_response(status)
+        handler.send_header("Content-Type", "application/json; charset=utf-8")
+        handler.send_header("Content-Length", str(len(body)))
+        handler.end_headers()
+        handler.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="độ trễ thêm vào mỗi request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="tỉ lệ request bị trả 503")
+    parser.add_argument("--keepalive", type=float, default=30.0, help="giây giữa hai keep-alive của luồng SSE")
+    parser.add_argument("--replay", help="file sự kiện JSONL (rtdb_gateway.py --record) để phát lại")
+    parser.add_argument("--speed", type=float, default=1.0, help="(--replay) hệ số tốc độ phát lại")
+    parser.add_argument("--no-wait", dest="wait", action="store_false",
+                        help="(--replay) phát lại ngay, không chờ client SSE đầu tiên")
+    args = parser.parse_args()
+
+    db = LocalRTDB(args.host, args.port, latency=args.latency_ms / 1000, fail_rate=args.fail_rate,
+                   keepalive=args.keepalive)
+    print(f"Local Realtime Database: {db.url}  (Ctrl+C để dừng)")
+    if args.replay:
+        events = load_events(args.replay)
+        db.replay(events, args.speed, wait=args.wait)
+        duration = events[-1]["t"] / args.speed if events else 0.0
+        print(f"Phát lại {len(events)} sự kiện từ {args.replay} ({duration:.1f} s)"
+              + (" khi có client SSE đầu tiên" if args.wait else ""))
+    try:
+        db._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        db._server.server_close()
+
+
+if __name__ == "__main__":
+    main()
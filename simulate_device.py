@@ -0,0 +1,93 @@
+"""
+Giả lập thiết bị đo ECG: sinh tín hiệu (ecg_synth) hoặc đọc file, rồi nối dần từng chunk vào
+Firebase Realtime Database (ECG/raw) theo đúng tốc độ lấy mẫu, như cảm biến thật. App React
+bấm "Lấy dữ liệu" giữa chừng sẽ thấy dữ liệu tăng dần. Xem ecg_uploader.
+
+Chạy:
+    python simulate_device.py                                   # normal 72 BPM, 60 giây @ 360 Hz
+    python simulate_device.py --kind arrhythmia --heart-rate 65 --duration 5m --speed 10
+    python simulate_device.py --file ecg_12s.txt --fs 360 --append
+    python simulate_device.py --local --latency-ms 40 --fail-rate 0.05 --speed 20   # offline (rtdb_local)
+Database: --database-url hoặc FIREBASE_DATABASE_URL; token ghi: --auth hoặc FIREBASE_AUTH.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+import requests
+
+from ecg_io import PayloadError, decode_ecg_payload
+from ecg_synth import KINDS, synthesize
+from ecg_uploader import CHUNK_SIZE, ECG_PATH, RTDBUploader
+from rtdb_local import LocalRTDB
+
+DURATIONS = {"s": 1, "m": 60, "h": 3600}
+
+
+def parse_duration(text):
+    """'10s' | '1m' | '24h' -> giây"""
+    return float(text[:-1]) * DURATIONS[text[-1]]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--kind", choices=KINDS, default="normal")
+    parser.add_argument("--heart-rate", type=float, default=72)
+    parser.add_argument("--fs", type=int, default=360)
+    parser.add_argument("--duration", default="60s")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--file", help="gửi tín hiệu từ file (text / .npy / int16) thay vì sinh")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--speed", type=float, default=1.0, help="hệ số thời gian thực (10 = nhanh gấp 10)")
+    parser.add_argument("--fast", action="store_true", help="gửi nhanh nhất có thể, không theo tốc độ lấy mẫu")
+    parser.add_argument("--append", action="store_true", help="nối tiếp chunk đang có thay vì thay node")
+    parser.add_argument("--max-batch", type=int, default=50, help="số chunk tối đa mỗi PATCH khi đuổi kịp")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--path", default=ECG_PATH)
+    parser.add_argument("--auth", default=os.environ.get("FIREBASE_AUTH"))
+    parser.add_argument("--retries", type=int, default=5)
+    parser.add_argument("--local", action="store_true", help="dùng rtdb_local chạy trong tiến trình này")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="(--local) độ trễ mỗi request")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="(--local) tỉ lệ request bị trả 503")
+    args = parser.parse_args()
+
+    if args.file:
+        try:
+            with open(args.file, "rb") as f:
+                ecg = decode_ecg_payload(f.read(), filename=args.file)
+        except (OSError, PayloadError) as e:
+            sys.exit(f"Cannot read {args.file}: {e}")
+        print(f"{args.file}: {len(ecg)} mẫu @ {args.fs} Hz ({len(ecg) / args.fs:.1f} s)")
+    else:
+        n = int(parse_duration(args.duration) * args.fs)
+        ecg = synthesize(n, args.fs, args.heart_rate, kind=args.kind, seed=args.seed)
+        print(f"{args.kind} {args.heart_rate:g} BPM: {n} mẫu @ {args.fs} Hz ({n / args.fs:.1f} s)")
+
+    local = None
+    database_url = args.database_url
+    if args.local:
+        local = LocalRTDB(latency=args.latency_ms / 1000, fail_rate=args.fail_rate).start()
+        database_url = local.url
+    try:
+        with RTDBUploader(database_url, args.path, auth=args.auth, retries=args.retries) as uploader:
+            print(f"→ {uploader.url} ({'nhanh nhất' if args.fast else f'x{args.speed:g} thời gian thực'})")
+            if args.fast:
+                stats = uploader.upload(ecg, args.chunk_size, reset=not args.append, max_batch=args.max_batch)
+            else:
+                stats = uploader.stream(ecg, args.fs, args.chunk_size, speed=args.speed, reset=not args.append,
+                                        max_batch=args.max_batch)
+    except requests.RequestException as e:
+        sys.exit(f"Upload failed: {e}")
+    finally:
+        if local is not None:
+            local.stop()
+
+    print(json.dumps(stats.summary(), indent=1))
+    if local is not None:
+        print(f"rtdb_local: {local.requests}, {local.failures} lỗi giả lập, {local.connections} kết nối")
+
+
+if __name__ == "__main__":
+    main()
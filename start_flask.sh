@@ -39,6 +39,9 @@ echo "Press Ctrl+C to stop"
 echo "========================================"
 echo ""
 
-# Run Flask API
+# Run Flask API ("./start_flask.sh prod": gunicorn pre-fork, xem gunicorn.conf.py)
+if [ "$1" == "prod" ]; then
+    exec gunicorn -c gunicorn.conf.py flask_api_fixed:app
+fi
 python flask_api_fixed.py
 
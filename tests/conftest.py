@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Module của repo nằm ở thư mục gốc (như benchmarks/)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
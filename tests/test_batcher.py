@@ -0,0 +1,48 @@
+import gc
+import os
+import weakref
+
+import numpy as np
+import pytest
+
+from ecg_batcher import MicroBatcher
+
+
+def forward(beats):
+    return np.repeat(beats[:, :1], 5, axis=1)
+
+
+def test_predict_splits_batch_per_request():
+    batcher = MicroBatcher(forward, max_batch_size=8, max_wait_ms=1.0)
+    try:
+        futures = [batcher.submit(np.full((3, 150), i, dtype=np.float32)) for i in range(4)]
+        for i, future in enumerate(futures):
+            np.testing.assert_array_equal(future.result(timeout=5), np.full((3, 5), i, dtype=np.float32))
+    finally:
+        batcher.close()
+
+
+def test_closed_batcher_is_garbage_collected():
+    batcher = MicroBatcher(forward)
+    batcher.predict(np.zeros((2, 150), dtype=np.float32), timeout=5)
+    batcher.close()
+    ref = weakref.ref(batcher)
+    del batcher
+    gc.collect()
+    assert ref() is None
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="fork")
+def test_batcher_restarts_after_fork():
+    batcher = MicroBatcher(forward)
+    batcher.predict(np.zeros((1, 150), dtype=np.float32), timeout=5)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            probs = batcher.predict(np.ones((2, 150), dtype=np.float32), timeout=5)
+            os._exit(0 if probs.shape == (2, 5) and batcher.stats()["requests"] == 1 else 1)
+        except BaseException:
+            os._exit(2)
+    _, status = os.waitpid(pid, 0)
+    batcher.close()
+    assert os.waitstatus_to_exitcode(status) == 0
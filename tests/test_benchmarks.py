@@ -0,0 +1,27 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Môi trường chỉ có requirements.txt: firebase_admin không được cài
+RUN_WITHOUT_FIREBASE = """
+import runpy, sys
+sys.modules["firebase_admin"] = None
+sys.argv = [sys.argv[1], "--help"]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def test_bench_suite_help_runs_without_firebase_admin():
+    script = os.path.join(ROOT, "benchmarks", "bench_suite.py")
+    result = subprocess.run([sys.executable, "-c", RUN_WITHOUT_FIREBASE, script],
+                            cwd=ROOT, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert "--baseline" in result.stdout
+
+
+def test_generate_mock_ecg_does_not_import_firebase_admin():
+    code = "import sys; import generate_mock_ecg; assert 'firebase_admin' not in sys.modules"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, timeout=60)
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,116 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from ecg_cache import PredictionCache, make_key
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.001)
+
+
+def _run_concurrently(cache, key, compute, count):
+    """count lượt get_or_compute cùng key; lượt đầu giữ compute tới khi các lượt sau đã chờ"""
+    results = [None] * count
+
+    def call(i):
+        try:
+            results[i] = cache.get_or_compute(key, compute)
+        except Exception as e:
+            results[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(count)]
+    threads[0].start()
+    _wait_for(lambda: cache.stats()["inflight"] == 1)
+    for thread in threads[1:]:
+        thread.start()
+    _wait_for(lambda: cache.stats()["coalesced"] == count - 1)
+    return threads, results
+
+
+def test_concurrent_requests_compute_once():
+    cache = PredictionCache()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return np.arange(3)
+
+    threads, results = _run_concurrently(cache, "k", compute, 2)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert len(calls) == 1
+    assert [status for _, status in results] == ["miss", "coalesced"]
+    assert results[0][0] is results[1][0]
+    assert not results[0][0].flags.writeable
+    assert cache.get_or_compute("k", compute)[1] == "hit"
+
+
+def test_compute_error_reaches_every_waiter():
+    cache = PredictionCache()
+    release = threading.Event()
+
+    def compute():
+        release.wait(5)
+        raise ValueError("bad signal")
+
+    threads, results = _run_concurrently(cache, "k", compute, 3)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert all(isinstance(r, ValueError) and str(r) == "bad signal" for r in results)
+    stats = cache.stats()
+    assert stats["inflight"] == 0 and stats["entries"] == 0
+    # Lỗi không được cache: lần sau tính lại
+    assert cache.get_or_compute("k", lambda: np.zeros(1))[1] == "miss"
+
+
+def test_ttl_expiry():
+    cache = PredictionCache(ttl=0.05)
+    cache.get_or_compute("k", lambda: np.zeros(4))
+    assert cache.get_or_compute("k", lambda: np.ones(4))[1] == "hit"
+    time.sleep(0.1)
+    value, status = cache.get_or_compute("k", lambda: np.ones(4))
+    assert status == "miss" and value[0] == 1
+    assert cache.stats()["expirations"] == 1
+
+
+def test_lru_and_byte_cap_eviction():
+    cache = PredictionCache(max_entries=2, max_bytes=1000)
+    for key in "abc":
+        cache.get_or_compute(key, lambda: np.zeros(10))     # 80 byte mỗi mục
+    stats = cache.stats()
+    assert stats["entries"] == 2 and stats["evictions"] == 1
+    assert cache.get_or_compute("a", lambda: np.zeros(10))[1] == "miss"
+
+    cache.get_or_compute("b", lambda: np.zeros(10))          # b mới dùng -> c bị bỏ trước
+    cache.get_or_compute("big", lambda: np.zeros(110))       # 880 byte: vượt max_bytes cùng a, b
+    stats = cache.stats()
+    assert stats["bytes"] <= 1000
+    assert cache.get_or_compute("big", lambda: None)[1] == "hit"
+
+    # Một mục lớn hơn max_bytes không được lưu
+    cache.get_or_compute("huge", lambda: np.zeros(200))
+    assert cache.get_or_compute("huge", lambda: np.zeros(200))[1] == "miss"
+
+
+@pytest.mark.parametrize("change", [
+    dict(model_version="v2"),
+    dict(fs=360),
+    dict(detector="pan_tompkins"),
+    dict(backend="onnx"),
+])
+def test_key_changes_with_model_and_preprocessing(change):
+    signal = np.arange(1000)
+    params = dict(model_version="v1", fs=250, pipeline_fs=250, backend="eager", detector="find_peaks")
+    base = make_key(signal, **params)
+    assert make_key(signal.astype(np.int16), **params) == base
+    assert make_key(signal, **{**params, **change}) != base
@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+from scipy.signal import butter, filtfilt, find_peaks, resample, resample_poly
+
+from ecg_dsp import PIPELINE_FS, ecg_to_beats
+from ecg_synth import synthesize
+
+
+def ecg_to_beats_reference(ecg_adc, fs=PIPELINE_FS, global_size=450, new_fs=120):
+    """
+    Cài đặt gốc, giữ nguyên để so: butter (b, a) + filtfilt, mỗi beat một lần pad + FFT resample + chuẩn hóa.
+    Tín hiệu ở fs khác được resample_poly về PIPELINE_FS trước (như /predict với fs từ user-003).
+    """
+    ecg = np.asarray(ecg_adc, dtype=np.float32)
+    ecg -= np.mean(ecg)
+    ecg /= 512.0
+    if fs != PIPELINE_FS:
+        ecg = resample_poly(ecg, PIPELINE_FS, fs)
+        fs = PIPELINE_FS
+
+    nyq = 0.5 * fs
+    b, a = butter(4, [0.5 / nyq, 40.0 / nyq], btype="band")
+    ecg = filtfilt(b, a, ecg)
+
+    peaks, _ = find_peaks(ecg, distance=int(0.25 * fs))
+    if len(peaks) < 2:
+        return np.array([])
+
+    rr = np.diff(peaks)
+    hb_size = int(np.mean(rr))
+
+    beats = []
+    for p in peaks:
+        s = p - hb_size // 2
+        e = p + hb_size // 2
+        if s < 0 or e > len(ecg):
+            continue
+
+        hb = ecg[s:e]
+        hb = np.pad(hb, (0, max(0, global_size - len(hb))), "constant")[:global_size]
+        hb = resample(hb, int(global_size * new_fs / fs))
+        hb = (hb - hb.mean()) / (hb.std() + 1e-8)
+        beats.append(hb[:150])
+
+    return np.array(beats)
+
+
+@pytest.mark.parametrize("fs", [250, 360])
+@pytest.mark.parametrize("kind, heart_rate", [("normal", 72), ("normal", 150), ("bradycardia", 30),
+                                              ("arrhythmia", 65)])
+def test_ecg_to_beats_matches_reference(fs, kind, heart_rate):
+    adc = synthesize(20 * fs, fs, heart_rate, kind=kind, seed=1)
+    expected = ecg_to_beats_reference(adc, fs=fs)
+    beats = ecg_to_beats(adc, fs=fs)
+    assert len(expected) > 0
+    np.testing.assert_allclose(beats, expected, atol=1e-5)
+
+
+@pytest.mark.parametrize("fs", [250, 360])
+def test_ecg_to_beats_fewer_than_two_peaks(fs):
+    adc = np.full(2 * fs, 512)
+    expected = ecg_to_beats_reference(adc, fs=fs)
+    beats = ecg_to_beats(adc, fs=fs)
+    assert expected.shape == (0,)
+    np.testing.assert_allclose(beats, expected)
@@ -0,0 +1,139 @@
+import numpy as np
+import pytest
+
+from ecg_dsp import PIPELINE_FS
+from ecg_stream import StreamingBeatExtractor
+from ecg_synth import synthesize
+from rtdb_gateway import RTDBGateway
+
+FS = 250
+CHUNK = 250
+PREFIX = "predictions/dev1"
+
+
+def classify(beats):
+    probs = np.full((len(beats), 5), 0.1, dtype=np.float32)
+    probs[:, 0] = 0.6
+    return probs
+
+
+@pytest.fixture
+def gateway(monkeypatch):
+    gateway = RTDBGateway(classify, database_url="http://127.0.0.1:9", fs=FS, detector="pan_tompkins")
+    gateway.writes = []
+    monkeypatch.setattr(gateway.writer, "request", lambda method, data: gateway.writes.append(data))
+    return gateway
+
+
+def chunks_of(signal):
+    return {f"chunk_{i // CHUNK + 1}": ",".join(map(str, signal[i:i + CHUNK])) for i in range(0, len(signal), CHUNK)}
+
+
+def reference_samples(signal):
+    """R-peak (mẫu ở FS) của cả tín hiệu qua một bộ trích beat"""
+    extractor = StreamingBeatExtractor(fs=FS, detector="pan_tompkins")
+    peaks = np.concatenate([extractor.process(signal)[1], extractor.flush()[1]])
+    return [int(round(p * FS / PIPELINE_FS)) for p in peaks]
+
+
+def finish(gateway):
+    """Như cuối RTDBGateway.run: bỏ qua chunk còn thiếu, chốt beat cuối, forward rồi ghi"""
+    for state in gateway.devices.values():
+        if state.pending:
+            gateway._drain(state, force=True)
+        gateway._end(state)
+    gateway.infer()
+    gateway.flush()
+    written = {}
+    for data in gateway.writes:
+        written.update(data)
+    beats = sorted((int(path.rsplit("_", 1)[1]), value) for path, value in written.items()
+                   if path.startswith(PREFIX + "/beats/"))
+    return [value["sample"] for _, value in beats], written
+
+
+@pytest.fixture(scope="module")
+def signal():
+    return synthesize(FS * 40, FS, 72, seed=5)
+
+
+def test_out_of_order_chunks_are_reordered(gateway, signal):
+    chunks = chunks_of(signal)
+    gateway.handle("put", "/", {"dev1": {"raw": {"chunk_1": chunks["chunk_1"]}}}, 0.0)
+    # chunk_3 đến trước chunk_2: được giữ lại, chưa decode
+    gateway.handle("patch", "/dev1/raw", {"chunk_3": chunks["chunk_3"]}, 0.1)
+    state = gateway.devices["dev1"]
+    assert state.next_chunk == 2 and list(state.pending) == [3]
+    gateway.handle("patch", "/dev1/raw", {"chunk_2": chunks["chunk_2"]}, 0.2)
+    assert state.next_chunk == 4 and not state.pending
+
+    rest = list(chunks)[3:]
+    for i in range(0, len(rest), 2):
+        for key in reversed(rest[i:i + 2]):
+            gateway.handle("put", f"/dev1/raw/{key}", chunks[key], 0.3)
+    samples, written = finish(gateway)
+    assert gateway.stats.skipped_chunks == 0
+    assert gateway.stats.chunks == len(chunks)
+    assert samples == reference_samples(signal)
+    assert written[PREFIX + "/summary"]["total_beats"] == len(samples)
+
+
+def test_dropped_chunk_is_skipped_after_gap_timeout(gateway, signal):
+    chunks = chunks_of(signal)
+    dropped = 20
+    for key, text in chunks.items():
+        if key != f"chunk_{dropped}":
+            gateway.handle("patch", "/dev1/raw", {key: text}, 0.0)
+    state = gateway.devices["dev1"]
+    assert state.next_chunk == dropped and len(state.pending) == len(chunks) - dropped
+    # Chưa quá gap_timeout: vẫn chờ
+    gateway._drain(state, now=state.gap_since + gateway.gap_timeout / 2)
+    assert state.pending and gateway.stats.skipped_chunks == 0
+    gateway._drain(state, now=state.gap_since + gateway.gap_timeout)
+    assert not state.pending and state.next_chunk == len(chunks) + 1
+    assert gateway.stats.skipped_chunks == 1
+
+    samples, _ = finish(gateway)
+    reference = np.array(reference_samples(signal))
+    gap = ((dropped - 1) * CHUNK, dropped * CHUNK)
+    # Beat sau khoảng trống vẫn ở đúng vị trí trong bản ghi gốc; không beat nào nằm trong chunk bị bỏ
+    assert not any(gap[0] <= s < gap[1] for s in samples)
+    assert all(np.abs(reference - s).min() <= 2 for s in samples)
+    assert sum(s >= gap[1] for s in samples) > 0.8 * (reference >= gap[1]).sum()
+
+
+def test_reput_with_same_first_chunk_is_not_reprocessed(gateway, signal):
+    chunks = chunks_of(signal)
+    keys = list(chunks)
+    gateway.handle("put", "/", {"dev1": {"raw": {key: chunks[key] for key in keys[:20]}}}, 0.0)
+    gateway.infer()
+    gateway.flush()
+    beats_before = gateway.devices["dev1"].beat_count
+    # Kết nối lại: Firebase gửi lại cả node, kèm chunk mới trong lúc mất kết nối
+    gateway.handle("put", "/", {"dev1": {"raw": dict(chunks)}}, 1.0)
+    assert gateway.stats.chunks == len(chunks)
+    assert gateway.devices["dev1"].beat_count == beats_before
+
+    samples, _ = finish(gateway)
+    assert not gateway._cleared and not any(None in data.values() for data in gateway.writes)
+    assert samples == reference_samples(signal)
+
+
+def test_reput_with_new_first_chunk_starts_new_session(gateway, signal):
+    chunks = chunks_of(signal)
+    gateway.handle("put", "/", {"dev1": {"raw": chunks}}, 0.0)
+    gateway.infer()
+    gateway.flush()
+    assert gateway.devices["dev1"].beat_count > 0
+
+    # Thiết bị PUT lại node: phiên đo mới, chunk_1 khác
+    other = synthesize(FS * 20, FS, 110, seed=6)
+    gateway.writes.clear()
+    gateway.handle("put", "/dev1/raw", chunks_of(other), 1.0)
+    assert gateway.devices["dev1"].beat_count == 0
+    samples, written = finish(gateway)
+    # Kết quả cũ bị xóa trong một PATCH riêng, trước các beat của phiên mới (đánh số lại từ beat_0)
+    assert gateway.writes[0] == {PREFIX: None}
+    assert samples == reference_samples(other)
+    assert f"{PREFIX}/beats/beat_0" in written
+    assert written[PREFIX + "/summary"]["total_beats"] == len(samples)
@@ -0,0 +1,23 @@
+import numpy as np
+import pytest
+
+from ecg_dsp import ecg_to_beats
+from ecg_holter import segment_beats
+from ecg_io import open_recording
+from ecg_synth import synthesize
+
+
+@pytest.mark.parametrize("fs", [250, 360])
+def test_segment_beats_matches_whole_recording(fs, tmp_path):
+    """Đoạn 60 s trên bản ghi 5 phút: nhiều biên đoạn, cùng beats như ecg_to_beats trên cả bản ghi"""
+    signal = synthesize(300 * fs, fs, 72, kind="arrhythmia", seed=fs).astype("<i2")
+    path = tmp_path / "holter.i16"
+    path.write_bytes(signal.tobytes())
+    recording = open_recording(str(path), fmt="int16")
+
+    segments = list(segment_beats(recording, fs, str(tmp_path), segment_seconds=60))
+    assert len(segments) == 5
+    beats = np.concatenate([b for _, b in segments])
+    expected = ecg_to_beats(signal, fs=fs)
+    assert beats.shape == expected.shape
+    np.testing.assert_allclose(beats, expected, atol=1e-5)
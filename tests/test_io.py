@@ -0,0 +1,105 @@
+import gzip
+import io
+
+import numpy as np
+import pytest
+
+from ecg_io import PayloadError, decode_chunks, decompress, load_zstandard, open_recording, spool_payload
+from ecg_synth import synthesize
+
+MB = 1024 * 1024
+COMPRESSORS = [gzip.compress]
+if load_zstandard() is not None:
+    COMPRESSORS.append(lambda data: load_zstandard().ZstdCompressor().compress(data))
+
+
+@pytest.mark.parametrize("compress", COMPRESSORS)
+def test_decompress_round_trip(compress, tmp_path):
+    data = bytes(range(256)) * 4096
+    assert decompress(compress(data)) == data
+    path = tmp_path / "upload"
+    assert spool_payload(io.BytesIO(compress(data)), str(path)) == len(data)
+    assert path.read_bytes() == data
+
+
+@pytest.mark.parametrize("compress", COMPRESSORS)
+def test_decompression_bomb_is_rejected(compress, tmp_path):
+    # 64 MB số 0 nén còn vài chục KB: giới hạn 4 MB phải dừng sớm, không giải hết ra RAM / đĩa
+    bomb = compress(bytes(64 * MB))
+    with pytest.raises(PayloadError, match="exceeds"):
+        decompress(bomb, max_size=4 * MB)
+    path = tmp_path / "upload"
+    with pytest.raises(PayloadError, match="exceeds"):
+        spool_payload(io.BytesIO(bomb), str(path), max_size=4 * MB)
+    assert path.stat().st_size <= 4 * MB
+
+
+@pytest.mark.parametrize("compress", COMPRESSORS)
+def test_truncated_payload_is_rejected(compress, tmp_path):
+    truncated = compress(bytes(range(256)) * 4096)[:-16]
+    with pytest.raises(PayloadError):
+        decompress(truncated)
+    with pytest.raises(PayloadError):
+        spool_payload(io.BytesIO(truncated), str(tmp_path / "upload"))
+
+
+@pytest.mark.parametrize("fmt, content_type, filename", [("firebase", None, None), (None, "application/json", None),
+                                                         (None, None, "ecg.json"), (None, None, None)])
+def test_open_recording_rejects_firebase_chunks(fmt, content_type, filename, tmp_path):
+    path = tmp_path / "upload"
+    path.write_bytes(b'{"chunk_0": "512,513,514"}')
+    with pytest.raises(PayloadError, match="Holter mode requires"):
+        open_recording(str(path), fmt=fmt, content_type=content_type, filename=filename)
+
+
+def test_decode_chunks_orders_by_index():
+    chunks = {"chunk_10": "7,8", "chunk_2": "3,4", "chunk_1": "1,2", "chunk_3": "5,6"}
+    np.testing.assert_array_equal(decode_chunks(chunks), [1, 2, 3, 4, 5, 6, 7, 8])
+    assert decode_chunks(chunks).dtype == np.int16
+
+
+def test_decode_chunks_joins_gaps():
+    """Chunk thiếu không bị báo lỗi: phần còn lại nối liền (xem docstring decode_chunks)"""
+    np.testing.assert_array_equal(decode_chunks({"chunk_3": "3", "chunk_1": "1"}), [1, 3])
+
+
+def test_decode_chunks_tolerates_trailing_commas_and_empty_chunks():
+    chunks = {"chunk_1": "1,2,", "chunk_2": "", "chunk_3": " ,3, 4\n", "chunk_4": ","}
+    np.testing.assert_array_equal(decode_chunks(chunks), [1, 2, 3, 4])
+    assert decode_chunks({}).shape == (0,)
+
+
+@pytest.mark.parametrize("chunks", [
+    {"chunk_01": "1", "chunk_1": "2"},                          # trùng chỉ số
+    {"chunk_1": "1,,2"},
+    {"chunk_1": "1 2,3"},
+    {"chunk_1": "12-3"},
+    {"chunk_1": "1.5"},
+    {"chunk_1": "1,-,2"},
+    {"chunk_1": "32768"},
+    {"chunk_1": "-32769"},
+    {"chunk_1": 512},
+    {"chunk_1": ["512"]},
+    {"raw_1": "512"},
+    ["512"],
+])
+def test_decode_chunks_rejects_malformed_input(chunks):
+    with pytest.raises(PayloadError):
+        decode_chunks(chunks)
+
+
+def test_decode_chunks_duplicate_index_message():
+    with pytest.raises(PayloadError, match="Duplicate chunk index 1"):
+        decode_chunks({"chunk_1": "1", "chunk_001": "2"})
+
+
+def test_predict_firebase_matches_predict():
+    from flask_api_fixed import app
+
+    client = app.test_client()
+    signal = synthesize(2500, 250, 72, seed=0)
+    chunks = {f"chunk_{i // 100}": ",".join(map(str, signal[i:i + 100])) for i in range(0, len(signal), 100)}
+    expected = client.post("/predict", data=" ".join(map(str, signal)), content_type="text/plain")
+    response = client.post("/predict/firebase", json=chunks)
+    assert expected.status_code == response.status_code == 200
+    assert response.get_json() == expected.get_json()
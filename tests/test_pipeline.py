@@ -0,0 +1,68 @@
+import os
+import time
+
+import numpy as np
+import pytest
+
+from ecg_dsp import ecg_to_beats, ecg_to_beats_many
+from ecg_pipeline import DspPool
+from ecg_synth import synthesize
+
+
+@pytest.fixture
+def pool():
+    pool = DspPool(1).start()
+    yield pool
+    pool.close()
+
+
+def _kill_workers(pool):
+    executor = pool._executor
+    for process in list(executor._processes.values()):
+        process.kill()
+        process.join()
+    return executor
+
+
+def test_killed_worker_falls_back_in_process(pool):
+    """Worker bị kill (OOM killer): request vẫn có kết quả, pool được tạo lại ở lần sau"""
+    signal = synthesize(2500, 250, 72, seed=0)
+    expected = ecg_to_beats(signal, fs=250)
+    broken = _kill_workers(pool)
+    np.testing.assert_allclose(pool.ecg_to_beats(signal, 250), expected, rtol=1e-5, atol=1e-5)
+    np.testing.assert_allclose(pool.ecg_to_beats(signal, 250), expected, rtol=1e-5, atol=1e-5)
+    assert pool._executor is not None and pool._executor is not broken
+
+
+def test_killed_worker_falls_back_for_many(pool):
+    signals = [synthesize(2500, fs, 60 + 10 * i, seed=i) for i, fs in enumerate((250, 360, 250))]
+    expected = ecg_to_beats_many(signals, [250, 360, 250])
+    _kill_workers(pool)
+    for beats, want in zip(pool.ecg_to_beats_many(signals, [250, 360, 250]), expected):
+        np.testing.assert_allclose(beats, want, rtol=1e-5, atol=1e-5)
+
+
+def _hang_in_worker(parent_pid):
+    """Treo trong worker (như deadlock sau fork), chạy bình thường trong process chính"""
+    if os.getpid() != parent_pid:
+        time.sleep(600)
+    return "done"
+
+
+def test_hung_worker_times_out_and_falls_back():
+    """Worker treo không được giữ thread của request mãi: quá timeout thì tính lại tại chỗ, pool được tạo lại"""
+    pool = DspPool(1, timeout=0.5).start()
+    try:
+        hung = pool._executor
+        processes = list(hung._processes.values())
+        started = time.perf_counter()
+        assert pool.submit(_hang_in_worker, os.getpid()).result() == "done"
+        assert time.perf_counter() - started < 10
+        for process in processes:
+            process.join(5)
+            assert not process.is_alive()
+        signal = synthesize(2500, 250, 72, seed=0)
+        np.testing.assert_allclose(pool.ecg_to_beats(signal, 250), ecg_to_beats(signal, fs=250), rtol=1e-5, atol=1e-5)
+        assert pool._executor is not hung
+    finally:
+        pool.close()
@@ -0,0 +1,44 @@
+import os
+
+import pytest
+import torch
+
+from ecg_registry import ModelRegistry, SelfTestError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_staged_versions_are_evicted_without_activate():
+    """load(activate=False) không được giữ quá max_versions phiên bản trong bộ nhớ"""
+    registry = ModelRegistry(max_versions=2)
+    try:
+        active = registry.load(os.path.join(ROOT, "resetECG_new.pth"))
+        staged = [registry.load(os.path.join(ROOT, name), backend, activate=False)
+                  for name, backend in (("resetECG.pth", "eager"), ("resetECG.pth", "fused"),
+                                        ("resetECG_new.pth", "fused"))]
+        versions = registry.info()["versions"]
+        assert len(versions) == 2
+        assert registry.active is active
+        assert staged[-1].state == "ready" and all(entry.state == "retired" for entry in staged[:-1])
+    finally:
+        registry.close()
+
+
+def test_failed_checkpoint_does_not_evict_ready_version(tmp_path):
+    """Checkpoint không qua self-test khi registry đã đầy không được đẩy mất bản rollback đã kiểm tra"""
+    broken = tmp_path / "broken.pth"
+    state = torch.load(os.path.join(ROOT, "resetECG_new.pth"), map_location="cpu")
+    torch.save({k: torch.full_like(v, float("nan")) if v.is_floating_point() else v for k, v in state.items()},
+               broken)
+    registry = ModelRegistry(max_versions=2)
+    try:
+        active = registry.load(os.path.join(ROOT, "resetECG_new.pth"))
+        rollback = registry.load(os.path.join(ROOT, "resetECG.pth"), activate=False)
+        with pytest.raises(SelfTestError):
+            registry.load(str(broken))
+        assert registry.active is active
+        assert rollback.state == "ready"
+        assert {(v["version"], v["backend"]) for v in registry.info()["versions"]} == {
+            (active.version, active.backend), (rollback.version, rollback.backend)}
+    finally:
+        registry.close()
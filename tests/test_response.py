@@ -0,0 +1,96 @@
+import base64
+
+import numpy as np
+import pytest
+
+from ecg_response import ARRAY_DTYPES, EncodingError, encode_array, encode_payload, rle_encode, select_fields
+from ecg_synth import synthesize
+
+
+def rle_decode(encoded):
+    return np.repeat(np.asarray(encoded["values"], dtype=np.int64), encoded["lengths"])
+
+
+def array_decode(encoded):
+    data = np.frombuffer(base64.b64decode(encoded["b64"]), dtype=np.dtype(encoded["dtype"]).newbyteorder("<"))
+    return data.reshape(encoded["shape"])
+
+
+@pytest.mark.parametrize("values", [[], [3], [0, 0, 0, 2, 0, 0], np.random.default_rng(0).integers(0, 5, 1000)])
+def test_rle_round_trip(values):
+    encoded = rle_encode(np.asarray(values, dtype=np.int64))
+    np.testing.assert_array_equal(rle_decode(encoded), values)
+    assert len(encoded["values"]) == len(encoded["lengths"])
+
+
+@pytest.mark.parametrize("mode, rtol", [("f32", 1e-7), ("f16", 1e-3)])
+def test_float_array_round_trip(mode, rtol):
+    probs = np.random.default_rng(1).dirichlet(np.ones(5), 200).astype(np.float32)
+    encoded = encode_array(probs, mode)
+    assert encoded["dtype"] == ARRAY_DTYPES[mode].name and encoded["shape"] == [200, 5]
+    np.testing.assert_allclose(array_decode(encoded), probs, rtol=rtol, atol=rtol)
+    # Mảng số nguyên luôn là list
+    assert encode_array(np.arange(3), mode) == [0, 1, 2]
+
+
+def test_select_fields_rejects_unknown_names():
+    with pytest.raises(EncodingError, match=r"Unknown field\(s\): bogus"):
+        select_fields({"a": 1}, "a,bogus", ["a"], ("a",))
+
+
+def test_encode_payload_rejects_unknown_array_mode():
+    with pytest.raises(EncodingError):
+        encode_payload({"a": np.zeros(2)}, [("a", "a")], arrays="f64")
+
+
+@pytest.fixture(scope="module")
+def client():
+    from flask_api_fixed import app
+
+    return app.test_client()
+
+
+@pytest.fixture(scope="module")
+def signal_text():
+    return " ".join(map(str, synthesize(2500, 250, 72, seed=0)))
+
+
+def post(client, path, text, **query):
+    return client.post(path, query_string=query, data=text, content_type="text/plain")
+
+
+def test_predict_compact_encodings_round_trip(client, signal_text):
+    full = post(client, "/predict", signal_text, fields="per_beat_predictions,probabilities").get_json()
+    compact = post(client, "/predict", signal_text, fields="per_beat_predictions,probabilities",
+                   arrays="f16", rle="1").get_json()
+    np.testing.assert_array_equal(rle_decode(compact["per_beat_predictions"]), full["per_beat_predictions"])
+    np.testing.assert_allclose(array_decode(compact["probabilities"]), full["probabilities"], atol=1e-3)
+
+
+def test_unknown_field_is_400(client, signal_text):
+    response = post(client, "/predict", signal_text, fields="final_prediction,bogus")
+    assert response.status_code == 400
+    assert "Unknown field(s)" in response.get_json()["error"]
+
+
+def test_predictt_keeps_its_keys(client, signal_text):
+    """/predictt dùng chung prediction_response với /predict nhưng giữ tên trường cũ"""
+    predictt = post(client, "/predictt", signal_text).get_json()
+    predict = post(client, "/predict", signal_text).get_json()
+    assert list(predictt) == ["num_beats", "beats", "per_beat_predictions", "per_beat_confidence",
+                              "final_prediction"]
+    assert predictt["num_beats"] == predict["beats"] == len(predictt["beats"])
+    assert np.asarray(predictt["beats"]).shape == (predictt["num_beats"], 150)
+    assert predictt["per_beat_predictions"] == predict["per_beat_predictions"]
+    assert predictt["per_beat_confidence"] == predict["beat_confidence"]
+    assert predictt["final_prediction"] == predict["final_prediction"]
+
+
+def test_msgpack_without_package_is_406(client, signal_text, monkeypatch):
+    import flask_api_fixed
+
+    monkeypatch.setattr(flask_api_fixed, "load_msgpack", lambda: None)
+    response = client.post("/predict", data=signal_text, content_type="text/plain",
+                           headers={"Accept": "application/msgpack"})
+    assert response.status_code == 406
+    assert "msgpack" in response.get_json()["error"]
@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+
+from ecg_stream import StreamingBeatExtractor
+from ecg_synth import synthesize
+
+
+@pytest.mark.parametrize("detector", ["find_peaks", "pan_tompkins"])
+@pytest.mark.parametrize("tail", ["flat", "saturated"])
+def test_buffer_stays_bounded_without_peaks(detector, tail):
+    """Mất điện cực / bão hòa: không có peak nhưng buffer không được lớn theo độ dài bản ghi"""
+    extractor = StreamingBeatExtractor(fs=250, detector=detector)
+    bound = 2 * extractor.max_half + extractor.distance + 100
+    head = synthesize(5000, 250, 72, seed=1) if tail == "saturated" else np.empty(0)
+    signal = np.concatenate([head, np.full(250 * 600, 1023 if tail == "saturated" else 512)])
+    largest = 0
+    for i in range(0, len(signal), 100):
+        extractor.process(signal[i:i + 100])
+        largest = max(largest, len(extractor._buf))
+    assert largest <= bound
+
+
+def test_pan_tompkins_chunked_matches_single_pass():
+    """Giới hạn buffer không làm mất peak: Pan-Tompkins cho cùng R-peak dù chia chunk thế nào"""
+    signal = synthesize(250 * 60, 250, 72, seed=3)
+    whole = StreamingBeatExtractor(fs=250, detector="pan_tompkins")
+    expected = np.concatenate([whole.process(signal)[1], whole.flush()[1]])
+    chunked = StreamingBeatExtractor(fs=250, detector="pan_tompkins")
+    peaks = [chunked.process(signal[i:i + 100])[1] for i in range(0, len(signal), 100)] + [chunked.flush()[1]]
+    assert len(expected) > 50
+    np.testing.assert_array_equal(np.concatenate(peaks), expected)
+
+
+@pytest.mark.parametrize("body", [[1, 2, 3], 5, {"samples": "1,2,3"}, {"samples": [[1, 2], [3]]}])
+def test_stream_chunk_rejects_malformed_json_body(body):
+    """Body JSON sai dạng -> 400 (trước đây list / số làm request lỗi 500)"""
+    from flask_api_fixed import app
+
+    client = app.test_client()
+    session_id = client.post("/stream").get_json()["session_id"]
+    try:
+        response = client.post(f"/stream/{session_id}", json=body)
+        assert response.status_code == 400
+        assert "samples" in response.get_json()["error"]
+        assert client.post(f"/stream/{session_id}", json={"samples": [512] * 100}).status_code == 200
+    finally:
+        client.delete(f"/stream/{session_id}")
+
+
+def test_expired_session_is_discarded_without_classify():
+    """Hết hạn trong create / get của client khác: không flush + classify phiên cũ, lỗi classify không lan sang"""
+    from ecg_stream import StreamSessionStore
+
+    calls = []
+
+    def classify(beats):
+        calls.append(len(beats))
+        raise RuntimeError("model failed")
+
+    store = StreamSessionStore(classify, idle_timeout=60)
+    idle = store.create(250)
+    idle.extractor.process(synthesize(2500, 250, 72, seed=0)[:1000])
+    idle.last_active -= 120
+
+    def close():
+        raise AssertionError("expired session must not be flushed")
+
+    idle.close = close
+    events = idle.events(heartbeat=0.01)
+
+    fresh = store.create(250)
+    assert store.get(idle.id) is None and store.get(fresh.id) is fresh
+    assert idle.closed and calls == []
+    assert list(events) == []
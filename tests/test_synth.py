@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+from ecg_synth import synthesize
+
+
+def arrhythmia_reference(num_points, sample_rate, heart_rate):
+    """Vòng lặp gốc của generate_abnormal_ecg(abnormality='arrhythmia'): QRS ghi đè, P / T cộng"""
+    t = np.linspace(0, num_points / sample_rate, num_points)
+    qrs = np.zeros_like(t)
+    rr_interval = 60.0 / heart_rate
+    for i in range(int(t[-1] / rr_interval)):
+        beat_time = i * rr_interval + np.random.uniform(-0.1, 0.1)
+        if beat_time < 0 or beat_time > t[-1]:
+            continue
+        mask = (t >= beat_time) & (t < beat_time + 0.12)
+        qrs[mask] = 2.5 * np.exp(-((t[mask] - beat_time - 0.06) / 0.025) ** 2)
+        mask = (t >= beat_time - 0.2) & (t < beat_time - 0.08)
+        qrs[mask] += 0.2 * np.exp(-((t[mask] - beat_time + 0.14) / 0.04) ** 2)
+        mask = (t >= beat_time + 0.2) & (t < beat_time + 0.4)
+        qrs[mask] += 0.6 * np.exp(-((t[mask] - beat_time - 0.3) / 0.06) ** 2)
+    ecg = qrs + np.random.normal(0, 0.1, num_points) + 0.2 * np.sin(2 * np.pi * 0.3 * t)
+    ecg_normalized = (ecg - np.min(ecg)) / (np.max(ecg) - np.min(ecg) + 1e-8)
+    return np.clip(512 + (ecg_normalized - 0.5) * 250, 0, 1023).astype(int)
+
+
+@pytest.mark.parametrize("heart_rate", [65, 150, 600])
+def test_arrhythmia_matches_old_generator(heart_rate):
+    """Nhịp nhanh: cửa sổ T / P / QRS của các beat kề nhau chồng lên nhau"""
+    np.random.seed(0)
+    expected = arrhythmia_reference(5000, 360, heart_rate)
+    np.random.seed(0)
+    adc = synthesize(5000, 360, heart_rate, kind="arrhythmia", seed=np.random)
+    assert np.abs(adc - expected).max() <= 1
+    assert (adc != expected).mean() < 0.01
+
+
+def good_reference(num_points, sample_rate, heart_rate):
+    """Vòng lặp gốc của push_good_mock_data.generate_good_ecg: beat đặt tại chỉ số int(beat_time x fs)"""
+    t = np.linspace(0, num_points / sample_rate, num_points)
+    ecg = np.zeros(num_points)
+    rr_interval = 60.0 / heart_rate
+    for beat in range(int(num_points / sample_rate / rr_interval)):
+        at = int(beat * rr_interval * sample_rate)
+        if at - int(0.15 * sample_rate) >= 0:
+            i = np.arange(at - int(0.15 * sample_rate), at - int(0.05 * sample_rate))
+            ecg[i] += 0.3 * np.exp(-(((i - at) / sample_rate + 0.1) / 0.03) ** 2)
+        i = np.arange(max(0, at - int(0.02 * sample_rate)), min(num_points, at + int(0.08 * sample_rate)))
+        x = (i - at) / sample_rate
+        ecg[i] += np.select([(x >= -0.02) & (x <= 0), (x > 0) & (x <= 0.04), (x > 0.04) & (x <= 0.08)],
+                            [-0.5 * np.exp(-((x + 0.01) / 0.005) ** 2), 2.5 * np.exp(-((x - 0.02) / 0.01) ** 2),
+                             -0.8 * np.exp(-((x - 0.06) / 0.01) ** 2)])
+        i = np.arange(at + int(0.15 * sample_rate), min(num_points, at + int(0.4 * sample_rate)))
+        ecg[i] += 0.6 * np.exp(-(((i - at) / sample_rate - 0.275) / 0.06) ** 2)
+    ecg += np.random.normal(0, 0.03, num_points) + 0.05 * np.sin(2 * np.pi * 0.3 * t)
+    ecg_normalized = 2 * (ecg - ecg.min()) / (ecg.max() - ecg.min()) - 1
+    return np.clip(512 + ecg_normalized * 150, 0, 1023).astype(int)
+
+
+@pytest.mark.parametrize("sample_rate, heart_rate", [(360, 72), (250, 60), (360, 150)])
+def test_good_pins_linspace_beat_placement(sample_rate, heart_rate):
+    """
+    kind="good" đặt beat trên trục linspace như các kind khác, không theo chỉ số int(beat_time x fs) của
+    bộ sinh cũ: hình dạng giống nhau nhưng sườn QRS lệch tới vài chục ADC ở từng mẫu
+    """
+    np.random.seed(0)
+    expected = good_reference(5000, sample_rate, heart_rate)
+    np.random.seed(0)
+    adc, r_peaks = synthesize(5000, sample_rate, heart_rate, kind="good", seed=np.random, return_r_peaks=True)
+    diff = np.abs(adc - expected)
+    assert diff.mean() < 5 and diff.max() < 100
+    assert adc.min() >= 512 - 150 and adc.max() <= 512 + 150
+
+    # Đỉnh R cách mẫu gần r_peaks nhất trên linspace(0, N / fs, N) không quá 1 mẫu (nhiễu)
+    step = (5000 / sample_rate) / (5000 - 1)
+    at = np.round(r_peaks / step).astype(int)
+    at = at[(at >= 2) & (at < len(adc) - 2)]
+    windows = np.stack([adc[i - 2:i + 3] for i in at])
+    assert len(at) == int(5000 / sample_rate * heart_rate / 60)
+    assert np.all(np.abs(windows.argmax(axis=1) - 2) <= 1)